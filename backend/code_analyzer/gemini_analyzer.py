@@ -4,20 +4,36 @@ Analyzes code diffs to extract programming topics
 """
 
 import os
-import json
+import hashlib
 import logging
-from typing import Dict, List, Any, Optional
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from google.api_core import retry
+from google.generativeai import caching
+
+from main.utils.json_stream import (
+    TOPIC_BATCH_RESPONSE_SCHEMA, TOPIC_DESCRIPTION_RESPONSE_SCHEMA, TOPIC_RESPONSE_SCHEMA, TopicStreamParser,
+    parse_batch_topics, parse_topics
+)
+from main.utils.llm_batch import format_batch
+from main.utils.prompt_cache import TopicSnapshot, prefix_cache
+from main.utils.topic_index import DEFAULT_CONTEXT_TOPICS, select_relevant_topics
 
 logger = logging.getLogger(__name__)
 
-# Template for the prompt to Gemini
-GEMINI_PROMPT_TEMPLATE = """
-You are an expert programming topic analyzer. Analyze the provided code diff to identify new programming concepts, technologies, libraries, patterns, or methodologies that would be valuable for a programmer to learn.
+# Default seconds allowed for one analysis, including retries of the initial request
+DEFAULT_REQUEST_TIMEOUT = 30.0
 
-CODE DIFF:
-{code_diff}
+# Default model; callers may pick another tier per request (see main/utils/model_router.py)
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+# Template for the prompt to Gemini. The part before the diff only depends on
+# the project, so providers can cache it (see main/utils/prompt_cache.py)
+GEMINI_PROMPT_PREFIX_TEMPLATE = """
+You are an expert programming topic analyzer. Analyze the code diff at the end of this prompt to identify new programming concepts, technologies, libraries, patterns, or methodologies that would be valuable for a programmer to learn.
 
 USER'S ALREADY COMPLETED TOPICS:
 {completed_topics}
@@ -32,27 +48,117 @@ INSTRUCTIONS:
 4. For each new topic, identify any direct prerequisites that should be learned first.
 
 RESPONSE FORMAT:
-Respond with a list of new topics only. For each topic:
-- Title: Concise, specific name for the topic (e.g., "React Context API" not just "React")
-- Description: 1-2 sentence explanation of what this topic involves
-- Prerequisites: List any prerequisite topics that should be learned first (if any)
-- Code_References: Brief mention of where/how this appears in the diff
+Respond with a JSON array of new topics only. Each element is an object with:
+- "title": Concise, specific name for the topic (e.g., "React Context API" not just "React")
+- "description": 1-2 sentence explanation of what this topic involves
+- "prerequisites": Array of prerequisite topic titles that should be learned first (may be empty)
+- "code_references": Brief mention of where/how this appears in the diff
+
+No introduction or conclusion text is needed. Only analyze actual code—ignore comments, documentation, or configuration changes unless they introduce new programming concepts.
+"""
+
+GEMINI_PROMPT_DIFF_TEMPLATE = """
+CODE DIFF:
+{code_diff}
+"""
+
+GEMINI_PROMPT_TEMPLATE = GEMINI_PROMPT_PREFIX_TEMPLATE + GEMINI_PROMPT_DIFF_TEMPLATE
+
+# Template for prompts analyzing several small diffs at once
+GEMINI_BATCH_PROMPT_PREFIX_TEMPLATE = """
+You are an expert programming topic analyzer. At the end of this prompt are several independent code changes. Analyze each one separately to identify new programming concepts, technologies, libraries, patterns, or methodologies that would be valuable for a programmer to learn.
+
+Each change starts with a line "### CHANGE <key>" and ends with a line "### END CHANGE <key>".
+
+USER'S ALREADY COMPLETED TOPICS:
+{completed_topics}
+
+USER'S ALREADY IDENTIFIED TO-LEARN TOPICS:
+{to_learn_topics}
+
+INSTRUCTIONS:
+1. For each change, identify the programming concepts, technologies, or patterns evident in that change alone.
+2. EXCLUDE any topics that appear in the COMPLETED or TO-LEARN lists above.
+3. Merge synonyms or near-duplicates within a change.
+4. For each new topic, identify any direct prerequisites that should be learned first.
+
+RESPONSE FORMAT:
+Respond with a JSON array containing exactly one element per change, in any order. Each element is an object with:
+- "change_key": The key of the change, exactly as written after "### CHANGE"
+- "topics": Array of new topics for that change (may be empty), each an object with "title", "description", "prerequisites" and "code_references" as described:
+  - "title": Concise, specific name for the topic
+  - "description": 1-2 sentence explanation of what this topic involves
+  - "prerequisites": Array of prerequisite topic titles that should be learned first (may be empty)
+  - "code_references": Brief mention of where/how this appears in the change
 
 No introduction or conclusion text is needed. Only analyze actual code—ignore comments, documentation, or configuration changes unless they introduce new programming concepts.
 """
 
+GEMINI_BATCH_PROMPT_DIFF_TEMPLATE = """
+CODE CHANGES:
+{code_diffs}
+"""
+
+GEMINI_BATCH_PROMPT_TEMPLATE = GEMINI_BATCH_PROMPT_PREFIX_TEMPLATE + GEMINI_BATCH_PROMPT_DIFF_TEMPLATE
+
+# Prefix and diff templates by prompt kind, with the diff template's field
+PROMPT_TEMPLATES = {
+    "diff": (GEMINI_PROMPT_PREFIX_TEMPLATE, GEMINI_PROMPT_DIFF_TEMPLATE, "code_diff"),
+    "batch": (GEMINI_BATCH_PROMPT_PREFIX_TEMPLATE, GEMINI_BATCH_PROMPT_DIFF_TEMPLATE, "code_diffs"),
+}
+
+# Part of the cached prefix versions, so editing a template replaces the cached prefixes
+_TEMPLATE_VERSIONS = {
+    kind: hashlib.sha256(templates[0].encode("utf-8")).hexdigest()[:8]
+    for kind, templates in PROMPT_TEMPLATES.items()
+}
+
+# Template for prompts describing topics that are only known by ID and title
+GEMINI_DESCRIBE_PROMPT_TEMPLATE = """
+You are an expert programming teacher. The programming topics below were found as prerequisites of other topics and are only known by an ID and a title.
+
+TOPICS (one per line, as "<topic_id>: <title>"):
+{topics}
+
+INSTRUCTIONS:
+1. For each topic, write what a programmer learns when studying it.
+2. Name the direct prerequisites that should be learned first, if any.
+
+RESPONSE FORMAT:
+Respond with a JSON array containing one element per topic, in any order. Each element is an object with:
+- "topic_id": The ID of the topic, exactly as written before the colon
+- "title": Concise, specific name for the topic (keep the given title unless it is unclear)
+- "description": 1-2 sentence explanation of what this topic involves
+- "prerequisites": Array of prerequisite topic titles that should be learned first (may be empty)
+
+No introduction or conclusion text is needed.
+"""
+
+
 class GeminiTopicAnalyzer:
     """
     Uses Google Gemini AI to analyze code diffs and extract programming topics
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, max_context_topics: Optional[int] = None,
+                 request_timeout: Optional[float] = None, model_name: Optional[str] = None):
         """
         Initialize the Gemini client with API key
         
         Args:
             api_key: Google Gemini API key (defaults to GEMINI_API_KEY env var)
+            max_context_topics: Maximum number of known topics rendered into the prompt
+                (defaults to BRAINVIBE_PROMPT_CONTEXT_TOPICS env var)
+            request_timeout: Default seconds allowed per analysis
+                (defaults to BRAINVIBE_LLM_TIMEOUT env var)
+            model_name: Default Gemini model (defaults to BRAINVIBE_LLM_FAST_MODEL env var)
         """
+        self.request_timeout = request_timeout or float(
+            os.environ.get("BRAINVIBE_LLM_TIMEOUT", DEFAULT_REQUEST_TIMEOUT)
+        )
+        self.max_context_topics = max_context_topics or int(
+            os.environ.get("BRAINVIBE_PROMPT_CONTEXT_TOPICS", DEFAULT_CONTEXT_TOPICS)
+        )
         self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("Gemini API key not provided and GEMINI_API_KEY environment variable not set")
@@ -60,16 +166,28 @@ class GeminiTopicAnalyzer:
         # Initialize the Gemini client
         genai.configure(api_key=self.api_key)
         
-        # Get the model - using latest stable version
         # Options: 'gemini-1.5-flash' (fast), 'gemini-1.5-pro' (advanced), 'gemini-2.0-flash' (experimental)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.model_name = model_name or os.environ.get("BRAINVIBE_LLM_FAST_MODEL", DEFAULT_MODEL)
+        self._models = {}
+        self.model = self._get_model(self.model_name)
+    
+    def _get_model(self, model_name: Optional[str] = None):
+        """Return the (cached) GenerativeModel for a model name"""
+        model_name = model_name or self.model_name
+        if model_name not in self._models:
+            self._models[model_name] = genai.GenerativeModel(model_name)
+        return self._models[model_name]
     
-    @retry.Retry(predicate=retry.if_transient_error)
     def analyze_diff(self, 
                     code_diff: str, 
                     completed_topics: List[str] = None, 
                     to_learn_topics: List[str] = None,
-                    temperature: float = 0.1) -> Dict[str, Any]:
+                    temperature: float = 0.1,
+                    on_topic: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    timeout: Optional[float] = None,
+                    retry_transient: bool = True,
+                    model: Optional[str] = None,
+                    snapshot: Optional[TopicSnapshot] = None) -> Dict[str, Any]:
         """
         Analyze a code diff to extract programming topics
         
@@ -78,6 +196,14 @@ class GeminiTopicAnalyzer:
             completed_topics: List of topics the user has already completed
             to_learn_topics: List of topics the user already knows they need to learn
             temperature: Sampling temperature (0.0-1.0), lower = more deterministic
+            on_topic: Optional callback invoked with each topic as soon as it is parsed,
+                while the model is still generating the rest of the response
+            timeout: Seconds allowed for the call, including retries (defaults to request_timeout)
+            retry_transient: Retry transient errors with capped backoff inside the timeout;
+                disable when the caller runs its own retry policy
+            model: Gemini model for this call (defaults to model_name)
+            snapshot: Optional snapshot of all the project's topics, used instead of
+                completed_topics and to_learn_topics and cached on the Gemini side
             
         Returns:
             Dictionary containing extracted topics and their metadata
@@ -86,45 +212,337 @@ class GeminiTopicAnalyzer:
             logger.warning("Empty code diff provided, skipping analysis")
             return {"topics": []}
         
-        # Format the lists for the prompt
-        completed_topics_str = "\n".join([f"- {topic}" for topic in (completed_topics or [])])
-        to_learn_topics_str = "\n".join([f"- {topic}" for topic in (to_learn_topics or [])])
+        chunks = []
+        topics = []
+        try:
+            for topic in self.stream_topics(
+                code_diff,
+                completed_topics=completed_topics,
+                to_learn_topics=to_learn_topics,
+                temperature=temperature,
+                raw_chunks=chunks,
+                timeout=timeout,
+                retry_transient=retry_transient,
+                model=model,
+                snapshot=snapshot
+            ):
+                topics.append(topic)
+                if on_topic:
+                    on_topic(topic)
+        except Exception as e:
+            logger.error(f"Error calling Gemini API: {str(e)}")
+            raise
+        
+        response_text = "".join(chunks)
+        if not topics and response_text.strip():
+            # The model ignored the JSON schema; fall back to the line-based format
+            topics = self._parse_gemini_response(response_text)
+        
+        return {
+            "topics": topics,
+            "raw_response": response_text
+        }
+    
+    def stream_topics(self,
+                      code_diff: str,
+                      completed_topics: List[str] = None,
+                      to_learn_topics: List[str] = None,
+                      temperature: float = 0.1,
+                      raw_chunks: Optional[List[str]] = None,
+                      timeout: Optional[float] = None,
+                      retry_transient: bool = True,
+                      model: Optional[str] = None,
+                      snapshot: Optional[TopicSnapshot] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream topics from Gemini using schema-constrained JSON output
+        
+        Each topic is yielded as soon as its JSON object closes in the streamed
+        response, without waiting for the full response.
         
-        # Format the prompt
-        prompt = GEMINI_PROMPT_TEMPLATE.format(
-            code_diff=code_diff,
-            completed_topics=completed_topics_str or "None",
-            to_learn_topics=to_learn_topics_str or "None"
+        Args:
+            code_diff: The code diff to analyze
+            completed_topics: List of topics the user has already completed
+            to_learn_topics: List of topics the user already knows they need to learn
+            temperature: Sampling temperature (0.0-1.0), lower = more deterministic
+            raw_chunks: Optional list that receives the raw response chunks
+            timeout: Seconds allowed for the request, including retries (defaults to request_timeout)
+            retry_transient: Retry transient errors of the initial request with capped backoff
+            model: Gemini model for this call (defaults to model_name)
+            snapshot: Optional snapshot of all the project's topics (see analyze_diff)
+            
+        Yields:
+            Topic dictionaries with title, description, prerequisites and code_references
+        """
+        generative_model, prompt, cache_key = self._prepare(
+            "diff", code_diff, completed_topics, to_learn_topics, snapshot, model
         )
+        with self._cached_prefix_errors(cache_key):
+            response = generative_model.generate_content(
+                prompt,
+                stream=True,
+                **self._request_kwargs(TOPIC_RESPONSE_SCHEMA, temperature, timeout, retry_transient)
+            )
         
-        try:
-            # Call the Gemini API
-            response = self.model.generate_content(
+        parser = TopicStreamParser()
+        for chunk in response:
+            text = chunk.text
+            if raw_chunks is not None:
+                raw_chunks.append(text)
+            for topic in parser.feed(text):
+                yield self._normalize_topic(topic)
+    
+    def analyze_batch(self,
+                      code_diffs: Dict[str, str],
+                      completed_topics: List[str] = None,
+                      to_learn_topics: List[str] = None,
+                      temperature: float = 0.1,
+                      timeout: Optional[float] = None,
+                      retry_transient: bool = True,
+                      model: Optional[str] = None,
+                      snapshot: Optional[TopicSnapshot] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Analyze several small diffs with a single request
+        
+        The template and topic context are sent once for all diffs; the model
+        answers with one topic list per change key.
+        
+        Args:
+            code_diffs: Diffs keyed by short change keys
+            completed_topics: List of topics the user has already completed
+            to_learn_topics: List of topics the user already knows they need to learn
+            temperature: Sampling temperature (0.0-1.0), lower = more deterministic
+            timeout: Seconds allowed for the call, including retries (defaults to request_timeout)
+            retry_transient: Retry transient errors with capped backoff inside the timeout
+            model: Gemini model for this call (defaults to model_name)
+            snapshot: Optional snapshot of all the project's topics (see analyze_diff)
+            
+        Returns:
+            Topic lists by change key; keys the model left out are missing
+        """
+        if not code_diffs:
+            return {}
+        generative_model, prompt, cache_key = self._prepare(
+            "batch", format_batch(code_diffs), completed_topics, to_learn_topics, snapshot, model
+        )
+        with self._cached_prefix_errors(cache_key):
+            response = generative_model.generate_content(
                 prompt,
-                generation_config={
-                    "temperature": temperature,
-                    "top_p": 0.95,
-                    "top_k": 40,
-                    "max_output_tokens": 8192,
-                }
+                **self._request_kwargs(TOPIC_BATCH_RESPONSE_SCHEMA, temperature, timeout, retry_transient)
             )
+        results = parse_batch_topics(response.text)
+        return {
+            key: [self._normalize_topic(topic) for topic in topics]
+            for key, topics in results.items() if key in code_diffs
+        }
+    
+    def describe_topics(self,
+                        topics: Dict[str, str],
+                        temperature: float = 0.1,
+                        timeout: Optional[float] = None,
+                        retry_transient: bool = True,
+                        model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Describe many topics known only by ID and title with a single request
+        
+        Args:
+            topics: Titles keyed by topic ID
+            temperature: Sampling temperature (0.0-1.0), lower = more deterministic
+            timeout: Seconds allowed for the call, including retries (defaults to request_timeout)
+            retry_transient: Retry transient errors with capped backoff inside the timeout
+            model: Gemini model for this call (defaults to model_name)
             
-            # Process the response
-            response_text = response.text
+        Returns:
+            Topics with topic_id, title, description and prerequisites; topics the model left out are missing
+        """
+        if not topics:
+            return []
+        prompt = GEMINI_DESCRIBE_PROMPT_TEMPLATE.format(
+            topics="\n".join(f"{topic_id}: {title}" for topic_id, title in topics.items())
+        )
+        response = self._get_model(model).generate_content(
+            prompt,
+            **self._request_kwargs(TOPIC_DESCRIPTION_RESPONSE_SCHEMA, temperature, timeout, retry_transient)
+        )
+        return [self._normalize_topic(topic) for topic in parse_topics(response.text)]
+    
+    def _request_kwargs(self,
+                        schema: Dict[str, Any],
+                        temperature: float,
+                        timeout: Optional[float],
+                        retry_transient: bool) -> Dict[str, Any]:
+        """
+        Generation config and request options shared by every call
+        
+        Args:
+            schema: Response schema the JSON output must follow
+            temperature: Sampling temperature (0.0-1.0), lower = more deterministic
+            timeout: Seconds allowed for the call, including retries (defaults to request_timeout)
+            retry_transient: Retry transient errors with capped backoff inside the timeout
             
-            # Parse the response into a structured format
-            # This is a simple parser that expects the format described in the prompt
-            topics = self._parse_gemini_response(response_text)
+        Returns:
+            Keyword arguments for generate_content
+        """
+        timeout = timeout or self.request_timeout
+        return {
+            "generation_config": {
+                "temperature": temperature,
+                "top_p": 0.95,
+                "top_k": 40,
+                "max_output_tokens": 8192,
+                "response_mime_type": "application/json",
+                "response_schema": schema,
+            },
+            # Capped backoff that gives up once the call's time budget is spent;
+            # None disables the client library's default retry so the caller's policy applies
+            "request_options": {
+                "timeout": timeout,
+                "retry": retry.Retry(
+                    predicate=retry.if_transient_error,
+                    initial=0.5,
+                    maximum=4.0,
+                    multiplier=2.0,
+                    timeout=timeout
+                ) if retry_transient else None,
+            },
+        }
+    
+    def _build_prompt(self,
+                      code_diff: str,
+                      completed_topics: Optional[List[str]],
+                      to_learn_topics: Optional[List[str]],
+                      kind: str = "diff") -> str:
+        """
+        Render the full prompt template for a diff
+        
+        Args:
+            code_diff: The code diff to analyze (for "batch", the diffs joined by format_batch)
+            completed_topics: List of topics the user has already completed
+            to_learn_topics: List of topics the user already knows they need to learn
+            kind: "diff" or "batch"
             
-            return {
-                "topics": topics,
-                "raw_response": response_text
-            }
+        Returns:
+            The prompt text
+        """
+        prefix_template, diff_template, diff_field = PROMPT_TEMPLATES[kind]
+        # Keep only the known topics relevant to this diff so the prompt stays bounded
+        prefix = prefix_template.format(
+            completed_topics=self._format_topics(self._select_context(code_diff, completed_topics)),
+            to_learn_topics=self._format_topics(self._select_context(code_diff, to_learn_topics))
+        )
+        return prefix + diff_template.format(**{diff_field: code_diff})
+    
+    def _prepare(self,
+                 kind: str,
+                 code_diff: str,
+                 completed_topics: Optional[List[str]],
+                 to_learn_topics: Optional[List[str]],
+                 snapshot: Optional[TopicSnapshot],
+                 model: Optional[str]) -> Tuple[Any, str, Optional[str]]:
+        """
+        Pick the model and render the prompt for a call
+        
+        With a snapshot whose prefix is cached on the Gemini side, the model
+        references the cached prefix and the prompt is just the diff. Otherwise
+        the whole prompt is rendered, with the known topics most relevant to the diff.
+        
+        Args:
+            kind: "diff" or "batch"
+            code_diff: The code diff to analyze
+            completed_topics: List of topics the user has already completed
+            to_learn_topics: List of topics the user already knows they need to learn
+            snapshot: Optional snapshot of all the project's topics
+            model: Gemini model for this call (defaults to model_name)
             
-        except Exception as e:
-            logger.error(f"Error calling Gemini API: {str(e)}")
+        Returns:
+            The GenerativeModel, the prompt and the key of the cached prefix (None when not cached)
+        """
+        model_name = model or self.model_name
+        if snapshot is not None:
+            cache_key = f"gemini:{kind}:{model_name}:{snapshot.project_id}"
+            handle = prefix_cache.get(
+                cache_key,
+                f"{snapshot.version}:{_TEMPLATE_VERSIONS[kind]}",
+                snapshot.tokens,
+                lambda ttl: self._create_cached_prefix(kind, snapshot, model_name, ttl),
+                delete=lambda cached: cached[0].delete()
+            )
+            if handle is not None:
+                _, diff_template, diff_field = PROMPT_TEMPLATES[kind]
+                return handle[1], diff_template.format(**{diff_field: code_diff}), cache_key
+            completed_topics, to_learn_topics = snapshot.completed, snapshot.to_learn
+        return self._get_model(model_name), self._build_prompt(code_diff, completed_topics, to_learn_topics, kind), None
+    
+    def _create_cached_prefix(self, kind: str, snapshot: TopicSnapshot, model_name: str, ttl: int):
+        """Upload the prompt prefix of a snapshot; returns the CachedContent and a model using it"""
+        prefix_template = PROMPT_TEMPLATES[kind][0]
+        cached = caching.CachedContent.create(
+            model=model_name,
+            display_name=f"brainvibe-{kind}-{snapshot.project_id}"[:128],
+            contents=[prefix_template.format(
+                completed_topics=self._format_topics(snapshot.completed),
+                to_learn_topics=self._format_topics(snapshot.to_learn)
+            )],
+            ttl=timedelta(seconds=ttl)
+        )
+        return cached, genai.GenerativeModel.from_cached_content(cached_content=cached)
+    
+    @contextmanager
+    def _cached_prefix_errors(self, cache_key: Optional[str]):
+        """Forget a cached prefix Gemini no longer has, so the next call uploads it again"""
+        try:
+            yield
+        except (google_exceptions.NotFound, google_exceptions.PermissionDenied):
+            if cache_key:
+                prefix_cache.invalidate(cache_key)
             raise
     
+    @staticmethod
+    def _format_topics(titles: List[str]) -> str:
+        """Format topic titles as a bullet list for the prompt"""
+        return "\n".join(f"- {title}" for title in titles) or "None"
+    
+    def _normalize_topic(self, topic: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fill in missing fields of a parsed topic
+        
+        Args:
+            topic: Topic object as returned by the model
+            
+        Returns:
+            Topic with title, description, prerequisites and code_references
+        """
+        prerequisites = topic.get("prerequisites") or []
+        if isinstance(prerequisites, str):
+            prerequisites = [p.strip() for p in prerequisites.split(",") if p.strip()]
+        normalized = dict(topic)
+        normalized.update({
+            "title": str(topic.get("title", "")).strip(),
+            "description": str(topic.get("description", "")).strip(),
+            "prerequisites": prerequisites,
+            "code_references": str(topic.get("code_references", "")).strip()
+        })
+        return normalized
+    
+    def _select_context(self, code_diff: str, titles: Optional[List[str]]) -> List[str]:
+        """
+        Select the topic titles most relevant to the diff
+        
+        Args:
+            code_diff: The code diff to analyze
+            titles: Known topic titles
+            
+        Returns:
+            At most max_context_topics titles
+        """
+        if not titles:
+            return []
+        selected = select_relevant_topics(
+            code_diff,
+            [{"title": title} for title in titles],
+            limit=self.max_context_topics
+        )
+        return [topic["title"] for topic in selected]
+    
     def _parse_gemini_response(self, response_text: str) -> List[Dict[str, Any]]:
         """
         Parse the response from Gemini into a structured format
@@ -191,27 +609,3 @@ class GeminiTopicAnalyzer:
         
         return topics
 
-# Usage example:
-if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
-        print("Usage: python gemini_analyzer.py <diff_file>")
-        sys.exit(1)
-    
-    # Read the diff from a file
-    with open(sys.argv[1], "r") as f:
-        diff_content = f.read()
-    
-    # Sample completed and to-learn topics
-    completed = ["Python Basics", "Git Version Control"]
-    to_learn = ["React Hooks", "GraphQL Queries"]
-    
-    # Initialize the analyzer
-    analyzer = GeminiTopicAnalyzer()
-    
-    # Analyze the diff
-    result = analyzer.analyze_diff(diff_content, completed, to_learn)
-    
-    # Print the results
-    print(json.dumps(result, indent=2)) 
\ No newline at end of file
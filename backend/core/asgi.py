@@ -3,6 +3,10 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the app through this module (e.g. `uvicorn core.asgi:application`) so the
+server-sent event streams under /api/.../events/ are handled asynchronously
+instead of holding a worker thread per connected client.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -165,10 +165,126 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache (used for editor delta uploads); use a shared backend such as Redis with several processes
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', 'brainvibe'),
+    }
+}
+
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True  # For development only, change in production
 CORS_ALLOW_CREDENTIALS = True
 
+# BrainVibe analysis settings
+# Maximum number of existing project topics rendered into an analysis prompt
+BRAINVIBE_PROMPT_CONTEXT_TOPICS = int(os.getenv('BRAINVIBE_PROMPT_CONTEXT_TOPICS', '40'))
+# Files whose added code lines the topic rules leave unexplained in a larger share than this go to the LLM
+BRAINVIBE_RULES_MAX_UNEXPLAINED_RATIO = float(os.getenv('BRAINVIBE_RULES_MAX_UNEXPLAINED_RATIO', '0.25'))
+# Background threads running streamed (asynchronous) diff analyses
+BRAINVIBE_ANALYSIS_WORKERS = int(os.getenv('BRAINVIBE_ANALYSIS_WORKERS', '4'))
+# Turns per class of the weighted-fair analysis scheduler (main/utils/scheduler.py), and the queue wait
+# after which a job runs next regardless of its class
+BRAINVIBE_SCHEDULER_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, weight in (item.split('=') for item in
+                         os.getenv('BRAINVIBE_SCHEDULER_WEIGHTS', 'interactive=8,normal=3,low=1').split(','))
+}
+BRAINVIBE_SCHEDULER_MAX_WAIT_SECONDS = float(os.getenv('BRAINVIBE_SCHEDULER_MAX_WAIT_SECONDS', '30'))
+# Worker threads per stage of the analysis pipeline (main/utils/pipeline.py, services.get_analysis_pipeline),
+# and the jobs each stage queues before the stage before it waits
+BRAINVIBE_PIPELINE_WORKERS = {
+    stage.strip(): int(workers)
+    for stage, workers in (item.split('=') for item in os.getenv(
+        'BRAINVIBE_PIPELINE_WORKERS', 'parse=2,classify=2,filter=4,cache=2,llm=8,merge=2,persist=2').split(','))
+}
+BRAINVIBE_PIPELINE_QUEUE_SIZE = int(os.getenv('BRAINVIBE_PIPELINE_QUEUE_SIZE', '64'))
+# Optional .brainvibeignore-style file whose patterns are dropped from diffs before analysis
+BRAINVIBE_IGNORE_FILE = os.getenv('BRAINVIBE_IGNORE_FILE', '')
+# LLM provider used for topic extraction: "mock", "gemini" or "stub" (local stub server)
+BRAINVIBE_LLM_PROVIDER = os.getenv('BRAINVIBE_LLM_PROVIDER', 'mock')
+# Base URL of the stub LLM server started with `manage.py run_llm_stub`
+BRAINVIBE_LLM_STUB_URL = os.getenv('BRAINVIBE_LLM_STUB_URL', 'http://127.0.0.1:8765')
+# Seconds before an LLM provider request is abandoned
+BRAINVIBE_LLM_TIMEOUT = float(os.getenv('BRAINVIBE_LLM_TIMEOUT', '30'))
+# Total seconds an LLM analysis may take, retries included
+BRAINVIBE_LLM_DEADLINE = float(os.getenv('BRAINVIBE_LLM_DEADLINE', '60'))
+# Attempts per LLM analysis for transient errors (capped, jittered exponential backoff in between)
+BRAINVIBE_LLM_MAX_ATTEMPTS = int(os.getenv('BRAINVIBE_LLM_MAX_ATTEMPTS', '3'))
+# Send a duplicate LLM request when the first is slower than the observed p95
+BRAINVIBE_LLM_HEDGE = os.getenv('BRAINVIBE_LLM_HEDGE', 'False') == 'True'
+# Error rate over the last 30s that opens the LLM circuit breaker, and how long it stays open
+BRAINVIBE_LLM_CIRCUIT_ERROR_RATE = float(os.getenv('BRAINVIBE_LLM_CIRCUIT_ERROR_RATE', '0.5'))
+BRAINVIBE_LLM_CIRCUIT_OPEN_SECONDS = float(os.getenv('BRAINVIBE_LLM_CIRCUIT_OPEN_SECONDS', '30'))
+# Requests per second sent to the LLM provider by this process (0 for no limit)
+BRAINVIBE_LLM_MAX_RPS = float(os.getenv('BRAINVIBE_LLM_MAX_RPS', '0'))
+# Model tiers: the fast model takes most diffs, the strong long-context model takes huge diffs and escalations
+BRAINVIBE_LLM_FAST_MODEL = os.getenv('BRAINVIBE_LLM_FAST_MODEL', 'gemini-1.5-flash')
+BRAINVIBE_LLM_STRONG_MODEL = os.getenv('BRAINVIBE_LLM_STRONG_MODEL', 'gemini-1.5-pro')
+# Estimated-token thresholds of the model router (main/utils/model_router.py): prompts up to the first
+# go to the fast model, up to the second to the strong model, and larger diffs are chunked
+BRAINVIBE_ROUTER_FAST_MAX_TOKENS = int(os.getenv('BRAINVIBE_ROUTER_FAST_MAX_TOKENS', '32000'))
+BRAINVIBE_ROUTER_STRONG_MAX_TOKENS = int(os.getenv('BRAINVIBE_ROUTER_STRONG_MAX_TOKENS', '500000'))
+# Fast-tier results with no topics for a diff of at least this many tokens are retried on the strong model
+BRAINVIBE_ROUTER_ESCALATE_MIN_TOKENS = int(os.getenv('BRAINVIBE_ROUTER_ESCALATE_MIN_TOKENS', '400'))
+# Client deadlines (X-BrainVibe-Deadline header): seconds kept back for sending the response, the largest
+# budget accepted, and the share of the budget per analysis stage (main/utils/resilience.py)
+BRAINVIBE_DEADLINE_MARGIN_SECONDS = float(os.getenv('BRAINVIBE_DEADLINE_MARGIN_SECONDS', '0.5'))
+BRAINVIBE_REQUEST_MAX_DEADLINE = float(os.getenv('BRAINVIBE_REQUEST_MAX_DEADLINE', '300'))
+BRAINVIBE_DEADLINE_STAGE_SHARES = {
+    stage.strip(): float(share)
+    for stage, share in (item.split('=') for item in
+                         os.getenv('BRAINVIBE_DEADLINE_STAGE_SHARES', 'filter=0.05,cache=0.05,llm=0.8,save=0.1').split(','))
+}
+# Compaction of the LLM residue (main/utils/diff_compaction.py): context lines kept around added lines,
+# longest string literal kept whole, and longest run of added data lines kept whole
+BRAINVIBE_COMPACTION_ENABLED = os.getenv('BRAINVIBE_COMPACTION_ENABLED', 'True') == 'True'
+BRAINVIBE_COMPACTION_CONTEXT_LINES = int(os.getenv('BRAINVIBE_COMPACTION_CONTEXT_LINES', '0'))
+BRAINVIBE_COMPACTION_MAX_LITERAL = int(os.getenv('BRAINVIBE_COMPACTION_MAX_LITERAL', '80'))
+BRAINVIBE_COMPACTION_MAX_DATA_LINES = int(os.getenv('BRAINVIBE_COMPACTION_MAX_DATA_LINES', '6'))
+# Micro-batching (main/utils/llm_batch.py): diffs up to the first token count share prompts of at most the
+# second token count and third item count; submitted diffs wait up to the window for others (0 disables)
+BRAINVIBE_BATCH_ITEM_MAX_TOKENS = int(os.getenv('BRAINVIBE_BATCH_ITEM_MAX_TOKENS', '1000'))
+BRAINVIBE_BATCH_MAX_TOKENS = int(os.getenv('BRAINVIBE_BATCH_MAX_TOKENS', '12000'))
+BRAINVIBE_BATCH_MAX_ITEMS = int(os.getenv('BRAINVIBE_BATCH_MAX_ITEMS', '20'))
+BRAINVIBE_BATCH_WINDOW_MS = int(os.getenv('BRAINVIBE_BATCH_WINDOW_MS', '500'))
+# Mark formatting-only, comment-only and rename-only changes analyzed without topics
+# (main/utils/change_classifier.py) instead of sending them to the LLM
+BRAINVIBE_SKIP_TRIVIAL_CHANGES = os.getenv('BRAINVIBE_SKIP_TRIVIAL_CHANGES', 'True') == 'True'
+# Placeholder prerequisite topics (main/utils/topic_enrichment.py): topics described per LLM call, seconds a
+# background pass waits for more placeholders (0 disables it), and placeholders handled per background pass
+BRAINVIBE_ENRICHMENT_BATCH_SIZE = int(os.getenv('BRAINVIBE_ENRICHMENT_BATCH_SIZE', '50'))
+BRAINVIBE_ENRICHMENT_DELAY_SECONDS = float(os.getenv('BRAINVIBE_ENRICHMENT_DELAY_SECONDS', '60'))
+BRAINVIBE_ENRICHMENT_MAX_TOPICS = int(os.getenv('BRAINVIBE_ENRICHMENT_MAX_TOPICS', '500'))
+# Provider-side caching of the prompt prefix (main/utils/prompt_cache.py): projects whose topic lists make a
+# prefix of at least the model's minimum tokens (by model name prefix, "default" for other models; Gemini 1.5
+# caches nothing under 32768) send all their topics in a prefix cached for the TTL (seconds)
+BRAINVIBE_PROMPT_CACHE_ENABLED = os.getenv('BRAINVIBE_PROMPT_CACHE_ENABLED', 'True') == 'True'
+BRAINVIBE_PROMPT_CACHE_MIN_TOKENS = {
+    model.strip(): int(tokens)
+    for model, tokens in (item.split('=') for item in
+                          os.getenv('BRAINVIBE_PROMPT_CACHE_MIN_TOKENS', 'gemini-1.5=32768,default=4096').split(','))
+}
+BRAINVIBE_PROMPT_CACHE_TTL = int(os.getenv('BRAINVIBE_PROMPT_CACHE_TTL', '3600'))
+# Seconds LLM topics stay cached per diff unit fingerprint (main/utils/analysis_cache.py; 0 disables)
+BRAINVIBE_ANALYSIS_CACHE_TTL = int(os.getenv('BRAINVIBE_ANALYSIS_CACHE_TTL', str(7 * 24 * 3600)))
+# Seconds file contents stay cached as bases for delta uploads, and the largest content cached
+BRAINVIBE_CONTENT_CACHE_TTL = int(os.getenv('BRAINVIBE_CONTENT_CACHE_TTL', '3600'))
+BRAINVIBE_CONTENT_CACHE_MAX_BYTES = int(os.getenv('BRAINVIBE_CONTENT_CACHE_MAX_BYTES', str(5 * 1024 * 1024)))
+# A Cursor session is analyzed once it has been idle this long (swept in the background and by `manage.py close_cursor_sessions`)
+BRAINVIBE_CURSOR_SESSION_IDLE_SECONDS = float(os.getenv('BRAINVIBE_CURSOR_SESSION_IDLE_SECONDS', '120'))
+# ...or as soon as the diffs of its edits add up to this many bytes
+BRAINVIBE_CURSOR_SESSION_MAX_DIFF_BYTES = int(os.getenv('BRAINVIBE_CURSOR_SESSION_MAX_DIFF_BYTES', '200000'))
+# Admission control (main/utils/admission.py): analyses in flight above which new scheduled_scan changes,
+# then git_commit/cli changes, are refused with 429, and above which every source is refused with 503
+BRAINVIBE_ADMISSION_ENABLED = os.getenv('BRAINVIBE_ADMISSION_ENABLED', 'True') == 'True'
+BRAINVIBE_ADMISSION_LOW_MAX_DEPTH = int(os.getenv('BRAINVIBE_ADMISSION_LOW_MAX_DEPTH', '16'))
+BRAINVIBE_ADMISSION_NORMAL_MAX_DEPTH = int(os.getenv('BRAINVIBE_ADMISSION_NORMAL_MAX_DEPTH', '40'))
+BRAINVIBE_ADMISSION_MAX_DEPTH = int(os.getenv('BRAINVIBE_ADMISSION_MAX_DEPTH', '64'))
+# Upper bound of the Retry-After sent with refusals
+BRAINVIBE_ADMISSION_MAX_RETRY_AFTER = int(os.getenv('BRAINVIBE_ADMISSION_MAX_RETRY_AFTER', '60'))
+
 # Logging configuration
 LOGGING = {
     'version': 1,
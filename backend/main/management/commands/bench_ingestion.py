@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from main.models import Project
+from main.utils.llm_providers import PROVIDERS, reset_providers
+from main.utils.llm_stub_server import StubBehaviour, start_stub_server
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Building blocks for synthetic diffs: imports the topic rules know about,
+# plus application code they cannot explain so part of each diff reaches the LLM
+SYNTHETIC_IMPORTS = [
+    ("py", "import numpy as np"),
+    ("py", "from django.db import models"),
+    ("py", "import requests"),
+    ("js", "import React, { useState } from 'react';"),
+    ("js", "import axios from 'axios';"),
+    ("js", "import jwt_decode from 'jwt-decode';"),
+]
+
+
+def _synthetic_diff(rng, index, body_lines):
+    extension, import_line = rng.choice(SYNTHETIC_IMPORTS)
+    path = f"src/bench/module_{index}.{extension}"
+    comment = "#" if extension == "py" else "//"
+    added = [import_line] + [
+        f"value_{index}_{n} = compute_{rng.randint(0, 999)}(value_{index}_{n - 1})  {comment} step {n}"
+        for n in range(1, body_lines + 1)
+    ]
+    return "\n".join([
+        f"diff --git a/{path} b/{path}",
+        "new file mode 100644",
+        "--- /dev/null",
+        f"+++ b/{path}",
+        f"@@ -0,0 +1,{len(added)} @@",
+    ] + [f"+{line}" for line in added]) + "\n"
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark throughput and tail latency of the diff ingestion path (POST analyze-diff)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Number of diffs to ingest (default: 200)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients (default: 8)')
+        parser.add_argument('--provider', choices=sorted(PROVIDERS), help='Override BRAINVIBE_LLM_PROVIDER')
+        parser.add_argument('--diff-dir', help='Directory of .diff/.patch files to replay (synthetic diffs otherwise)')
+        parser.add_argument('--body-lines', type=int, default=60, help='Added lines per synthetic diff (default: 60)')
+        parser.add_argument('--project', default='bench-ingestion', help='Project ID to ingest into')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for synthetic diffs and the stub')
+        parser.add_argument(
+            '--with-stub',
+            action='store_true',
+            help='Start an in-process stub LLM server and use the "stub" provider'
+        )
+        parser.add_argument('--stub-latency', default='lognormal:800,0.5', help='Latency spec for --with-stub')
+        parser.add_argument('--stub-error-rate', type=float, default=0.0, help='Error rate for --with-stub')
+        parser.add_argument('--stub-rate-limit-rate', type=float, default=0.0, help='429 rate for --with-stub')
+        parser.add_argument('--keep', action='store_true', help='Keep a newly created benchmark project and its data afterwards')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        concurrency = max(1, options['concurrency'])
+        rng = random.Random(options['seed'])
+
+        if options['with_stub']:
+            try:
+                behaviour = StubBehaviour(
+                    latency=options['stub_latency'],
+                    error_rate=options['stub_error_rate'],
+                    rate_limit_rate=options['stub_rate_limit_rate'],
+                    seed=options['seed']
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            server = start_stub_server('127.0.0.1', 0, behaviour, background=True)
+            host, port = server.server_address[:2]
+            settings.BRAINVIBE_LLM_STUB_URL = f"http://{host}:{port}"
+            settings.BRAINVIBE_LLM_PROVIDER = 'stub'
+            self.stdout.write(f"Started stub LLM on {settings.BRAINVIBE_LLM_STUB_URL} (latency={options['stub_latency']})")
+        if options['provider']:
+            settings.BRAINVIBE_LLM_PROVIDER = options['provider']
+        reset_providers()
+
+        diffs = self._load_diffs(options, rng)
+        if not diffs:
+            raise CommandError("No diffs to replay")
+
+        project, created = Project.objects.get_or_create(
+            project_id=options['project'],
+            defaults={'name': 'Ingestion benchmark', 'description': 'Created by bench_ingestion'}
+        )
+        url = reverse('analyze_diff', kwargs={'project_id': project.project_id})
+        clients = threading.local()
+
+        def ingest(index):
+            if not hasattr(clients, 'client'):
+                clients.client = Client(SERVER_NAME='localhost')
+            started = time.perf_counter()
+            try:
+                response = clients.client.post(url, {
+                    'diff_content': diffs[index % len(diffs)],
+                    'change_id': f"bench-{uuid.uuid4().hex[:12]}",
+                }, content_type='application/json')
+                ok = response.status_code == 200
+            except Exception as e:
+                logger.warning(f"Benchmark request {index} failed: {e}")
+                ok = False
+            finally:
+                close_old_connections()
+            return time.perf_counter() - started, ok
+
+        self.stdout.write(
+            f"Ingesting {total} diffs with concurrency {concurrency} "
+            f"(provider={getattr(settings, 'BRAINVIBE_LLM_PROVIDER', 'mock')})..."
+        )
+        wall_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bench') as executor:
+            results = list(executor.map(ingest, range(total)))
+        wall = time.perf_counter() - wall_started
+
+        latencies = sorted(elapsed for elapsed, _ in results)
+        failures = sum(1 for _, ok in results if not ok)
+        self.stdout.write(self.style.SUCCESS("Results:"))
+        self.stdout.write(f"  requests:    {total} ({failures} failed)")
+        self.stdout.write(f"  wall time:   {wall:.2f}s")
+        self.stdout.write(f"  throughput:  {total / wall:.1f} diffs/s")
+        for label, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+            self.stdout.write(f"  {label}:         {_percentile(latencies, fraction) * 1000:.1f} ms")
+        self.stdout.write(f"  max:         {latencies[-1] * 1000:.1f} ms")
+        if options['with_stub']:
+            self.stdout.write(f"  stub:        {behaviour.stats}")
+            server.shutdown()
+            server.server_close()
+            reset_providers()
+
+        if created and not options['keep']:
+            project.delete()
+
+    def _load_diffs(self, options, rng):
+        diff_dir = options['diff_dir']
+        if not diff_dir:
+            return [_synthetic_diff(rng, index, options['body_lines']) for index in range(min(options['requests'], 500))]
+        if not os.path.isdir(diff_dir):
+            raise CommandError(f"Diff directory not found: {diff_dir}")
+        diffs = []
+        for name in sorted(os.listdir(diff_dir)):
+            if name.endswith(('.diff', '.patch')):
+                with open(os.path.join(diff_dir, name), 'r', encoding='utf-8', errors='replace') as f:
+                    diffs.append(f.read())
+        return diffs
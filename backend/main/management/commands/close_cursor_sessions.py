@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from main.utils.cursor_sessions import close_idle_sessions
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Close idle Cursor sessions and analyze each one as a single change'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-seconds',
+            type=float,
+            help='Seconds without edits after which a session closes '
+                 '(default: BRAINVIBE_CURSOR_SESSION_IDLE_SECONDS)'
+        )
+        parser.add_argument(
+            '--loop',
+            type=float,
+            default=0,
+            help='Keep running and sweep every N seconds (default: sweep once)'
+        )
+
+    def handle(self, *args, **options):
+        idle_seconds = options.get('idle_seconds')
+        interval = options.get('loop')
+
+        while True:
+            closed = close_idle_sessions(idle_seconds=idle_seconds)
+            if closed:
+                self.stdout.write(self.style.SUCCESS(f"Closed and analyzed {closed} Cursor sessions"))
+            elif not interval:
+                self.stdout.write("No idle Cursor sessions")
+            if not interval:
+                break
+            time.sleep(interval)
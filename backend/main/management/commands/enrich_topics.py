@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from main.utils.llm_utils import set_max_rps, wait_for_provider
+from main.utils.topic_enrichment import dedupe_key, enrich_topics, enrichment_setting, placeholder_topics
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Describe placeholder prerequisite topics of all projects with batched LLM calls '
+            'and save the descriptions with bulk updates')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help='Topics described per LLM call (default: BRAINVIBE_ENRICHMENT_BATCH_SIZE)')
+        parser.add_argument('--page-size', type=int, default=500,
+                            help='Placeholders loaded per page (default: 500)')
+        parser.add_argument('--rps', type=float,
+                            help='LLM requests per second for this process (default: BRAINVIBE_LLM_MAX_RPS)')
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many placeholders (default: no limit)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the placeholders waiting')
+
+    def handle(self, *args, **options):
+        set_max_rps(options['rps'])
+
+        pending = placeholder_topics()
+        total = pending.count()
+        if not total:
+            self.stdout.write("No placeholder topics")
+            return
+        if options['dry_run']:
+            unique = len({dedupe_key(topic_id) for topic_id in pending.values_list('topic_id', flat=True)})
+            batch_size = options['batch_size'] or enrichment_setting('BRAINVIBE_ENRICHMENT_BATCH_SIZE')
+            self.stdout.write(f"{total} placeholder topics ({unique} after deduplication, "
+                              f"{-(-unique // batch_size)} LLM calls at {batch_size} per call)")
+            return
+
+        page_size = max(1, options['page_size'])
+        limit = options['limit']
+        totals = {'topics': 0, 'enriched': 0, 'calls': 0, 'failed_calls': 0, 'prerequisites_linked': 0}
+        last_pk = 0
+        started = time.monotonic()
+        while not limit or totals['topics'] < limit:
+            size = min(page_size, limit - totals['topics']) if limit else page_size
+            # Walk by primary key, so topics the provider did not answer are not selected again in this run
+            page = list(pending.filter(pk__gt=last_pk)[:size])
+            if not page:
+                break
+            wait_for_provider(self.stdout.write)
+            result = enrich_topics(page, options['batch_size'])
+            for key in totals:
+                totals[key] += result.get(key, 0)
+            if result.get('circuit_open'):
+                self.stdout.write("LLM circuit opened during the run; stopping")
+                break
+            last_pk = page[-1].pk
+            rate = totals['topics'] / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f"Up to pk {last_pk}: {totals['enriched']} of {totals['topics']} topics enriched "
+                              f"in {totals['calls']} calls ({rate:.1f} topics/s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Enriched {totals['enriched']} of {totals['topics']} placeholder topics with {totals['calls']} LLM calls "
+            f"({totals['failed_calls']} failed, {totals['prerequisites_linked']} prerequisites linked)"
+        ))
+        if totals['enriched'] < totals['topics']:
+            self.stdout.write("Topics that were not described stay placeholders for the next run")
@@ -0,0 +1,135 @@
+from django.core.management.base import BaseCommand, CommandError
+from main.models import CodeChange
+from main.utils.diff_compaction import compact_diff
+from main.utils.diff_filter import filter_diff
+from main.utils.diff_parser import parse_diff
+from main.utils.llm_utils import _analyze_with_llm, extract_mock_topics, merge_topics
+from main.utils.resilience import Deadline
+from main.utils.topic_rules import extract_rule_topics
+from django.conf import settings
+from pathlib import Path
+import json
+import logging
+import statistics
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+
+def _offline_topic_ids(diff_text):
+    # Import/API rules plus the keyword extractor: deterministic and free, a proxy for the model
+    rule_topics = extract_rule_topics(parse_diff(diff_text)).topics
+    return {topic['topic_id'] for topic in merge_topics(rule_topics, extract_mock_topics(diff_text))}
+
+
+def _llm_topic_ids(diff_text):
+    deadline = Deadline(getattr(settings, 'BRAINVIBE_LLM_DEADLINE', 60))
+    return {topic['topic_id'] for topic in _analyze_with_llm(diff_text, None, deadline, fallback=False)}
+
+
+class Command(BaseCommand):
+    help = ('Measure the prompt-token savings of diff compaction and the topic recall it keeps, '
+            'on stored changes, a directory of diffs or a Git history')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', help='Use stored changes of this project ID')
+        parser.add_argument('--diff-dir', help='Use the *.diff and *.patch files in this directory')
+        parser.add_argument('--repo', help='Use the diffs of the latest commits of this Git repository')
+        parser.add_argument('--limit', type=int, default=200, help='Maximum number of diffs (default: 200)')
+        parser.add_argument('--extractor', choices=['offline', 'llm'], default='offline',
+                            help='Topic extractor compared on both versions: the offline rules and keyword '
+                                 'extractor, or the configured LLM provider (default: offline)')
+        parser.add_argument('--min-recall', type=float,
+                            help='Fail if the mean topic recall is below this value (0-1)')
+        parser.add_argument('--verbose', action='store_true', help='Print one line per diff')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        diffs = list(self._load_diffs(options))
+        if not diffs:
+            raise CommandError("No diffs to evaluate")
+        extract = _llm_topic_ids if options['extractor'] == 'llm' else _offline_topic_ids
+
+        rows = []
+        covered = 0
+        for name, diff_text in diffs:
+            diff_text = filter_diff(diff_text)
+            if not diff_text:
+                continue
+            # Compaction only ever sees what the topic rules leave for the LLM
+            rule_result = extract_rule_topics(parse_diff(diff_text))
+            if rule_result.fully_covered:
+                covered += 1
+                continue
+            residue = rule_result.residue
+            compacted = compact_diff(residue)
+            try:
+                original_ids = extract(residue)
+                compacted_ids = extract(compacted.text)
+            except Exception as e:
+                logger.error(f"Topic extraction failed for {name}: {e}")
+                continue
+            recall = len(original_ids & compacted_ids) / len(original_ids) if original_ids else 1.0
+            rows.append({
+                'diff': name,
+                'tokens_before': compacted.tokens_before,
+                'tokens_after': compacted.tokens_after,
+                'saved_ratio': round(compacted.saved_ratio, 3),
+                'topics': len(original_ids),
+                'recall': round(recall, 3),
+                'missing': sorted(original_ids - compacted_ids),
+            })
+            if options['verbose'] and not options['json']:
+                self.stdout.write(f"{name}: {compacted.tokens_before} -> {compacted.tokens_after} tokens "
+                                  f"({compacted.saved_ratio:.0%} saved), recall {recall:.2f}")
+
+        if not rows:
+            raise CommandError(f"All {covered} diffs were fully covered by the topic rules; nothing to compact")
+        before = sum(row['tokens_before'] for row in rows)
+        after = sum(row['tokens_after'] for row in rows)
+        mean_recall = statistics.mean(row['recall'] for row in rows)
+        report = {
+            'extractor': options['extractor'],
+            'diffs': len(rows),
+            'covered_by_rules': covered,
+            'tokens_before': before,
+            'tokens_after': after,
+            'saved_ratio': round(1 - after / before, 3) if before else 0.0,
+            'median_saved_ratio': statistics.median(row['saved_ratio'] for row in rows),
+            'mean_recall': round(mean_recall, 3),
+            'lost_topics': [row for row in rows if row['missing']][:20],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report if not options['verbose'] else dict(report, rows=rows), indent=2))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(rows)} diffs ({covered} covered by rules): {before} -> {after} prompt tokens "
+                f"({report['saved_ratio']:.1%} saved, median {report['median_saved_ratio']:.1%} per diff), "
+                f"mean topic recall {mean_recall:.3f}"
+            ))
+            for row in report['lost_topics']:
+                self.stdout.write(f"  {row['diff']}: lost {', '.join(row['missing'])}")
+
+        if options['min_recall'] is not None and mean_recall < options['min_recall']:
+            raise CommandError(f"Mean topic recall {mean_recall:.3f} is below {options['min_recall']}")
+
+    def _load_diffs(self, options):
+        limit = options['limit']
+        if options['diff_dir']:
+            paths = sorted(p for p in Path(options['diff_dir']).iterdir() if p.suffix in ('.diff', '.patch'))
+            for path in paths[:limit]:
+                yield path.name, path.read_text(errors='replace')
+        elif options['repo']:
+            shas = subprocess.run(['git', '-C', options['repo'], 'rev-list', f'--max-count={limit}', 'HEAD'],
+                                  capture_output=True, text=True, check=True).stdout.split()
+            for sha in shas:
+                diff = subprocess.run(['git', '-C', options['repo'], 'show', '--format=', sha],
+                                      capture_output=True, text=True, errors='replace').stdout
+                yield sha[:12], diff
+        else:
+            changes = CodeChange.objects.exclude(diff_content='').order_by('-created_at')
+            if options['project']:
+                changes = changes.filter(project__project_id=options['project'])
+            for change in changes[:limit]:
+                yield change.change_id or str(change.pk), change.diff_content
@@ -0,0 +1,168 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.models import Max, Min
+from main.models import CodeChange
+from main.services import run_batched_analysis
+from main.utils.llm_batch import batch_setting
+from main.utils.llm_utils import set_max_rps, wait_for_provider
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import groupby
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _shard_range(shard, first_pk, last_pk):
+    # Split [first_pk, last_pk] into equal key ranges and return the one for "index/count"
+    try:
+        index, count = (int(part) for part in shard.split('/'))
+    except ValueError:
+        raise CommandError(f"--shard must look like INDEX/COUNT (e.g. 0/4), got '{shard}'")
+    if count < 1 or not 0 <= index < count:
+        raise CommandError(f"--shard index must be between 0 and {count - 1}")
+    span = last_pk - first_pk + 1
+    low = first_pk + span * index // count
+    high = first_pk + span * (index + 1) // count - 1
+    return low, high
+
+
+class Command(BaseCommand):
+    help = ('Analyze the backlog of unanalyzed code changes in primary-key order, '
+            'with parallel workers, rate limiting and resumable checkpoints')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Parallel analysis workers (default: 4)')
+        parser.add_argument('--page-size', type=int, default=200,
+                            help='Changes loaded per page; the checkpoint advances after each page (default: 200)')
+        parser.add_argument('--rps', type=float,
+                            help='LLM requests per second for this process (default: BRAINVIBE_LLM_MAX_RPS)')
+        parser.add_argument('--min-pk', type=int, help='First primary key to process (inclusive)')
+        parser.add_argument('--max-pk', type=int, help='Last primary key to process (inclusive)')
+        parser.add_argument('--shard',
+                            help='Process one of COUNT equal key ranges, as INDEX/COUNT; pass the same '
+                                 '--min-pk/--max-pk on every node so the ranges line up')
+        parser.add_argument('--project', help='Only process changes of this project ID')
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many changes (default: no limit)')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint file (default: named after the selection options, in the current directory)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start over')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the size of the backlog')
+
+    def handle(self, *args, **options):
+        set_max_rps(options['rps'])
+
+        backlog = CodeChange.objects.filter(is_analyzed=False)
+        if options['project']:
+            backlog = backlog.filter(project__project_id=options['project'])
+
+        checkpoint_path = options['checkpoint'] or self._checkpoint_name(options)
+        state = None if options['restart'] else self._load_checkpoint(checkpoint_path)
+        if state is None:
+            # The key range is fixed when a run starts; the backlog shrinks as it is processed
+            bounds = backlog.aggregate(first=Min('pk'), last=Max('pk'))
+            if bounds['first'] is None:
+                self.stdout.write("No unanalyzed code changes")
+                return
+            low = options['min_pk'] if options['min_pk'] is not None else bounds['first']
+            high = options['max_pk'] if options['max_pk'] is not None else bounds['last']
+            if options['shard']:
+                low, high = _shard_range(options['shard'], low, high)
+            state = {'min_pk': low, 'max_pk': high, 'last_pk': low - 1, 'processed': 0, 'failed_pks': []}
+        low, high = state['min_pk'], state['max_pk']
+        backlog = backlog.filter(pk__gte=low, pk__lte=high)
+        pending = backlog.filter(pk__gt=state['last_pk'])
+        self.stdout.write(f"Key range {low}-{high}: {pending.count()} unanalyzed changes after pk {state['last_pk']}")
+        if options['dry_run']:
+            return
+
+        page_size = max(1, options['page_size'])
+        limit = options['limit']
+        started = time.monotonic()
+        processed_now = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers']), thread_name_prefix='backlog') as executor:
+            while not limit or processed_now < limit:
+                size = min(page_size, limit - processed_now) if limit else page_size
+                page = list(backlog.filter(pk__gt=state['last_pk']).select_related('project').order_by('pk')[:size])
+                if not page:
+                    break
+
+                # After an open circuit the page runs sequentially, so its first call probes the provider alone
+                if wait_for_provider(self.stdout.write):
+                    outcomes = [self._analyze_unit(unit) for unit in self._units(page)]
+                else:
+                    futures = [executor.submit(self._analyze_unit, unit) for unit in self._units(page)]
+                    wait(futures)
+                    outcomes = [future.result() for future in futures]
+                for done, failed in outcomes:
+                    state['processed'] += done
+                    state['failed_pks'].extend(failed)
+
+                # Every change up to the end of the page has been attempted
+                state['last_pk'] = page[-1].pk
+                processed_now += len(page)
+                self._save_checkpoint(checkpoint_path, state)
+                rate = processed_now / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f"Up to pk {state['last_pk']}: {state['processed']} analyzed, "
+                                  f"{len(state['failed_pks'])} failed ({rate:.1f} changes/s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Analyzed {state['processed']} changes in key range {low}-{high} "
+            f"({len(state['failed_pks'])} failed; checkpoint {checkpoint_path})"
+        ))
+        if state['failed_pks']:
+            self.stdout.write("Failed changes stay unanalyzed; run again with --restart to retry them")
+
+    def _units(self, page):
+        # Changes of one project share batched prompts, so each unit is one project's slice of the page
+        max_items = batch_setting('BRAINVIBE_BATCH_MAX_ITEMS')
+        for _, changes in groupby(sorted(page, key=lambda change: (change.project_id, change.pk)),
+                                  key=lambda change: change.project_id):
+            changes = list(changes)
+            for start in range(0, len(changes), max_items):
+                yield changes[start:start + max_items]
+
+    def _analyze_unit(self, changes):
+        # Returns (changes analyzed, primary keys of failed changes)
+        try:
+            # Without fallback topics, an LLM failure leaves the changes unanalyzed for a later run
+            results = run_batched_analysis(changes[0].project, changes, fallback=False)
+        except Exception as e:
+            logger.error(f"Backlog analysis of changes {changes[0].pk}-{changes[-1].pk} failed: {e}")
+            return 0, [change.pk for change in changes]
+        finally:
+            close_old_connections()
+        # Partial results leave their changes unanalyzed, like failures
+        failed = [change.pk for change in changes
+                  if not (results.get(change.change_id) or {}).get('success') or results[change.change_id].get('partial')]
+        return len(changes) - len(failed), failed
+
+    def _checkpoint_name(self, options):
+        # Runs with the same selection share a checkpoint; different shards or ranges get their own
+        parts = ['reprocess_backlog']
+        if options['project']:
+            parts.append(f"project-{options['project']}")
+        if options['min_pk'] is not None or options['max_pk'] is not None:
+            parts.append(f"pk-{options['min_pk'] if options['min_pk'] is not None else ''}"
+                         f"-{options['max_pk'] if options['max_pk'] is not None else ''}")
+        if options['shard']:
+            parts.append(f"shard-{options['shard'].replace('/', 'of')}")
+        return '_'.join(parts) + '.json'
+
+    def _load_checkpoint(self, path):
+        if not os.path.exists(path):
+            return None
+        with open(path) as checkpoint_file:
+            state = json.load(checkpoint_file)
+        self.stdout.write(f"Resuming from checkpoint {path}: keys {state['min_pk']}-{state['max_pk']}, "
+                          f"after pk {state['last_pk']}")
+        return state
+
+    def _save_checkpoint(self, path, state):
+        # Write atomically so an interrupted run never leaves a corrupt checkpoint
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(temp_path, path)
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from main.utils.llm_stub_server import StubBehaviour, load_canned_responses, start_stub_server
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run the local stub LLM server used for offline load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to bind (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8765, help='Port to bind (default: 8765)')
+        parser.add_argument(
+            '--latency',
+            default='lognormal:800,0.5',
+            help='Latency distribution in ms: fixed:MS, uniform:LOW,HIGH, normal:MEAN,SD or '
+                 'lognormal:MEDIAN,SIGMA (default: lognormal:800,0.5)'
+        )
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500/503')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+        parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429 responses')
+        parser.add_argument('--prefill-ms-per-1k', type=float, default=0.0,
+                            help='Latency added per 1000 prompt tokens not read from a cached prefix (default: 0)')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible runs')
+        parser.add_argument(
+            '--canned',
+            help='JSON file with canned topics (a list, or an object keyed by diff sha256 / "default"); '
+                 'topics are derived from the diff by the rule and mock extractors otherwise'
+        )
+
+    def handle(self, *args, **options):
+        if options['error_rate'] + options['rate_limit_rate'] > 1:
+            raise CommandError("--error-rate and --rate-limit-rate must add up to at most 1")
+        try:
+            behaviour = StubBehaviour(
+                latency=options['latency'],
+                error_rate=options['error_rate'],
+                rate_limit_rate=options['rate_limit_rate'],
+                retry_after=options['retry_after'],
+                seed=options['seed'],
+                canned=load_canned_responses(options['canned']) if options['canned'] else None,
+                prefill_ms_per_1k=options['prefill_ms_per_1k']
+            )
+        except (ValueError, OSError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub LLM listening on http://{options['host']}:{options['port']} "
+            f"(latency={options['latency']}, errors={options['error_rate']:.1%}, "
+            f"429s={options['rate_limit_rate']:.1%})"
+        ))
+        self.stdout.write("Set BRAINVIBE_LLM_PROVIDER=stub to route analyses through it. Press Ctrl+C to stop.")
+        try:
+            start_stub_server(options['host'], options['port'], behaviour)
+        except KeyboardInterrupt:
+            self.stdout.write(f"Stopped. Stats: {behaviour.stats}")
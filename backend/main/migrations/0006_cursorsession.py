@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_alter_topic_topic_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CursorSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('closed', 'Closed')], default='open', max_length=20)),
+                ('edit_count', models.IntegerField(default=0)),
+                ('diff_bytes', models.IntegerField(default=0)),
+                ('close_reason', models.CharField(blank=True, max_length=20)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('last_edit_at', models.DateTimeField()),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('code_change', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cursor_session', to='main.codechange')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cursor_sessions', to='main.project')),
+            ],
+            options={
+                'verbose_name': 'Cursor Session',
+                'verbose_name_plural': 'Cursor Sessions',
+            },
+        ),
+        migrations.CreateModel(
+            name='CursorSessionFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_path', models.CharField(max_length=1024)),
+                ('base_content', models.TextField(blank=True)),
+                ('current_content', models.TextField(blank=True)),
+                ('edit_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='main.cursorsession')),
+            ],
+            options={
+                'verbose_name': 'Cursor Session File',
+                'verbose_name_plural': 'Cursor Session Files',
+                'unique_together': {('session', 'file_path')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cursorsession',
+            index=models.Index(fields=['status', 'last_edit_at'], name='main_cursor_status_87c938_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cursorsession',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'open')), fields=('project', 'session_id'), name='unique_open_cursor_session'),
+        ),
+    ]
@@ -97,6 +97,71 @@ class CodeChange(models.Model):
         ordering = ['-created_at']
 
 
+class CursorSession(models.Model):
+    """
+    Groups the edits of one Cursor AI interaction so they are analyzed together
+    An open session accumulates edits; once closed (after inactivity or when it
+    grows too large) its net diff is recorded as a single CodeChange
+    """
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('closed', 'Closed'),
+    )
+    
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='cursor_sessions')
+    session_id = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    # Number of edits received and the total size of their individual diffs
+    edit_count = models.IntegerField(default=0)
+    diff_bytes = models.IntegerField(default=0)
+    # Why the session was closed (idle, size, no_session, manual)
+    close_reason = models.CharField(max_length=20, blank=True)
+    # Metadata sent with the edits (later edits override earlier keys)
+    metadata = models.JSONField(default=dict, blank=True)
+    # The aggregated change created when the session closed
+    code_change = models.OneToOneField(CodeChange, on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='cursor_session')
+    started_at = models.DateTimeField(auto_now_add=True)
+    last_edit_at = models.DateTimeField()
+    closed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Cursor session {self.session_id} ({self.status})"
+    
+    class Meta:
+        verbose_name = "Cursor Session"
+        verbose_name_plural = "Cursor Sessions"
+        indexes = [
+            models.Index(fields=['status', 'last_edit_at']),
+        ]
+        constraints = [
+            # At most one open session per Cursor session ID
+            models.UniqueConstraint(fields=['project', 'session_id'], condition=models.Q(status='open'),
+                                    name='unique_open_cursor_session'),
+        ]
+
+
+class CursorSessionFile(models.Model):
+    """
+    A file touched during a Cursor session: its content before the first edit
+    and after the latest one, from which the net diff is computed
+    """
+    session = models.ForeignKey(CursorSession, on_delete=models.CASCADE, related_name='files')
+    file_path = models.CharField(max_length=1024)
+    base_content = models.TextField(blank=True)
+    current_content = models.TextField(blank=True)
+    edit_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.file_path} in {self.session}"
+    
+    class Meta:
+        verbose_name = "Cursor Session File"
+        verbose_name_plural = "Cursor Session Files"
+        unique_together = ('session', 'file_path')
+
+
 # Note: The TopicDependency model is superseded by the ManyToMany relationship in Topic
 # Keeping for backward compatibility temporarily
 class TopicDependency(models.Model):
@@ -3,13 +3,29 @@ Service functions for the Brain Vibe application.
 These services coordinate between the models, utils, and views.
 """
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Any, Optional, Tuple
+from django.conf import settings
+from django.db import close_old_connections
 from .models import Project, Topic, CodeChange
-from .utils import git_utils, llm_utils
+from .serializers import TopicSerializer
+from .utils import admission, change_classifier, git_utils, llm_utils, path_router, topic_enrichment
+from .utils.diff_parser import parse_diff
+from .utils.llm_batch import MicroBatcher, batch_setting, is_batchable
+from .utils.pipeline import JobExpired, Pipeline, Stage
+from .utils.progress import publish_change_event
+from .utils.resilience import Deadline
+from .utils.scheduler import FairScheduler
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Worker threads per analysis pipeline stage (see get_analysis_pipeline)
+DEFAULT_PIPELINE_WORKERS = {
+    'parse': 2, 'classify': 2, 'filter': 4, 'cache': 2, 'llm': 8, 'merge': 2, 'persist': 2,
+}
+
 def analyze_project_changes(project_id: str, repo_path: str) -> Dict[str, Any]:
     """
     Analyze changes in a project's repository and extract learning topics.
@@ -36,15 +52,19 @@ def analyze_project_changes(project_id: str, repo_path: str) -> Dict[str, Any]:
         logger.warning(f"No changes found in repository {repo_path}")
         return {"warning": "No changes found in repository"}
     
-    # Prepare project context
-    project_context = {
-        "project_id": project.project_id,
-        "name": project.name,
-        "existing_topics": list(Topic.objects.filter(project=project).values('topic_id', 'title', 'status'))
-    }
+    # Analyze the diff without recording a change; nothing is saved
+    job = AnalysisJob(project, [ChangeAnalysis(project, diff_text=diff_text, key=repo_path)])
+    result = run_analysis_job(job)[repo_path]
+    if result.get('change_kind'):
+        logger.info(f"Skipping analysis of {result['change_kind']}-only changes in repository {repo_path}")
+        return {
+            "message": "No new topics extracted",
+            "changes_found": True,
+            "change_kind": result['change_kind'],
+            "topics_extracted": 0
+        }
     
-    # Analyze diff and extract topics
-    extracted_topics = llm_utils.analyze_diff(diff_text, project_context)
+    extracted_topics = result['topics']
     if not extracted_topics:
         logger.info(f"No new topics extracted from changes in repository {repo_path}")
         return {
@@ -146,7 +166,8 @@ def analyze_code_change(
     project_id: str, 
     file_path: str, 
     diff_content: str, 
-    change_source: str = 'manual_edit'
+    change_source: str = 'manual_edit',
+    change_kind: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Analyze a code change and extract learning topics.
@@ -156,6 +177,8 @@ def analyze_code_change(
         file_path: Path to the file that was changed
         diff_content: The diff content to analyze
         change_source: Source of the change (e.g., manual_edit, git_commit, scheduled_scan)
+        change_kind: Kind of the change, when the caller classified it from the
+            full file versions (see change_classifier)
         
     Returns:
         A dictionary with the analysis results
@@ -179,6 +202,8 @@ def analyze_code_change(
             "timestamp": datetime.now().isoformat(),
             "change_source": change_source
         }
+        if change_kind:
+            metadata["change_kind"] = change_kind
         
         # Create a CodeChange record
         code_change = CodeChange.objects.create(
@@ -191,20 +216,21 @@ def analyze_code_change(
             is_analyzed=False
         )
         
-        # Prepare project context
-        project_context = {
-            "project_id": project.project_id,
-            "name": project.name,
-            "existing_topics": list(Topic.objects.filter(project=project).values('topic_id', 'title', 'status'))
-        }
-        
-        # Analyze the diff and extract topics
-        extracted_topics = llm_utils.analyze_diff(diff_content, project_context)
+        # Parse, classify, analyze and save the change in the analysis pipeline
+        job = AnalysisJob(project, [ChangeAnalysis(project, code_change)])
+        result = run_analysis_job(job)[change_id]
+        if result.get('change_kind'):
+            return {
+                "status": "success",
+                "change_id": change_id,
+                "message": result['analysis_details'][0],
+                "change_kind": result['change_kind'],
+                "topics_extracted": 0
+            }
         
+        extracted_topics = job.changes[0].topics
         if not extracted_topics:
             logger.info(f"No topics extracted from code change for {file_path}")
-            code_change.is_analyzed = True
-            code_change.save()
             return {
                 "status": "success",
                 "change_id": change_id,
@@ -212,27 +238,11 @@ def analyze_code_change(
                 "topics_extracted": 0
             }
         
-        # Process and save the extracted topics
-        result = process_and_save_topics(project_id, extracted_topics)
-        
-        # Update the CodeChange record to mark it as analyzed
-        code_change.is_analyzed = True
-        code_change.save()
-        
-        # Add the extracted topics to the CodeChange record
-        for topic_data in extracted_topics:
-            topic_id = topic_data.get("topic_id")
-            if topic_id:
-                try:
-                    topic = Topic.objects.get(topic_id=topic_id)
-                    code_change.extracted_topics.add(topic)
-                except Topic.DoesNotExist:
-                    logger.warning(f"Topic with ID {topic_id} not found")
-        
         return {
             "status": "success",
             "change_id": change_id,
             "topics_extracted": len(extracted_topics),
+            "topics_created": result['topics_created'],
             "topics": extracted_topics
         }
         
@@ -247,4 +257,653 @@ def analyze_code_change(
         return {
             "status": "error",
             "message": str(e)
-        } 
\ No newline at end of file
+        } 
+
+def _skip_trivial_changes() -> bool:
+    return getattr(settings, 'BRAINVIBE_SKIP_TRIVIAL_CHANGES', True)
+
+
+def skip_trivial_change(project: Project, code_change: CodeChange) -> Optional[Dict[str, Any]]:
+    """
+    Mark a change analyzed without topics if it only reformats, recomments or renames code.
+    
+    The kind recorded in the change's metadata, classified from the full file
+    versions where the caller had them, takes precedence; otherwise the diff
+    is classified (see change_classifier).
+    
+    Args:
+        project: The project the change belongs to
+        code_change: The CodeChange record holding the diff
+        
+    Returns:
+        The analysis result if the change was skipped, otherwise None
+    """
+    if not _skip_trivial_changes():
+        return None
+    metadata = code_change.metadata or {}
+    change_kind = metadata.get('change_kind') or change_classifier.classify_diff(code_change.diff_content)
+    if not change_classifier.is_trivial(change_kind):
+        return None
+    
+    code_change.metadata = {**metadata, 'change_kind': change_kind}
+    code_change.is_analyzed = True
+    code_change.save(update_fields=['metadata', 'is_analyzed', 'updated_at'])
+    logger.info(f"Skipping analysis of change {code_change.change_id}: {change_kind}-only change")
+    result = {
+        'success': True,
+        'project_id': project.project_id,
+        'topics_created': [],
+        'change_id': code_change.change_id,
+        'change_kind': change_kind,
+        'analysis_details': [f"Skipped analysis of a {change_kind}-only change"]
+    }
+    publish_change_event(project.project_id, code_change.change_id, "complete", result)
+    return result
+
+
+def _save_change_topics(project: Project, code_change: CodeChange, topics_data: List[Dict[str, Any]],
+                        publish, analyzed: bool = True) -> List[str]:
+    """
+    Save extracted topics, link them to their code change and mark it analyzed.
+    
+    Args:
+        project: The project the change belongs to
+        code_change: The analyzed CodeChange
+        topics_data: Processed topics (see llm_utils.extract_topics_from_diff)
+        publish: Callable publishing progress events for the change
+        analyzed: Mark the change analyzed; partial topics leave it for reprocess_backlog
+        
+    Returns:
+        IDs of the topics that were newly created
+    """
+    topics_created = []
+    new_topics = []
+    for topic_data in topics_data:
+        try:
+            # Check if the topic already exists
+            topic_id = topic_data['topic_id']
+            topic, created = Topic.objects.get_or_create(
+                topic_id=topic_id,
+                defaults={
+                    'title': topic_data['title'],
+                    'description': topic_data['description'],
+                    'project': project,
+                    'status': 'not_learned'
+                }
+            )
+            
+            # Link the topic to the code change
+            code_change.extracted_topics.add(topic)
+            
+            # Only add to the topics_created list if it's a new topic
+            if created:
+                topics_created.append(topic_id)
+                new_topics.append((topic, topic_data))
+            
+            publish("topic", created=created, topic=TopicSerializer(topic).data)
+            
+        except Exception as e:
+            logger.error(f"Error processing topic {topic_data.get('topic_id')}: {str(e)}")
+    
+    # Create prerequisite relationships once all topics exist, as placeholder prerequisites
+    # come after the topics needing them
+    for topic, topic_data in new_topics:
+        for prereq_id in topic_data.get('prerequisites', []):
+            try:
+                prereq = Topic.objects.get(topic_id=prereq_id)
+                topic.prerequisites.add(prereq)
+            except Topic.DoesNotExist:
+                logger.warning(f"Prerequisite topic {prereq_id} not found")
+    
+    # Placeholders get their descriptions in batches later (see topic_enrichment)
+    if any(not topic.description for topic, _ in new_topics):
+        topic_enrichment.schedule_enrichment()
+    
+    if analyzed:
+        code_change.is_analyzed = True
+        code_change.save(update_fields=['is_analyzed', 'updated_at'])
+    return topics_created
+
+
+def _analysis_result(project: Project, change_id: str, diff_summary: Dict[str, Any],
+                     topics_created: List[str]) -> Dict[str, Any]:
+    return {
+        'success': True,
+        'project_id': project.project_id,
+        'topics_created': topics_created,
+        'change_id': change_id,
+        'analysis_details': [
+            f"Analyzed diff with {diff_summary['lines']} lines in {diff_summary['files']} files",
+            f"Created {len(topics_created)} new topics",
+            "The topics are now visible in your project"
+        ]
+    }
+
+
+class ChangeAnalysis:
+    """
+    One change's part of an AnalysisJob.
+    
+    Attributes:
+        code_change: The CodeChange record, or None for diffs analyzed without being recorded
+        key: Key of the change's result (its change ID)
+        diff_text: The diff
+        summary: Line and file counts of the diff
+        rule_topics: Topics of the topic rules
+        residue: Diff the rules left for the LLM ("" when fully covered)
+        cached: Topic lists of the residue units answered from the analysis cache
+        fingerprints: Fingerprints of the residue units sent to the LLM
+        topics: Processed topics, once merged
+        partial: Whether some units got no LLM answer
+        result: The change's result once it is finished
+    """
+    __slots__ = ("code_change", "key", "diff_text", "summary", "rule_topics", "residue", "cached",
+                 "fingerprints", "topics", "partial", "result", "_project_id")
+    
+    def __init__(self, project: Project, code_change: Optional[CodeChange] = None, diff_text: str = "",
+                 key: Optional[str] = None):
+        self.code_change = code_change
+        self.key = code_change.change_id if code_change is not None else (key or "diff")
+        self.diff_text = code_change.diff_content if code_change is not None else diff_text
+        self.summary: Dict[str, Any] = {}
+        self.rule_topics: List[Dict[str, Any]] = []
+        self.residue = ""
+        self.cached: List[List[Dict[str, Any]]] = []
+        self.fingerprints: List[str] = []
+        self.topics: List[Dict[str, Any]] = []
+        self.partial = False
+        self.result: Optional[Dict[str, Any]] = None
+        self._project_id = project.project_id
+    
+    def publish(self, event: str, **data):
+        """Publish a progress event on the change's channel (recorded changes only)"""
+        if self.code_change is not None:
+            publish_change_event(self._project_id, self.key, event, data)
+
+
+class AnalysisJob:
+    """
+    Changes of one project analyzed together by the analysis pipeline.
+    
+    The LLM units of all changes share calls, so small diffs end up as items
+    of the same batched prompts.
+    
+    Attributes:
+        project: The project the changes belong to
+        changes: The ChangeAnalysis of each change
+        deadline: Time budget, split across the stages when it is a StagedDeadline
+        request_deadline: The client's request deadline, if any; the job is only
+            waited for until it passes (see run_analysis_job)
+        fallback: Answer failed LLM calls with fallback topics; with False the
+            changes keep the topics found so far and are marked partial
+        pending: Texts of the units waiting for the LLM, keyed by fingerprint
+        answers: LLM (or fallback) topics keyed by fingerprint
+    """
+    __slots__ = ("project", "changes", "deadline", "request_deadline", "fallback", "pending", "answers")
+    
+    def __init__(self, project: Project, changes: List[ChangeAnalysis], deadline: Optional[Deadline] = None,
+                 fallback: bool = True):
+        self.project = project
+        self.changes = changes
+        self.deadline = deadline or Deadline(getattr(settings, 'BRAINVIBE_LLM_DEADLINE', 60))
+        self.request_deadline = deadline
+        self.fallback = fallback
+        self.pending: Dict[str, str] = {}
+        self.answers: Dict[str, List[Dict[str, Any]]] = {}
+    
+    def live(self) -> List[ChangeAnalysis]:
+        """The changes not finished yet"""
+        return [change for change in self.changes if change.result is None]
+    
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        return {change.key: change.result for change in self.changes}
+    
+    def wait_timeout(self) -> Optional[float]:
+        """Seconds left to wait for the job (None without a request deadline)"""
+        return self.request_deadline.remaining() if self.request_deadline is not None else None
+
+
+def _parse_stage(job: AnalysisJob):
+    for change in job.changes:
+        change.summary = parse_diff(change.diff_text).summary()
+
+
+def _classify_stage(job: AnalysisJob):
+    # Formatting, comment and rename changes have nothing to learn from
+    for change in job.changes:
+        if change.code_change is not None:
+            change.result = skip_trivial_change(job.project, change.code_change)
+        elif _skip_trivial_changes():
+            change_kind = change_classifier.classify_diff(change.diff_text)
+            if change_classifier.is_trivial(change_kind):
+                change.result = {'success': True, 'change_kind': change_kind, 'topics': []}
+    if not job.live():
+        return job.results()
+
+
+def _filter_stage(job: AnalysisJob):
+    live = job.live()
+    for change in live:
+        extra = {'batch_size': len(live)} if len(live) > 1 else {}
+        change.publish("stage", stage="extracting", **extra, **change.summary)
+        rule_result = llm_utils.rule_analysis(change.diff_text, job.deadline)
+        if rule_result is not None:
+            change.rule_topics = rule_result.topics
+            change.residue = "" if rule_result.fully_covered else rule_result.residue
+
+
+def _cache_stage(job: AnalysisJob):
+    for change in job.live():
+        if change.residue:
+            change.cached, pending = llm_utils.lookup_units(change.residue, job.deadline)
+            change.fingerprints = list(pending)
+            job.pending.update(pending)
+
+
+def _llm_stage(job: AnalysisJob):
+    if not job.pending:
+        return
+    diff_text = "\n".join(change.diff_text for change in job.live() if change.fingerprints)
+    project_context = llm_utils.build_project_context(job.project, diff_text)
+    try:
+        llm_utils.analyze_units(job.pending, project_context, job.deadline.stage("llm"), job.fallback, job.answers)
+    except Exception as e:
+        if job.fallback:
+            raise
+        # The changes keep what was answered and stay unanalyzed for reprocess_backlog
+        logger.warning(f"LLM analysis of {len(job.pending) - len(job.answers)} diff units of project "
+                       f"{job.project.project_id} did not finish: {e}")
+
+
+def _merge_stage(job: AnalysisJob):
+    for change in job.live():
+        answered = [job.answers[fingerprint] for fingerprint in change.fingerprints if fingerprint in job.answers]
+        change.partial = len(answered) < len(change.fingerprints)
+        change.topics = llm_utils.process_topics(
+            llm_utils.merge_topics(change.rule_topics, *change.cached, *answered)
+        )
+
+
+def _persist_stage(job: AnalysisJob):
+    for change in job.live():
+        if change.code_change is None:
+            change.result = {'success': True, 'topics': change.topics}
+            continue
+        try:
+            change.publish("stage", stage="saving", topics_found=len(change.topics))
+            topics_created = _save_change_topics(job.project, change.code_change, change.topics, change.publish,
+                                                 analyzed=not change.partial)
+            result = _analysis_result(job.project, change.key, change.summary, topics_created)
+            if change.partial:
+                result['partial'] = True
+                result['analysis_details'].append(
+                    "The LLM analysis did not finish in time; the change will be analyzed again"
+                )
+            change.publish("complete", **result)
+            change.result = result
+        except Exception as e:
+            if len(job.changes) == 1:
+                raise
+            # One failing change must not lose the results of the others
+            logger.exception(f"Error saving topics of change {change.key}: {e}")
+            change.publish("error", message=str(e))
+            change.result = {'success': False, 'change_id': change.key, 'error': str(e)}
+    return job.results()
+
+
+def _closing_connections(run):
+    # Stage workers are long-lived threads; give their database connections back after each job
+    def stage(job):
+        try:
+            return run(job)
+        finally:
+            close_old_connections()
+    return stage
+
+
+ANALYSIS_STAGES = (
+    ('parse', _parse_stage),
+    ('classify', _closing_connections(_classify_stage)),
+    ('filter', _filter_stage),
+    ('cache', _cache_stage),
+    ('llm', _closing_connections(_llm_stage)),
+    ('merge', _merge_stage),
+    ('persist', _closing_connections(_persist_stage)),
+)
+
+_analysis_pipeline: Optional[Pipeline] = None
+_analysis_pipeline_lock = threading.Lock()
+
+
+def get_analysis_pipeline() -> Pipeline:
+    """
+    Return the pipeline every analysis runs through.
+    
+    Stages: parse (diff summary), classify (trivial changes are finished
+    here), filter (ignored files and topic rules), cache (analysis cache
+    lookups of the residue units), llm, merge and persist. Worker counts come
+    from BRAINVIBE_PIPELINE_WORKERS and queue sizes from
+    BRAINVIBE_PIPELINE_QUEUE_SIZE.
+    """
+    global _analysis_pipeline
+    with _analysis_pipeline_lock:
+        if _analysis_pipeline is None:
+            workers = dict(DEFAULT_PIPELINE_WORKERS, **getattr(settings, 'BRAINVIBE_PIPELINE_WORKERS', {}))
+            queue_size = getattr(settings, 'BRAINVIBE_PIPELINE_QUEUE_SIZE', 64)
+            _analysis_pipeline = Pipeline('brainvibe-pipeline', [
+                Stage(name, run, workers=int(workers.get(name, 1)), queue_size=queue_size)
+                for name, run in ANALYSIS_STAGES
+            ])
+        return _analysis_pipeline
+
+
+def _expired_results(job: AnalysisJob, reason: Exception) -> Dict[str, Dict[str, Any]]:
+    # Results of a job the client's deadline ran out on while it was queued or running: its
+    # unfinished changes are reported partial with no topics saved and stay unanalyzed
+    logger.warning(f"Analysis of {len(job.changes)} changes for project {job.project.project_id} "
+                   f"did not finish by the request deadline: {str(reason) or 'timed out'}")
+    message = "The request deadline passed before the analysis finished; the change will be analyzed later"
+    results = {}
+    for change in job.changes:
+        if change.result is not None:
+            results[change.key] = change.result
+        elif change.code_change is None:
+            results[change.key] = {'success': True, 'partial': True, 'topics': []}
+        else:
+            summary = change.summary or parse_diff(change.diff_text).summary()
+            result = _analysis_result(job.project, change.key, summary, [])
+            result['partial'] = True
+            result['analysis_details'].append(message)
+            change.publish("complete", **result)
+            results[change.key] = result
+    return results
+
+
+def run_analysis_job(job: AnalysisJob) -> Dict[str, Dict[str, Any]]:
+    """
+    Run a job through the analysis pipeline and wait for it.
+    
+    With a request deadline, the job is waited for (for room at the first
+    stage and for its result) only until the deadline passes. The unfinished
+    changes then get partial results without topics, the job is dropped from
+    the pipeline before its next stage, and the changes stay unanalyzed for
+    reprocess_backlog.
+    
+    Args:
+        job: The AnalysisJob
+        
+    Returns:
+        Results keyed by change ID; a failure of the whole job is raised after
+        an "error" event is published for each unfinished change
+    """
+    try:
+        return get_analysis_pipeline().run(job, job.wait_timeout())
+    except (JobExpired, FutureTimeoutError) as e:
+        return _expired_results(job, e)
+    except Exception as e:
+        logger.exception(f"Error analyzing {len(job.changes)} changes for project {job.project.project_id}: {e}")
+        for change in job.live():
+            change.publish("error", message=str(e))
+        raise
+
+
+def run_diff_analysis(project: Project, code_change: CodeChange,
+                      deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """
+    Extract topics from a recorded code change and save them to the project.
+    
+    Progress is published as events on the change and project channels:
+    "stage" events as the analysis advances, one "topic" event per saved topic,
+    and a final "complete" or "error" event. Formatting, comment and rename
+    changes only get the "complete" event (see skip_trivial_change).
+    
+    Under a request deadline, an LLM analysis that cannot finish in time does
+    not fall back to keyword topics: the topics found so far (those of the
+    topic rules and of the diff units already answered) are saved, the result
+    is marked partial and the change stays unanalyzed for reprocess_backlog.
+    
+    Args:
+        project: The project the change belongs to
+        code_change: The CodeChange record holding the diff
+        deadline: The client's request deadline (see views), or None
+        
+    Returns:
+        A dictionary with the created topic IDs and analysis details
+    """
+    job = AnalysisJob(project, [ChangeAnalysis(project, code_change)], deadline, fallback=deadline is None)
+    return run_analysis_job(job)[code_change.change_id]
+
+
+def run_batched_analysis(project: Project, code_changes: List[CodeChange],
+                         fallback: bool = True, deadline: Optional[Deadline] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyze several code changes of one project together.
+    
+    The LLM units of all changes share batched prompts (see
+    llm_utils.analyze_units); each change still gets its own topics, progress
+    events and result.
+    
+    Args:
+        project: The project the changes belong to
+        code_changes: CodeChange records holding the diffs
+        fallback: Save fallback topics when the LLM fails; with False the
+            changes keep the topics found so far, are marked partial and stay
+            unanalyzed
+        deadline: Time budget for the LLM calls (default: BRAINVIBE_LLM_DEADLINE)
+        
+    Returns:
+        Results (as returned by run_diff_analysis) keyed by change ID
+    """
+    job = AnalysisJob(project, [ChangeAnalysis(project, code_change) for code_change in code_changes],
+                      deadline, fallback)
+    results = run_analysis_job(job)
+    logger.info(f"Batched analysis of {len(code_changes)} changes for project {project.project_id} complete")
+    return results
+
+
+def route_diff(project: Project, diff_text: str) -> List[Tuple[Project, str, int]]:
+    """
+    Split a diff across the projects owning its files.
+
+    The ownership rules are the path prefixes in the project's metadata (see
+    path_router). Files no rule covers, or whose owner is not a known
+    project, stay with the project itself.
+
+    Args:
+        project: The project the diff was posted to
+        diff_text: The diff
+
+    Returns:
+        (project, sub-diff, number of files) per owning project, in order of
+        first appearance; just the project and the whole diff without rules
+    """
+    rules = path_router.project_rules(project.metadata)
+    if not rules:
+        return [(project, diff_text, len(parse_diff(diff_text).files))]
+
+    parts = path_router.split_diff(diff_text, path_router.compile_rules(rules), project.project_id)
+    owners = {owner.project_id: owner for owner in Project.objects.filter(project_id__in=list(parts))}
+    owners[project.project_id] = project
+    routes: Dict[str, List[Any]] = {}
+    for owner_id, (text, files) in parts.items():
+        if owner_id not in owners:
+            logger.warning(f"Path owner {owner_id} of project {project.project_id} does not exist; "
+                           f"its {files} files stay with the project")
+            owner_id = project.project_id
+        route = routes.setdefault(owner_id, [owners[owner_id], "", 0])
+        route[1] += text
+        route[2] += files
+    return [tuple(route) for route in routes.values()]
+
+
+def run_routed_analysis(routes: List[Tuple[Project, CodeChange]],
+                        deadline: Optional[Deadline] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyze the sub-diffs of a routed diff concurrently, one job per project.
+
+    Each job runs as in run_diff_analysis, so every project gets only the
+    topics of its own files, and a job still unfinished at the deadline gets
+    a partial result (see run_analysis_job). A failed job does not fail the
+    others.
+
+    Args:
+        routes: (project, CodeChange holding the project's sub-diff) pairs
+        deadline: The client's request deadline (see views), or None
+
+    Returns:
+        Results (as returned by run_diff_analysis) keyed by project ID
+    """
+    pipeline = get_analysis_pipeline()
+    submitted = []
+    for project, code_change in routes:
+        job = AnalysisJob(project, [ChangeAnalysis(project, code_change)], deadline, fallback=deadline is None)
+        try:
+            future = pipeline.submit(job, job.wait_timeout())
+        except JobExpired as e:
+            future = Future()
+            future.set_exception(e)
+        submitted.append((job, code_change, future))
+
+    results = {}
+    for job, code_change, future in submitted:
+        project_id = job.project.project_id
+        try:
+            results[project_id] = future.result(job.wait_timeout())[code_change.change_id]
+        except (JobExpired, FutureTimeoutError) as e:
+            results[project_id] = _expired_results(job, e)[code_change.change_id]
+        except Exception as e:
+            logger.exception(f"Error analyzing routed change {code_change.change_id} for project {project_id}: {e}")
+            for change in job.live():
+                change.publish("error", message=str(e))
+            results[project_id] = {'success': False, 'change_id': code_change.change_id, 'error': str(e)}
+    return results
+
+
+_analysis_scheduler: Optional[FairScheduler] = None
+_analysis_scheduler_lock = threading.Lock()
+
+
+def get_analysis_scheduler() -> FairScheduler:
+    """
+    Return the weighted-fair worker pool running background analyses.
+    """
+    global _analysis_scheduler
+    with _analysis_scheduler_lock:
+        if _analysis_scheduler is None:
+            _analysis_scheduler = FairScheduler(
+                workers=getattr(settings, 'BRAINVIBE_ANALYSIS_WORKERS', 4),
+                weights=getattr(settings, 'BRAINVIBE_SCHEDULER_WEIGHTS', None),
+                max_wait=getattr(settings, 'BRAINVIBE_SCHEDULER_MAX_WAIT_SECONDS', 30)
+            )
+        return _analysis_scheduler
+
+
+def _cancel_expired(project: Project, code_change: CodeChange) -> Dict[str, Any]:
+    # The client stopped waiting before the job started; the change stays unanalyzed for reprocess_backlog
+    message = "The request deadline passed before the analysis started; the change will be analyzed later"
+    logger.info(f"Cancelled queued analysis of change {code_change.change_id}: request deadline passed")
+    publish_change_event(project.project_id, code_change.change_id, "error", {"message": message})
+    return {'success': False, 'cancelled': True, 'change_id': code_change.change_id, 'error': message}
+
+
+def _run_batch(group: Tuple[int, str], items: List[Tuple[Project, CodeChange, Future, Optional[Deadline]]]):
+    # Flush callback of the micro-batcher: analyze the batch in the pool
+    project_pk, job_class = group
+    
+    def task():
+        live = []
+        try:
+            for project, code_change, future, deadline in items:
+                if deadline is not None and deadline.expired:
+                    future.set_result(_cancel_expired(project, code_change))
+                else:
+                    live.append((code_change, future, deadline))
+            if not live:
+                return
+            # The batch runs as long as its most patient client waits; with a client deadline, an
+            # unfinished LLM analysis leaves partial topics and the changes stay unanalyzed
+            deadlines = [deadline for _, _, deadline in live]
+            deadline = None if None in deadlines else max(deadlines, key=lambda d: d.expires_at)
+            results = run_batched_analysis(items[0][0], [code_change for code_change, _, _ in live],
+                                           fallback=deadline is None, deadline=deadline)
+            for code_change, future, _ in live:
+                future.set_result(results.get(code_change.change_id))
+        except Exception as e:
+            for _, _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            close_old_connections()
+    
+    get_analysis_scheduler().submit(task, job_class, project_pk)
+
+
+_micro_batcher: Optional[MicroBatcher] = None
+_micro_batcher_lock = threading.Lock()
+
+
+def _get_micro_batcher() -> MicroBatcher:
+    global _micro_batcher
+    with _micro_batcher_lock:
+        if _micro_batcher is None:
+            _micro_batcher = MicroBatcher(
+                _run_batch,
+                window=batch_setting('BRAINVIBE_BATCH_WINDOW_MS') / 1000.0,
+                max_items=batch_setting('BRAINVIBE_BATCH_MAX_ITEMS')
+            )
+        return _micro_batcher
+
+
+def submit_diff_analysis(project: Project, code_change: CodeChange,
+                         deadline: Optional[Deadline] = None) -> Future:
+    """
+    Run run_diff_analysis in the background analysis pool.
+    
+    The request thread returns immediately; clients follow progress through
+    the change's event stream. Jobs are scheduled by the priority of the
+    change's source and fairly across projects (see scheduler). Small diffs
+    wait up to BRAINVIBE_BATCH_WINDOW_MS for other small diffs of the same
+    project and priority and are analyzed together in one batched LLM prompt.
+    The analysis counts towards the admission depth (see admission) until it
+    finishes. Formatting, comment and rename changes are completed right away
+    without being queued.
+    
+    With a request deadline, a job still queued when the deadline passes is
+    cancelled instead of run, and a running analysis returns partial topics
+    (see run_diff_analysis).
+    
+    Args:
+        project: The project the change belongs to
+        code_change: The CodeChange record holding the diff
+        deadline: The client's request deadline (see views), or None
+        
+    Returns:
+        A Future resolving to the analysis result
+    """
+    skipped = skip_trivial_change(project, code_change)
+    if skipped is not None:
+        future = Future()
+        future.set_result(skipped)
+        return future
+    
+    publish_change_event(project.project_id, code_change.change_id, "stage", {"stage": "queued"})
+    admission.load.enter()
+    job_class = admission.source_priority(code_change.change_source)
+    
+    if batch_setting('BRAINVIBE_BATCH_WINDOW_MS') > 0 and is_batchable(code_change.diff_content):
+        future = Future()
+        future.add_done_callback(lambda _: admission.load.exit())
+        _get_micro_batcher().add((project.pk, job_class), (project, code_change, future, deadline))
+        return future
+    
+    def task():
+        try:
+            if deadline is not None and deadline.expired:
+                return _cancel_expired(project, code_change)
+            return run_diff_analysis(project, code_change, deadline)
+        finally:
+            close_old_connections()
+    
+    future = get_analysis_scheduler().submit(task, job_class, project.pk)
+    future.add_done_callback(lambda _: admission.load.exit())
+    return future
@@ -0,0 +1,94 @@
+"""
+Tests for admission control of analysis work.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from main.utils import admission
+from main.utils.admission import AnalysisLoad, admit, retry_after_seconds
+
+
+@override_settings(BRAINVIBE_ADMISSION_ENABLED=True, BRAINVIBE_ADMISSION_LOW_MAX_DEPTH=2,
+                   BRAINVIBE_ADMISSION_NORMAL_MAX_DEPTH=4, BRAINVIBE_ADMISSION_MAX_DEPTH=6,
+                   BRAINVIBE_ADMISSION_MAX_RETRY_AFTER=60)
+class AdmissionTests(SimpleTestCase):
+    def setUp(self):
+        load_patch = mock.patch.object(admission, "load", AnalysisLoad())
+        self.load = load_patch.start()
+        self.addCleanup(load_patch.stop)
+
+    def fill(self, depth):
+        for _ in range(depth):
+            self.load.enter()
+
+    def test_everything_is_admitted_below_the_limits(self):
+        self.fill(1)
+        for source in ("scheduled_scan", "git_commit", "cursor_ai"):
+            self.assertIsNone(admit(source))
+
+    def test_low_priority_is_shed_first_with_429(self):
+        self.fill(2)
+        rejection = admit("scheduled_scan")
+        self.assertEqual(rejection.status_code, 429)
+        self.assertIsNone(admit("git_commit"))
+        self.assertIsNone(admit("cursor_ai"))
+
+    def test_normal_priority_is_shed_with_429(self):
+        self.fill(4)
+        self.assertEqual(admit("cli").status_code, 429)
+        self.assertEqual(admit("unknown-source").status_code, 429)
+        self.assertIsNone(admit("manual_edit"))
+
+    def test_interactive_is_refused_with_503_when_saturated(self):
+        self.fill(6)
+        self.assertEqual(admit("cursor_ai").status_code, 503)
+
+    @override_settings(BRAINVIBE_ADMISSION_ENABLED=False)
+    def test_disabled(self):
+        self.fill(100)
+        self.assertIsNone(admit("scheduled_scan"))
+
+    def test_tracked_analyses_leave_the_depth(self):
+        with self.load.track():
+            self.assertEqual(self.load.depth, 1)
+        self.assertEqual(self.load.depth, 0)
+        self.load.exit()
+        self.assertEqual(self.load.depth, 0)
+
+
+@override_settings(BRAINVIBE_ADMISSION_MAX_RETRY_AFTER=60)
+class RetryAfterTests(SimpleTestCase):
+    def setUp(self):
+        load_patch = mock.patch.object(admission, "load", AnalysisLoad())
+        self.load = load_patch.start()
+        self.addCleanup(load_patch.stop)
+
+    def complete(self, count):
+        for _ in range(count):
+            self.load.enter()
+            self.load.exit()
+
+    def test_no_recent_completions_waits_the_maximum(self):
+        self.assertEqual(retry_after_seconds(1), 60)
+
+    def test_wait_follows_the_completion_rate(self):
+        # Ten completions within one second: ten per second
+        self.complete(10)
+        self.assertEqual(retry_after_seconds(30), 3)
+
+    def test_wait_is_at_least_one_second(self):
+        self.complete(10)
+        self.assertEqual(retry_after_seconds(1), 1)
+
+    def test_wait_is_capped(self):
+        self.complete(10)
+        self.assertEqual(retry_after_seconds(10000), 60)
+
+    def test_rejection_carries_the_wait(self):
+        self.complete(10)
+        for _ in range(20):
+            self.load.enter()
+        with self.settings(BRAINVIBE_ADMISSION_ENABLED=True, BRAINVIBE_ADMISSION_MAX_DEPTH=5):
+            rejection = admit("cursor_ai")
+        self.assertEqual((rejection.status_code, rejection.retry_after), (503, 2))
@@ -0,0 +1,58 @@
+"""
+Tests for micro-batched analysis of changes posted with a client deadline.
+"""
+from concurrent.futures import Future
+from unittest import mock
+
+from django.test import TransactionTestCase
+
+from main import services
+from main.models import CodeChange, Project
+from main.utils import llm_utils
+from main.utils.admission import INTERACTIVE_PRIORITY
+from main.utils.resilience import Deadline, DeadlineExceeded
+
+DIFF = (
+    "diff --git a/flux.py b/flux.py\n--- a/flux.py\n+++ b/flux.py\n"
+    "@@ -1,2 +1,3 @@\n def warble(zork):\n-    return zork\n+    return frobnicate_quux(zork, 7)\n"
+)
+
+
+class RunBatchTests(TransactionTestCase):
+    def setUp(self):
+        self.project = Project.objects.create(project_id="batch-project", name="Batch project")
+        self.change = CodeChange.objects.create(project=self.project, change_source="cursor_ai",
+                                                change_id="batch-change", diff_content=DIFF)
+        scheduler_patch = mock.patch.object(services, "get_analysis_scheduler")
+        # Run the batch job inline instead of in the pool
+        scheduler_patch.start().return_value.submit.side_effect = lambda task, *args: task()
+        self.addCleanup(scheduler_patch.stop)
+        for name in ("_analyze_with_llm", "_analyze_batch_with_llm"):
+            llm_patch = mock.patch.object(llm_utils, name, side_effect=DeadlineExceeded("deadline passed"))
+            llm_patch.start()
+            self.addCleanup(llm_patch.stop)
+
+    def run_batch(self, deadline):
+        future = Future()
+        services._run_batch((self.project.pk, INTERACTIVE_PRIORITY), [(self.project, self.change, future, deadline)])
+        self.change.refresh_from_db()
+        return future.result(timeout=5)
+
+    def test_deadline_bearing_change_comes_back_partial(self):
+        result = self.run_batch(Deadline(30))
+        self.assertTrue(result['success'])
+        self.assertTrue(result['partial'])
+        self.assertFalse(self.change.is_analyzed)
+
+    def test_change_without_deadline_falls_back(self):
+        result = self.run_batch(None)
+        self.assertTrue(result['success'])
+        self.assertFalse(result.get('partial'))
+        self.assertTrue(self.change.is_analyzed)
+
+    def test_expired_change_is_cancelled(self):
+        with mock.patch.object(services, "run_batched_analysis") as run:
+            result = self.run_batch(Deadline(0))
+        run.assert_not_called()
+        self.assertTrue(result['cancelled'])
+        self.assertFalse(self.change.is_analyzed)
@@ -0,0 +1,88 @@
+"""
+Tests for the formatting, comment and rename detection of changes.
+"""
+from django.test import SimpleTestCase
+
+from main.utils.change_classifier import (
+    COMMENTS, FORMATTING, RENAME, SEMANTIC, classify_diff, classify_versions
+)
+
+
+def classify(before, after, path="app.py"):
+    return classify_versions([(path, before, after)])
+
+
+class PythonClassificationTests(SimpleTestCase):
+    def test_formatting(self):
+        self.assertEqual(classify("x=f( 1,2 )\n", "x = f(1, 2)\n"), FORMATTING)
+
+    def test_comments_and_docstrings(self):
+        self.assertEqual(classify("def f():\n    return 1\n", "def f():\n    # one\n    return 1\n"), COMMENTS)
+        self.assertEqual(classify('def f():\n    """Old."""\n    return 1\n',
+                                  'def f():\n    """New."""\n    return 1\n'), COMMENTS)
+
+    def test_consistent_rename_of_bound_names(self):
+        before = "def total(items):\n    count = len(items)\n    return count\n\nprint(total([]))\n"
+        after = "def size(values):\n    n = len(values)\n    return n\n\nprint(size([]))\n"
+        self.assertEqual(classify(before, after), RENAME)
+
+    def test_swapping_an_external_call_is_semantic(self):
+        self.assertEqual(classify("import json\njson.dumps(x)\n", "import json\njson.loads(x)\n"), SEMANTIC)
+
+    def test_inconsistent_rename_is_semantic(self):
+        before = "a = 1\nb = a\nc = a\n"
+        after = "x = 1\nb = x\nc = y\n"
+        self.assertEqual(classify(before, after), SEMANTIC)
+
+    def test_attribute_store_on_another_object_is_semantic(self):
+        self.assertEqual(classify("settings.DEBUG = True\n", "settings.TESTING = True\n"), SEMANTIC)
+        self.assertEqual(classify("model.train = True\n", "model.eval = True\n"), SEMANTIC)
+
+    def test_renamed_self_attribute(self):
+        before = ("class Client:\n    def __init__(self):\n        self.timeout = 1\n\n"
+                  "    def wait(self):\n        return self.timeout\n")
+        after = before.replace("timeout", "delay")
+        self.assertEqual(classify(before, after), RENAME)
+
+    def test_keyword_of_an_external_call_is_semantic(self):
+        before = ("class Client:\n    def __init__(self):\n        self.timeout = 1\n\n"
+                  "    def get(self, u):\n        return requests.get(u, timeout=self.timeout)\n")
+        after = before.replace("timeout", "retries")
+        self.assertEqual(classify(before, after), SEMANTIC)
+
+    def test_keyword_of_a_defined_function_follows_its_parameter(self):
+        before = "def fetch(timeout):\n    return timeout\n\nfetch(timeout=1)\n"
+        after = before.replace("timeout", "limit")
+        self.assertEqual(classify(before, after), RENAME)
+
+    def test_renamed_method_and_its_calls(self):
+        before = "class A:\n    def run(self):\n        return 1\n\n    def go(self):\n        return self.run()\n"
+        after = before.replace("run", "start")
+        self.assertEqual(classify(before, after), RENAME)
+
+    def test_changed_code(self):
+        self.assertEqual(classify("x = 1\n", "x = 2\n"), SEMANTIC)
+
+
+class TokenClassificationTests(SimpleTestCase):
+    def test_javascript_formatting_and_comments(self):
+        self.assertEqual(classify("const a = {b: 1,};\n", "const a = { b: 1 };\n", "app.js"), FORMATTING)
+        self.assertEqual(classify("let a = 1;\n", "// one\nlet a = 1;\n", "app.js"), COMMENTS)
+
+    def test_javascript_changed_code(self):
+        self.assertEqual(classify("let a = 1;\n", "let a = 2;\n", "app.js"), SEMANTIC)
+
+
+class DiffClassificationTests(SimpleTestCase):
+    def test_comment_only_hunk(self):
+        diff = ("diff --git a/app.py b/app.py\n--- a/app.py\n+++ b/app.py\n"
+                "@@ -1,2 +1,2 @@\n x = 1\n-# old\n+# new\n")
+        self.assertEqual(classify_diff(diff), COMMENTS)
+
+    def test_attribute_swap_in_a_hunk_is_semantic(self):
+        diff = ("diff --git a/conf.py b/conf.py\n--- a/conf.py\n+++ b/conf.py\n"
+                "@@ -1 +1 @@\n-settings.DEBUG = True\n+settings.TESTING = True\n")
+        self.assertEqual(classify_diff(diff), SEMANTIC)
+
+    def test_empty_diff_is_semantic(self):
+        self.assertEqual(classify_diff(""), SEMANTIC)
@@ -0,0 +1,62 @@
+"""
+Tests for the delta upload content cache.
+"""
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from main.utils.content_cache import (
+    SendFullContent, content_hash, get_content, remember_content, resolve_contents, session_scope
+)
+from main.utils.fast_diff import diff_texts
+
+
+class ContentCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.scope = session_scope("project", "session")
+
+    def test_remember_returns_the_content_hash(self):
+        digest = remember_content(self.scope, "print(1)\n")
+        self.assertEqual(digest, content_hash("print(1)\n"))
+        self.assertEqual(get_content(self.scope, digest), "print(1)\n")
+
+    def test_scopes_do_not_share_contents(self):
+        digest = remember_content(self.scope, "x")
+        self.assertIsNone(get_content(session_scope("project", "other"), digest))
+
+    @override_settings(BRAINVIBE_CONTENT_CACHE_MAX_BYTES=4)
+    def test_large_contents_are_not_cached(self):
+        self.assertIsNone(remember_content(self.scope, "too large"))
+
+    def test_full_contents(self):
+        self.assertEqual(resolve_contents(self.scope, {"new_content": "b"}), ("", "b"))
+        self.assertEqual(resolve_contents(self.scope, {"original_content": "a", "new_content": "b"}), ("a", "b"))
+
+    def test_patch_against_cached_base(self):
+        base = "def f():\n    return 1"
+        new = "def f():\n    return 2"
+        digest = remember_content(self.scope, base)
+        data = {"base_hash": digest, "patch": diff_texts(base, new), "content_hash": content_hash(new)}
+        self.assertEqual(resolve_contents(self.scope, data), (base, new))
+
+    def test_unknown_base_asks_for_full_contents(self):
+        with self.assertRaises(SendFullContent) as raised:
+            resolve_contents(self.scope, {"base_hash": "0" * 64, "patch": ""})
+        self.assertEqual(raised.exception.base_hash, "0" * 64)
+
+    def test_bad_patch_asks_for_full_contents(self):
+        digest = remember_content(self.scope, "a\n")
+        with self.assertRaises(SendFullContent):
+            resolve_contents(self.scope, {"base_hash": digest, "patch": diff_texts("x\n", "y\n")})
+
+    def test_content_hash_mismatch_asks_for_full_contents(self):
+        digest = remember_content(self.scope, "a\n")
+        with self.assertRaises(SendFullContent):
+            resolve_contents(self.scope, {"base_hash": digest, "patch": diff_texts("a\n", "b\n"),
+                                          "content_hash": content_hash("c\n")})
+
+    def test_missing_fields(self):
+        with self.assertRaises(ValueError):
+            resolve_contents(self.scope, {})
+        with self.assertRaises(ValueError):
+            resolve_contents(self.scope, {"base_hash": "abc"})
@@ -0,0 +1,60 @@
+"""
+Tests for the background sweep of idle Cursor sessions.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from main.utils import cursor_sessions, scheduler
+from main.utils.scheduler import DelayedSubmission
+
+
+@override_settings(BRAINVIBE_CURSOR_SESSION_IDLE_SECONDS=120)
+class IdleSweepTests(SimpleTestCase):
+    def setUp(self):
+        timer_patch = mock.patch.object(scheduler.threading, "Timer")
+        self.Timer = timer_patch.start()
+        self.addCleanup(timer_patch.stop)
+        sweep_patch = mock.patch.object(cursor_sessions, "_sweep", DelayedSubmission(cursor_sessions._run_sweep,
+                                                                                     "interactive"))
+        self.sweep = sweep_patch.start()
+        self.addCleanup(sweep_patch.stop)
+
+    def test_sweep_is_scheduled_after_the_idle_timeout(self):
+        cursor_sessions.schedule_idle_sweep()
+        delay, callback = self.Timer.call_args[0]
+        self.assertEqual(delay, 120 + cursor_sessions.SWEEP_SLACK_SECONDS)
+        self.assertEqual(callback, self.sweep._submit)
+        self.Timer.return_value.start.assert_called_once_with()
+
+    def test_one_sweep_is_pending_at_a_time(self):
+        cursor_sessions.schedule_idle_sweep()
+        cursor_sessions.schedule_idle_sweep(5)
+        self.assertEqual(self.Timer.call_count, 1)
+
+    def test_fired_sweep_runs_in_the_analysis_pool(self):
+        cursor_sessions.schedule_idle_sweep()
+        with mock.patch("main.services.get_analysis_scheduler") as scheduler:
+            self.sweep._submit()
+        scheduler.return_value.submit.assert_called_once_with(cursor_sessions._run_sweep, "interactive")
+        cursor_sessions.schedule_idle_sweep()
+        self.assertEqual(self.Timer.call_count, 2)
+
+    def test_sweep_reschedules_while_sessions_stay_open(self):
+        with mock.patch.object(cursor_sessions, "close_idle_sessions", return_value=1) as close, \
+                mock.patch.object(cursor_sessions, "CursorSession") as sessions, \
+                mock.patch.object(cursor_sessions, "close_old_connections"):
+            query = sessions.objects.filter.return_value.order_by.return_value.values_list.return_value
+            query.first.return_value = cursor_sessions.timezone.now()
+            cursor_sessions._run_sweep()
+        close.assert_called_once_with(background=True)
+        self.assertAlmostEqual(self.Timer.call_args[0][0], 120 + cursor_sessions.SWEEP_SLACK_SECONDS, delta=1)
+
+    def test_sweep_stops_when_no_session_is_open(self):
+        with mock.patch.object(cursor_sessions, "close_idle_sessions", return_value=0), \
+                mock.patch.object(cursor_sessions, "CursorSession") as sessions, \
+                mock.patch.object(cursor_sessions, "close_old_connections"):
+            query = sessions.objects.filter.return_value.order_by.return_value.values_list.return_value
+            query.first.return_value = None
+            cursor_sessions._run_sweep()
+        self.Timer.assert_not_called()
@@ -0,0 +1,122 @@
+"""
+Tests for syntax-aware chunking of diffs into definition units.
+"""
+from django.test import SimpleTestCase
+
+from main.utils.diff_chunker import MODULE_SYMBOL, chunk_diff
+
+
+def file_diff(path, *hunks):
+    return f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n" + "".join(hunks)
+
+
+NEW_PYTHON = file_diff(
+    "cart.py",
+    "@@ -0,0 +1,8 @@\n"
+    "+import os\n"
+    "+class Cart:\n"
+    "+    @property\n"
+    "+    def total(self):\n"
+    "+        return 1\n"
+    "+\n"
+    "+def helper():\n"
+    "+    return 2\n",
+)
+# Starts mid-function, so the hunk lines do not parse on their own
+MID_FUNCTION = file_diff(
+    "cart.py",
+    "@@ -10,4 +10,6 @@     def total(self):\n"
+    "         x = 1\n"
+    "+        y = 2\n"
+    "         return x\n"
+    " \n"
+    "     def tax(self):\n"
+    "+        return 0\n",
+)
+GO = file_diff(
+    "calc.go",
+    "@@ -1,9 +1,9 @@\n"
+    " package main\n"
+    " \n"
+    " func Add(a, b int) int {\n"
+    "-\treturn a - b\n"
+    "+\treturn a + b\n"
+    " }\n"
+    " \n"
+    " func Sub(a, b int) int {\n"
+    "-\treturn a + b\n"
+    "+\treturn a - b\n"
+    " }\n",
+)
+
+
+def shifted_edit(start, context):
+    # The same edit to Cart.total, at a different place in the file and with different context
+    return file_diff(
+        "cart.py",
+        f"@@ -{start},4 +{start},4 @@ class Cart:\n"
+        f" {context}\n"
+        "     def total(self):\n"
+        "-        return sum(self.items)\n"
+        "+        return sum(item.price for item in self.items)\n",
+    )
+
+
+class ChunkDiffTests(SimpleTestCase):
+    def test_python_definitions_from_ast(self):
+        units = chunk_diff(NEW_PYTHON)
+        self.assertEqual([unit.symbol for unit in units], [MODULE_SYMBOL, "Cart", "Cart.total", "helper"])
+        # The decorator belongs to the method it decorates
+        self.assertIn("+    @property\n", units[2].hunk_texts[0])
+        self.assertTrue(all(unit.path == "cart.py" for unit in units))
+
+    def test_split_pieces_get_their_own_headers(self):
+        units = chunk_diff(NEW_PYTHON)
+        self.assertEqual([unit.hunk_texts[0].splitlines()[0] for unit in units],
+                         ["@@ -0,0 +1,1 @@", "@@ -0,0 +2,1 @@", "@@ -0,0 +3,3 @@", "@@ -0,0 +7,2 @@"])
+        # The blank line between the definitions is module code again
+        self.assertEqual(units[0].hunk_texts[1], "@@ -0,0 +6,1 @@\n+\n")
+
+    def test_python_definitions_from_indentation(self):
+        units = chunk_diff(MID_FUNCTION)
+        # The first change precedes any definition in the hunk: git's function context names it
+        self.assertEqual([unit.symbol for unit in units], ["total", "tax"])
+        self.assertIn("+        y = 2", units[0].text)
+        self.assertIn("+        return 0", units[1].text)
+
+    def test_brace_language(self):
+        units = chunk_diff(GO)
+        self.assertEqual([unit.symbol for unit in units], ["Add", "Sub"])
+        self.assertIn("+\treturn a + b", units[0].text)
+        self.assertNotIn("Sub", units[0].text)
+        self.assertTrue(units[1].text.startswith("diff --git a/calc.go b/calc.go\n"))
+
+    def test_hunks_of_one_definition_form_one_unit(self):
+        diff = file_diff(
+            "svc.go",
+            "@@ -3,3 +3,3 @@ func Run() {\n \ta := 1\n-\tb := 2\n+\tb := 3\n \tc := 4\n",
+            "@@ -20,3 +20,3 @@ func Run() {\n \tx := 1\n-\ty := 2\n+\ty := 3\n \tz := 4\n",
+        )
+        units = chunk_diff(diff)
+        self.assertEqual(len(units), 1)
+        self.assertEqual(units[0].symbol, "Run")
+        self.assertEqual(len(units[0].hunk_texts), 2)
+        self.assertGreater(units[0].tokens, 0)
+
+    def test_fingerprint_survives_the_function_moving(self):
+        before = chunk_diff(shifted_edit(12, "    items = []"))
+        after = chunk_diff(shifted_edit(87, "    # totals"))
+        self.assertEqual([unit.symbol for unit in before], [unit.symbol for unit in after])
+        self.assertEqual(before[0].fingerprint, after[0].fingerprint)
+
+    def test_fingerprint_changes_with_the_edit_or_path(self):
+        base = chunk_diff(shifted_edit(12, "    items = []"))[0].fingerprint
+        edited = shifted_edit(12, "    items = []").replace("item.price", "item.cost")
+        self.assertNotEqual(chunk_diff(edited)[0].fingerprint, base)
+        moved_file = shifted_edit(12, "    items = []").replace("cart.py", "basket.py")
+        self.assertNotEqual(chunk_diff(moved_file)[0].fingerprint, base)
+
+    def test_file_without_hunks(self):
+        units = chunk_diff("diff --git a/logo.png b/logo.png\nBinary files a/logo.png and b/logo.png differ\n")
+        self.assertEqual([(unit.path, unit.symbol) for unit in units], [("logo.png", MODULE_SYMBOL)])
+        self.assertTrue(units[0].fingerprint)
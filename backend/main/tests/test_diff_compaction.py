@@ -0,0 +1,107 @@
+"""
+Tests for diff compaction before prompting.
+"""
+from django.test import SimpleTestCase
+
+from main.utils.diff_compaction import compact_diff, is_data_line
+from main.utils.diff_parser import parse_diff
+
+
+def file_diff(path, *hunks):
+    return f"diff --git a/{path} b/{path}\nindex 1111111..2222222 100644\n--- a/{path}\n+++ b/{path}\n" + "".join(hunks)
+
+
+MOVED = ["def resolve(user):", "    account = lookup(user.id)", "    return account.owner"]
+WHITESPACE = file_diff(
+    "fmt.py",
+    "@@ -1,2 +1,2 @@\n-def f(a,b):\n-    return a+b\n+def f(a, b):\n+    return a + b\n",
+)
+MOVE = (
+    file_diff("old.py", "@@ -1,4 +1,1 @@\n keep = 1\n" + "".join(f"-{line}\n" for line in MOVED))
+    + file_diff("new.py", "@@ -0,0 +1,4 @@\n+import lookup\n" + "".join(f"+{line}\n" for line in MOVED))
+)
+DATA = file_diff(
+    "table.py",
+    "@@ -0,0 +1,10 @@\n+RATES = [\n" + "".join(f"+    ({n}, {n * 0.5}, \"r{n}\"),\n" for n in range(8)) + "+]\n",
+)
+
+
+class CompactDiffTests(SimpleTestCase):
+    def test_whitespace_only_hunk_is_folded(self):
+        result = compact_diff(WHITESPACE)
+        self.assertIn("~ whitespace-only change to 2 lines", result.text)
+        self.assertNotIn("return a + b", result.text)
+        self.assertEqual(result.actions["whitespace_hunks_folded"], 1)
+
+    def test_removal_only_hunk_becomes_a_note(self):
+        result = compact_diff(file_diff("gone.py", "@@ -1,2 +0,0 @@\n-a = 1\n-b = 2\n"))
+        self.assertIn("~ 2 lines removed", result.text)
+        self.assertEqual(result.actions["removed_lines_dropped"], 2)
+
+    def test_moved_run_is_folded(self):
+        result = compact_diff(MOVE)
+        self.assertIn("~ 3 lines moved from elsewhere in the diff", result.text)
+        self.assertIn("+import lookup", result.text)
+        self.assertNotIn("account.owner", result.text)
+        self.assertEqual(result.actions["moved_lines_folded"], 3)
+
+    def test_short_moved_run_is_kept(self):
+        diff = (file_diff("a.py", "@@ -1,1 +0,0 @@\n-value = compute_total()\n")
+                + file_diff("b.py", "@@ -0,0 +1,1 @@\n+value = compute_total()\n"))
+        result = compact_diff(diff)
+        self.assertIn("+value = compute_total()", result.text)
+        self.assertFalse(result.actions["moved_lines_folded"])
+
+    def test_data_run_keeps_its_first_lines(self):
+        result = compact_diff(DATA, max_data_lines=4)
+        self.assertIn('+    (0, 0.0, "r0"),', result.text)
+        self.assertIn('+    (1, 0.5, "r1"),', result.text)
+        self.assertNotIn('"r2"', result.text)
+        self.assertIn("~ 6 more data lines", result.text)
+        self.assertIn("+RATES = [", result.text)
+        self.assertIn("+]", result.text)
+
+    def test_short_data_run_is_kept(self):
+        result = compact_diff(DATA, max_data_lines=8)
+        self.assertIn('"r7"', result.text)
+        self.assertNotIn("more data lines", result.text)
+
+    def test_data_lines(self):
+        self.assertTrue(is_data_line('    (1, 0.5, "r1"),'))
+        self.assertTrue(is_data_line('  "key": true,'))
+        self.assertFalse(is_data_line("    total = price * 2"))
+
+    def test_long_literals_are_truncated(self):
+        literal = "x" * 200
+        result = compact_diff(file_diff("msg.py", f'@@ -0,0 +1 @@\n+MESSAGE = "{literal}"\n'), max_literal=40)
+        self.assertNotIn(literal, result.text)
+        self.assertIn('..."', result.text)
+        self.assertEqual(result.actions["literals_truncated"], 1)
+
+    def test_context_is_dropped_except_imports_and_signatures(self):
+        diff = file_diff(
+            "svc.py",
+            "@@ -1,5 +1,6 @@\n import os\n def handler(event):\n     a = 1\n     b = 2\n+    c = 3\n     d = 4\n",
+        )
+        result = compact_diff(diff, context_lines=0)
+        self.assertIn(" import os", result.text)
+        self.assertIn(" def handler(event):", result.text)
+        self.assertNotIn("a = 1", result.text)
+        self.assertNotIn("index 1111111", result.text)
+        near = compact_diff(diff, context_lines=1)
+        self.assertIn("b = 2", near.text)
+        self.assertIn("d = 4", near.text)
+        self.assertNotIn("a = 1", near.text)
+
+    def test_output_still_parses_as_a_diff(self):
+        result = compact_diff(WHITESPACE + MOVE + DATA, max_data_lines=4)
+        parsed = parse_diff(result.text)
+        self.assertEqual([f.path for f in parsed.files], ["fmt.py", "old.py", "new.py", "table.py"])
+        self.assertEqual([len(f.hunks) for f in parsed.files], [1, 1, 1, 1])
+        self.assertEqual(list(parsed.iter_added_lines(parsed.files[2])), ["import lookup"])
+
+    def test_savings_are_reported(self):
+        result = compact_diff(MOVE)
+        self.assertLess(result.tokens_after, result.tokens_before)
+        self.assertGreater(result.saved_ratio, 0)
+        self.assertEqual(compact_diff("").text, "")
@@ -0,0 +1,74 @@
+"""
+Tests for the streaming diff filter and its gitignore-style matcher.
+"""
+from django.test import SimpleTestCase
+
+from main.utils.diff_filter import DiffFilter, IgnoreMatcher, filter_diff, parse_diff_header
+
+
+def section(path, lines, header_extra=""):
+    body = "".join(f"+{line}\n" for line in lines)
+    return (f"diff --git a/{path} b/{path}\n{header_extra}--- a/{path}\n+++ b/{path}\n"
+            f"@@ -0,0 +1,{len(lines)} @@\n{body}")
+
+
+class IgnoreMatcherTests(SimpleTestCase):
+    def test_directory_and_glob_patterns(self):
+        matcher = IgnoreMatcher(["node_modules/", "*.min.js", "/build"])
+        self.assertTrue(matcher.is_ignored("web/node_modules/react/index.js"))
+        self.assertTrue(matcher.is_ignored("static/app.min.js"))
+        self.assertTrue(matcher.is_ignored("build/out.js"))
+        self.assertFalse(matcher.is_ignored("src/build/out.js"))
+        self.assertFalse(matcher.is_ignored("src/node_modules.py"))
+
+    def test_star_does_not_cross_directories(self):
+        matcher = IgnoreMatcher(["docs/*.md", "**/gen/**"])
+        self.assertTrue(matcher.is_ignored("docs/intro.md"))
+        self.assertFalse(matcher.is_ignored("docs/guide/intro.md"))
+        self.assertTrue(matcher.is_ignored("api/gen/client.py"))
+
+    def test_negation_and_comments(self):
+        matcher = IgnoreMatcher(["# generated", "*.json", "!package.json"])
+        self.assertTrue(matcher.is_ignored("data/fixtures.json"))
+        self.assertFalse(matcher.is_ignored("package.json"))
+        self.assertEqual(matcher.patterns, 2)
+
+
+class ParseDiffHeaderTests(SimpleTestCase):
+    def test_plain_and_quoted_paths(self):
+        self.assertEqual(parse_diff_header("diff --git a/src/a b.py b/src/a b.py\n"), "src/a b.py")
+        self.assertEqual(parse_diff_header('diff --git "a/caf\\303\\251.py" "b/caf\\303\\251.py"'), "café.py")
+
+    def test_renames_give_the_new_path(self):
+        self.assertEqual(parse_diff_header("diff --git a/old.py b/new.py"), "new.py")
+
+
+class DiffFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = IgnoreMatcher(["node_modules/", "*.lock"])
+
+    def test_drops_ignored_files_and_keeps_the_rest(self):
+        diff = section("app.py", ["x = 1"]) + section("node_modules/a.js", ["y"]) + section("poetry.lock", ["z"])
+        self.assertEqual(filter_diff(diff, self.matcher), section("app.py", ["x = 1"]))
+
+    def test_drops_binary_minified_and_generated_json(self):
+        binary = "diff --git a/logo.png b/logo.png\nBinary files a/logo.png and b/logo.png differ\n"
+        minified = section("bundle.js", ["var a=1;" * 200])
+        generated = section("data.json", ["{}"] * 3)
+        diff_filter = DiffFilter(self.matcher, max_json_lines=2)
+        kept = list(diff_filter.iter_sections(binary + minified + generated + section("ok.py", ["pass"])))
+        self.assertEqual(kept, [section("ok.py", ["pass"])])
+        self.assertEqual(diff_filter.stats, {"binary": 1, "minified": 1, "generated_json": 1, "kept": 1})
+
+    def test_content_lines_are_not_mistaken_for_headers(self):
+        diff = section("notes.py", ["Binary files are fine here", "--- not a header"])
+        self.assertEqual(filter_diff(diff, self.matcher), diff)
+
+    def test_accepts_an_iterable_of_lines(self):
+        diff = section("a.py", ["x"]) + section("b.lock", ["y"])
+        kept = list(DiffFilter(self.matcher).iter_sections(diff.splitlines(keepends=True)))
+        self.assertEqual(kept, [section("a.py", ["x"])])
+
+    def test_plain_diff_without_headers_is_kept(self):
+        diff = "--- before\n+++ after\n@@ -1 +1 @@\n-a\n+b\n"
+        self.assertEqual(filter_diff(diff, self.matcher), diff)
@@ -0,0 +1,68 @@
+"""
+Tests for the offset-based unified diff parser.
+"""
+from django.test import SimpleTestCase
+
+from main.utils.diff_parser import detect_language, parse_diff
+
+DIFF = (
+    "diff --git a/app.py b/app.py\n"
+    "--- a/app.py\n+++ b/app.py\n"
+    "@@ -1,3 +1,4 @@\n import os\n-x = 1\n+x = 2\n+y = 3\n z = 4\n"
+    "@@ -10 +11 @@\n-old()\n+new()\n"
+    "diff --git a/web/ui.tsx b/web/ui.tsx\nnew file mode 100644\n"
+    "--- /dev/null\n+++ b/web/ui.tsx\n@@ -0,0 +1 @@\n+export const A = 1;\n"
+    "diff --git a/logo.png b/logo.png\nBinary files a/logo.png and b/logo.png differ\n"
+)
+
+
+class ParseDiffTests(SimpleTestCase):
+    def test_files_and_hunks(self):
+        parsed = parse_diff(DIFF)
+        self.assertEqual([f.path for f in parsed.files], ["app.py", "web/ui.tsx", "logo.png"])
+        app = parsed.files[0]
+        self.assertEqual([(h.old_start, h.old_count, h.new_start, h.new_count) for h in app.hunks],
+                         [(1, 3, 1, 4), (10, 1, 11, 1)])
+        self.assertEqual((app.added, app.removed), (3, 2))
+
+    def test_file_markers_and_languages(self):
+        _, ui, logo = parse_diff(DIFF).files
+        self.assertTrue(ui.is_new)
+        self.assertEqual(ui.language, "javascript")
+        self.assertTrue(logo.is_binary)
+        self.assertIsNone(logo.language)
+
+    def test_added_and_changed_lines(self):
+        parsed = parse_diff(DIFF)
+        app = parsed.files[0]
+        self.assertEqual(list(parsed.iter_added_lines(app)), ["x = 2", "y = 3", "new()"])
+        self.assertEqual(list(parsed.iter_changed_lines(app)), ["x = 1", "x = 2", "y = 3", "old()", "new()"])
+
+    def test_sections_round_trip(self):
+        parsed = parse_diff(DIFF)
+        self.assertEqual(parsed.join(parsed.files), DIFF)
+        self.assertTrue(parsed.section_text(parsed.files[1]).startswith("diff --git a/web/ui.tsx"))
+
+    def test_summary(self):
+        self.assertEqual(parse_diff(DIFF).summary(), {"lines": DIFF.count("\n"), "files": 3, "added": 4, "removed": 2})
+
+    def test_plain_diff_takes_the_path_from_the_plus_line(self):
+        parsed = parse_diff("--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n")
+        self.assertEqual(parsed.files[0].path, "x.py")
+        self.assertEqual(parsed.added, 1)
+
+    def test_bytes_input_and_empty_input(self):
+        self.assertEqual(parse_diff(DIFF.encode()).summary(), parse_diff(DIFF).summary())
+        self.assertEqual(parse_diff(None).files, [])
+        self.assertEqual(parse_diff("").line_count, 0)
+
+    def test_parsed_diff_is_returned_unchanged(self):
+        parsed = parse_diff(DIFF)
+        self.assertIs(parse_diff(parsed), parsed)
+
+
+class DetectLanguageTests(SimpleTestCase):
+    def test_extensions(self):
+        self.assertEqual(detect_language("src/Main.JAVA"), "java")
+        self.assertEqual(detect_language("lib.rs"), "rust")
+        self.assertIsNone(detect_language("README"))
@@ -0,0 +1,142 @@
+"""
+Tests for the patience/Myers line diff engine.
+"""
+import difflib
+import random
+
+from django.test import SimpleTestCase
+
+from main.utils import fast_diff
+from main.utils.fast_diff import diff_texts, get_opcodes, matching_blocks, unified_diff
+
+
+def _lines(count, rng, alphabet="abcdefgh"):
+    return [rng.choice(alphabet) * rng.randint(1, 3) + "\n" for _ in range(count)]
+
+
+def _mutate(lines, edits, rng):
+    lines = list(lines)
+    for _ in range(edits):
+        position = rng.randint(0, len(lines))
+        action = rng.random()
+        if action < 0.4 and position < len(lines):
+            del lines[position]
+        elif action < 0.7:
+            lines.insert(position, f"inserted {rng.random()}\n")
+        elif position < len(lines):
+            lines[position] = f"changed {rng.random()}\n"
+    return lines
+
+
+class OpcodeTests(SimpleTestCase):
+    def assertRebuilds(self, a, b):
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in get_opcodes(a, b):
+            if tag == "equal":
+                self.assertEqual(a[i1:i2], b[j1:j2])
+                rebuilt.extend(a[i1:i2])
+            else:
+                rebuilt.extend(b[j1:j2])
+        self.assertEqual(rebuilt, list(b))
+
+    def test_random_edits_rebuild_the_new_version(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            a = _lines(rng.randint(0, 60), rng)
+            self.assertRebuilds(a, _mutate(a, rng.randint(0, 15), rng))
+
+    def test_edit_cost_cap_still_produces_valid_opcodes(self):
+        rng = random.Random(3)
+        a = _lines(2000, rng, alphabet="ab")
+        b = _mutate(a, 400, rng)
+        self.assertRebuilds(a, b)
+
+    def test_blocks_are_merged_and_ordered(self):
+        blocks = matching_blocks(["a\n", "b\n", "c\n", "d\n"], ["a\n", "b\n", "x\n", "c\n", "d\n"])
+        self.assertEqual(blocks, [(0, 0, 2), (2, 3, 2)])
+
+    def test_disjoint_versions_are_one_replace(self):
+        self.assertEqual(get_opcodes(["a\n", "b\n"], ["c\n"]), [("replace", 0, 2, 0, 1)])
+
+
+class UnifiedDiffTests(SimpleTestCase):
+    def test_matches_difflib_for_unambiguous_edits(self):
+        a = [f"line {i}\n" for i in range(40)]
+        b = list(a)
+        b[3] = "changed\n"
+        del b[20]
+        b.insert(35, "added\n")
+        expected = list(difflib.unified_diff(a, b, fromfile="before", tofile="after"))
+        self.assertEqual(list(unified_diff(a, b, fromfile="before", tofile="after")), expected)
+
+    def test_context_size(self):
+        a = [f"line {i}\n" for i in range(20)]
+        b = a[:10] + ["new\n"] + a[10:]
+        for n in (0, 1, 5):
+            self.assertEqual(list(unified_diff(a, b, n=n)), list(difflib.unified_diff(a, b, n=n)))
+
+    def test_reports_changes_whenever_difflib_does(self):
+        rng = random.Random(11)
+        for _ in range(30):
+            a = _lines(rng.randint(1, 80), rng)
+            b = _mutate(a, rng.randint(1, 10), rng)
+            ours = "".join(unified_diff(a, b))
+            theirs = "".join(difflib.unified_diff(a, b))
+            self.assertEqual(bool(ours), bool(theirs))
+
+    def test_identical_texts(self):
+        self.assertEqual(diff_texts("same\n", "same\n"), "")
+        self.assertEqual(list(unified_diff(["a\n"], ["a\n"])), [])
+
+    def test_diff_texts_headers(self):
+        diff = diff_texts("a\n", "b\n")
+        self.assertEqual(diff, "--- before\n+++ after\n@@ -1 +1 @@\n-a\n+b\n")
+
+    def test_myers_is_capped(self):
+        rng = random.Random(5)
+        a = _lines(500, rng, alphabet="ab")
+        b = _lines(500, rng, alphabet="ab")
+        original = fast_diff.MAX_EDIT_COST
+        try:
+            fast_diff.MAX_EDIT_COST = 2
+            opcodes = get_opcodes(a, b)
+        finally:
+            fast_diff.MAX_EDIT_COST = original
+        self.assertEqual(sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal"),
+                         sum(j2 - j1 for tag, _, _, j1, j2 in opcodes if tag == "equal"))
+
+
+class ApplyPatchTests(SimpleTestCase):
+    def assertRoundTrips(self, a, b):
+        self.assertEqual(fast_diff.apply_patch(a, diff_texts(a, b)), b)
+
+    def test_missing_final_newline_is_marked(self):
+        diff = diff_texts("a\nb", "a\nc")
+        self.assertEqual(diff, "--- before\n+++ after\n@@ -1,2 +1,2 @@\n a\n-b\n"
+                               "\\ No newline at end of file\n+c\n\\ No newline at end of file\n")
+        self.assertRoundTrips("a\nb", "a\nc")
+
+    def test_final_newline_added_or_removed(self):
+        self.assertRoundTrips("a\nb", "a\nb\n")
+        self.assertRoundTrips("a\nb\n", "a\nb")
+        self.assertRoundTrips("", "x")
+        self.assertRoundTrips("x", "")
+
+    def test_unchanged_last_line_without_newline(self):
+        self.assertRoundTrips("a\nb\nc", "z\nb\nc")
+
+    def test_random_round_trips(self):
+        rng = random.Random(13)
+        for _ in range(200):
+            a = _lines(rng.randint(0, 30), rng)
+            b = _mutate(a, rng.randint(0, 8), rng)
+            a_text, b_text = "".join(a), "".join(b)
+            if rng.random() < 0.5:
+                a_text = a_text.rstrip("\n")
+            if rng.random() < 0.5:
+                b_text = b_text.rstrip("\n")
+            self.assertRoundTrips(a_text, b_text)
+
+    def test_mismatched_base_is_rejected(self):
+        with self.assertRaises(fast_diff.PatchError):
+            fast_diff.apply_patch("x\ny\n", diff_texts("a\nb\n", "a\nc\n"))
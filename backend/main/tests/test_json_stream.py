@@ -0,0 +1,52 @@
+"""
+Tests for the incremental parser of structured LLM topic responses.
+"""
+from django.test import SimpleTestCase
+
+from main.utils.json_stream import TopicStreamParser, iter_topics, parse_batch_topics, parse_topics
+
+RESPONSE = '[{"title": "React Hooks", "prerequisites": ["React"]}, {"title": "Say \\"hi\\" {braces}", "prerequisites": []}]'
+
+
+class TopicStreamParserTests(SimpleTestCase):
+    def test_emits_each_topic_when_its_object_closes(self):
+        parser = TopicStreamParser()
+        self.assertEqual(parser.feed('[{"title": "React Hooks", "prere'), [])
+        self.assertEqual(parser.feed('quisites": []}, {"ti'), [{"title": "React Hooks", "prerequisites": []}])
+        self.assertEqual(parser.feed('tle": "Redux"}]'), [{"title": "Redux"}])
+        self.assertTrue(parser.complete)
+        self.assertEqual(parser.topics_emitted, 2)
+
+    def test_any_chunking_gives_the_same_topics(self):
+        expected = parse_topics(RESPONSE)
+        self.assertEqual([topic["title"] for topic in expected], ["React Hooks", 'Say "hi" {braces}'])
+        for size in (1, 2, 7, 13):
+            chunks = [RESPONSE[i:i + size] for i in range(0, len(RESPONSE), size)]
+            self.assertEqual(list(iter_topics(chunks)), expected)
+
+    def test_skips_code_fences_and_wrapping_objects(self):
+        text = '```json\n{"topics": [{"title": "SQL Joins"}]}\n```'
+        self.assertEqual(parse_topics(text), [{"title": "SQL Joins"}])
+
+    def test_skips_malformed_objects(self):
+        self.assertEqual(parse_topics('[{"title": "A",}, {"title": "B"}]'), [{"title": "B"}])
+
+    def test_ignores_text_after_the_array(self):
+        parser = TopicStreamParser()
+        parser.feed('[{"title": "A"}] trailing {"title": "B"}')
+        self.assertEqual(parser.feed('[{"title": "C"}]'), [])
+
+    def test_incomplete_response_keeps_finished_topics(self):
+        self.assertEqual(parse_topics('[{"title": "A"}, {"title": "B'), [{"title": "A"}])
+
+
+class ParseBatchTopicsTests(SimpleTestCase):
+    def test_schema_shape(self):
+        text = '[{"change_key": "c1", "topics": [{"title": "A"}]}, {"change_key": "c2", "topics": []}]'
+        self.assertEqual(parse_batch_topics(text), {"c1": [{"title": "A"}], "c2": []})
+
+    def test_object_keyed_by_change(self):
+        self.assertEqual(parse_batch_topics('```json\n{"c1": [{"title": "A"}]}\n```'), {"c1": [{"title": "A"}]})
+
+    def test_unparseable_response(self):
+        self.assertEqual(parse_batch_topics("no json here"), {})
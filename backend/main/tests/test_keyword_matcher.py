@@ -0,0 +1,49 @@
+"""
+Tests for the Aho-Corasick keyword matcher.
+"""
+from django.test import SimpleTestCase
+
+from main.utils.keyword_matcher import AhoCorasick, scan_added_lines
+
+
+class AhoCorasickTests(SimpleTestCase):
+    def test_finds_overlapping_keywords_in_order(self):
+        matcher = AhoCorasick([("=", "assign"), ("==", "equals"), ("+=", "add")])
+        self.assertEqual(matcher.find_all("a += b == c"), [
+            ("+=", "add"), ("=", "assign"), ("=", "assign"), ("==", "equals"), ("=", "assign"),
+        ])
+
+    def test_word_keywords_match_on_token_boundaries(self):
+        matcher = AhoCorasick([("fetch", "fetch-api")])
+        self.assertEqual(matcher.find_all("await fetch(url)"), [("fetch", "fetch-api")])
+        self.assertEqual(matcher.find_all("prefetchData()"), [])
+        self.assertEqual(matcher.find_all("fetchAll()"), [])
+
+    def test_signature_keywords_match_inside_expressions(self):
+        matcher = AhoCorasick([("useState(", "react-hooks")])
+        self.assertEqual(matcher.find_all("const [a, b] = React.useState(0)"), [("useState(", "react-hooks")])
+
+    def test_duplicate_keywords_keep_every_payload(self):
+        matcher = AhoCorasick([("map", "python"), ("map", "javascript")])
+        self.assertEqual(sorted(payload for _, payload in matcher.find_all("map(f, xs)")), ["javascript", "python"])
+
+    def test_empty_keywords_are_ignored(self):
+        self.assertEqual(len(AhoCorasick([("", 1), ("a", 2)])), 1)
+
+
+class ScanAddedLinesTests(SimpleTestCase):
+    DIFF = (
+        "diff --git a/a.js b/a.js\n--- a/a.js\n+++ b/a.js\n@@ -1,2 +1,2 @@\n"
+        "-old = fetch(x)\n+data = await fetch(url)\n fetch(context)\n"
+        "diff --git a/b.js b/b.js\n--- a/b.js\n+++ b/b.js\n@@ -0,0 +1 @@\n+fetch(a); fetch(b)\n"
+    )
+
+    def test_counts_hits_per_file_in_added_lines_only(self):
+        hits = scan_added_lines(self.DIFF, AhoCorasick([("fetch", "fetch-api")]))
+        self.assertEqual(hits.to_dict(), {"a.js": {"fetch": 1}, "b.js": {"fetch": 2}})
+        self.assertEqual(hits.totals["fetch"], 3)
+
+    def test_payload_filter_discards_hits(self):
+        hits = scan_added_lines(self.DIFF, AhoCorasick([("fetch", "fetch-api")]),
+                                payload_filter=lambda path, payload: path != "b.js")
+        self.assertEqual(hits.to_dict(), {"a.js": {"fetch": 1}})
@@ -0,0 +1,93 @@
+"""
+Tests for packing small diffs into batches and the micro-batcher.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from main.utils import llm_batch
+from main.utils.llm_batch import MicroBatcher, format_batch, pack_batches
+from main.utils.tokens import estimate_tokens
+
+SMALL = "+x = 1\n"
+LARGE = "+value = compute(value)\n" * 50
+
+
+@override_settings(BRAINVIBE_BATCH_MAX_ITEMS=20)
+class PackBatchesTests(SimpleTestCase):
+    def test_small_items_share_a_batch(self):
+        batches, singles = pack_batches({"a": SMALL, "b": SMALL, "c": SMALL}, item_max_tokens=100,
+                                        batch_max_tokens=1000)
+        self.assertEqual(batches, [{"a": SMALL, "b": SMALL, "c": SMALL}])
+        self.assertEqual(singles, [])
+
+    def test_large_items_are_singles(self):
+        batches, singles = pack_batches({"a": SMALL, "big": LARGE, "b": SMALL}, item_max_tokens=100,
+                                        batch_max_tokens=1000)
+        self.assertEqual(batches, [{"a": SMALL, "b": SMALL}])
+        self.assertEqual(singles, ["big"])
+
+    def test_token_limit_starts_a_new_batch(self):
+        budget = estimate_tokens(SMALL) * 2
+        batches, singles = pack_batches({key: SMALL for key in "abcd"}, item_max_tokens=100,
+                                        batch_max_tokens=budget)
+        self.assertEqual([list(batch) for batch in batches], [["a", "b"], ["c", "d"]])
+        self.assertEqual(singles, [])
+
+    @override_settings(BRAINVIBE_BATCH_MAX_ITEMS=2)
+    def test_item_limit_starts_a_new_batch(self):
+        batches, _ = pack_batches({key: SMALL for key in "abcd"}, item_max_tokens=100, batch_max_tokens=1000)
+        self.assertEqual([list(batch) for batch in batches], [["a", "b"], ["c", "d"]])
+
+    @override_settings(BRAINVIBE_BATCH_MAX_ITEMS=2)
+    def test_batch_of_one_falls_back_to_a_single(self):
+        batches, singles = pack_batches({key: SMALL for key in "abc"}, item_max_tokens=100, batch_max_tokens=1000)
+        self.assertEqual([list(batch) for batch in batches], [["a", "b"]])
+        self.assertEqual(singles, ["c"])
+
+    def test_format_batch_delimits_items(self):
+        text = format_batch({"c1": "+a", "c2": "+b\n"})
+        self.assertEqual(text, "### CHANGE c1\n+a\n### END CHANGE c1\n\n### CHANGE c2\n+b\n### END CHANGE c2\n")
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def setUp(self):
+        timer_patch = mock.patch.object(llm_batch.threading, "Timer")
+        self.Timer = timer_patch.start()
+        self.addCleanup(timer_patch.stop)
+        self.flushed = []
+        self.batcher = MicroBatcher(lambda group, items: self.flushed.append((group, list(items))),
+                                    window=0.5, max_items=3)
+
+    def fire_timer(self, call_index=0):
+        _, function, args = self.Timer.call_args_list[call_index][0]
+        function(*args)
+
+    def test_window_flushes_the_group(self):
+        self.batcher.add("g", 1)
+        self.batcher.add("g", 2)
+        self.assertEqual(self.Timer.call_count, 1)
+        self.assertEqual(self.flushed, [])
+        self.fire_timer()
+        self.assertEqual(self.flushed, [("g", [1, 2])])
+
+    def test_groups_are_separate(self):
+        self.batcher.add("g", 1)
+        self.batcher.add("h", 2)
+        self.fire_timer(1)
+        self.assertEqual(self.flushed, [("h", [2])])
+
+    def test_full_group_flushes_at_once(self):
+        for item in (1, 2, 3):
+            self.batcher.add("g", item)
+        self.assertEqual(self.flushed, [("g", [1, 2, 3])])
+
+    def test_pending_timer_of_a_flushed_group_does_nothing(self):
+        for item in (1, 2, 3):
+            self.batcher.add("g", item)
+        # The group restarts with a new item and its own timer
+        self.batcher.add("g", 4)
+        self.fire_timer(0)
+        self.assertEqual(self.flushed, [("g", [1, 2, 3])])
+        self.fire_timer(1)
+        self.assertEqual(self.flushed, [("g", [1, 2, 3]), ("g", [4])])
@@ -0,0 +1,19 @@
+"""
+Tests for the LLM provider implementations.
+"""
+import threading
+
+from django.test import SimpleTestCase
+
+from main.utils.llm_providers import HTTPStubProvider
+
+
+class HTTPStubProviderTests(SimpleTestCase):
+    def test_each_thread_gets_its_own_session(self):
+        provider = HTTPStubProvider(base_url="http://127.0.0.1:1", timeout=1)
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(provider.session))
+        thread.start()
+        thread.join()
+        self.assertIs(provider.session, provider.session)
+        self.assertIsNot(provider.session, sessions[0])
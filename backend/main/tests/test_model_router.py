@@ -0,0 +1,40 @@
+"""
+Tests for model tier routing.
+"""
+from django.test import SimpleTestCase, override_settings
+
+from main.utils import model_router
+from main.utils.tokens import estimate_tokens
+
+CONTEXT = {"existing_topics": [{"title": f"Topic number {i}"} for i in range(200)]}
+
+
+@override_settings(BRAINVIBE_ROUTER_FAST_MAX_TOKENS=32000, BRAINVIBE_ROUTER_STRONG_MAX_TOKENS=500000,
+                   BRAINVIBE_ROUTER_ESCALATE_MIN_TOKENS=400)
+class RouteTests(SimpleTestCase):
+    def test_small_residue_goes_to_the_fast_model(self):
+        decision = model_router.route("+x = 1\n")
+        self.assertEqual(decision.tier, model_router.FAST_TIER)
+        self.assertEqual(decision.chunks, ["+x = 1\n"])
+
+    def test_diff_tokens_exclude_the_project_context(self):
+        decision = model_router.route("+x = 1\n", CONTEXT)
+        self.assertEqual(decision.diff_tokens, estimate_tokens("+x = 1\n"))
+        self.assertGreater(decision.tokens - decision.diff_tokens, 400)
+
+    def test_empty_result_escalates_on_diff_size_only(self):
+        decision = model_router.route("+x = 1\n", CONTEXT)
+        self.assertIsNone(model_router.validate_topics([], decision.diff_tokens))
+        self.assertEqual(model_router.validate_topics([], 400), "no topics for a substantial diff")
+
+    def test_malformed_topics_escalate(self):
+        self.assertEqual(model_router.validate_topics([{"title": "x"}], 10), "malformed topic")
+
+    @override_settings(BRAINVIBE_ROUTER_FAST_MAX_TOKENS=1000, BRAINVIBE_ROUTER_STRONG_MAX_TOKENS=2000)
+    def test_large_diffs_go_to_the_strong_tier_then_chunks(self):
+        hunk = "@@ -1 +1 @@\n" + "+value = compute(value, other_value)\n" * 20
+        header = "diff --git a/app.py b/app.py\n--- a/app.py\n+++ b/app.py\n"
+        self.assertEqual(model_router.route(header + hunk * 5).tier, model_router.STRONG_TIER)
+        decision = model_router.route(header + hunk * 20)
+        self.assertEqual(decision.tier, model_router.CHUNKED_TIER)
+        self.assertGreater(len(decision.chunks), 1)
@@ -0,0 +1,118 @@
+"""
+Tests for path-prefix routing of monorepo diffs.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from main import services
+from main.models import CodeChange, Project
+from main.utils.diff_parser import parse_diff
+from main.utils.path_router import PathTrie, compile_rules, project_rules, split_diff
+
+
+def file_diff(path, line="+x = 1"):
+    return f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n@@ -0,0 +1 @@\n{line}\n"
+
+
+RULES = {"web": "web", "services/billing/": "billing", "services/billing/reports": "reports"}
+
+
+class PathTrieTests(SimpleTestCase):
+    def setUp(self):
+        self.trie = compile_rules(RULES)
+
+    def test_prefixes_match_whole_segments(self):
+        self.assertEqual(self.trie.owner_of("web/app.js"), "web")
+        self.assertIsNone(self.trie.owner_of("webhooks/app.py"))
+        self.assertIsNone(self.trie.owner_of("services/billing_v2/api.py"))
+
+    def test_longest_prefix_wins(self):
+        self.assertEqual(self.trie.owner_of("services/billing/api.py"), "billing")
+        self.assertEqual(self.trie.owner_of("services/billing/reports/monthly.py"), "reports")
+        self.assertIsNone(self.trie.owner_of("services/search/api.py"))
+
+    def test_paths_are_normalized(self):
+        self.assertEqual(self.trie.owner_of("./web//static/app.js"), "web")
+        self.assertEqual(self.trie.owner_of("services\\billing\\api.py"), "billing")
+
+    def test_later_owner_of_a_prefix_replaces_the_earlier(self):
+        trie = PathTrie()
+        trie.add("web/", "old")
+        trie.add("web", "new")
+        self.assertEqual(trie.size, 1)
+        self.assertEqual(trie.owner_of("web/app.js"), "new")
+
+    def test_compiled_tries_are_cached_by_rules(self):
+        self.assertIs(compile_rules(dict(reversed(list(RULES.items())))), self.trie)
+
+
+class ProjectRulesTests(SimpleTestCase):
+    def test_invalid_rules_are_ignored(self):
+        self.assertEqual(project_rules(None), {})
+        self.assertEqual(project_rules({"path_owners": ["web"]}), {})
+        self.assertEqual(project_rules({"path_owners": {"web": "web", "api": "", "lib": 3}}), {"web": "web"})
+
+
+class SplitDiffTests(SimpleTestCase):
+    def test_files_are_grouped_by_owner_in_order(self):
+        diff = file_diff("web/a.js") + file_diff("README.md") + file_diff("web/b.js") + file_diff("webhooks/h.py")
+        parts = split_diff(diff, compile_rules(RULES), "mono")
+        self.assertEqual(list(parts), ["web", "mono"])
+        web_text, web_files = parts["web"]
+        self.assertEqual(web_files, 2)
+        self.assertEqual([f.path for f in parse_diff(web_text).files], ["web/a.js", "web/b.js"])
+        self.assertEqual([f.path for f in parse_diff(parts["mono"][0]).files], ["README.md", "webhooks/h.py"])
+
+    def test_headerless_diff_goes_to_the_default_owner(self):
+        diff = "@@ -1 +1 @@\n-a\n+b\n"
+        parts = split_diff(diff, compile_rules(RULES), "mono")
+        self.assertEqual(list(parts), ["mono"])
+        self.assertEqual(parts["mono"], (diff, 1))
+
+    def test_diff_without_git_header_is_routed_by_its_file_lines(self):
+        diff = "--- a/web/app.js\n+++ b/web/app.js\n@@ -1 +1 @@\n-a\n+b\n"
+        self.assertEqual(list(split_diff(diff, compile_rules(RULES), "mono")), ["web"])
+
+
+class RouteDiffTests(TestCase):
+    def setUp(self):
+        self.mono = Project.objects.create(project_id="mono", name="Monorepo", metadata={
+            "path_owners": {"web": "web", "services/billing": "billing"},
+        })
+        self.web = Project.objects.create(project_id="web", name="Web")
+
+    def test_without_rules_the_diff_stays_whole(self):
+        diff = file_diff("web/a.js")
+        self.assertEqual(services.route_diff(self.web, diff), [(self.web, diff, 1)])
+
+    def test_unknown_owner_folds_back_to_the_posted_project(self):
+        diff = file_diff("web/a.js") + file_diff("services/billing/api.py") + file_diff("setup.py")
+        routes = services.route_diff(self.mono, diff)
+        self.assertEqual([(owner, files) for owner, _, files in routes], [(self.web, 1), (self.mono, 2)])
+        mono_paths = [f.path for f in parse_diff(routes[1][1]).files]
+        self.assertEqual(mono_paths, ["services/billing/api.py", "setup.py"])
+
+    @mock.patch.object(services, "submit_diff_analysis")
+    def test_streamed_response_reports_the_posted_change(self, submit):
+        diff = file_diff("web/a.js") + file_diff("setup.py")
+        response = self.client.post(reverse("analyze_diff", kwargs={"project_id": "mono"}),
+                                    {"diff_content": diff, "change_id": "c1", "stream": True},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["change_id"], "c1")
+        self.assertTrue(response.data["events_url"].endswith("/changes/c1/events/"))
+        self.assertEqual([route["change_id"] for route in response.data["routes"]], ["c1-web", "c1"])
+        self.assertEqual(submit.call_count, 2)
+        self.assertEqual(CodeChange.objects.get(change_id="c1-web").project, self.web)
+
+    @mock.patch.object(services, "submit_diff_analysis")
+    def test_streamed_response_without_posted_files_has_no_top_level_events(self, submit):
+        response = self.client.post(reverse("analyze_diff", kwargs={"project_id": "mono"}),
+                                    {"diff_content": file_diff("web/a.js"), "change_id": "c2", "stream": True},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["change_id"], "c2")
+        self.assertNotIn("events_url", response.data)
+        self.assertEqual([route["change_id"] for route in response.data["routes"]], ["c2-web"])
@@ -0,0 +1,90 @@
+"""
+Tests for the staged pipeline and its deadline handling.
+"""
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.test import SimpleTestCase
+
+from main.utils.pipeline import JobExpired, Pipeline, Stage
+
+
+def _append(name):
+    def run(job):
+        job.append(name)
+    return run
+
+
+class PipelineTests(SimpleTestCase):
+    def test_stages_run_in_order(self):
+        pipeline = Pipeline("test", [Stage("a", _append("a")), Stage("b", lambda job: job + ["b"])])
+        self.assertEqual(pipeline.run([], timeout=5), ["a", "b"])
+        self.assertEqual(pipeline.stats()["completed"], 1)
+
+    def test_stage_can_finish_early(self):
+        pipeline = Pipeline("test", [Stage("a", lambda job: "done"), Stage("b", _append("b"))])
+        self.assertEqual(pipeline.run([], timeout=5), "done")
+        self.assertEqual(pipeline.stats()["stages"]["a"]["finished_early"], 1)
+
+    def test_stage_error_fails_only_the_job(self):
+        def fail(job):
+            if job == "bad":
+                raise ValueError("bad job")
+            return job
+        pipeline = Pipeline("test", [Stage("a", fail)])
+        with self.assertRaises(ValueError):
+            pipeline.run("bad", timeout=5)
+        self.assertEqual(pipeline.run("good", timeout=5), "good")
+
+    def test_on_error_turns_the_error_into_a_result(self):
+        def fail(job):
+            raise ValueError("bad job")
+        pipeline = Pipeline("test", [Stage("a", fail, on_error=lambda job, e: "recovered")])
+        self.assertEqual(pipeline.run("job", timeout=5), "recovered")
+
+
+class PipelineDeadlineTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def blocked(self, job):
+        self.release.wait(5)
+        job.append("blocked")
+
+    def test_run_stops_waiting_at_the_timeout(self):
+        pipeline = Pipeline("test", [Stage("slow", self.blocked)])
+        with self.assertRaises(FutureTimeoutError):
+            pipeline.run([], timeout=0.05)
+
+    def test_submit_gives_up_on_a_full_first_queue(self):
+        pipeline = Pipeline("test", [Stage("slow", self.blocked, queue_size=1)])
+        pipeline.submit([])
+        pipeline.submit([])
+        with self.assertRaises(JobExpired):
+            pipeline.submit([], timeout=0.05)
+        self.assertEqual(pipeline.stats()["expired"], 1)
+
+    def test_handoff_to_a_full_stage_expires_the_job(self):
+        pipeline = Pipeline("test", [Stage("fast", _append("fast")),
+                                     Stage("slow", self.blocked, queue_size=1)])
+        pipeline.submit([])
+        pipeline.submit([])
+        future = pipeline.submit([], timeout=0.1)
+        with self.assertRaises(JobExpired):
+            future.result(5)
+        self.assertEqual(pipeline.stats()["stages"]["slow"]["expired"], 1)
+
+    def test_expired_job_is_dropped_before_its_next_stage(self):
+        ran = []
+        pipeline = Pipeline("test", [Stage("slow", self.blocked), Stage("next", ran.append)])
+        blocker = pipeline.submit([])
+        future = pipeline.submit([], timeout=0.05)
+        with self.assertRaises(FutureTimeoutError):
+            future.result(0.2)
+        self.release.set()
+        blocker.result(5)
+        with self.assertRaises(JobExpired):
+            future.result(5)
+        self.assertEqual(len(ran), 1)
+        self.assertEqual(pipeline.stats()["in_flight"], 0)
@@ -0,0 +1,48 @@
+"""
+Tests for the per-model minimums of the prompt prefix cache.
+"""
+from django.test import SimpleTestCase, override_settings
+
+from main.utils import prompt_cache
+from main.utils.prompt_cache import build_snapshot, cacheable_snapshot, min_cache_tokens, snapshot_for_model
+
+
+def _topics(count):
+    return [{"topic_id": f"topic-{i}", "title": f"A fairly descriptive topic title number {i}", "status": "not_learned"}
+            for i in range(count)]
+
+
+@override_settings(BRAINVIBE_PROMPT_CACHE_ENABLED=True,
+                   BRAINVIBE_PROMPT_CACHE_MIN_TOKENS={"gemini-1.5": 32768, "gemini-1.5-pro-002": 40000,
+                                                      "default": 4096})
+class MinTokensTests(SimpleTestCase):
+    def setUp(self):
+        prompt_cache._snapshots.clear()
+
+    def test_longest_model_prefix_wins(self):
+        self.assertEqual(min_cache_tokens("gemini-1.5-flash"), 32768)
+        self.assertEqual(min_cache_tokens("gemini-1.5-pro-002"), 40000)
+        self.assertEqual(min_cache_tokens("gemini-2.0-flash"), 4096)
+        self.assertEqual(min_cache_tokens(None), 4096)
+
+    @override_settings(BRAINVIBE_PROMPT_CACHE_MIN_TOKENS=1000)
+    def test_single_number_applies_to_every_model(self):
+        self.assertEqual(min_cache_tokens("gemini-1.5-flash"), 1000)
+
+    def test_snapshot_is_kept_from_the_smallest_minimum(self):
+        small = build_snapshot("p", _topics(200))
+        self.assertLess(small.tokens, 4096)
+        self.assertIsNone(cacheable_snapshot("p", 1, lambda: _topics(200)))
+        snapshot = cacheable_snapshot("p", 2, lambda: _topics(600))
+        self.assertIsNotNone(snapshot)
+        self.assertTrue(4096 <= snapshot.tokens < 32768)
+
+    def test_snapshot_below_the_model_minimum_is_not_used(self):
+        context = {"topic_snapshot": cacheable_snapshot("p", 1, lambda: _topics(600))}
+        self.assertIsNone(snapshot_for_model(context, "gemini-1.5-flash"))
+        self.assertIs(snapshot_for_model(context, "gemini-2.0-flash"), context["topic_snapshot"])
+        self.assertIsNone(snapshot_for_model({}, "gemini-2.0-flash"))
+
+    @override_settings(BRAINVIBE_PROMPT_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.assertIsNone(cacheable_snapshot("p", 1, lambda: _topics(5000)))
@@ -0,0 +1,140 @@
+"""
+Tests for deadlines, retries and circuit breaking around LLM calls.
+"""
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from main.utils.llm_providers import LLMProviderError
+from main.utils.resilience import (
+    CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, ProviderGuard, RateLimiter, StagedDeadline,
+    backoff_delay, call_with_resilience
+)
+
+
+def opened_guard():
+    # A guard whose circuit is open and due for a half-open probe
+    guard = ProviderGuard("test", minimum_calls=1, error_rate=0.5, open_seconds=0.0)
+    guard.breaker.record_failure()
+    return guard
+
+
+class DeadlineTests(SimpleTestCase):
+    def test_unbounded_deadline(self):
+        deadline = Deadline(None)
+        self.assertIsNone(deadline.remaining())
+        self.assertFalse(deadline.expired)
+        self.assertEqual(deadline.timeout(5), 5)
+
+    def test_timeout_is_capped_by_the_remaining_budget(self):
+        self.assertLessEqual(Deadline(1).timeout(30), 1)
+        self.assertTrue(Deadline(0).expired)
+
+    def test_staged_deadline_splits_by_share(self):
+        deadline = StagedDeadline(10, {"filter": 0.1, "cache": 0.1, "llm": 0.7, "save": 0.1})
+        self.assertAlmostEqual(deadline.stage("filter").remaining(), 1.0, places=1)
+        self.assertAlmostEqual(deadline.stage("llm").remaining(), 10 * 0.7 / 0.8, places=1)
+        self.assertIs(deadline.stage("other"), deadline)
+
+    def test_backoff_is_capped(self):
+        for attempt in range(10):
+            self.assertLessEqual(backoff_delay(attempt, base=0.5, cap=2.0), 2.0)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_at_the_error_rate(self):
+        breaker = CircuitBreaker("test", error_rate=0.5, minimum_calls=4, open_seconds=60)
+        breaker.record_success()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_allows_one_probe(self):
+        breaker = opened_guard().breaker
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, "half_open")
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker("test", minimum_calls=1, open_seconds=60)
+        breaker.record_failure()
+        breaker._opened_at -= 60
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+    def test_released_probe_can_be_granted_again(self):
+        breaker = opened_guard().breaker
+        self.assertTrue(breaker.allow())
+        breaker.release()
+        self.assertTrue(breaker.allow())
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_pause_longer_than_the_deadline_fails_fast(self):
+        limiter = RateLimiter()
+        limiter.pause(30)
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            limiter.acquire(Deadline(0.5))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+@mock.patch("main.utils.resilience.backoff_delay", return_value=0.0)
+class CallWithResilienceTests(SimpleTestCase):
+    def test_retries_transient_errors(self, _):
+        calls = []
+
+        def call(timeout):
+            calls.append(timeout)
+            if len(calls) < 3:
+                raise LLMProviderError("busy", status_code=503)
+            return "ok"
+
+        self.assertEqual(call_with_resilience(call, ProviderGuard("test"), Deadline(5), max_attempts=3), "ok")
+        self.assertEqual(len(calls), 3)
+
+    def test_does_not_retry_permanent_errors(self, _):
+        call = mock.Mock(side_effect=LLMProviderError("bad request", status_code=400, transient=False))
+        with self.assertRaises(LLMProviderError):
+            call_with_resilience(call, ProviderGuard("test"), Deadline(5), max_attempts=3)
+        self.assertEqual(call.call_count, 1)
+
+    def test_retry_after_pauses_every_caller(self, _):
+        guard = ProviderGuard("test")
+        call = mock.Mock(side_effect=[LLMProviderError("slow down", status_code=429, retry_after=0.2), "ok"])
+        self.assertEqual(call_with_resilience(call, guard, Deadline(5)), "ok")
+        self.assertGreater(guard.limiter._paused_until, 0)
+
+    def test_open_circuit_fails_fast(self, _):
+        guard = ProviderGuard("test", minimum_calls=1, open_seconds=60)
+        guard.breaker.record_failure()
+        call = mock.Mock()
+        with self.assertRaises(CircuitOpenError):
+            call_with_resilience(call, guard, Deadline(5))
+        call.assert_not_called()
+
+    def test_probe_blocked_by_the_rate_limit_does_not_lock_the_circuit(self, _):
+        guard = opened_guard()
+        guard.limiter.pause(30)
+        with self.assertRaises(DeadlineExceeded):
+            call_with_resilience(mock.Mock(), guard, Deadline(0.2))
+        self.assertEqual(guard.breaker.state, "half_open")
+
+        guard.limiter._paused_until = 0.0
+        self.assertEqual(call_with_resilience(mock.Mock(return_value="ok"), guard, Deadline(5)), "ok")
+        self.assertEqual(guard.breaker.state, "closed")
+
+    def test_probe_with_an_expired_deadline_does_not_lock_the_circuit(self, _):
+        guard = opened_guard()
+        with self.assertRaises(DeadlineExceeded):
+            call_with_resilience(mock.Mock(), guard, Deadline(0))
+        self.assertEqual(call_with_resilience(mock.Mock(return_value="ok"), guard, Deadline(5)), "ok")
+        self.assertEqual(guard.breaker.state, "closed")
@@ -0,0 +1,133 @@
+"""
+Tests for the weighted-fair analysis scheduler.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from main.utils.admission import INTERACTIVE_PRIORITY, LOW_PRIORITY, NORMAL_PRIORITY
+from main.utils import scheduler as scheduler_module
+from main.utils.scheduler import DelayedSubmission, FairScheduler
+
+
+class FairSchedulerTests(SimpleTestCase):
+    # No workers: jobs stay queued and the tests drive dispatch themselves
+
+    def scheduler(self, **kwargs):
+        kwargs.setdefault("max_wait", None)
+        return FairScheduler(workers=0, **kwargs)
+
+    def submit(self, scheduler, job_class, count=1, project=None):
+        for _ in range(count):
+            scheduler.submit(lambda: None, job_class, project)
+
+    def dispatch(self, scheduler, count):
+        with scheduler._condition:
+            return [scheduler._next_job() for _ in range(count)]
+
+    def classes(self, scheduler, count):
+        return [job.job_class for job in self.dispatch(scheduler, count)]
+
+    def test_stride_shares_turns_by_weight(self):
+        scheduler = self.scheduler()
+        for job_class in (INTERACTIVE_PRIORITY, NORMAL_PRIORITY, LOW_PRIORITY):
+            self.submit(scheduler, job_class, 30)
+        order = self.classes(scheduler, 24)
+        self.assertEqual(order.count(INTERACTIVE_PRIORITY), 16)
+        self.assertEqual(order.count(NORMAL_PRIORITY), 6)
+        self.assertEqual(order.count(LOW_PRIORITY), 2)
+        # Turns are interleaved, not served in blocks
+        self.assertIn(NORMAL_PRIORITY, order[:4])
+
+    def test_stride_order_with_custom_weights(self):
+        scheduler = self.scheduler(weights={INTERACTIVE_PRIORITY: 2, NORMAL_PRIORITY: 1, LOW_PRIORITY: 1})
+        self.submit(scheduler, INTERACTIVE_PRIORITY, 4)
+        self.submit(scheduler, NORMAL_PRIORITY, 2)
+        self.assertEqual(
+            self.classes(scheduler, 6),
+            [INTERACTIVE_PRIORITY, NORMAL_PRIORITY, INTERACTIVE_PRIORITY,
+             INTERACTIVE_PRIORITY, NORMAL_PRIORITY, INTERACTIVE_PRIORITY],
+        )
+
+    def test_unknown_class_is_normal(self):
+        scheduler = self.scheduler()
+        self.submit(scheduler, "bogus")
+        self.assertEqual(self.classes(scheduler, 1), [NORMAL_PRIORITY])
+
+    def test_projects_take_turns_within_a_class(self):
+        scheduler = self.scheduler()
+        self.submit(scheduler, NORMAL_PRIORITY, 5, project="backfill")
+        self.submit(scheduler, NORMAL_PRIORITY, 2, project="a")
+        self.submit(scheduler, NORMAL_PRIORITY, 1, project="b")
+        projects = [job.project for job in self.dispatch(scheduler, 8)]
+        self.assertEqual(projects, ["backfill", "a", "b", "backfill", "a", "backfill", "backfill", "backfill"])
+
+    def test_jobs_of_one_project_stay_fifo(self):
+        scheduler = self.scheduler()
+        jobs = [scheduler.submit(lambda index=index: index, NORMAL_PRIORITY, "p") for index in range(3)]
+        dispatched = self.dispatch(scheduler, 3)
+        self.assertEqual([job.future for job in dispatched], jobs)
+
+    def test_idle_class_rejoins_at_the_current_clock(self):
+        scheduler = self.scheduler(weights={INTERACTIVE_PRIORITY: 1, NORMAL_PRIORITY: 1, LOW_PRIORITY: 1})
+        self.submit(scheduler, INTERACTIVE_PRIORITY, 20)
+        self.dispatch(scheduler, 10)
+        self.submit(scheduler, NORMAL_PRIORITY, 5)
+        self.assertEqual(scheduler._classes[NORMAL_PRIORITY].clock, scheduler._clock)
+        # Equal weights alternate; the idle class gets no burst of banked turns
+        order = self.classes(scheduler, 6)
+        self.assertEqual(order.count(NORMAL_PRIORITY), 3)
+        self.assertNotEqual(order[:2], [NORMAL_PRIORITY, NORMAL_PRIORITY])
+
+    def test_long_wait_jumps_the_queue(self):
+        scheduler = self.scheduler(max_wait=30.0)
+        self.submit(scheduler, LOW_PRIORITY)
+        self.submit(scheduler, INTERACTIVE_PRIORITY, 3)
+        self.assertEqual(self.classes(scheduler, 1), [INTERACTIVE_PRIORITY])
+        scheduler._classes[LOW_PRIORITY].oldest().enqueued_at -= 60
+        self.assertEqual(self.classes(scheduler, 1), [LOW_PRIORITY])
+        self.assertEqual(scheduler.stats()["aged_dispatches"], 1)
+
+    def test_aging_leaves_stride_clocks_alone(self):
+        scheduler = self.scheduler(max_wait=30.0)
+        self.submit(scheduler, LOW_PRIORITY)
+        self.submit(scheduler, INTERACTIVE_PRIORITY)
+        clocks = {name: queue.clock for name, queue in scheduler._classes.items()}
+        scheduler._classes[LOW_PRIORITY].oldest().enqueued_at -= 60
+        self.dispatch(scheduler, 1)
+        self.assertEqual({name: queue.clock for name, queue in scheduler._classes.items()}, clocks)
+
+    def test_stats_counts_queued_jobs(self):
+        scheduler = self.scheduler()
+        self.submit(scheduler, NORMAL_PRIORITY, 2, project="a")
+        self.submit(scheduler, NORMAL_PRIORITY, 1, project="b")
+        stats = scheduler.stats()
+        self.assertEqual(stats["workers"], 0)
+        self.assertEqual(stats["classes"][NORMAL_PRIORITY]["queued"], 3)
+        self.assertEqual(stats["classes"][NORMAL_PRIORITY]["projects_queued"], 2)
+
+
+class DelayedSubmissionTests(SimpleTestCase):
+    def setUp(self):
+        timer_patch = mock.patch.object(scheduler_module.threading, "Timer")
+        self.Timer = timer_patch.start()
+        self.addCleanup(timer_patch.stop)
+        self.job = mock.Mock()
+        self.submission = DelayedSubmission(self.job, LOW_PRIORITY)
+
+    def test_calls_while_pending_share_one_submission(self):
+        self.assertTrue(self.submission.schedule(5))
+        self.assertFalse(self.submission.schedule(1))
+        self.Timer.assert_called_once_with(5, self.submission._submit)
+        self.assertTrue(self.Timer.return_value.daemon)
+        self.Timer.return_value.start.assert_called_once_with()
+
+    def test_fired_timer_submits_to_the_analysis_pool(self):
+        self.submission.schedule(-3)
+        self.assertEqual(self.Timer.call_args[0][0], 0.0)
+        with mock.patch("main.services.get_analysis_scheduler") as get_scheduler:
+            self.submission._submit()
+        get_scheduler.return_value.submit.assert_called_once_with(self.job, LOW_PRIORITY)
+        self.job.assert_not_called()
+        self.assertTrue(self.submission.schedule(5))
+        self.assertEqual(self.Timer.call_count, 2)
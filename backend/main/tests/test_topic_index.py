@@ -0,0 +1,79 @@
+"""
+Tests for the BM25 topic index used to pick prompt context topics.
+"""
+from collections import Counter
+
+from django.test import SimpleTestCase
+
+from main.utils.topic_index import TopicIndex, extract_diff_terms, get_cached_index, select_relevant_topics, tokenize
+
+TOPICS = [
+    {"topic_id": "react-hooks", "title": "React Hooks", "description": "useState and useEffect in function components"},
+    {"topic_id": "python-asyncio", "title": "Python asyncio", "description": "Event loops, coroutines and tasks"},
+    {"topic_id": "sql-joins", "title": "SQL Joins", "description": "Combining rows from several tables"},
+    {"topic_id": "django-orm", "title": "Django ORM", "description": "Models, querysets and migrations"},
+]
+
+DIFF = """diff --git a/app.py b/app.py
+--- a/app.py
++++ b/app.py
+@@ -1 +1,3 @@
++import asyncio
++async def fetchAll():
++    await asyncio.gather(load_user(), load_orders())
+"""
+
+
+class TokenizeTests(SimpleTestCase):
+    def test_splits_camel_and_snake_case(self):
+        terms = tokenize("fetchUserProfile load_orders")
+        self.assertIn("fetchuserprofile", terms)
+        self.assertIn("fetch", terms)
+        self.assertIn("profile", terms)
+        self.assertIn("orders", terms)
+
+    def test_drops_stop_words(self):
+        self.assertEqual(tokenize("return the self"), [])
+
+
+class ExtractDiffTermsTests(SimpleTestCase):
+    def test_weights_imported_modules(self):
+        terms = extract_diff_terms(DIFF)
+        self.assertGreater(terms["asyncio"], terms["gather"])
+
+    def test_ignores_context_lines(self):
+        diff = "diff --git a/x.py b/x.py\n--- a/x.py\n+++ b/x.py\n@@ -1,2 +1,2 @@\n unchanged_name\n+added_name\n"
+        terms = extract_diff_terms(diff)
+        self.assertIn("added", terms)
+        self.assertNotIn("unchanged", terms)
+
+
+class TopicIndexTests(SimpleTestCase):
+    def test_ranks_matching_topic_first(self):
+        results = TopicIndex(TOPICS).search(extract_diff_terms(DIFF), limit=2)
+        self.assertEqual(results[0][1]["topic_id"], "python-asyncio")
+
+    def test_unrelated_query_returns_nothing(self):
+        self.assertEqual(TopicIndex(TOPICS).search(Counter(tokenize("kubernetes")), limit=5), [])
+
+    def test_select_returns_all_topics_under_the_limit(self):
+        self.assertEqual(select_relevant_topics(DIFF, TOPICS, limit=10), TOPICS)
+
+    def test_select_limits_to_relevant_topics(self):
+        selected = select_relevant_topics(DIFF, TOPICS, limit=1)
+        self.assertEqual([topic["topic_id"] for topic in selected], ["python-asyncio"])
+
+
+class CachedIndexTests(SimpleTestCase):
+    def test_rebuilds_only_when_version_changes(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return TOPICS
+
+        first = get_cached_index("test-project", 1, loader)
+        self.assertIs(get_cached_index("test-project", 1, loader), first)
+        self.assertIsNot(get_cached_index("test-project", 2, loader), first)
+        self.assertEqual(len(loads), 2)
+
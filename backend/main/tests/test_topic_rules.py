@@ -0,0 +1,84 @@
+"""
+Tests for the rule-based topic extractor that runs before the LLM.
+"""
+from django.test import SimpleTestCase
+
+from main.utils.topic_rules import TopicCatalogue, extract_rule_topics, is_ignorable_import, parse_import
+
+CATALOGUE = TopicCatalogue({
+    "version": "test",
+    "topics": {
+        "python-asyncio": {"title": "Python asyncio", "prerequisites": ["python-basics"]},
+        "python-requests": {"title": "HTTP with requests"},
+    },
+    "packages": {"python": {"requests": ["python-requests"]}},
+    "apis": {"python": {"asyncio.gather(": ["python-asyncio"]}},
+})
+
+
+def make_diff(path, lines):
+    body = "".join(f"+{line}\n" for line in lines)
+    return f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n@@ -0,0 +1,{len(lines)} @@\n{body}"
+
+
+class ParseImportTests(SimpleTestCase):
+    def test_python_imports(self):
+        self.assertEqual(parse_import("python", "import os, requests as r"), ["os", "requests"])
+        self.assertEqual(parse_import("python", "from .models import Topic"), [".models"])
+
+    def test_javascript_imports(self):
+        self.assertEqual(parse_import("javascript", "import leftpad from 'left-pad';"), ["left-pad"])
+        self.assertEqual(parse_import("javascript", "const fs = require('fs')"), ["fs"])
+
+    def test_ignorable_imports(self):
+        self.assertTrue(is_ignorable_import("python", "os.path"))
+        self.assertTrue(is_ignorable_import("javascript", "node:fs"))
+        self.assertFalse(is_ignorable_import("python", "quuxlib"))
+
+
+class ExtractRuleTopicsTests(SimpleTestCase):
+    def test_known_import_and_api_cover_the_file(self):
+        diff = make_diff("app.py", ["import asyncio", "import requests", "await asyncio.gather(a(), b())"])
+        result = extract_rule_topics(diff, CATALOGUE)
+        self.assertTrue(result.fully_covered)
+        self.assertEqual({topic["topic_id"] for topic in result.topics}, {"python-asyncio", "python-requests"})
+        self.assertEqual(result.residue, "")
+
+    def test_unknown_import_goes_to_the_llm(self):
+        diff = make_diff("app.py", ["import requests", "import quuxlib"])
+        result = extract_rule_topics(diff, CATALOGUE)
+        self.assertEqual(result.residue_files, ["app.py"])
+        self.assertIn("import quuxlib", result.residue)
+
+    def test_code_without_rule_hits_goes_to_the_llm(self):
+        # A new function the rules know nothing about must not be skipped as covered
+        lines = ["def score(items):"] + [f"    total_{i} = items[{i}] * {i}" for i in range(35)]
+        result = extract_rule_topics(make_diff("score.py", lines), CATALOGUE)
+        self.assertFalse(result.fully_covered)
+        self.assertEqual(result.topics, [])
+
+    def test_mostly_unexplained_file_goes_to_the_llm(self):
+        lines = ["import requests"] + [f"value_{i} = compute({i})" for i in range(10)]
+        result = extract_rule_topics(make_diff("app.py", lines), CATALOGUE)
+        self.assertEqual(result.residue_files, ["app.py"])
+        # The topics the rules did find are still reported
+        self.assertEqual([topic["topic_id"] for topic in result.topics], ["python-requests"])
+
+    def test_unexplained_share_is_configurable(self):
+        lines = ["import requests", "session = make_session()"]
+        self.assertFalse(extract_rule_topics(make_diff("app.py", lines), CATALOGUE).fully_covered)
+        self.assertTrue(extract_rule_topics(make_diff("app.py", lines), CATALOGUE,
+                                            max_unexplained_ratio=0.5).fully_covered)
+
+    def test_comment_only_file_is_covered(self):
+        result = extract_rule_topics(make_diff("app.py", ["# a note", ""]), CATALOGUE)
+        self.assertTrue(result.fully_covered)
+        self.assertEqual(result.topics, [])
+
+    def test_files_are_split_into_covered_and_residue(self):
+        diff = (make_diff("ok.py", ["import requests"])
+                + make_diff("new.py", ["import quuxlib", "quuxlib.run()"]))
+        result = extract_rule_topics(diff, CATALOGUE)
+        self.assertEqual(result.covered_files, ["ok.py"])
+        self.assertEqual(result.residue_files, ["new.py"])
+        self.assertTrue(result.residue.startswith("diff --git a/new.py"))
@@ -12,7 +12,10 @@ router.register(r'changes', views.CodeChangeViewSet)
 urlpatterns = [
     path('hello/', views.HelloWorldView.as_view(), name='hello_world'),
     path('analysis/code/', views.CodeAnalysisView.as_view(), name='code_analysis'),
+    path('analysis/queue/', views.AnalysisQueueView.as_view(), name='analysis_queue'),
     path('projects/<str:project_id>/analyze-diff/', views.AnalyzeDiffView.as_view(), name='analyze_diff'),
+    path('projects/<str:project_id>/events/', views.project_events_view, name='project_events'),
+    path('changes/<str:change_id>/events/', views.change_events_view, name='change_events'),
     path('master-graph/', views.MasterGraphView.as_view(), name='master_graph'),
     path('topics/<str:topic_id>/complete/', views.MarkTopicAsLearnedView.as_view(), name='mark_topic_as_learned'),
     path('', include(router.urls)),
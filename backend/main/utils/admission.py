@@ -0,0 +1,166 @@
+"""
+Queue-depth-aware admission control for the ingestion endpoints.
+
+Every analysis in flight (queued in the background pool or the micro-batcher,
+or running on a request thread) counts towards the analysis depth. Each change
+source has a priority, and each priority a depth above which new work of that
+priority is refused:
+
+- low (scheduled_scan): BRAINVIBE_ADMISSION_LOW_MAX_DEPTH, answered with 429
+- normal (git_commit, cli): BRAINVIBE_ADMISSION_NORMAL_MAX_DEPTH, answered with 429
+- interactive (cursor_ai, manual_edit, web): BRAINVIBE_ADMISSION_MAX_DEPTH,
+  answered with 503 because the server as a whole is saturated
+
+Background sources are shed long before interactive ones, so the work queued
+ahead of an interactive request stays short and its latency stable. Refusals
+carry a Retry-After estimated from the depth and the recent completion rate.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from django.conf import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+LOW_PRIORITY = "low"
+NORMAL_PRIORITY = "normal"
+INTERACTIVE_PRIORITY = "interactive"
+
+SOURCE_PRIORITIES = {
+    'scheduled_scan': LOW_PRIORITY,
+    'git_commit': NORMAL_PRIORITY,
+    'cli': NORMAL_PRIORITY,
+    'cursor_ai': INTERACTIVE_PRIORITY,
+    'manual_edit': INTERACTIVE_PRIORITY,
+    'web': INTERACTIVE_PRIORITY,
+}
+
+# Completions remembered for the throughput estimate
+THROUGHPUT_WINDOW_SECONDS = 60.0
+
+
+def source_priority(change_source: Optional[str]) -> str:
+    """
+    Priority of a change source (unknown sources are treated as normal).
+    """
+    return SOURCE_PRIORITIES.get(change_source or '', NORMAL_PRIORITY)
+
+
+def _depth_limit(priority: str) -> int:
+    if priority == LOW_PRIORITY:
+        return getattr(settings, 'BRAINVIBE_ADMISSION_LOW_MAX_DEPTH', 16)
+    if priority == NORMAL_PRIORITY:
+        return getattr(settings, 'BRAINVIBE_ADMISSION_NORMAL_MAX_DEPTH', 40)
+    return getattr(settings, 'BRAINVIBE_ADMISSION_MAX_DEPTH', 64)
+
+
+class Rejection:
+    """
+    Why a request was refused and when to come back.
+
+    Attributes:
+        status_code: 429 (source shed) or 503 (server saturated)
+        retry_after: Seconds the client should wait
+        message: Human-readable reason
+    """
+    __slots__ = ("status_code", "retry_after", "message")
+
+    def __init__(self, status_code: int, retry_after: int, message: str):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.message = message
+
+
+class AnalysisLoad:
+    """
+    Count of analyses in flight and their recent completion rate.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self._completions: deque = deque()
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.depth += 1
+
+    def exit(self):
+        now = time.monotonic()
+        with self._lock:
+            self.depth = max(0, self.depth - 1)
+            self._completions.append(now)
+            self._trim(now)
+
+    @contextmanager
+    def track(self):
+        """
+        Count the enclosed analysis as in flight.
+        """
+        self.enter()
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def _trim(self, now: float):
+        while self._completions and now - self._completions[0] > THROUGHPUT_WINDOW_SECONDS:
+            self._completions.popleft()
+
+    def throughput(self) -> float:
+        """
+        Analyses completed per second over the recent window.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if not self._completions:
+                return 0.0
+            span = max(now - self._completions[0], 1.0)
+            return len(self._completions) / span
+
+
+load = AnalysisLoad()
+
+
+def retry_after_seconds(excess: int) -> int:
+    """
+    Seconds until roughly `excess` analyses have drained, within the configured bounds.
+    """
+    max_retry_after = getattr(settings, 'BRAINVIBE_ADMISSION_MAX_RETRY_AFTER', 60)
+    rate = load.throughput()
+    if rate <= 0:
+        return max_retry_after
+    return int(min(max_retry_after, max(1, math.ceil(excess / rate))))
+
+
+def admit(change_source: Optional[str]) -> Optional[Rejection]:
+    """
+    Decide whether new analysis work from a source may be accepted.
+
+    Args:
+        change_source: Source of the change (see SOURCE_PRIORITIES)
+
+    Returns:
+        None if the work is admitted, otherwise a Rejection
+    """
+    if not getattr(settings, 'BRAINVIBE_ADMISSION_ENABLED', True):
+        return None
+    priority = source_priority(change_source)
+    limit = _depth_limit(priority)
+    depth = load.depth
+    if depth < limit:
+        return None
+
+    retry_after = retry_after_seconds(depth - limit + 1)
+    if priority == INTERACTIVE_PRIORITY:
+        logger.warning(f"Analysis queue saturated ({depth} in flight), refusing {change_source} change")
+        return Rejection(503, retry_after, f"Analysis queue is full ({depth} in flight), retry later")
+    logger.info(f"Shedding {priority}-priority {change_source} change ({depth} in flight, limit {limit})")
+    return Rejection(429, retry_after, f"Analysis queue is busy; {change_source} changes are deferred")
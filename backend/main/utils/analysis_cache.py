@@ -0,0 +1,77 @@
+"""
+Cache of LLM topics per diff unit, keyed by the unit's fingerprint.
+
+A diff_chunker unit is the set of hunks changing one definition, and its
+fingerprint depends only on the file, the definition and the changed lines.
+When the same edit to a function appears in several snapshots (repeated scans
+of a working tree, overlapping diffs of an editing session), only the first
+occurrence is sent to the model; later ones are answered from here.
+
+Entries live in the Django cache for BRAINVIBE_ANALYSIS_CACHE_TTL seconds
+(0 disables the cache), so a shared backend (e.g. Redis) shares them between
+server processes and the management commands. Keys include the provider, as
+topics from one provider are not reused for another.
+"""
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "brainvibe:unit-topics"
+
+
+def _ttl() -> int:
+    return getattr(settings, 'BRAINVIBE_ANALYSIS_CACHE_TTL', 7 * 24 * 3600)
+
+
+def _key(provider_name: str, fingerprint: str) -> str:
+    return f"{KEY_PREFIX}:{provider_name}:{fingerprint}"
+
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_unit_topics(provider_name: str, fingerprint: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Topics cached for a diff unit.
+
+    Args:
+        provider_name: Name of the LLM provider
+        fingerprint: The unit's fingerprint
+
+    Returns:
+        The cached topics (possibly empty), or None on a miss
+    """
+    if _ttl() <= 0:
+        return None
+    topics = cache.get(_key(provider_name, fingerprint))
+    with _stats_lock:
+        _stats["hits" if topics is not None else "misses"] += 1
+    return topics
+
+
+def remember_unit_topics(provider_name: str, fingerprint: str, topics: List[Dict[str, Any]]):
+    """
+    Cache the topics the LLM found for a diff unit.
+
+    Only results the provider actually returned belong here; fallback topics
+    would hide the unit from the model for the whole TTL.
+    """
+    ttl = _ttl()
+    if ttl > 0:
+        cache.set(_key(provider_name, fingerprint), topics, ttl)
+
+
+def analysis_cache_stats() -> Dict[str, int]:
+    """
+    Unit cache hits and misses since start-up.
+    """
+    with _stats_lock:
+        return dict(_stats)
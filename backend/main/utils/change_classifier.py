@@ -0,0 +1,535 @@
+"""
+Detection of changes that cannot hold anything new to learn.
+
+Formatter runs, comment edits and renames make up many snapshots, and none of
+them need a topic analysis. classify_versions() compares the before and after
+versions of files, and classify_diff() the old and new sides of each hunk of
+a diff:
+
+- Python: the ASTs, with docstrings set aside, when both sides parse
+- otherwise: token streams without whitespace and comments, with string
+  quotes and trailing commas normalized; where indentation carries meaning
+  (Python, YAML, unknown file types) the indentation level of each logical
+  line is kept as a token
+
+A change is "formatting" if code and comments are unchanged, "comment" if only
+comments or docstrings differ, and "rename" if the code is the same up to a
+consistent renaming of identifiers the change itself binds (a function, class,
+parameter or variable, an attribute its classes set on self or cls, or a
+keyword argument to a function it defines), so swapping one external API,
+attribute or keyword argument for another is never a rename. Everything else,
+including anything that cannot be compared, is "semantic". A change to several
+files or hunks takes the most significant kind among them, and a rename must
+be consistent across all of them.
+"""
+import ast
+import inspect
+import io
+import logging
+import os
+import re
+import textwrap
+import tokenize
+from typing import Iterable, List, Optional, Set, Tuple
+
+from .diff_chunker import find_definitions
+from .diff_parser import detect_language, parse_diff
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+FORMATTING = "formatting"
+COMMENTS = "comment"
+RENAME = "rename"
+SEMANTIC = "semantic"
+
+# Kinds in increasing significance
+KINDS = (FORMATTING, COMMENTS, RENAME, SEMANTIC)
+# Kinds that are marked analyzed without topics
+TRIVIAL_KINDS = frozenset((FORMATTING, COMMENTS, RENAME))
+
+_BRACE_LANGUAGES = {"javascript", "go", "java", "rust", "cpp"}
+_HASH_COMMENT_EXTENSIONS = {".sh", ".bash", ".zsh", ".yml", ".yaml", ".toml", ".cfg", ".r", ".pl"}
+_SLASH_COMMENT_EXTENSIONS = {".css", ".scss", ".less", ".swift", ".cs", ".php", ".kt", ".scala"}
+_INDENTED_EXTENSIONS = {".yml", ".yaml"}
+# Words after which an identifier is being declared
+_DECLARATION_WORDS = {
+    "def", "class", "function", "fn", "func", "let", "const", "var", "val", "type", "interface", "struct",
+    "enum", "trait", "module",
+}
+
+_STRING_PATTERN = (r"(?P<string>[rbuRBUfF]{0,2}(?:\"\"\"[\s\S]*?\"\"\"|'''[\s\S]*?'''|"
+                   r"\"(?:[^\"\\\n]|\\.)*\"|'(?:[^'\\\n]|\\.)*'|`(?:[^`\\]|\\.)*`))")
+_TOKEN_TAIL = r"(?P<word>[A-Za-z_$][\w$]*)|(?P<number>\d[\w.]*)|(?P<newline>\n)|(?P<punct>[^\s\w])"
+_TOKEN_RES = {
+    "hash": re.compile(f"{_STRING_PATTERN}|(?P<comment>#[^\\n]*)|{_TOKEN_TAIL}"),
+    "slash": re.compile(f"{_STRING_PATTERN}|(?P<comment>//[^\\n]*|/\\*[\\s\\S]*?\\*/)|{_TOKEN_TAIL}"),
+    None: re.compile(f"{_STRING_PATTERN}|{_TOKEN_TAIL}"),
+}
+_OPENERS = {"(": ")", "[": "]", "{": "}"}
+_CLOSERS = set(_OPENERS.values())
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class Comparison:
+    """
+    How two versions of some code differ.
+
+    Attributes:
+        kind: One of KINDS
+        names: (before, after) pairs of identifiers at the same positions, when
+            the code has the same shape
+        bound_before: Identifiers the before version binds
+        bound_after: Identifiers the after version binds
+    """
+    __slots__ = ("kind", "names", "bound_before", "bound_after")
+
+    def __init__(self, kind: str, names: Optional[List[Tuple[str, str]]] = None,
+                 bound_before: Optional[Set[str]] = None, bound_after: Optional[Set[str]] = None):
+        self.kind = kind
+        self.names = names or []
+        self.bound_before = bound_before or set()
+        self.bound_after = bound_after or set()
+
+
+def is_trivial(kind: Optional[str]) -> bool:
+    """
+    Whether a change of this kind can be marked analyzed without topics.
+    """
+    return kind in TRIVIAL_KINDS
+
+
+# Python, by AST
+
+_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+_IDENTIFIER_FIELDS = (
+    (ast.Name, "id"), (ast.arg, "arg"), (ast.FunctionDef, "name"), (ast.AsyncFunctionDef, "name"),
+    (ast.ClassDef, "name"), (ast.Attribute, "attr"), (ast.keyword, "arg"), (ast.alias, "asname"),
+    (ast.ExceptHandler, "name"),
+)
+
+
+def _python_tree(source: str) -> Optional[Tuple[ast.AST, List[str]]]:
+    # The AST without docstrings, and the docstrings
+    try:
+        tree = ast.parse(textwrap.dedent(source))
+    except (SyntaxError, ValueError):
+        return None
+    docstrings = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and node.body:
+            first = node.body[0]
+            if (isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant)
+                    and isinstance(first.value.value, str)):
+                docstrings.append(inspect.cleandoc(first.value.value))
+                node.body = node.body[1:] or [ast.Pass()]
+    return tree, docstrings
+
+
+def _python_comments(source: str) -> Optional[List[str]]:
+    readline = io.StringIO(textwrap.dedent(source)).readline
+    try:
+        return [token.string.strip() for token in tokenize.generate_tokens(readline) if token.type == tokenize.COMMENT]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+
+
+def _callee(call: ast.Call) -> str:
+    # Name of the function a call invokes, as far as the call site tells
+    if isinstance(call.func, ast.Name):
+        return call.func.id
+    if isinstance(call.func, ast.Attribute):
+        return call.func.attr
+    return ""
+
+
+def _parameters(function: ast.AST) -> List[str]:
+    arguments = function.args
+    return [arg.arg for arg in arguments.posonlyargs + arguments.args + arguments.kwonlyargs]
+
+
+def _python_bound(tree: ast.AST) -> Set[str]:
+    # Names the code binds. Attributes (keyed ".name") only count when the code's own
+    # classes define them: stores on self or cls and names bound in a class body.
+    # Keyword arguments (keyed "callee(name") only count for functions the code defines.
+    bound = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            bound.add(node.name)
+            parameters = _parameters(node)
+            bound.update(f"{node.name}({parameter}" for parameter in parameters)
+            # A method seen without its class (a hunk of its body)
+            if parameters[:1] in (["self"], ["cls"]):
+                bound.add(f".{node.name}")
+        elif isinstance(node, ast.ClassDef):
+            bound.add(node.name)
+            for statement in node.body:
+                if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    bound.add(f".{statement.name}")
+                    if statement.name == "__init__":
+                        bound.update(f"{node.name}({parameter}" for parameter in _parameters(statement))
+                else:
+                    bound.update(f".{target.id}" for target in ast.walk(statement)
+                                 if isinstance(target, ast.Name) and isinstance(target.ctx, ast.Store))
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            bound.add(node.id)
+        elif (isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store)
+              and isinstance(node.value, ast.Name) and node.value.id in ("self", "cls")):
+            bound.add(f".{node.attr}")
+        elif isinstance(node, (ast.alias, ast.ExceptHandler)):
+            name = node.asname if isinstance(node, ast.alias) else node.name
+            if name:
+                bound.add(name)
+    return bound
+
+
+def _function_locals(function: ast.AST) -> Set[str]:
+    # Parameters and assigned names of a function, outside nested scopes
+    arguments = function.args
+    names = {arg.arg for arg in arguments.posonlyargs + arguments.args + arguments.kwonlyargs}
+    names.update(arg.arg for arg in (arguments.vararg, arguments.kwarg) if arg)
+    declared = set()
+    nodes = list(function.body) if isinstance(function.body, list) else [function.body]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            declared.update(node.names)
+        if not isinstance(node, _SCOPES):
+            nodes.extend(ast.iter_child_nodes(node))
+    return names - declared
+
+
+def _anonymize(tree: ast.AST) -> Tuple[str, List[str]]:
+    # The AST dump with every identifier blanked, and the identifiers in visiting order;
+    # parameters and local variables are qualified by their function, attributes and
+    # keyword arguments are keyed as in _python_bound
+    names = []
+    callees = {id(keyword): _callee(node) for node in ast.walk(tree) if isinstance(node, ast.Call)
+               for keyword in node.keywords}
+
+    def visit(node, scope, local_names):
+        own_name = getattr(node, "name", None) or "<lambda>"
+        for node_type, field in _IDENTIFIER_FIELDS:
+            if isinstance(node, node_type) and getattr(node, field, None):
+                name = getattr(node, field)
+                if isinstance(node, ast.Name) and name in local_names:
+                    names.append(f"{scope}:{name}")
+                elif isinstance(node, ast.Attribute):
+                    names.append(f".{name}")
+                elif isinstance(node, ast.keyword):
+                    names.append(f"{callees.get(id(node), '')}({name}")
+                else:
+                    names.append(name)
+                setattr(node, field, "_")
+
+        if isinstance(node, ast.ClassDef):
+            for child in ast.iter_child_nodes(node):
+                visit(child, f"{scope}.{own_name}", set())
+            return
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            for child in ast.iter_child_nodes(node):
+                visit(child, scope, local_names)
+            return
+
+        # Decorators, annotations and defaults are evaluated in the enclosing scope
+        inner_scope = f"{scope}.{own_name}"
+        inner_locals = _function_locals(node)
+        for decorator in getattr(node, "decorator_list", []):
+            visit(decorator, scope, local_names)
+        arguments = node.args
+        parameters = arguments.posonlyargs + arguments.args + arguments.kwonlyargs + [arguments.vararg, arguments.kwarg]
+        for arg in parameters:
+            if arg is None:
+                continue
+            names.append(f"{inner_scope}:{arg.arg}")
+            arg.arg = "_"
+            if arg.annotation is not None:
+                visit(arg.annotation, scope, local_names)
+        for default in arguments.defaults + [default for default in arguments.kw_defaults if default is not None]:
+            visit(default, scope, local_names)
+        if getattr(node, "returns", None) is not None:
+            visit(node.returns, scope, local_names)
+        for child in node.body if isinstance(node.body, list) else [node.body]:
+            visit(child, inner_scope, inner_locals)
+
+    visit(tree, "", set())
+    return ast.dump(tree), names
+
+
+def _compare_python(before: str, after: str) -> Optional[Comparison]:
+    parsed_before, parsed_after = _python_tree(before), _python_tree(after)
+    if parsed_before is None or parsed_after is None:
+        return None
+    (tree_before, docs_before), (tree_after, docs_after) = parsed_before, parsed_after
+    bound_before, bound_after = _python_bound(tree_before), _python_bound(tree_after)
+    same_code = ast.dump(tree_before) == ast.dump(tree_after)
+    shape_before, names_before = _anonymize(tree_before)
+    shape_after, names_after = _anonymize(tree_after)
+    if shape_before != shape_after:
+        return Comparison(SEMANTIC)
+    names = list(zip(names_before, names_after))
+    if not same_code:
+        return Comparison(RENAME, names, bound_before, bound_after)
+    comments_before, comments_after = _python_comments(before), _python_comments(after)
+    same_comments = docs_before == docs_after and comments_before is not None and comments_before == comments_after
+    return Comparison(FORMATTING if same_comments else COMMENTS, names, bound_before, bound_after)
+
+
+# Other languages, by token stream
+
+def _comment_style(path: str, language: Optional[str]) -> Optional[str]:
+    extension = os.path.splitext(path or "")[1].lower()
+    if language == "python" or extension in _HASH_COMMENT_EXTENSIONS:
+        return "hash"
+    if language in _BRACE_LANGUAGES or extension in _SLASH_COMMENT_EXTENSIONS:
+        return "slash"
+    return None
+
+
+def _indentation_matters(path: str, language: Optional[str]) -> bool:
+    extension = os.path.splitext(path or "")[1].lower()
+    return extension in _INDENTED_EXTENSIONS or language not in _BRACE_LANGUAGES | {"ruby"}
+
+
+def _normalize_string(literal: str) -> str:
+    # Same text in single or double quotes (or triple quotes) is the same string
+    quote_at = min(index for index in (literal.find('"'), literal.find("'"), literal.find("`")) if index >= 0)
+    prefix, body = literal[:quote_at].lower(), literal[quote_at:]
+    width = 3 if body[:3] in ('"""', "'''") else 1
+    kind = "`" if body[0] == "`" else "'"
+    return f"\x01{prefix}{kind}{body[width:-width]}"
+
+
+def tokenize_code(path: str, text: str) -> Tuple[List[str], List[int], List[str]]:
+    """
+    Split code into tokens, without whitespace and comments.
+
+    Args:
+        path: Path of the file, for its comment syntax and whether indentation matters
+        text: The code
+
+    Returns:
+        Tuple of (code tokens, line number of each token, comment texts)
+    """
+    language = detect_language(path)
+    pattern = _TOKEN_RES[_comment_style(path, language)]
+    indented = _indentation_matters(path, language)
+    drop_semicolons = language == "javascript"
+
+    tokens: List[object] = []
+    token_lines: List[int] = []
+    comments: List[str] = []
+    brackets: List[str] = []
+    line_number = 1
+    line_start = 0
+    at_line_start = True
+
+    def drop_last():
+        tokens.pop()
+        token_lines.pop()
+
+    for match in pattern.finditer(text):
+        group = match.lastgroup
+        value = match.group()
+        if group == "comment":
+            comments.append(_WHITESPACE_RE.sub(" ", value.strip()))
+            line_number += value.count("\n")
+            continue
+        if group == "newline":
+            if drop_semicolons and tokens and tokens[-1] == ";" and (not brackets or brackets[-1] == "{"):
+                drop_last()
+            line_number += 1
+            line_start = match.end()
+            at_line_start = True
+            continue
+        if at_line_start and indented and not brackets:
+            # Indentation of a logical line, ranked later so that re-indenting by a fixed step is formatting
+            tokens.append((len(text[line_start:match.start()].expandtabs(8)),))
+            token_lines.append(line_number)
+        at_line_start = False
+        if group == "string":
+            value = _normalize_string(value)
+        elif group == "punct":
+            if value in _OPENERS:
+                brackets.append(value)
+            elif value in _CLOSERS:
+                if brackets:
+                    brackets.pop()
+                if tokens and tokens[-1] == ",":
+                    drop_last()
+                if drop_semicolons and value == "}" and tokens and tokens[-1] == ";":
+                    drop_last()
+        tokens.append(value)
+        token_lines.append(line_number)
+        if group == "string":
+            line_number += match.group().count("\n")
+    if drop_semicolons and tokens and tokens[-1] == ";":
+        drop_last()
+
+    widths = sorted({token[0] for token in tokens if isinstance(token, tuple)})
+    ranks = {width: rank for rank, width in enumerate(widths)}
+    tokens = [f"\x00{ranks[token[0]]}" if isinstance(token, tuple) else token for token in tokens]
+    return tokens, token_lines, comments
+
+
+def _is_word(token: str) -> bool:
+    return bool(token) and (token[0].isalpha() or token[0] in "_$")
+
+
+def _binding_positions(tokens: List[str]) -> List[int]:
+    # Identifiers following a declaration keyword, or assigned with a single "="
+    positions = []
+    for index, token in enumerate(tokens):
+        if not _is_word(token):
+            continue
+        if index and tokens[index - 1] in _DECLARATION_WORDS:
+            positions.append(index)
+        elif tokens[index + 1:index + 2] == ["="] and tokens[index + 2:index + 3] not in (["="], [">"]):
+            positions.append(index)
+    return positions
+
+
+def _scoped_words(path: str, text: str, tokens: List[str], token_lines: List[int]) -> Tuple[List[str], Set[str]]:
+    # Identifier keys aligned with the tokens (names bound inside a definition are
+    # qualified by it), and the bound names
+    definitions = find_definitions(detect_language(path), list(enumerate(text.split("\n"), 1)))
+
+    def scope_of(line: int) -> str:
+        enclosing = [definition for definition in definitions if definition.start <= line <= definition.end]
+        return max(enclosing, key=lambda definition: definition.start).name if enclosing else ""
+
+    scopes = [scope_of(line) if _is_word(token) else "" for token, line in zip(tokens, token_lines)]
+    positions = _binding_positions(tokens)
+    local_names = {(scopes[index], tokens[index]) for index in positions if scopes[index]}
+    keys = [f"{scope}:{token}" if (scope, token) in local_names else token for token, scope in zip(tokens, scopes)]
+    return keys, {tokens[index] for index in positions}
+
+
+def _compare_tokens(path: str, before: str, after: str) -> Comparison:
+    tokens_before, lines_before, comments_before = tokenize_code(path, before)
+    tokens_after, lines_after, comments_after = tokenize_code(path, after)
+    if len(tokens_before) != len(tokens_after):
+        return Comparison(SEMANTIC)
+    if any(token_before != token_after and not (_is_word(token_before) and _is_word(token_after))
+           for token_before, token_after in zip(tokens_before, tokens_after)):
+        return Comparison(SEMANTIC)
+    keys_before, bound_before = _scoped_words(path, before, tokens_before, lines_before)
+    keys_after, bound_after = _scoped_words(path, after, tokens_after, lines_after)
+    names = [(key_before, key_after) for token, key_before, key_after in zip(tokens_before, keys_before, keys_after)
+             if _is_word(token)]
+    if tokens_before != tokens_after:
+        return Comparison(RENAME, names, bound_before, bound_after)
+    kind = FORMATTING if comments_before == comments_after else COMMENTS
+    return Comparison(kind, names, bound_before, bound_after)
+
+
+def compare_code(path: str, before: str, after: str) -> Comparison:
+    """
+    Compare two versions of a file, or the two sides of a hunk.
+
+    Args:
+        path: Path of the file
+        before: Old code
+        after: New code
+
+    Returns:
+        A Comparison
+    """
+    if detect_language(path) == "python":
+        comparison = _compare_python(before, after)
+        if comparison is not None:
+            return comparison
+    return _compare_tokens(path, before, after)
+
+
+def combine(comparisons: List[Comparison]) -> str:
+    """
+    Kind of a change made of several compared parts.
+
+    Renames must map each identifier the same way in every part, and only
+    between identifiers the change binds on each side.
+
+    Args:
+        comparisons: Comparisons of the parts
+
+    Returns:
+        One of KINDS
+    """
+    if not comparisons:
+        return SEMANTIC
+    kind = max((comparison.kind for comparison in comparisons), key=KINDS.index)
+    if kind != RENAME:
+        return kind
+
+    renamed, reverse = {}, {}
+    bound_before, bound_after = set(), set()
+    for comparison in comparisons:
+        bound_before |= comparison.bound_before
+        bound_after |= comparison.bound_after
+        for old, new in comparison.names:
+            if renamed.setdefault(old, new) != new or reverse.setdefault(new, old) != old:
+                return SEMANTIC
+    for old, new in renamed.items():
+        # Keys of local names carry their scope before the ":"
+        if old != new and not (old.rsplit(":", 1)[-1] in bound_before and new.rsplit(":", 1)[-1] in bound_after):
+            return SEMANTIC
+    return RENAME
+
+
+def classify_versions(files: Iterable[Tuple[str, str, str]]) -> str:
+    """
+    Classify a change from the before and after versions of its files.
+
+    Args:
+        files: (path, before, after) triples
+
+    Returns:
+        One of KINDS
+    """
+    comparisons = [compare_code(path, before, after) for path, before, after in files if before != after]
+    return combine(comparisons) if comparisons else FORMATTING
+
+
+def classify_diff(diff_text: str) -> str:
+    """
+    Classify a change from its diff, comparing the two sides of each hunk.
+
+    New, deleted and binary files are semantic; a file moved without content
+    changes is a rename.
+
+    Args:
+        diff_text: The diff
+
+    Returns:
+        One of KINDS
+    """
+    parsed = parse_diff(diff_text)
+    comparisons = []
+    for file_diff in parsed.files:
+        if file_diff.is_binary or file_diff.is_new or file_diff.is_deleted:
+            return SEMANTIC
+        if not file_diff.hunks:
+            if "\nrename to " not in parsed.section_text(file_diff):
+                return SEMANTIC
+            comparisons.append(Comparison(RENAME))
+            continue
+        for hunk in file_diff.hunks:
+            before, after = [], []
+            for line in str(parsed.view[hunk.body_start:hunk.end], "utf-8", "replace").splitlines():
+                marker = line[:1]
+                if marker in (" ", ""):
+                    before.append(line[1:])
+                    after.append(line[1:])
+                elif marker == "-":
+                    before.append(line[1:])
+                elif marker == "+":
+                    after.append(line[1:])
+            comparison = compare_code(file_diff.path, "\n".join(before), "\n".join(after))
+            if comparison.kind == SEMANTIC:
+                return SEMANTIC
+            comparisons.append(comparison)
+    return combine(comparisons)
@@ -0,0 +1,129 @@
+"""
+Per-session cache of file contents for delta uploads from editor integrations.
+
+Instead of sending the full before/after contents of a file on every edit, a
+client may send the sha256 of the content the server last saw (`base_hash`)
+and a unified diff against it (`patch`). The server looks the base up in this
+cache, applies the patch and caches the result, whose hash the client uses as
+the base of its next edit. If the base is not cached (expired, evicted, or
+another server process), or the patch does not apply, the client is asked to
+send the full contents once.
+
+Entries live in the Django cache, so a shared backend (e.g. Redis) is needed
+when the API runs in several processes.
+"""
+import hashlib
+import logging
+from typing import Any, Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .fast_diff import PatchError, apply_patch
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "brainvibe:content"
+
+
+class SendFullContent(Exception):
+    """
+    Raised when a delta upload cannot be resolved and the client must send the full contents.
+    """
+
+    def __init__(self, message: str, base_hash: Optional[str] = None):
+        super().__init__(message)
+        self.base_hash = base_hash
+
+
+def content_hash(content: str) -> str:
+    """
+    The sha256 hex digest clients use to name a content version.
+    """
+    return hashlib.sha256(content.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def session_scope(project_id: Any, cursor_session_id: Optional[str] = None) -> str:
+    """
+    Cache scope of a client session (contents are only shared within a project and session).
+    """
+    return f"{project_id}:{cursor_session_id or ''}"
+
+
+def _key(scope: str, digest: str) -> str:
+    # Cache backends limit key length, so the scope is hashed too
+    scope_digest = hashlib.sha1(scope.encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}:{scope_digest}:{digest}"
+
+
+def remember_content(scope: str, content: str) -> Optional[str]:
+    """
+    Cache a content version for later delta uploads.
+
+    Args:
+        scope: Session scope (see session_scope)
+        content: File contents
+
+    Returns:
+        The content hash, or None if the content is too large to cache
+    """
+    encoded = content.encode("utf-8", "surrogatepass")
+    digest = hashlib.sha256(encoded).hexdigest()
+    if len(encoded) > getattr(settings, 'BRAINVIBE_CONTENT_CACHE_MAX_BYTES', 5 * 1024 * 1024):
+        logger.debug(f"Not caching {len(encoded)} bytes of content for scope {scope}")
+        return None
+    cache.set(_key(scope, digest), content, getattr(settings, 'BRAINVIBE_CONTENT_CACHE_TTL', 3600))
+    return digest
+
+
+def get_content(scope: str, digest: str) -> Optional[str]:
+    """
+    Look up a cached content version by hash.
+    """
+    return cache.get(_key(scope, digest))
+
+
+def resolve_contents(scope: str, data: Mapping[str, Any]) -> Tuple[str, str]:
+    """
+    Resolve the original and new contents of an uploaded change.
+
+    A change carries either `original_content` and `new_content`, or
+    `base_hash` and `patch` (plus an optional `content_hash` of the result to
+    verify the patch against).
+
+    Args:
+        scope: Session scope (see session_scope)
+        data: Request data
+
+    Returns:
+        Tuple of (original content, new content)
+
+    Raises:
+        SendFullContent: If the base is unknown or the patch does not apply
+        ValueError: If the request carries neither form
+    """
+    base_hash = data.get('base_hash')
+    if not base_hash:
+        new_content = data.get('new_content')
+        if new_content is None:
+            raise ValueError("new_content, or base_hash and patch, are required")
+        return data.get('original_content') or '', new_content
+
+    patch = data.get('patch')
+    if patch is None:
+        raise ValueError("patch is required with base_hash")
+    original_content = get_content(scope, base_hash)
+    if original_content is None:
+        logger.info(f"Base {base_hash[:12]} not cached for scope {scope}, asking for full contents")
+        raise SendFullContent("Base content is not cached", base_hash)
+    try:
+        new_content = apply_patch(original_content, patch)
+    except PatchError as e:
+        logger.info(f"Patch against {base_hash[:12]} failed: {e}")
+        raise SendFullContent(f"Patch does not apply: {e}", base_hash)
+
+    expected = data.get('content_hash')
+    if expected and expected != content_hash(new_content):
+        raise SendFullContent("Patched content does not match content_hash", base_hash)
+    return original_content, new_content
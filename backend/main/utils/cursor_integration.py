@@ -4,10 +4,10 @@ Replaces the removed code_tracker.cursor_integration module
 """
 
 import logging
-import difflib
 from typing import Dict, Any, Optional
-from datetime import datetime
-from ..models import Project, CodeChange
+from ..models import Project
+from .fast_diff import diff_texts
+from .cursor_sessions import record_edit
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +16,9 @@ def compute_diff(original_content: str, new_content: str) -> str:
     """
     Compute a unified diff between original and new content.
 
+    Uses the patience/Myers engine in fast_diff, which produces the same
+    format as difflib.unified_diff but stays fast on large files.
+
     Args:
         original_content: Original content
         new_content: New content
@@ -23,18 +26,7 @@ def compute_diff(original_content: str, new_content: str) -> str:
     Returns:
         Unified diff string
     """
-    original_lines = original_content.splitlines(keepends=True)
-    new_lines = new_content.splitlines(keepends=True)
-
-    diff = difflib.unified_diff(
-        original_lines,
-        new_lines,
-        fromfile='before',
-        tofile='after',
-        n=3  # Context lines
-    )
-
-    return ''.join(diff)
+    return diff_texts(original_content, new_content, fromfile='before', tofile='after', n=3)
 
 
 def process_cursor_change(
@@ -72,39 +64,19 @@ def process_cursor_change(
                 "message": "No changes detected in the content"
             }
 
-        # Prepare metadata
-        if metadata is None:
-            metadata = {}
-
-        metadata.update({
-            "file_path": file_path,
-            "timestamp": datetime.now().isoformat(),
-            "cursor_session_id": cursor_session_id
-        })
-
-        # Generate a unique ID for this change
-        change_id = cursor_session_id or f"cursor_{datetime.now().timestamp()}"
-
-        # Create a CodeChange record
-        code_change = CodeChange.objects.create(
-            project=project,
-            change_source='cursor_ai',
-            change_id=change_id,
-            summary=f"Changes to {file_path}",
-            diff_content=diff_content,
-            metadata=metadata,
-            is_analyzed=False
-        )
-
-        # Note: In the original implementation, this would call Gemini to analyze topics
-        # For now, we'll mark it as analyzed
-        code_change.is_analyzed = True
-        code_change.save()
+        # Fold the edit into its Cursor session; the session's net diff is
+        # recorded and analyzed once when the session closes
+        result = record_edit(project, cursor_session_id, file_path, original_content, new_content, diff_content,
+                             metadata)
 
         return {
             "status": "success",
-            "change_id": change_id,
-            "message": "Code change processed successfully"
+            "change_id": result.get("change_id"),
+            "session_id": result["session_id"],
+            "session_status": result["session_status"],
+            "edit_count": result["edit_count"],
+            "message": ("Cursor session closed and queued for analysis" if result["session_status"] == "closed"
+                        else "Edit added to the open Cursor session")
         }
 
     except Project.DoesNotExist:
@@ -0,0 +1,268 @@
+"""
+Session-level aggregation of Cursor AI edits.
+
+An AI interaction in Cursor arrives as many small edits, often to the same
+file. Edits sharing a `cursor_session_id` are folded into one open
+CursorSession that keeps, per file, the content before the first edit and
+after the latest one. A session closes after
+BRAINVIBE_CURSOR_SESSION_IDLE_SECONDS without edits (checked when the next
+edit arrives, by a background sweep scheduled while sessions are open, and by
+`manage.py close_cursor_sessions`) or once its edits exceed
+BRAINVIBE_CURSOR_SESSION_MAX_DIFF_BYTES. On close, the net diff of all files
+is recorded as a single CodeChange and analyzed once.
+"""
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from ..models import CodeChange, CursorSession, CursorSessionFile, Project
+from .admission import INTERACTIVE_PRIORITY
+from .change_classifier import classify_versions
+from .fast_diff import diff_texts
+from .scheduler import DelayedSubmission
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Seconds the background sweep waits past the idle timeout, so the session is surely idle
+SWEEP_SLACK_SECONDS = 1.0
+
+
+def _idle_timeout() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'BRAINVIBE_CURSOR_SESSION_IDLE_SECONDS', 120))
+
+
+def _max_diff_bytes() -> int:
+    return getattr(settings, 'BRAINVIBE_CURSOR_SESSION_MAX_DIFF_BYTES', 200_000)
+
+
+def file_diff(file_path: str, original_content: str, new_content: str) -> str:
+    """
+    Git-style diff of one file, with headers so several files can be concatenated.
+    """
+    hunks = diff_texts(original_content, new_content, fromfile=f"a/{file_path}", tofile=f"b/{file_path}")
+    if not hunks:
+        return ""
+    return f"diff --git a/{file_path} b/{file_path}\n{hunks}"
+
+
+def _open_session(project: Project, session_id: str) -> CursorSession:
+    # Lock the open session for this ID, creating it if needed
+    session = (CursorSession.objects.select_for_update()
+               .filter(project=project, session_id=session_id, status='open').first())
+    if session is not None:
+        return session
+    try:
+        with transaction.atomic():
+            return CursorSession.objects.create(project=project, session_id=session_id, last_edit_at=timezone.now())
+    except IntegrityError:
+        # Another request opened it concurrently
+        return CursorSession.objects.select_for_update().get(project=project, session_id=session_id, status='open')
+
+
+def record_edit(project: Project, session_id: Optional[str], file_path: str, original_content: str,
+                new_content: str, edit_diff: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fold one edit into its Cursor session, closing the session if it is due.
+
+    Edits without a session ID form a session of their own that closes at once.
+
+    Args:
+        project: The project the edit belongs to
+        session_id: The Cursor session ID, if any
+        file_path: Path of the edited file
+        original_content: File content before the edit
+        new_content: File content after the edit
+        edit_diff: The diff of this edit alone (used for the size threshold)
+        metadata: Optional metadata sent with the edit
+
+    Returns:
+        Dictionary with the session status and, if it closed, the aggregated change
+    """
+    now = timezone.now()
+    stale = None
+    with transaction.atomic():
+        session = _open_session(project, session_id or f"edit_{now.timestamp()}")
+        if session.edit_count and now - session.last_edit_at > _idle_timeout():
+            # The previous interaction ended; close it and start a new session
+            stale = session
+            _mark_closed(stale, 'idle', now)
+            session = CursorSession.objects.create(project=project, session_id=stale.session_id, last_edit_at=now)
+
+        session_file, created = CursorSessionFile.objects.get_or_create(
+            session=session, file_path=file_path,
+            defaults={'base_content': original_content, 'current_content': new_content, 'edit_count': 1}
+        )
+        if not created:
+            session_file.current_content = new_content
+            session_file.edit_count += 1
+            session_file.save(update_fields=['current_content', 'edit_count', 'updated_at'])
+
+        session.edit_count += 1
+        session.diff_bytes += len(edit_diff)
+        session.last_edit_at = now
+        if metadata:
+            session.metadata.update(metadata)
+        close_reason = None
+        if not session_id:
+            close_reason = 'no_session'
+        elif session.diff_bytes >= _max_diff_bytes():
+            close_reason = 'size'
+        if close_reason:
+            _mark_closed(session, close_reason, now)
+        else:
+            session.save(update_fields=['edit_count', 'diff_bytes', 'last_edit_at', 'metadata'])
+
+    if stale is not None:
+        analyze_session(stale)
+    if not close_reason:
+        schedule_idle_sweep()
+    result = {
+        "session_id": session.session_id,
+        "session_status": session.status,
+        "edit_count": session.edit_count,
+    }
+    if close_reason:
+        result.update(analyze_session(session))
+    return result
+
+
+def _mark_closed(session: CursorSession, reason: str, now) -> None:
+    session.status = 'closed'
+    session.close_reason = reason
+    session.closed_at = now
+    session.save(update_fields=['status', 'close_reason', 'closed_at', 'edit_count', 'diff_bytes', 'last_edit_at',
+                                'metadata'])
+
+
+def analyze_session(session: CursorSession, background: bool = True) -> Dict[str, Any]:
+    """
+    Record the net diff of a closed session as one CodeChange and analyze it.
+
+    Sessions are analyzed at most once; a session that already has its change
+    is left alone.
+
+    Args:
+        session: A closed CursorSession
+        background: Run the analysis in the background pool instead of inline
+
+    Returns:
+        Dictionary with the aggregated change ID (None if the edits cancelled out)
+    """
+    from .. import services
+
+    with transaction.atomic():
+        session = CursorSession.objects.select_for_update().get(pk=session.pk)
+        if session.code_change_id is not None:
+            return {"change_id": session.code_change.change_id}
+
+        files = list(session.files.order_by('file_path'))
+        diffs = [file_diff(f.file_path, f.base_content, f.current_content) for f in files]
+        diff_content = "".join(diff for diff in diffs if diff)
+        if not diff_content:
+            logger.info(f"Cursor session {session.session_id} has no net change")
+            return {"change_id": None}
+
+        changed = [f.file_path for f, diff in zip(files, diffs) if diff]
+        # Classified from the full versions while they are at hand (see change_classifier)
+        change_kind = classify_versions((f.file_path, f.base_content, f.current_content)
+                                        for f, diff in zip(files, diffs) if diff)
+        code_change = CodeChange.objects.create(
+            project=session.project,
+            change_source='cursor_ai',
+            change_id=f"cursor_{session.session_id}_{session.pk}",
+            summary=f"Cursor session changes to {', '.join(changed[:5])}" + (" and more" if len(changed) > 5 else ""),
+            diff_content=diff_content,
+            metadata={
+                **session.metadata,
+                "cursor_session_id": session.session_id,
+                "files": changed,
+                "edit_count": session.edit_count,
+                "close_reason": session.close_reason,
+                "started_at": session.started_at.isoformat(),
+                "closed_at": session.closed_at.isoformat() if session.closed_at else None,
+                "change_kind": change_kind,
+            },
+            is_analyzed=False
+        )
+        session.code_change = code_change
+        session.save(update_fields=['code_change'])
+        # The per-file contents are no longer needed once the net diff is recorded
+        session.files.all().delete()
+
+    logger.info(f"Cursor session {session.session_id} closed ({session.close_reason}) with "
+                f"{session.edit_count} edits to {len(changed)} files")
+    if background:
+        services.submit_diff_analysis(session.project, code_change)
+    else:
+        services.run_diff_analysis(session.project, code_change)
+    return {"change_id": code_change.change_id}
+
+
+def close_idle_sessions(idle_seconds: Optional[float] = None, background: bool = False) -> int:
+    """
+    Close and analyze every open session without edits for the idle timeout.
+
+    Args:
+        idle_seconds: Override of BRAINVIBE_CURSOR_SESSION_IDLE_SECONDS
+        background: Run the analyses in the background pool instead of inline
+
+    Returns:
+        Number of sessions closed
+    """
+    timeout = timedelta(seconds=idle_seconds) if idle_seconds is not None else _idle_timeout()
+    cutoff = timezone.now() - timeout
+    closed = 0
+    for session_pk in list(CursorSession.objects.filter(status='open', last_edit_at__lt=cutoff)
+                           .values_list('pk', flat=True)):
+        with transaction.atomic():
+            session = CursorSession.objects.select_for_update().get(pk=session_pk)
+            # Skip sessions that received an edit or were closed since the query
+            if session.status != 'open' or session.last_edit_at >= cutoff:
+                continue
+            _mark_closed(session, 'idle', timezone.now())
+        try:
+            analyze_session(session, background=background)
+        except Exception as e:
+            logger.exception(f"Error analyzing Cursor session {session.session_id}: {e}")
+        closed += 1
+    return closed
+
+
+def schedule_idle_sweep(delay: Optional[float] = None):
+    """
+    Sweep idle sessions in the background once an open session can have gone idle.
+
+    Calls while a sweep is pending are no-ops; each sweep schedules the next
+    one for as long as sessions stay open, so an interaction whose last edit
+    is never followed by another is still closed and analyzed. The sweep runs
+    as interactive work in the analysis pool (see services.get_analysis_scheduler).
+
+    Args:
+        delay: Seconds until the sweep (default: the idle timeout)
+    """
+    if delay is None:
+        delay = _idle_timeout().total_seconds()
+    _sweep.schedule(max(0.0, delay) + SWEEP_SLACK_SECONDS)
+
+
+def _run_sweep():
+    try:
+        closed = close_idle_sessions(background=True)
+        if closed:
+            logger.info(f"Closed {closed} idle Cursor sessions")
+        oldest = (CursorSession.objects.filter(status='open').order_by('last_edit_at')
+                  .values_list('last_edit_at', flat=True).first())
+        if oldest is not None:
+            schedule_idle_sweep((oldest + _idle_timeout() - timezone.now()).total_seconds())
+    except Exception as e:
+        logger.exception(f"Background sweep of idle Cursor sessions failed: {e}")
+    finally:
+        close_old_connections()
+
+
+_sweep = DelayedSubmission(_run_sweep, INTERACTIVE_PRIORITY)
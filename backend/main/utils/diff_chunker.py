@@ -0,0 +1,380 @@
+"""
+Syntax-aware chunking of diffs at function and class boundaries.
+
+Each hunk is mapped to the innermost definition (function, method or class)
+enclosing its first change, found in the new-side lines of the hunk:
+
+- Python: `ast` where the lines parse (whole definitions, new files), an
+  indentation scanner where they do not (a hunk starting mid-function)
+- JS/TS, Java, Kotlin, C#, Go, Rust, C/C++, PHP, Swift, Scala: a lightweight
+  tokenizer that skips strings and comments and tracks the braces opened by
+  signature lines
+- otherwise, or when the change lies before any definition in the hunk: the
+  function context git writes after the `@@` header, if any
+
+Hunks of a file with the same enclosing definition are grouped into one
+DiffUnit, a semantically complete piece of the diff that chunking never cuts
+through. A unit's fingerprint hashes its path, definition and changed lines
+(not line numbers or context), so the same edit to a function keeps its
+fingerprint when it shows up again in a later snapshot, wherever the function
+moved in the file.
+"""
+import ast
+import hashlib
+import logging
+import re
+import textwrap
+from typing import Dict, List, Optional, Tuple
+
+from .diff_parser import FileDiff, ParsedDiff, parse_diff
+from .tokens import estimate_tokens
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Symbol of hunks outside any definition
+MODULE_SYMBOL = "<module>"
+
+BRACE_LANGUAGES = {
+    "javascript", "typescript", "java", "kotlin", "csharp", "go", "rust", "c", "cpp", "php", "swift", "scala",
+}
+
+_HUNK_CONTEXT_RE = re.compile(r"^@@ [^@]* @@ ?(.*)$")
+_PY_DEFINITION_RE = re.compile(r"^(\s*)(?:async\s+)?(?:def|class)\s+(\w+)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Signature patterns of the brace languages, tried in order; group 1 is the name
+_BRACE_SIGNATURE_RES = [
+    re.compile(r"\b(?:class|interface|struct|enum|trait|impl|object|namespace|protocol|extension)"
+               r"\s+(?:<[^>]*>\s*)?([A-Za-z_$][\w$]*)"),
+    re.compile(r"\bfunction\s*\*?\s*([A-Za-z_$][\w$]*)"),
+    re.compile(r"\bfunc\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)"),
+    re.compile(r"\bfn\s+([A-Za-z_]\w*)"),
+    re.compile(r"\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(?:async\s+)?"
+               r"(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[A-Za-z_$][\w$]*\s*=>)"),
+    re.compile(r"^\s*([A-Za-z_$][\w$]*)\s*:\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>)"),
+    # Methods and C-style functions: a name followed by a parameter list, then a body
+    re.compile(r"(?<![.\w$])([A-Za-z_$~][\w$]*)\s*\([^;]*\)\s*"
+               r"(?:const\b|throws\s+[\w.,\s]+|->\s*[^{]+|:\s*[^{=]+)?\s*\{?\s*$"),
+]
+_NOT_NAMES = {
+    "if", "for", "while", "switch", "catch", "return", "else", "do", "try", "with", "new", "typeof", "sizeof",
+    "function", "await", "match", "when", "foreach", "using", "lock", "synchronized", "elif", "defer", "go",
+}
+_BRACE_STRIP_RE = re.compile(r"""//.*$|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|`(?:[^`\\]|\\.)*`""")
+
+
+class Definition:
+    """
+    A definition found in the new side of a diff.
+
+    Attributes:
+        name: Qualified name (outer definitions joined with ".")
+        start: First new-side line number
+        end: Last new-side line number
+    """
+    __slots__ = ("name", "start", "end")
+
+    def __init__(self, name: str, start: int, end: int):
+        self.name = name
+        self.start = start
+        self.end = end
+
+
+class DiffUnit:
+    """
+    The hunks of one file that change the same definition.
+
+    Attributes:
+        path: Path of the file
+        symbol: Qualified name of the enclosing definition (MODULE_SYMBOL outside any)
+        header: The file's diff header
+        hunk_texts: Texts of the unit's hunks, in file order
+        fingerprint: Stable hash of the path, symbol and changed lines
+    """
+    __slots__ = ("path", "symbol", "header", "hunk_texts", "fingerprint")
+
+    def __init__(self, path: str, symbol: str, header: str):
+        self.path = path
+        self.symbol = symbol
+        self.header = header
+        self.hunk_texts: List[str] = []
+        self.fingerprint = ""
+
+    @property
+    def text(self) -> str:
+        """The file header followed by the unit's hunks"""
+        return self.header + "".join(self.hunk_texts)
+
+    @property
+    def tokens(self) -> int:
+        """Estimated tokens of the unit's text"""
+        return estimate_tokens(self.text)
+
+
+def _python_definitions(lines: List[Tuple[int, str]]) -> List[Definition]:
+    # Exact definitions from ast when the lines parse, otherwise from indentation
+    try:
+        tree = ast.parse(textwrap.dedent("\n".join(text for _, text in lines)))
+    except (SyntaxError, ValueError):
+        return _indented_definitions(lines)
+    first = lines[0][0]
+    definitions: List[Definition] = []
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                name = f"{prefix}{child.name}"
+                # Decorators belong to the definition they decorate
+                start = min([child.lineno] + [decorator.lineno for decorator in child.decorator_list])
+                definitions.append(Definition(name, first + start - 1, first + child.end_lineno - 1))
+                visit(child, f"{name}.")
+            else:
+                visit(child, prefix)
+
+    visit(tree, "")
+    return definitions
+
+
+def _indented_definitions(lines: List[Tuple[int, str]]) -> List[Definition]:
+    # A definition runs until the next non-blank line indented at most as far as its header
+    definitions: List[Definition] = []
+    open_definitions: List[Tuple[int, Definition]] = []
+    last_line = lines[0][0] if lines else 0
+    for number, text in lines:
+        if not text.strip():
+            continue
+        indent = len(text) - len(text.lstrip())
+        while open_definitions and indent <= open_definitions[-1][0]:
+            open_definitions.pop()[1].end = last_line
+        match = _PY_DEFINITION_RE.match(text)
+        if match:
+            names = [definition.name for _, definition in open_definitions[-1:]]
+            definition = Definition(".".join(names + [match.group(2)]), number, number)
+            definitions.append(definition)
+            open_definitions.append((indent, definition))
+        last_line = number
+    for _, definition in open_definitions:
+        definition.end = last_line
+    return definitions
+
+
+def brace_signature_name(text: str) -> Optional[str]:
+    """
+    Name defined by a signature line of a brace language, if it is one.
+    """
+    for pattern in _BRACE_SIGNATURE_RES:
+        match = pattern.search(text)
+        if match and match.group(1) not in _NOT_NAMES:
+            return match.group(1)
+    return None
+
+
+def _brace_definitions(lines: List[Tuple[int, str]]) -> List[Definition]:
+    # A definition runs from its signature to the brace closing the body the signature opened
+    definitions: List[Definition] = []
+    open_definitions: List[Tuple[int, Definition]] = []
+    depth = 0
+    pending: Optional[Definition] = None
+    in_comment = False
+    last_line = lines[0][0] if lines else 0
+    for number, text in lines:
+        if in_comment:
+            if "*/" not in text:
+                continue
+            text = text.split("*/", 1)[1]
+            in_comment = False
+        code = _BRACE_STRIP_RE.sub('""', text)
+        code = re.sub(r"/\*.*?\*/", " ", code)
+        if "/*" in code:
+            code, in_comment = code.split("/*", 1)[0], True
+
+        if pending is not None and not code.lstrip().startswith("{"):
+            # The body of a signature opens on its own line or not at all
+            pending = None
+        name = brace_signature_name(code) if code.strip() else None
+        if name:
+            names = [definition.name for _, definition in open_definitions[-1:]]
+            pending = Definition(".".join(names + [name]), number, number)
+        for char in code:
+            if char == "{":
+                if pending is not None:
+                    definitions.append(pending)
+                    open_definitions.append((depth, pending))
+                    pending = None
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                while open_definitions and open_definitions[-1][0] >= depth:
+                    open_definitions.pop()[1].end = number
+            elif char == ";":
+                # A declaration without a body
+                pending = None
+        last_line = number
+    for _, definition in open_definitions:
+        definition.end = last_line
+    return definitions
+
+
+def find_definitions(language: Optional[str], lines: List[Tuple[int, str]]) -> List[Definition]:
+    """
+    Find the definitions in consecutive new-side lines of a file.
+
+    Args:
+        language: Catalogue language of the file
+        lines: (new-side line number, text) pairs
+
+    Returns:
+        The definitions, outer ones before the definitions they contain
+    """
+    if not lines:
+        return []
+    if language == "python":
+        return _python_definitions(lines)
+    if language in BRACE_LANGUAGES:
+        return _brace_definitions(lines)
+    return []
+
+
+def _context_symbol(language: Optional[str], context: str) -> Optional[str]:
+    # Name in the function context git writes after a hunk header
+    if not context.strip():
+        return None
+    if language == "python":
+        match = _PY_DEFINITION_RE.match(context)
+        return match.group(2) if match else None
+    return brace_signature_name(context)
+
+
+def split_hunk(language: Optional[str], hunk_text: str, old_start: int, new_start: int) -> List[Tuple[str, str]]:
+    """
+    Map a hunk to its enclosing definitions, splitting it where its changes
+    move from one definition to another.
+
+    Args:
+        language: Catalogue language of the file
+        hunk_text: The hunk, from its `@@` header line
+        old_start: Old-side start line from the header
+        new_start: New-side start line from the header
+
+    Returns:
+        (symbol, hunk text) pairs; split pieces get their own `@@` headers
+    """
+    lines = hunk_text.splitlines()
+    header = lines[0]
+    body = [line for line in lines[1:] if not line.startswith("\\")]
+    match = _HUNK_CONTEXT_RE.match(header)
+    context_symbol = _context_symbol(language, match.group(1) if match else "")
+
+    # New-side position of every body line (a removed line sits before the next new-side line)
+    positions: List[int] = []
+    new_side: List[Tuple[int, str]] = []
+    number = new_start
+    for line in body:
+        positions.append(number)
+        if line[:1] != "-":
+            new_side.append((number, line[1:]))
+            number += 1
+    definitions = find_definitions(language, new_side)
+
+    def symbol_at(position: int) -> str:
+        enclosing = [definition for definition in definitions if definition.start <= position <= definition.end]
+        if enclosing:
+            return max(enclosing, key=lambda definition: definition.start).name
+        if all(definition.start > position for definition in definitions):
+            # Before the first definition of the hunk, still inside the one git named
+            return context_symbol or MODULE_SYMBOL
+        return MODULE_SYMBOL
+
+    symbols = [symbol_at(position) for position in positions]
+    changes = [index for index, line in enumerate(body) if line[:1] in ("+", "-")]
+    if not changes:
+        return [(context_symbol or MODULE_SYMBOL, hunk_text)]
+
+    # Cut between two changes of different definitions, where the second definition's lines begin
+    cuts = [0]
+    segment_symbol = symbols[changes[0]]
+    previous = changes[0]
+    for index in changes[1:]:
+        if symbols[index] != segment_symbol:
+            cut = index
+            while cut - 1 > previous and symbols[cut - 1] == symbols[index]:
+                cut -= 1
+            cuts.append(cut)
+            segment_symbol = symbols[index]
+        previous = index
+    if len(cuts) == 1:
+        return [(segment_symbol, hunk_text)]
+
+    pieces = []
+    old_number, new_number = old_start, new_start
+    for piece_start, piece_end in zip(cuts, cuts[1:] + [len(body)]):
+        piece = body[piece_start:piece_end]
+        old_count = sum(1 for line in piece if line[:1] != "+")
+        new_count = sum(1 for line in piece if line[:1] != "-")
+        piece_symbol = next(symbols[index] for index in changes if piece_start <= index < piece_end)
+        piece_header = f"@@ -{old_number},{old_count} +{new_number},{new_count} @@"
+        pieces.append((piece_symbol, "\n".join([piece_header] + piece) + "\n"))
+        old_number += old_count
+        new_number += new_count
+    return pieces
+
+
+def _fingerprint(path: str, symbol: str, hunk_texts: List[str]) -> str:
+    # Changed lines only, whitespace-normalized: line numbers and context do not matter
+    digest = hashlib.sha256(f"{path}\0{symbol}\0".encode("utf-8"))
+    for hunk_text in hunk_texts:
+        for line in hunk_text.splitlines()[1:]:
+            if line[:1] in ("+", "-"):
+                digest.update(line[:1].encode("utf-8"))
+                digest.update(_WHITESPACE_RE.sub(" ", line[1:].strip()).encode("utf-8"))
+                digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def file_units(parsed: ParsedDiff, file_diff: FileDiff) -> List[DiffUnit]:
+    """
+    Group the hunks of one file by enclosing definition.
+
+    Args:
+        parsed: The parsed diff
+        file_diff: One of its files
+
+    Returns:
+        The file's units, in order of their first hunk
+    """
+    buffer = parsed.view
+    if not file_diff.hunks:
+        unit = DiffUnit(file_diff.path, MODULE_SYMBOL, parsed.section_text(file_diff))
+        unit.fingerprint = _fingerprint(file_diff.path, MODULE_SYMBOL, [unit.header])
+        return [unit]
+
+    header = str(buffer[file_diff.start:file_diff.hunks[0].start], "utf-8", "replace")
+    units: Dict[str, DiffUnit] = {}
+    for hunk in file_diff.hunks:
+        hunk_text = str(buffer[hunk.start:hunk.end], "utf-8", "replace")
+        for symbol, piece in split_hunk(file_diff.language, hunk_text, hunk.old_start, hunk.new_start):
+            if symbol not in units:
+                units[symbol] = DiffUnit(file_diff.path, symbol, header)
+            units[symbol].hunk_texts.append(piece)
+    for unit in units.values():
+        unit.fingerprint = _fingerprint(unit.path, unit.symbol, unit.hunk_texts)
+    return list(units.values())
+
+
+def chunk_diff(diff_text: str) -> List[DiffUnit]:
+    """
+    Split a diff into units of hunks that change the same definition.
+
+    Args:
+        diff_text: The diff to split
+
+    Returns:
+        The units, file by file
+    """
+    parsed = parse_diff(diff_text)
+    units: List[DiffUnit] = []
+    for file_diff in parsed.files:
+        units.extend(file_units(parsed, file_diff))
+    logger.debug(f"Chunked {len(parsed.files)} files into {len(units)} definition units")
+    return units
@@ -0,0 +1,309 @@
+"""
+Token-minimising compaction of diffs before they are rendered into a prompt.
+
+Topics come from the code a change adds, so most of a verbatim diff is noise
+to the model. compact_diff() rewrites the residue the topic rules could not
+explain:
+
+- file and hunk headers are kept; `index` lines and no-newline markers are dropped
+- removed lines are dropped (a hunk that only removes code becomes a
+  one-line `~` note)
+- context lines are dropped unless they are import or signature lines, or
+  within `context_lines` of an added line
+- hunks that only change whitespace, and runs of lines moved elsewhere in
+  the diff, are folded into a `~` note
+- string literals longer than `max_literal` characters are truncated
+- runs of more than `max_data_lines` added data lines (numbers, strings,
+  JSON-like rows) keep their first lines and a `~` note
+
+Notes start with `~`, so the result still parses as a diff (see diff_parser)
+and can be routed and chunked like the original. Each call reports the token
+savings, and compaction_stats() sums them since start-up.
+"""
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+from django.conf import settings
+
+from .tokens import estimate_tokens
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Changed lines of at least this many characters (whitespace removed) count for move detection,
+# and runs of at least MIN_MOVED_RUN such lines are folded
+MIN_MOVED_LENGTH = 8
+MIN_MOVED_RUN = 3
+# Data lines kept at the start of a folded data run
+DATA_LINES_KEPT = 2
+# Characters kept from a truncated string literal
+LITERAL_KEPT = 32
+
+_IMPORT_RE = re.compile(
+    r"^\s*(?:import\s|from\s+\S+\s+import\s|export\s+.*\sfrom\s|#\s*include\s|use\s+[\w:]+|package\s|"
+    r"require\s*\(|.*=\s*require\s*\(|using\s+[\w.]+;)"
+)
+_SIGNATURE_RE = re.compile(
+    r"^\s*(?:@\w+|(?:async\s+)?def\s+\w+|class\s+\w+|(?:export\s+)?(?:default\s+)?(?:async\s+)?function\b|"
+    r"(?:pub(?:\([\w:]+\))?\s+)?(?:async\s+)?fn\s+\w+|func\s+|interface\s+\w+|type\s+\w+|struct\s+\w+|"
+    r"(?:export\s+)?(?:const|let|var)\s+\w+\s*=\s*(?:async\s+)?(?:\([^)]*\)|\w+)\s*=>|"
+    r"(?:(?:public|private|protected|static|final|abstract|override)\s+)+[\w<>\[\], ]+\s+\w+\s*\()"
+)
+_STRING_RE = re.compile(r"""("(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|`(?:[^`\\]|\\.)*`)""")
+_NUMBER_RE = re.compile(r"[-+]?(?:0[xX][0-9a-fA-F]+|\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)")
+_KEYWORD_LITERAL_RE = re.compile(r"\b(?:true|false|null|None|True|False|nil|undefined)\b")
+_DATA_PUNCTUATION = set(",:;[]{}() \t")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class CompactionResult:
+    """
+    A compacted diff and what compaction saved.
+
+    Attributes:
+        text: The compacted diff
+        tokens_before: Estimated tokens of the input
+        tokens_after: Estimated tokens of the output
+        actions: Counts of what was dropped, folded or truncated
+    """
+    __slots__ = ("text", "tokens_before", "tokens_after", "actions")
+
+    def __init__(self, text: str, tokens_before: int, tokens_after: int, actions: Counter):
+        self.text = text
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+        self.actions = actions
+
+    @property
+    def saved_ratio(self) -> float:
+        """Fraction of the input's tokens saved"""
+        if not self.tokens_before:
+            return 0.0
+        return 1.0 - self.tokens_after / self.tokens_before
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "saved_ratio": round(self.saved_ratio, 3),
+            "actions": dict(self.actions),
+        }
+
+
+def _normalize(line: str) -> str:
+    return _WHITESPACE_RE.sub("", line)
+
+
+def is_import_line(line: str) -> bool:
+    return bool(_IMPORT_RE.match(line))
+
+
+def is_signature_line(line: str) -> bool:
+    return bool(_SIGNATURE_RE.match(line))
+
+
+def is_data_line(line: str) -> bool:
+    """
+    Whether a line holds only literals and separators (array rows, JSON entries).
+    """
+    stripped = _STRING_RE.sub("", line)
+    literals = len(line) != len(stripped)
+    stripped, count = _NUMBER_RE.subn("", stripped)
+    stripped, keyword_count = _KEYWORD_LITERAL_RE.subn("", stripped)
+    literals = literals or count or keyword_count
+    return bool(literals) and all(char in _DATA_PUNCTUATION for char in stripped)
+
+
+def _truncate_literals(line: str, max_literal: int, actions: Counter) -> str:
+    def shorten(match):
+        literal = match.group(0)
+        if len(literal) <= max_literal:
+            return literal
+        actions["literals_truncated"] += 1
+        quote = literal[0]
+        return f"{literal[:LITERAL_KEPT + 1]}...{quote}"
+    return _STRING_RE.sub(shorten, line)
+
+
+def _moved_keys(lines: List[str]) -> Set[str]:
+    # Normalized lines that are both removed and added somewhere in the diff
+    removed, added = set(), set()
+    in_hunk = False
+    for line in lines:
+        if line.startswith("diff --git "):
+            in_hunk = False
+        elif line.startswith("@@"):
+            in_hunk = True
+        elif in_hunk and line[:1] in ("+", "-"):
+            key = _normalize(line[1:])
+            if len(key) >= MIN_MOVED_LENGTH:
+                (added if line[0] == "+" else removed).add(key)
+    return removed & added
+
+
+class _Compactor:
+    def __init__(self, context_lines: int, max_literal: int, max_data_lines: int, moved: Set[str]):
+        self.context_lines = context_lines
+        self.max_literal = max_literal
+        self.max_data_lines = max_data_lines
+        self.moved = moved
+        self.actions: Counter = Counter()
+
+    def hunk(self, header: str, body: List[str]) -> List[str]:
+        added = [line[1:] for line in body if line.startswith("+")]
+        removed = [line[1:] for line in body if line.startswith("-")]
+
+        if added and removed and Counter(map(_normalize, added)) == Counter(map(_normalize, removed)):
+            self.actions["whitespace_hunks_folded"] += 1
+            return [header, f"~ whitespace-only change to {len(added)} lines"]
+        if not added:
+            self.actions["removed_lines_dropped"] += len(removed)
+            return [header, f"~ {len(removed)} lines removed"] if removed else []
+
+        # Indices of added lines that are part of a moved run
+        moved_run: Set[int] = set()
+        run: List[int] = []
+        for index, line in enumerate(body + [" "]):
+            if line.startswith("+") and _normalize(line[1:]) in self.moved:
+                run.append(index)
+                continue
+            if len(run) >= MIN_MOVED_RUN:
+                moved_run.update(run)
+            run = []
+
+        # Positions of added lines, for the context window
+        added_positions = [index for index, line in enumerate(body) if line.startswith("+")]
+
+        def near_change(index: int) -> bool:
+            return any(abs(index - position) <= self.context_lines for position in added_positions)
+
+        output = [header]
+        data_run: List[str] = []
+
+        def flush_data():
+            if len(data_run) > self.max_data_lines:
+                output.extend(data_run[:DATA_LINES_KEPT])
+                output.append(f"~ {len(data_run) - DATA_LINES_KEPT} more data lines")
+                self.actions["data_lines_folded"] += len(data_run) - DATA_LINES_KEPT
+            else:
+                output.extend(data_run)
+            data_run.clear()
+
+        index = 0
+        while index < len(body):
+            line = body[index]
+            if index in moved_run:
+                start = index
+                while index in moved_run:
+                    index += 1
+                flush_data()
+                output.append(f"~ {index - start} lines moved from elsewhere in the diff")
+                self.actions["moved_lines_folded"] += index - start
+                continue
+
+            index += 1
+            marker, content = line[:1], line[1:].rstrip()
+            if marker == "-":
+                self.actions["removed_lines_dropped"] += 1
+                continue
+            if marker != "+":
+                if is_import_line(content) or is_signature_line(content) or (
+                        self.context_lines and near_change(index - 1)):
+                    flush_data()
+                    output.append(f" {content}")
+                else:
+                    self.actions["context_lines_dropped"] += 1
+                continue
+            if not content.strip():
+                self.actions["blank_lines_dropped"] += 1
+                continue
+            content = _truncate_literals(content, self.max_literal, self.actions)
+            if is_data_line(content) and not is_import_line(content):
+                data_run.append(f"+{content}")
+                continue
+            flush_data()
+            output.append(f"+{content}")
+        flush_data()
+        return output
+
+
+def compact_diff(diff_text: str, context_lines: Optional[int] = None, max_literal: Optional[int] = None,
+                 max_data_lines: Optional[int] = None) -> CompactionResult:
+    """
+    Compact a diff for prompting.
+
+    Args:
+        diff_text: The (filtered) diff to compact
+        context_lines: Context lines kept around added lines, besides import and
+            signature lines (default: BRAINVIBE_COMPACTION_CONTEXT_LINES)
+        max_literal: Longest string literal kept whole (default: BRAINVIBE_COMPACTION_MAX_LITERAL)
+        max_data_lines: Longest run of added data lines kept whole
+            (default: BRAINVIBE_COMPACTION_MAX_DATA_LINES)
+
+    Returns:
+        A CompactionResult
+    """
+    if context_lines is None:
+        context_lines = getattr(settings, 'BRAINVIBE_COMPACTION_CONTEXT_LINES', 0)
+    if max_literal is None:
+        max_literal = getattr(settings, 'BRAINVIBE_COMPACTION_MAX_LITERAL', 80)
+    if max_data_lines is None:
+        max_data_lines = getattr(settings, 'BRAINVIBE_COMPACTION_MAX_DATA_LINES', 6)
+
+    lines = diff_text.splitlines()
+    compactor = _Compactor(context_lines, max_literal, max_data_lines, _moved_keys(lines))
+    output: List[str] = []
+    header: Optional[str] = None
+    body: List[str] = []
+    in_hunk = False
+
+    def flush_hunk():
+        if header is not None:
+            output.extend(compactor.hunk(header, body))
+
+    for line in lines:
+        if line.startswith("diff --git "):
+            flush_hunk()
+            header, body, in_hunk = None, [], False
+            output.append(line)
+        elif line.startswith("@@"):
+            flush_hunk()
+            header, body, in_hunk = line, [], True
+        elif in_hunk:
+            if line.startswith("\\"):
+                continue
+            body.append(line)
+        elif line.startswith("index ") or line.startswith("similarity index "):
+            compactor.actions["header_lines_dropped"] += 1
+        else:
+            output.append(line)
+    flush_hunk()
+
+    text = "\n".join(output) + "\n" if output else ""
+    result = CompactionResult(text, estimate_tokens(diff_text), estimate_tokens(text), compactor.actions)
+    _record(result)
+    return result
+
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+def _record(result: CompactionResult):
+    with _stats_lock:
+        _stats["diffs"] += 1
+        _stats["tokens_before"] += result.tokens_before
+        _stats["tokens_after"] += result.tokens_after
+    logger.debug(f"Diff compaction {json.dumps(result.to_dict(), sort_keys=True)}")
+
+
+def compaction_stats() -> Dict[str, int]:
+    """
+    Diffs compacted and their token totals before and after since start-up.
+    """
+    with _stats_lock:
+        return dict(_stats)
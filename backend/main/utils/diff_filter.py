@@ -0,0 +1,356 @@
+"""
+Streaming, file-aware filter that drops irrelevant files from a Git diff.
+
+Decisions are made per file at its `diff --git` header (ignore patterns), in
+its header block (binary markers) and at hunk headers (size of generated JSON),
+never by searching content lines for path fragments. A file is also dropped
+as soon as one of its lines looks minified. Input is consumed line by line
+and kept file sections are yielded one at a time, so memory is bounded by the
+largest kept file rather than by the whole diff.
+"""
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from typing import Iterable, Iterator, List, Optional, Union
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Patterns applied on top of any .brainvibeignore file (gitignore-style)
+DEFAULT_IGNORE_PATTERNS = [
+    "node_modules/",
+    "bower_components/",
+    "dist/",
+    "build/",
+    ".git/",
+    "__pycache__/",
+    "venv/",
+    ".venv/",
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "*.lock",
+    "package-lock.json",
+    "npm-shrinkwrap.json",
+    "pnpm-lock.yaml",
+    "go.sum",
+]
+
+# Lines longer than this are treated as minified/generated code
+MAX_LINE_LENGTH = 1000
+# JSON files adding more lines than this are treated as generated data
+MAX_JSON_LINES = 2000
+
+_HUNK_HEADER_RE = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+
+
+def _glob_to_regex(glob: str) -> str:
+    # Translate a gitignore glob; "*" and "?" never cross a path separator
+    parts = []
+    index, length = 0, len(glob)
+    while index < length:
+        char = glob[index]
+        if char == "*":
+            if glob.startswith("**/", index):
+                parts.append("(?:.*/)?")
+                index += 3
+                continue
+            if glob.startswith("**", index):
+                parts.append(".*")
+                index += 2
+                continue
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = glob.find("]", index + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = glob[index + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                index = end
+        else:
+            parts.append(re.escape(char))
+        index += 1
+    return "".join(parts)
+
+
+def _pattern_to_regex(pattern: str) -> str:
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    body = _glob_to_regex(pattern.lstrip("/"))
+    # Unanchored patterns match any path component; anchored ones start at the root
+    prefix = "^" if anchored else "(?:^|/)"
+    # A directory pattern must be followed by more path; others may also match a parent directory
+    suffix = "/" if directory_only else "(?:/|$)"
+    return f"{prefix}{body}{suffix}"
+
+
+class IgnoreMatcher:
+    """
+    gitignore-style path matcher compiled into a single regular expression.
+
+    Supported syntax: `*`, `**`, `?`, `[...]`, trailing `/` for directories,
+    a `/` inside the pattern to anchor it at the repository root, and `!` to
+    re-include paths. Unlike git, negations apply regardless of their position
+    in the file.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        ignore, negate = [], []
+        for raw in patterns:
+            pattern = raw.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            target = ignore
+            if pattern.startswith("!"):
+                target, pattern = negate, pattern[1:]
+            elif pattern.startswith("\\"):
+                pattern = pattern[1:]
+            if pattern:
+                target.append(_pattern_to_regex(pattern))
+        self.patterns = len(ignore) + len(negate)
+        self._ignore = re.compile("|".join(ignore)) if ignore else None
+        self._negate = re.compile("|".join(negate)) if negate else None
+
+    def is_ignored(self, path: str) -> bool:
+        """
+        Check whether a repository-relative path is ignored.
+        """
+        if self._ignore is None or not self._ignore.search(path):
+            return False
+        return not (self._negate and self._negate.search(path))
+
+
+def read_ignore_file(path: str) -> List[str]:
+    """
+    Read the patterns of a .brainvibeignore file (missing files give no patterns).
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.rstrip("\n") for line in f]
+    except OSError:
+        return []
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_ignore_matcher(ignore_file: Optional[str] = None) -> IgnoreMatcher:
+    """
+    Return the compiled matcher for the default patterns plus an ignore file.
+
+    Matchers are cached per file and rebuilt when the file changes.
+
+    Args:
+        ignore_file: Path of a .brainvibeignore file (defaults to the
+            BRAINVIBE_IGNORE_FILE setting, if any)
+
+    Returns:
+        An IgnoreMatcher
+    """
+    if ignore_file is None:
+        from django.conf import settings
+        ignore_file = getattr(settings, 'BRAINVIBE_IGNORE_FILE', '') or ''
+    try:
+        version = os.stat(ignore_file).st_mtime_ns if ignore_file else None
+    except OSError:
+        version = None
+    with _matchers_lock:
+        cached = _matchers.get(ignore_file)
+        if cached and cached[0] == version:
+            return cached[1]
+    matcher = IgnoreMatcher(DEFAULT_IGNORE_PATTERNS + (read_ignore_file(ignore_file) if version else []))
+    with _matchers_lock:
+        _matchers[ignore_file] = (version, matcher)
+    return matcher
+
+
+_PATH_ESCAPES = {"a": "\a", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+
+
+def _unquote_path(quoted: str) -> str:
+    # Undo git's C-style quoting; octal escapes are UTF-8 bytes
+    raw = bytearray()
+    index, length = 0, len(quoted)
+    while index < length:
+        char = quoted[index]
+        if char == "\\" and index + 1 < length:
+            octal = quoted[index + 1:index + 4]
+            if len(octal) == 3 and all(digit in "01234567" for digit in octal):
+                raw.append(int(octal, 8))
+                index += 4
+                continue
+            raw.extend(_PATH_ESCAPES.get(quoted[index + 1], quoted[index + 1]).encode("utf-8"))
+            index += 2
+            continue
+        raw.extend(char.encode("utf-8"))
+        index += 1
+    return raw.decode("utf-8", "replace")
+
+
+def parse_diff_header(line: str) -> str:
+    """
+    Extract the new path from a `diff --git a/<old> b/<new>` header line.
+
+    Quoted paths (used by git for unusual characters) are unquoted.
+    """
+    rest = line[len("diff --git "):].rstrip("\r\n")
+    if rest.endswith('"'):
+        start = rest.rfind(' "', 0, len(rest) - 1)
+        path = _unquote_path(rest[start + 2:-1] if start != -1 else rest.strip('"'))
+        return path[2:] if path.startswith("b/") else path
+    # Both sides normally carry the same path, so split in the middle
+    half = len(rest) // 2
+    if rest[half:half + 3] == " b/" and rest[:2] == "a/":
+        return rest[half + 3:]
+    return rest.rsplit(" b/", 1)[-1]
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """
+    Lazily split text into lines, keeping line endings.
+    """
+    start, length = 0, len(text)
+    while start < length:
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end + 1]
+        start = end + 1
+
+
+class DiffFilter:
+    """
+    Single-pass filter over the file sections of a unified Git diff.
+
+    Content lines always start with " ", "+", "-" or "\\", so only real
+    `diff --git` headers start a new file, and `+++`, `Binary files` or
+    `GIT binary patch` lines are only interpreted in a file's header block.
+    Text before the first `diff --git` header (e.g. a plain `diff -u`) is
+    treated as one file without a path.
+    """
+
+    def __init__(self, matcher: Optional[IgnoreMatcher] = None, max_line_length: int = MAX_LINE_LENGTH,
+                 max_json_lines: int = MAX_JSON_LINES):
+        """
+        Args:
+            matcher: Ignore matcher (defaults to get_ignore_matcher())
+            max_line_length: Line length above which a file counts as minified
+            max_json_lines: Added lines above which a JSON file counts as generated
+        """
+        self.matcher = matcher or get_ignore_matcher()
+        self.max_line_length = max_line_length
+        self.max_json_lines = max_json_lines
+        # Files kept, and files dropped per reason
+        self.stats: Counter = Counter()
+
+    def iter_sections(self, source: Union[str, Iterable[str]]) -> Iterator[str]:
+        """
+        Yield the text of every kept file section.
+
+        Args:
+            source: The diff text, or an iterable of lines (e.g. an open file)
+
+        Yields:
+            Kept file sections, in order
+        """
+        lines = iter_lines(source) if isinstance(source, str) else source
+        section: List[str] = []
+        path = ""
+        # State of the current file: keep, drop, and whether we are past its header block
+        dropping = False
+        in_hunks = False
+        is_json = False
+        json_lines = 0
+
+        for line in lines:
+            if line.startswith("diff --git "):
+                if section:
+                    self.stats["kept"] += 1
+                    yield "".join(section)
+                section = []
+                path = parse_diff_header(line)
+                in_hunks = False
+                is_json = path.lower().endswith(".json")
+                json_lines = 0
+                dropping = self.matcher.is_ignored(path)
+                if dropping:
+                    self.stats["ignored"] += 1
+                else:
+                    section.append(line)
+                continue
+
+            if dropping:
+                continue
+
+            if line.startswith("@@"):
+                in_hunks = True
+                if is_json:
+                    match = _HUNK_HEADER_RE.match(line)
+                    if match:
+                        json_lines += int(match.group(2) if match.group(2) is not None else 1)
+                    if json_lines > self.max_json_lines:
+                        dropping = self._drop("generated_json", path, section)
+                        continue
+            elif not in_hunks:
+                if line.startswith("Binary files ") or line.startswith("GIT binary patch"):
+                    dropping = self._drop("binary", path, section)
+                    continue
+            elif len(line) > self.max_line_length and line[:1] in "+- ":
+                dropping = self._drop("minified", path, section)
+                continue
+
+            section.append(line)
+
+        if section and not dropping:
+            self.stats["kept"] += 1
+            yield "".join(section)
+
+    def _drop(self, reason: str, path: str, section: List[str]) -> bool:
+        logger.debug(f"Dropping {path or 'diff'} from analysis ({reason})")
+        self.stats[reason] += 1
+        section.clear()
+        return True
+
+
+def iter_kept_sections(source: Union[str, Iterable[str]],
+                       matcher: Optional[IgnoreMatcher] = None) -> Iterator[str]:
+    """
+    Lazily yield the file sections of a diff that are worth analyzing.
+
+    Args:
+        source: The diff text, or an iterable of lines
+        matcher: Optional ignore matcher (defaults to get_ignore_matcher())
+
+    Yields:
+        Kept file sections
+    """
+    return DiffFilter(matcher).iter_sections(source)
+
+
+def filter_diff(diff_text: str, matcher: Optional[IgnoreMatcher] = None) -> str:
+    """
+    Remove ignored, binary and generated files from a diff.
+
+    Args:
+        diff_text: The Git diff to filter
+        matcher: Optional ignore matcher (defaults to get_ignore_matcher())
+
+    Returns:
+        The filtered diff
+    """
+    diff_filter = DiffFilter(matcher)
+    filtered = "".join(diff_filter.iter_sections(diff_text or ""))
+    dropped = sum(count for reason, count in diff_filter.stats.items() if reason != "kept")
+    if dropped:
+        logger.info(f"Diff filter dropped {dropped} files: {dict(diff_filter.stats)}")
+    return filtered
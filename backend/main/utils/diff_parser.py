@@ -0,0 +1,290 @@
+"""
+Structured unified-diff parser shared by the analysis stages.
+
+The diff is encoded once into a bytes buffer. Files and hunks are found with
+C-level `find`/`count` calls on that buffer and recorded as `__slots__`
+objects holding offsets into it, so parsing creates no per-line strings.
+Stages ask the parsed diff for counts, language tags and added/changed lines;
+line text is only decoded when a stage actually iterates over it.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .diff_filter import parse_diff_header
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "python", ".pyi": "python",
+    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".cjs": "javascript",
+    ".ts": "javascript", ".tsx": "javascript", ".vue": "javascript", ".svelte": "javascript",
+    ".go": "go",
+    ".java": "java", ".kt": "java", ".scala": "java",
+    ".rs": "rust",
+    ".c": "cpp", ".h": "cpp", ".cc": "cpp", ".cpp": "cpp", ".cxx": "cpp", ".hpp": "cpp",
+    ".rb": "ruby",
+}
+
+_FILE_HEADER = b"diff --git "
+_HUNK_RE = re.compile(rb"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_ADDED_RE = re.compile(rb"^\+([^\r\n]*)", re.M)
+_CHANGED_RE = re.compile(rb"^[+-]([^\r\n]*)", re.M)
+
+
+def detect_language(file_path: str) -> Optional[str]:
+    """
+    Map a file path to a catalogue language by its extension.
+
+    Args:
+        file_path: Path of the changed file
+
+    Returns:
+        The language name, or None if unknown
+    """
+    return LANGUAGE_BY_EXTENSION.get(os.path.splitext(file_path or "")[1].lower())
+
+
+class Hunk:
+    """
+    One hunk of a file diff, as offsets into the diff buffer.
+
+    Attributes:
+        start: Offset of the `@@` header line
+        body_start: Offset of the first line after the header
+        end: Offset just past the hunk
+        old_start, old_count, new_start, new_count: Line ranges from the header
+    """
+    __slots__ = ("start", "body_start", "end", "old_start", "old_count", "new_start", "new_count")
+
+    def __init__(self, start: int, body_start: int, end: int,
+                 old_start: int, old_count: int, new_start: int, new_count: int):
+        self.start = start
+        self.body_start = body_start
+        self.end = end
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+
+
+class FileDiff:
+    """
+    One file section of a diff, as offsets into the diff buffer.
+
+    Attributes:
+        path: New path of the file ("" for a plain diff without headers)
+        start: Offset of the section (its `diff --git` line, if any)
+        end: Offset just past the section
+        hunks: The file's hunks
+        added: Number of added lines
+        removed: Number of removed lines
+        is_binary: Whether git reported a binary change
+        is_new: Whether the file was created
+        is_deleted: Whether the file was deleted
+    """
+    __slots__ = ("path", "start", "end", "hunks", "added", "removed", "is_binary", "is_new", "is_deleted",
+                 "_language")
+
+    def __init__(self, path: str, start: int, end: int):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.hunks: List[Hunk] = []
+        self.added = 0
+        self.removed = 0
+        self.is_binary = False
+        self.is_new = False
+        self.is_deleted = False
+        self._language = False
+
+    @property
+    def language(self) -> Optional[str]:
+        """Catalogue language of the file, from its extension"""
+        if self._language is False:
+            self._language = detect_language(self.path)
+        return self._language
+
+
+class ParsedDiff:
+    """
+    A unified diff parsed into file and hunk records over a single buffer.
+    """
+
+    def __init__(self, buffer: bytes):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.files: List[FileDiff] = []
+        self._parse()
+
+    # Parsing
+
+    def _parse(self):
+        buffer = self.buffer
+        length = len(buffer)
+        headers = []
+        position = 0 if buffer.startswith(_FILE_HEADER) else buffer.find(b"\n" + _FILE_HEADER)
+        while position != -1:
+            if buffer[position] == 0x0A:
+                position += 1
+            headers.append(position)
+            position = buffer.find(b"\n" + _FILE_HEADER, position)
+
+        # Text before the first header is a plain diff (e.g. `diff -u`) without a path
+        preamble_end = headers[0] if headers else length
+        if buffer[:preamble_end].strip():
+            self.files.append(self._parse_file(0, preamble_end, has_header=False))
+
+        for index, start in enumerate(headers):
+            end = headers[index + 1] if index + 1 < len(headers) else length
+            self.files.append(self._parse_file(start, end, has_header=True))
+
+    def _line_end(self, position: int, limit: int) -> int:
+        end = self.buffer.find(b"\n", position, limit)
+        return limit if end == -1 else end + 1
+
+    def _parse_file(self, start: int, end: int, has_header: bool) -> FileDiff:
+        buffer = self.buffer
+        path = ""
+        if has_header:
+            path = parse_diff_header(buffer[start:self._line_end(start, end)].decode("utf-8", "replace"))
+
+        first_hunk = start if buffer.startswith(b"@@ ", start) else buffer.find(b"\n@@ ", start, end)
+        if first_hunk == -1:
+            header_end = end
+        else:
+            header_end = first_hunk + 1 if buffer[first_hunk] == 0x0A else first_hunk
+
+        file_diff = FileDiff(path, start, end)
+        # Only the short header block is inspected for markers
+        file_diff.is_binary = (buffer.find(b"\nBinary files ", start, header_end) != -1
+                               or buffer.find(b"\nGIT binary patch", start, header_end) != -1)
+        file_diff.is_new = buffer.find(b"\nnew file mode", start, header_end) != -1
+        file_diff.is_deleted = buffer.find(b"\ndeleted file mode", start, header_end) != -1
+        plus = buffer.find(b"\n+++ ", start, header_end)
+        line_start = plus + 1 if plus != -1 else (start if buffer.startswith(b"+++ ", start) else -1)
+        if line_start != -1:
+            target = buffer[line_start + 4:self._line_end(line_start, header_end)].decode("utf-8", "replace")
+            target = target.split("\t", 1)[0].strip()
+            # The +++ line is exact even when the path contains " b/"
+            if target != "/dev/null" and (not has_header or target.startswith("b/")):
+                file_diff.path = target[2:] if target.startswith("b/") else target
+
+        if first_hunk == -1 and not has_header:
+            # Bare +/- lines without hunk headers: treat the text as a single hunk
+            file_diff.hunks.append(Hunk(start, start, end, 0, 0, 0, 0))
+            file_diff.added = buffer.count(b"\n+", start, end) + buffer.startswith(b"+", start)
+            file_diff.removed = buffer.count(b"\n-", start, end) + buffer.startswith(b"-", start)
+            return file_diff
+
+        hunk_start = header_end if first_hunk != -1 else -1
+        while hunk_start != -1:
+            next_hunk = buffer.find(b"\n@@ ", hunk_start, end)
+            hunk_end = end if next_hunk == -1 else next_hunk + 1
+            body_start = self._line_end(hunk_start, hunk_end)
+            match = _HUNK_RE.match(buffer, hunk_start, body_start)
+            if match:
+                old_start, old_count, new_start, new_count = match.groups()
+                file_diff.hunks.append(Hunk(
+                    hunk_start, body_start, hunk_end,
+                    int(old_start), int(old_count) if old_count is not None else 1,
+                    int(new_start), int(new_count) if new_count is not None else 1
+                ))
+                # Every body line follows a newline, starting with the header's own
+                file_diff.added += buffer.count(b"\n+", body_start - 1, hunk_end)
+                file_diff.removed += buffer.count(b"\n-", body_start - 1, hunk_end)
+            hunk_start = -1 if next_hunk == -1 else next_hunk + 1
+        return file_diff
+
+    # Summary
+
+    @property
+    def added(self) -> int:
+        """Added lines over all files"""
+        return sum(f.added for f in self.files)
+
+    @property
+    def removed(self) -> int:
+        """Removed lines over all files"""
+        return sum(f.removed for f in self.files)
+
+    @property
+    def line_count(self) -> int:
+        """Number of lines in the diff text"""
+        if not self.buffer:
+            return 0
+        return self.buffer.count(b"\n") + (0 if self.buffer.endswith(b"\n") else 1)
+
+    def languages(self) -> Counter:
+        """Added line counts per language (None for unknown languages)"""
+        counts = Counter()
+        for file_diff in self.files:
+            counts[file_diff.language] += file_diff.added
+        return counts
+
+    def summary(self) -> Dict[str, Any]:
+        """Counts suitable for logging and progress events"""
+        return {
+            "lines": self.line_count,
+            "files": len(self.files),
+            "added": self.added,
+            "removed": self.removed,
+        }
+
+    # Text access (decoded on demand)
+
+    def section_text(self, file_diff: FileDiff) -> str:
+        """The full text of a file section"""
+        return str(self.view[file_diff.start:file_diff.end], "utf-8", "replace")
+
+    def join(self, files: Iterable[FileDiff]) -> str:
+        """The text of several file sections, in the order given"""
+        return b"".join(self.view[f.start:f.end] for f in files).decode("utf-8", "replace")
+
+    def iter_added_lines(self, file_diff: FileDiff) -> Iterator[str]:
+        """
+        Yield the added lines of a file, without the leading "+".
+        """
+        for hunk in file_diff.hunks:
+            for match in _ADDED_RE.finditer(self.buffer, hunk.body_start, hunk.end):
+                yield match.group(1).decode("utf-8", "replace")
+
+    def iter_changed_lines(self, file_diff: FileDiff) -> Iterator[str]:
+        """
+        Yield the added and removed lines of a file, without the leading "+"/"-".
+        """
+        for hunk in file_diff.hunks:
+            for match in _CHANGED_RE.finditer(self.buffer, hunk.body_start, hunk.end):
+                yield match.group(1).decode("utf-8", "replace")
+
+    def iter_all_added_lines(self) -> Iterator[Tuple[FileDiff, str]]:
+        """
+        Yield (file, added line) pairs over the whole diff.
+        """
+        for file_diff in self.files:
+            for line in self.iter_added_lines(file_diff):
+                yield file_diff, line
+
+
+def parse_diff(diff: Union[str, bytes, bytearray, memoryview, ParsedDiff, None]) -> ParsedDiff:
+    """
+    Parse a unified diff.
+
+    Args:
+        diff: Diff text or bytes; an already parsed diff is returned unchanged
+
+    Returns:
+        A ParsedDiff
+    """
+    if isinstance(diff, ParsedDiff):
+        return diff
+    if diff is None:
+        return ParsedDiff(b"")
+    if isinstance(diff, str):
+        return ParsedDiff(diff.encode("utf-8", "surrogatepass"))
+    if isinstance(diff, memoryview):
+        diff = diff.obj if isinstance(diff.obj, bytes) and diff.nbytes == len(diff.obj) else diff.tobytes()
+    return ParsedDiff(bytes(diff) if isinstance(diff, bytearray) else diff)
@@ -0,0 +1,432 @@
+"""
+Line diff engine for file snapshots, producing difflib-style unified diffs.
+
+difflib.SequenceMatcher is quadratic on large or heavily edited files. This
+engine short-circuits identical inputs, interns lines to integers, trims the
+common prefix and suffix, aligns the rest on lines that are unique in both
+versions (patience diff) and falls back to Myers' O(ND) bisection where no
+such anchors exist. Myers is capped at MAX_EDIT_COST per region; beyond it the
+region is halved, which keeps the work near-linear on repetitive content at
+the price of a less minimal diff. Output follows difflib.unified_diff exactly
+in format (headers, hunk ranges, context grouping), except that a last line
+without a newline is followed by "\\ No newline at end of file" as in GNU
+diff and git, so the diff can be applied back; for ambiguous edits the chosen
+alignment may differ.
+"""
+import logging
+import re
+from collections import Counter
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Edit distance after which Myers gives up on a region; the region is then cut in
+# half and each half diffed separately (valid, possibly non-minimal output)
+MAX_EDIT_COST = 32
+
+# (a index, b index, length) runs of equal lines
+Match = Tuple[int, int, int]
+Opcode = Tuple[str, int, int, int, int]
+
+# Marker following a diff line whose source line has no trailing newline
+NO_NEWLINE_MARKER = "\\ No newline at end of file"
+
+
+def intern_lines(a_lines: Sequence[str], b_lines: Sequence[str]) -> Tuple[List[int], List[int]]:
+    """
+    Map lines to integer IDs so comparisons are integer comparisons.
+    """
+    ids = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a_lines]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b_lines]
+    return a_ids, b_ids
+
+
+def _patience_anchors(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int) -> List[Tuple[int, int]]:
+    # Lines occurring exactly once in both regions, aligned by a longest increasing subsequence
+    a_counts = Counter(a[alo:ahi])
+    b_counts = Counter(b[blo:bhi])
+    b_position = {}
+    for j in range(blo, bhi):
+        line = b[j]
+        if b_counts[line] == 1 and a_counts.get(line) == 1:
+            b_position[line] = j
+    if not b_position:
+        return []
+    pairs = [(i, b_position[a[i]]) for i in range(alo, ahi) if a[i] in b_position]
+
+    # Patience sorting: piles hold the smallest tail b index of each length
+    tails: List[int] = []
+    tail_pairs: List[int] = []
+    previous = [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        low, high = 0, len(tails)
+        while low < high:
+            middle = (low + high) // 2
+            if tails[middle] < j:
+                low = middle + 1
+            else:
+                high = middle
+        if low:
+            previous[index] = tail_pairs[low - 1]
+        if low == len(tails):
+            tails.append(j)
+            tail_pairs.append(index)
+        else:
+            tails[low] = j
+            tail_pairs[low] = index
+
+    anchors = []
+    index = tail_pairs[-1]
+    while index != -1:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _myers_split(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int) -> Optional[Tuple[int, int]]:
+    # Find the middle snake of the shortest edit script (Myers 1986, bisection as in
+    # diff-match-patch) and return the point to split the region at
+    len_a, len_b = ahi - alo, bhi - blo
+    max_d = min((len_a + len_b + 1) // 2, MAX_EDIT_COST)
+    offset = max_d + 1
+    size = 2 * offset + 2
+    forward = [-1] * size
+    backward = [-1] * size
+    forward[offset + 1] = 0
+    backward[offset + 1] = 0
+    delta = len_a - len_b
+    front = delta % 2 != 0
+    k1_start = k1_end = k2_start = k2_end = 0
+
+    for d in range(max_d):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and forward[k1_offset - 1] < forward[k1_offset + 1]):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < len_a and y1 < len_b and a[alo + x1] == b[blo + y1]:
+                x1 += 1
+                y1 += 1
+            forward[k1_offset] = x1
+            if x1 > len_a:
+                k1_end += 2
+            elif y1 > len_b:
+                k1_start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < size and backward[k2_offset] != -1:
+                    if x1 >= len_a - backward[k2_offset]:
+                        return x1, y1
+
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and backward[k2_offset - 1] < backward[k2_offset + 1]):
+                x2 = backward[k2_offset + 1]
+            else:
+                x2 = backward[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < len_a and y2 < len_b and a[ahi - 1 - x2] == b[bhi - 1 - y2]:
+                x2 += 1
+                y2 += 1
+            backward[k2_offset] = x2
+            if x2 > len_a:
+                k2_end += 2
+            elif y2 > len_b:
+                k2_start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < size and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    y1 = offset + x1 - k1_offset
+                    if x1 >= len_a - x2:
+                        return x1, y1
+    return None
+
+
+def _diff_region(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int, matches: List[Match]):
+    # Common prefix
+    start_a, start_b = alo, blo
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    if alo > start_a:
+        matches.append((start_a, start_b, alo - start_a))
+
+    # Common suffix (emitted after the middle)
+    suffix = 0
+    while alo < ahi - suffix and blo < bhi - suffix and a[ahi - 1 - suffix] == b[bhi - 1 - suffix]:
+        suffix += 1
+    ahi -= suffix
+    bhi -= suffix
+
+    if alo < ahi and blo < bhi:
+        anchors = _patience_anchors(a, alo, ahi, b, blo, bhi)
+        if anchors:
+            for i, j in anchors:
+                _diff_region(a, alo, i, b, blo, j, matches)
+                matches.append((i, j, 1))
+                alo, blo = i + 1, j + 1
+            _diff_region(a, alo, ahi, b, blo, bhi, matches)
+        else:
+            split = None
+            if not set(a[alo:ahi]).isdisjoint(b[blo:bhi]):
+                split = _myers_split(a, alo, ahi, b, blo, bhi)
+                if split is None:
+                    # Too costly to diff exactly; halve the region instead
+                    split = ((ahi - alo) // 2, (bhi - blo) // 2)
+            if split is not None:
+                x, y = split
+                _diff_region(a, alo, alo + x, b, blo, blo + y, matches)
+                _diff_region(a, alo + x, ahi, b, blo + y, bhi, matches)
+            # Otherwise the whole region is reported as replaced
+
+    if suffix:
+        matches.append((ahi, bhi, suffix))
+
+
+def matching_blocks(a_lines: Sequence[str], b_lines: Sequence[str]) -> List[Match]:
+    """
+    Compute the runs of equal lines between two line lists.
+
+    Args:
+        a_lines: Lines of the old version
+        b_lines: Lines of the new version
+
+    Returns:
+        (a index, b index, length) runs in increasing order, adjacent runs merged
+    """
+    a, b = intern_lines(a_lines, b_lines)
+    raw: List[Match] = []
+    _diff_region(a, 0, len(a), b, 0, len(b), raw)
+
+    merged: List[Match] = []
+    for i, j, size in raw:
+        if not size:
+            continue
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            last_i, last_j, last_size = merged[-1]
+            merged[-1] = (last_i, last_j, last_size + size)
+        else:
+            merged.append((i, j, size))
+    return merged
+
+
+def get_opcodes(a_lines: Sequence[str], b_lines: Sequence[str]) -> List[Opcode]:
+    """
+    Opcodes in the format of difflib.SequenceMatcher.get_opcodes().
+    """
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for ai, bj, size in matching_blocks(a_lines, b_lines) + [(len(a_lines), len(b_lines), 0)]:
+        if i < ai and j < bj:
+            opcodes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(("insert", i, ai, j, bj))
+        if size:
+            opcodes.append(("equal", ai, ai + size, bj, bj + size))
+        i, j = ai + size, bj + size
+    return opcodes
+
+
+def _grouped_opcodes(opcodes: List[Opcode], n: int) -> Iterator[List[Opcode]]:
+    # Same grouping as difflib.SequenceMatcher.get_grouped_opcodes()
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > n + n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _format_range(start: int, stop: int) -> str:
+    # Same as difflib._format_range_unified
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff(a_lines: Sequence[str], b_lines: Sequence[str], fromfile: str = "", tofile: str = "",
+                 n: int = 3, lineterm: str = "\n") -> Iterator[str]:
+    """
+    Drop-in replacement for difflib.unified_diff (without file dates).
+
+    Unlike difflib, a line without a trailing newline (the last line of a
+    file not ending in one) is terminated and followed by a
+    "\\ No newline at end of file" marker, as apply_patch expects.
+
+    Args:
+        a_lines: Lines of the old version, with line endings
+        b_lines: Lines of the new version, with line endings
+        fromfile: Name for the --- header
+        tofile: Name for the +++ header
+        n: Context lines around changes
+        lineterm: Terminator for header lines
+
+    Yields:
+        Diff lines
+    """
+    if list(a_lines) == list(b_lines):
+        return
+    started = False
+    for group in _grouped_opcodes(get_opcodes(a_lines, b_lines), n):
+        if not started:
+            started = True
+            yield f"--- {fromfile}{lineterm}"
+            yield f"+++ {tofile}{lineterm}"
+        first, last = group[0], group[-1]
+        yield f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@{lineterm}"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                yield from _hunk_lines(" ", a_lines[i1:i2], lineterm)
+                continue
+            if tag in ("replace", "delete"):
+                yield from _hunk_lines("-", a_lines[i1:i2], lineterm)
+            if tag in ("replace", "insert"):
+                yield from _hunk_lines("+", b_lines[j1:j2], lineterm)
+
+
+def _hunk_lines(prefix: str, lines: Sequence[str], lineterm: str) -> Iterator[str]:
+    # Only the last line of a file can lack its newline
+    for line in lines:
+        if line.endswith("\n"):
+            yield prefix + line
+        else:
+            yield prefix + line + "\n"
+            yield NO_NEWLINE_MARKER + lineterm
+
+
+def diff_texts(original_content: str, new_content: str, fromfile: str = "before", tofile: str = "after",
+               n: int = 3) -> str:
+    """
+    Unified diff of two texts; identical texts return "" without splitting them.
+    """
+    if original_content == new_content:
+        return ""
+    return "".join(unified_diff(
+        original_content.splitlines(keepends=True),
+        new_content.splitlines(keepends=True),
+        fromfile=fromfile,
+        tofile=tofile,
+        n=n
+    ))
+
+
+class PatchError(ValueError):
+    """
+    Raised when a unified diff does not apply to the given base text.
+    """
+
+
+_PATCH_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def _split_lines(text: str) -> List[str]:
+    # Split on "\n" only, so patch and base agree on line boundaries
+    lines = text.split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def apply_patch(base: str, patch: str) -> str:
+    """
+    Apply a unified diff (as produced by diff_texts, `diff -u` or git) to a text.
+
+    Context and removed lines must match the base exactly; file headers are
+    ignored and "\\ No newline at end of file" markers are honoured.
+
+    Args:
+        base: The text the patch was computed against
+        patch: The unified diff
+
+    Returns:
+        The patched text
+
+    Raises:
+        PatchError: If the patch is malformed or does not match the base
+    """
+    if not patch:
+        return base
+    base_lines = _split_lines(base)
+    patch_lines = _split_lines(patch)
+    output: List[str] = []
+    position = 0
+    index = 0
+    while index < len(patch_lines):
+        match = _PATCH_HUNK_RE.match(patch_lines[index])
+        index += 1
+        if not match:
+            continue
+        old_start, old_count, _, new_count = (
+            int(value) if value is not None else 1 for value in match.groups()
+        )
+        # An empty old range names the line after which the new lines go
+        start = old_start - 1 if old_count else old_start
+        if start < position or start > len(base_lines):
+            raise PatchError(f"Hunk at line {old_start} is out of order or out of range")
+
+        old_lines: List[str] = []
+        new_lines: List[str] = []
+        last_tag = None
+        while index < len(patch_lines):
+            line = patch_lines[index]
+            tag = line[:1]
+            if tag == "\\":
+                # The previous line has no trailing newline
+                targets = {" ": (old_lines, new_lines), "-": (old_lines,), "+": (new_lines,)}.get(last_tag, ())
+                for lines in targets:
+                    lines[-1] = lines[-1].rstrip("\n")
+                index += 1
+                continue
+            if len(old_lines) >= old_count and len(new_lines) >= new_count:
+                break
+            # Some tools strip the space of empty context lines
+            if line == "\n":
+                tag, line = " ", " \n"
+            if tag == " ":
+                old_lines.append(line[1:])
+                new_lines.append(line[1:])
+            elif tag == "-":
+                old_lines.append(line[1:])
+            elif tag == "+":
+                new_lines.append(line[1:])
+            else:
+                break
+            last_tag = tag
+            index += 1
+
+        if len(old_lines) != old_count or len(new_lines) != new_count:
+            raise PatchError(f"Hunk at line {old_start} does not match its header counts")
+        if base_lines[start:start + old_count] != old_lines:
+            raise PatchError(f"Hunk at line {old_start} does not match the base text")
+        output.extend(base_lines[position:start])
+        output.extend(new_lines)
+        position = start + old_count
+
+    output.extend(base_lines[position:])
+    return "".join(output)
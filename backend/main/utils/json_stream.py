@@ -0,0 +1,219 @@
+"""
+Incremental parser for structured (JSON) topic responses from the LLM.
+
+Topics are emitted as soon as their JSON object closes, so downstream work
+(DB upserts, client notifications) can start while the model is still
+generating the rest of the response.
+"""
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Response schema for schema-constrained output (Gemini OpenAPI subset)
+TOPIC_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "topic_id": {"type": "STRING"},
+            "title": {"type": "STRING"},
+            "description": {"type": "STRING"},
+            "prerequisites": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "code_references": {"type": "STRING"},
+        },
+        "required": ["title", "description", "prerequisites"],
+    },
+}
+
+# Response schema for batched prompts: one topic list per change key
+TOPIC_BATCH_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "change_key": {"type": "STRING"},
+            "topics": TOPIC_RESPONSE_SCHEMA,
+        },
+        "required": ["change_key", "topics"],
+    },
+}
+
+# Response schema for describing placeholder topics (see topic_enrichment)
+TOPIC_DESCRIPTION_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "topic_id": {"type": "STRING"},
+            "title": {"type": "STRING"},
+            "description": {"type": "STRING"},
+            "prerequisites": {"type": "ARRAY", "items": {"type": "STRING"}},
+        },
+        "required": ["topic_id", "title", "description", "prerequisites"],
+    },
+}
+
+
+class TopicStreamParser:
+    """
+    Incremental parser that extracts topic objects from a streamed JSON response.
+
+    The response may be a bare array of topics or an object whose first array
+    holds the topics (e.g. {"topics": [...]}). Text outside the JSON value, such
+    as markdown code fences, is skipped. Only the text of the object currently
+    being parsed is buffered.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        # Depth of the array holding the topics, once seen
+        self._items_depth: Optional[int] = None
+        self._in_string = False
+        self._escape = False
+        self._capturing = False
+        self._done = False
+        self.topics_emitted = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Consume the next chunk of the response.
+
+        Args:
+            chunk: Text received from the model
+
+        Returns:
+            Topics whose objects were completed by this chunk
+        """
+        completed = []
+        if self._done or not chunk:
+            return completed
+
+        capture_start = 0 if self._capturing else None
+        for position, char in enumerate(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                # Strings only matter inside the JSON value
+                if self._depth:
+                    self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+                if char == "[" and self._items_depth is None:
+                    self._items_depth = self._depth
+                elif char == "{" and self._items_depth is not None and self._depth == self._items_depth + 1:
+                    self._capturing = True
+                    capture_start = position
+            elif char in "]}":
+                if not self._depth:
+                    continue
+                self._depth -= 1
+                if char == "}" and self._capturing and self._depth == self._items_depth:
+                    self._buffer.append(chunk[capture_start:position + 1])
+                    topic = self._decode("".join(self._buffer))
+                    if topic is not None:
+                        completed.append(topic)
+                    self._buffer = []
+                    self._capturing = False
+                    capture_start = None
+                elif char == "]" and self._items_depth is not None and self._depth < self._items_depth:
+                    self._done = True
+                    break
+
+        if self._capturing and capture_start is not None:
+            self._buffer.append(chunk[capture_start:])
+        self.topics_emitted += len(completed)
+        return completed
+
+    def _decode(self, text: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skipping malformed topic object in LLM response: {e}")
+            return None
+        return value if isinstance(value, dict) else None
+
+    @property
+    def complete(self) -> bool:
+        """True once the topics array has been closed"""
+        return self._done
+
+
+def iter_topics(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield topics from a stream of response chunks as each one completes.
+
+    Args:
+        chunks: Iterable of text chunks
+
+    Yields:
+        Topic dictionaries
+    """
+    parser = TopicStreamParser()
+    for chunk in chunks:
+        for topic in parser.feed(chunk):
+            yield topic
+    if not parser.complete:
+        logger.warning(f"LLM response ended before the topic array closed ({parser.topics_emitted} topics parsed)")
+
+
+def parse_topics(text: str) -> List[Dict[str, Any]]:
+    """
+    Parse all topics from a complete response text.
+
+    Args:
+        text: The full response text, optionally wrapped in a code fence
+
+    Returns:
+        A list of topic dictionaries
+    """
+    return list(iter_topics([text]))
+
+
+def parse_batch_topics(text: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Parse a batched response into topic lists keyed by change key.
+
+    Accepts the schema shape ([{"change_key": ..., "topics": [...]}, ...]),
+    optionally wrapped in a code fence or an object, as well as a plain
+    object mapping change keys to topic lists.
+
+    Args:
+        text: The full response text
+
+    Returns:
+        Topic lists by change key (keys the model left out are missing)
+    """
+    start = min((i for i in (text.find("["), text.find("{")) if i != -1), default=-1)
+    if start == -1:
+        return {}
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text, start)
+    except ValueError as e:
+        logger.warning(f"Could not parse batched LLM response: {e}")
+        return {}
+
+    if isinstance(data, dict):
+        arrays = [value for value in data.values() if isinstance(value, list)]
+        if len(arrays) == 1 and all(isinstance(item, dict) and "change_key" in item for item in arrays[0]):
+            data = arrays[0]
+        else:
+            return {str(key): [t for t in value if isinstance(t, dict)]
+                    for key, value in data.items() if isinstance(value, list)}
+
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    for item in data if isinstance(data, list) else []:
+        if isinstance(item, dict) and item.get("change_key") is not None:
+            topics = item.get("topics") or []
+            results.setdefault(str(item["change_key"]), []).extend(t for t in topics if isinstance(t, dict))
+    return results
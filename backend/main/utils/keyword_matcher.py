@@ -0,0 +1,171 @@
+"""
+Aho-Corasick multi-pattern matcher for keyword-based topic detection.
+
+The automaton is compiled once from the topic catalogue and finds every
+keyword hit in a single pass over the added lines of a diff, so detection
+cost grows with the diff size rather than with diff size times catalogue size.
+"""
+import logging
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+from .diff_parser import ParsedDiff, parse_diff
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char in "_$"
+
+
+class AhoCorasick:
+    """
+    Compiled Aho-Corasick automaton over a fixed set of keywords.
+
+    Each keyword carries an arbitrary payload that is returned with its hits.
+    Keywords that start or end with a word character only match on token
+    boundaries, so `fetch` matches `fetch(url)` but not `prefetchData`.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Any]]):
+        """
+        Build the automaton
+
+        Args:
+            keywords: (keyword, payload) pairs; duplicate keywords keep all payloads
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: list of (keyword length, keyword index)
+        self._output: List[List[Tuple[int, int]]] = [[]]
+        self.keywords: List[str] = []
+        self.payloads: List[Any] = []
+
+        for keyword, payload in keywords:
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append((len(keyword), len(self.keywords)))
+            self.keywords.append(keyword)
+            self.payloads.append(payload)
+
+        self._bounded_start = [_is_word_char(k[0]) for k in self.keywords]
+        self._bounded_end = [_is_word_char(k[-1]) for k in self.keywords]
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Inherit the outputs of the longest proper suffix
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Scan text once and yield every keyword occurrence.
+
+        Args:
+            text: Text to scan
+
+        Yields:
+            Tuples of (start offset, keyword index)
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        bounded_start, bounded_end = self._bounded_start, self._bounded_end
+        length = len(text)
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not output[state]:
+                continue
+            for keyword_length, keyword_index in output[state]:
+                start = position - keyword_length + 1
+                if bounded_start[keyword_index] and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if bounded_end[keyword_index] and position + 1 < length and _is_word_char(text[position + 1]):
+                    continue
+                yield start, keyword_index
+
+    def find_all(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        Return every (keyword, payload) hit in text, in order of occurrence.
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            A list of (keyword, payload) tuples
+        """
+        return [(self.keywords[index], self.payloads[index]) for _, index in self.iter_matches(text)]
+
+
+class KeywordHits:
+    """
+    Keyword hit counts for a diff, per file and in total.
+    """
+
+    def __init__(self):
+        self.per_file: Dict[str, Counter] = {}
+        self.payloads: Dict[str, List[Any]] = {}
+
+    def add(self, file_path: str, keyword: str, payload: Any):
+        """Record one hit of keyword in file_path"""
+        self.per_file.setdefault(file_path, Counter())[keyword] += 1
+        self.payloads.setdefault(keyword, [])
+        if payload not in self.payloads[keyword]:
+            self.payloads[keyword].append(payload)
+
+    @property
+    def totals(self) -> Counter:
+        """Hit counts summed over all files"""
+        totals = Counter()
+        for counts in self.per_file.values():
+            totals.update(counts)
+        return totals
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        """Per-file hit counts as plain dictionaries"""
+        return {path: dict(counts) for path, counts in self.per_file.items()}
+
+
+def scan_added_lines(diff_text: Union[str, ParsedDiff], matcher: AhoCorasick, payload_filter=None) -> KeywordHits:
+    """
+    Find every keyword hit in the added lines of a diff in a single pass.
+
+    Args:
+        diff_text: The Git diff to scan, as text or already parsed
+        matcher: Compiled automaton
+        payload_filter: Optional callable (file_path, payload) -> bool used to
+            discard hits, e.g. signatures that belong to another language
+
+    Returns:
+        KeywordHits with per-file counts
+    """
+    hits = KeywordHits()
+    for file_diff, line in parse_diff(diff_text).iter_all_added_lines():
+        for keyword, payload in matcher.find_all(line):
+            if payload_filter is None or payload_filter(file_diff.path, payload):
+                hits.add(file_diff.path, keyword, payload)
+    return hits
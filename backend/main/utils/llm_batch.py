@@ -0,0 +1,157 @@
+"""
+Micro-batching of small diffs into a single LLM request.
+
+For a diff of a few lines, the fixed prompt template and the topic context
+cost far more tokens than the diff itself. Small diffs of one project are
+therefore packed into one prompt, each wrapped in delimiters carrying a short
+per-item key, and the model answers with one topic list per key:
+
+    ### CHANGE c1
+    <diff>
+    ### END CHANGE c1
+
+pack_batches() decides what goes together; MicroBatcher collects diffs
+submitted within a short window and flushes them as one batch.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from django.conf import settings
+
+from .tokens import estimate_tokens
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+ITEM_START = "### CHANGE {key}"
+ITEM_END = "### END CHANGE {key}"
+
+
+def batch_setting(name: str) -> Any:
+    """
+    Batching settings with their defaults.
+    """
+    defaults = {
+        # Diffs up to this many estimated tokens are batched
+        'BRAINVIBE_BATCH_ITEM_MAX_TOKENS': 1000,
+        # Diff tokens per batched prompt, and diffs per batch
+        'BRAINVIBE_BATCH_MAX_TOKENS': 12000,
+        'BRAINVIBE_BATCH_MAX_ITEMS': 20,
+        # Milliseconds submitted diffs wait for others to join their batch (0 disables batching)
+        'BRAINVIBE_BATCH_WINDOW_MS': 500,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def format_batch(items: Dict[str, str]) -> str:
+    """
+    Render keyed diffs into one delimited text for the prompt.
+
+    Args:
+        items: Diff texts keyed by their per-item key
+
+    Returns:
+        The delimited diffs
+    """
+    parts = []
+    for key, diff_text in items.items():
+        body = diff_text if diff_text.endswith("\n") else diff_text + "\n"
+        parts.append(f"{ITEM_START.format(key=key)}\n{body}{ITEM_END.format(key=key)}\n")
+    return "\n".join(parts)
+
+
+def is_batchable(diff_text: str) -> bool:
+    """
+    Whether a diff is small enough to share a prompt with others.
+    """
+    return estimate_tokens(diff_text) <= batch_setting('BRAINVIBE_BATCH_ITEM_MAX_TOKENS')
+
+
+def pack_batches(items: Dict[str, str], item_max_tokens: Optional[int] = None,
+                 batch_max_tokens: Optional[int] = None) -> Tuple[List[Dict[str, str]], List[str]]:
+    """
+    Group small diffs into batches within the token and item limits.
+
+    Args:
+        items: Diff texts keyed by caller keys
+        item_max_tokens: Largest diff batched (default: BRAINVIBE_BATCH_ITEM_MAX_TOKENS)
+        batch_max_tokens: Diff tokens per batch (default: BRAINVIBE_BATCH_MAX_TOKENS)
+
+    Returns:
+        Tuple of (batches of two or more diffs, keys to analyze on their own)
+    """
+    item_max = item_max_tokens or batch_setting('BRAINVIBE_BATCH_ITEM_MAX_TOKENS')
+    batch_max = batch_max_tokens or batch_setting('BRAINVIBE_BATCH_MAX_TOKENS')
+    max_items = batch_setting('BRAINVIBE_BATCH_MAX_ITEMS')
+
+    singles: List[str] = []
+    batches: List[Dict[str, str]] = []
+    current: Dict[str, str] = {}
+    current_tokens = 0
+    for key, diff_text in items.items():
+        tokens = estimate_tokens(diff_text)
+        if tokens > item_max:
+            singles.append(key)
+            continue
+        if current and (current_tokens + tokens > batch_max or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = {}, 0
+        current[key] = diff_text
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+
+    # A batch of one gains nothing over a normal request
+    singles.extend(key for batch in batches if len(batch) == 1 for key in batch)
+    return [batch for batch in batches if len(batch) > 1], singles
+
+
+class MicroBatcher:
+    """
+    Collects items per group and hands them to a flush callback in batches.
+
+    A group is flushed when it reaches max_items or window seconds after its
+    first item arrived, whichever comes first. The callback runs on a timer
+    thread or on the thread adding the last item, so it should hand the work
+    off to a pool.
+    """
+
+    def __init__(self, flush: Callable[[Hashable, List[Any]], None], window: float, max_items: int):
+        """
+        Args:
+            flush: Called with (group, items) for every batch
+            window: Seconds the first item of a group waits for others
+            max_items: Items that trigger an immediate flush
+        """
+        self.flush = flush
+        self.window = window
+        self.max_items = max_items
+        self._pending: Dict[Hashable, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, group: Hashable, item: Any):
+        """
+        Add an item to its group's pending batch.
+        """
+        with self._lock:
+            items = self._pending.setdefault(group, [])
+            items.append(item)
+            if len(items) >= self.max_items:
+                ready = self._pending.pop(group)
+            else:
+                ready = None
+                if len(items) == 1:
+                    timer = threading.Timer(self.window, self._flush_group, (group, items))
+                    timer.daemon = True
+                    timer.start()
+        if ready:
+            self.flush(group, ready)
+
+    def _flush_group(self, group: Hashable, items: List[Any]):
+        with self._lock:
+            # The group may have been flushed (and restarted) because it filled up
+            if self._pending.get(group) is not items:
+                return
+            del self._pending[group]
+        self.flush(group, items)
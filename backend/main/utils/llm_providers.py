@@ -0,0 +1,408 @@
+"""
+Pluggable LLM providers for topic extraction.
+
+The provider used by llm_utils is selected with the BRAINVIBE_LLM_PROVIDER
+setting:
+- "mock": keyword-based mock extractor, no network
+- "gemini": Google Gemini through code_analyzer.GeminiTopicAnalyzer
+- "stub": the local stub LLM server (see llm_stub_server), for offline load tests
+"""
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import requests
+from django.conf import settings
+from django.utils.text import slugify
+
+from .json_stream import parse_batch_topics, parse_topics
+from .prompt_cache import prefix_cache, snapshot_for_model
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+_TOPIC_ID_RE = re.compile(r"[\w.:-]+")
+
+
+class LLMProviderError(Exception):
+    """
+    Raised when a provider call fails.
+
+    Attributes:
+        status_code: HTTP status of the failure, if any
+        retry_after: Seconds the provider asked us to wait, if any
+        transient: Whether retrying the call may succeed
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None, transient: bool = True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.transient = transient
+
+
+class LLMProvider:
+    """
+    Interface every LLM provider implements.
+    """
+    name = "base"
+
+    def analyze(self, diff_text: str, project_context: Optional[Dict[str, Any]] = None,
+                timeout: Optional[float] = None, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Extract topics from a diff.
+
+        Args:
+            diff_text: The Git diff to analyze
+            project_context: Optional context about the project (see llm_utils.build_project_context)
+            timeout: Seconds the call may take, or None for the provider default
+            model: Model tier chosen by the router (see model_router), or None for the provider default
+
+        Returns:
+            A list of topic dictionaries with topic_id, title, description and prerequisites
+        """
+        raise NotImplementedError
+
+    def analyze_batch(self, diff_texts: Dict[str, str], project_context: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None, model: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Extract topics from several small diffs (see llm_batch).
+
+        Providers that can answer a batched prompt override this; the default
+        analyzes the diffs one by one.
+
+        Args:
+            diff_texts: Diffs keyed by short change keys
+            project_context: Optional context about the project
+            timeout: Seconds the whole call may take, or None for the provider default
+            model: Model tier, or None for the provider default
+
+        Returns:
+            Topic lists by change key; keys missing from the result were not answered
+        """
+        return {key: self.analyze(text, project_context, timeout=timeout, model=model)
+                for key, text in diff_texts.items()}
+
+    def describe_topics(self, topics: Dict[str, str], timeout: Optional[float] = None,
+                        model: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Describe topics known only by ID and title (see topic_enrichment).
+
+        The default answers from the topic catalogue only.
+
+        Args:
+            topics: Titles keyed by topic ID
+            timeout: Seconds the whole call may take, or None for the provider default
+            model: Model tier, or None for the provider default
+
+        Returns:
+            Topics with title, description and prerequisite IDs, keyed by topic ID;
+            IDs missing from the result were not answered
+        """
+        from .topic_rules import get_catalogue
+        catalogue = get_catalogue()
+        return {topic_id: entry for entry, topic_id in ((catalogue.topic(topic_id), topic_id) for topic_id in topics)
+                if entry and entry["description"]}
+
+
+def normalize_topic(topic: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Bring a provider topic into the shape used by the rest of the pipeline.
+
+    Providers that only return titles get slug topic IDs, and prerequisite
+    titles are turned into prerequisite IDs the same way.
+
+    Args:
+        topic: Topic dictionary returned by a provider
+
+    Returns:
+        The normalised topic, or None if it has neither an ID nor a title
+    """
+    title = (topic.get("title") or "").strip()
+    topic_id = topic.get("topic_id") or slugify(title)
+    if not topic_id:
+        return None
+    prerequisites = topic.get("prerequisites") or []
+    if isinstance(prerequisites, str):
+        prerequisites = [p.strip() for p in prerequisites.split(",") if p.strip()]
+    return {
+        "topic_id": topic_id,
+        "title": title or topic_id.replace("-", " ").title(),
+        "description": topic.get("description", ""),
+        "prerequisites": [p for p in (_as_topic_id(p) for p in prerequisites) if p],
+    }
+
+
+def _described_topics(topics: Dict[str, str], answered: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    # Key normalised descriptions by the requested topic IDs, dropping unknown IDs and empty descriptions
+    results = {}
+    for topic in answered:
+        topic_id = topic.get("topic_id")
+        described = normalize_topic(topic) if topic_id in topics else None
+        if described and described["description"].strip():
+            described["prerequisites"] = [p for p in described["prerequisites"] if p != topic_id]
+            results[topic_id] = described
+    return results
+
+
+def _as_topic_id(value: str) -> str:
+    # Values that already look like IDs are kept as-is; titles are slugified
+    value = str(value).strip()
+    return value if _TOPIC_ID_RE.fullmatch(value) else slugify(value)
+
+
+def _context_titles(project_context: Optional[Dict[str, Any]], learned: bool) -> List[str]:
+    topics = (project_context or {}).get("existing_topics", [])
+    return [t["title"] for t in topics if (t.get("status") == "learned") == learned]
+
+
+class MockProvider(LLMProvider):
+    """
+    Deterministic keyword-based provider; never touches the network.
+    """
+    name = "mock"
+
+    def analyze(self, diff_text: str, project_context: Optional[Dict[str, Any]] = None,
+                timeout: Optional[float] = None, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        from .llm_utils import extract_mock_topics
+        return extract_mock_topics(diff_text)
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini provider backed by code_analyzer.GeminiTopicAnalyzer.
+    """
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        # Imported lazily so the google-generativeai package is only needed when selected
+        from code_analyzer.gemini_analyzer import GeminiTopicAnalyzer
+        from google.api_core import exceptions as google_exceptions
+        self.analyzer = GeminiTopicAnalyzer(api_key=api_key)
+        # Rate limits, server errors and timeouts: worth retrying after a backoff
+        self._transient_errors = (
+            google_exceptions.TooManyRequests,
+            google_exceptions.ResourceExhausted,
+            google_exceptions.InternalServerError,
+            google_exceptions.BadGateway,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.GatewayTimeout,
+            google_exceptions.DeadlineExceeded,
+        )
+
+    @contextmanager
+    def _transient_errors_as_provider_errors(self):
+        """
+        Raise transient Gemini errors as LLMProviderError(transient=True), with
+        the Retry-After the API asked for, so the caller's retry policy applies.
+        """
+        try:
+            yield
+        except self._transient_errors as e:
+            code = getattr(e, "code", None)
+            raise LLMProviderError(
+                f"Gemini request failed: {e}",
+                status_code=code if isinstance(code, int) else None,
+                retry_after=_google_retry_after(e),
+                transient=True
+            ) from e
+
+    def analyze(self, diff_text: str, project_context: Optional[Dict[str, Any]] = None,
+                timeout: Optional[float] = None, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._transient_errors_as_provider_errors():
+            result = self.analyzer.analyze_diff(
+                diff_text,
+                completed_topics=_context_titles(project_context, learned=True),
+                to_learn_topics=_context_titles(project_context, learned=False),
+                timeout=timeout,
+                # llm_utils retries provider calls itself
+                retry_transient=False,
+                model=model,
+                snapshot=snapshot_for_model(project_context, model or self.analyzer.model_name)
+            )
+        return [t for t in (normalize_topic(topic) for topic in result["topics"]) if t]
+
+    def analyze_batch(self, diff_texts: Dict[str, str], project_context: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None, model: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        with self._transient_errors_as_provider_errors():
+            results = self.analyzer.analyze_batch(
+                diff_texts,
+                completed_topics=_context_titles(project_context, learned=True),
+                to_learn_topics=_context_titles(project_context, learned=False),
+                timeout=timeout,
+                retry_transient=False,
+                model=model,
+                snapshot=snapshot_for_model(project_context, model or self.analyzer.model_name)
+            )
+        return {key: [t for t in (normalize_topic(topic) for topic in topics) if t]
+                for key, topics in results.items()}
+
+    def describe_topics(self, topics: Dict[str, str], timeout: Optional[float] = None,
+                        model: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        with self._transient_errors_as_provider_errors():
+            answered = self.analyzer.describe_topics(topics, timeout=timeout, retry_transient=False, model=model)
+        return _described_topics(topics, answered)
+
+
+def _google_retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds a Google API error asks us to wait: its Retry-After header, or
+    the RetryInfo in its error details.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+
+class HTTPStubProvider(LLMProvider):
+    """
+    Provider that calls the local stub LLM server over HTTP.
+
+    The stub speaks a Gemini-shaped JSON protocol, so this provider exercises
+    the same parsing path as a real model while staying fully offline.
+
+    The provider is shared by all pipeline and scheduler workers, and a
+    requests.Session is not guaranteed to be thread-safe, so each thread
+    keeps its own session (and connection pool) to the stub.
+    """
+    name = "stub"
+
+    def __init__(self, base_url: Optional[str] = None, timeout: Optional[float] = None):
+        self.base_url = (base_url or getattr(settings, 'BRAINVIBE_LLM_STUB_URL', 'http://127.0.0.1:8765')).rstrip("/")
+        self.timeout = timeout or getattr(settings, 'BRAINVIBE_LLM_TIMEOUT', 30)
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """The calling thread's session to the stub"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def analyze(self, diff_text: str, project_context: Optional[Dict[str, Any]] = None,
+                timeout: Optional[float] = None, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        text = self._post({"diff": diff_text}, project_context, timeout, model)
+        return [t for t in (normalize_topic(topic) for topic in parse_topics(text)) if t]
+
+    def analyze_batch(self, diff_texts: Dict[str, str], project_context: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None, model: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        text = self._post({"items": diff_texts}, project_context, timeout, model)
+        return {key: [t for t in (normalize_topic(topic) for topic in topics) if t]
+                for key, topics in parse_batch_topics(text).items() if key in diff_texts}
+
+    def describe_topics(self, topics: Dict[str, str], timeout: Optional[float] = None,
+                        model: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        text = self._post({"describe": topics}, None, timeout, model)
+        return _described_topics(topics, parse_topics(text))
+
+    def _post(self, payload: Dict[str, Any], project_context: Optional[Dict[str, Any]],
+              timeout: Optional[float], model: Optional[str]) -> str:
+        # Send a request to the stub and return the text of its first candidate
+        snapshot = snapshot_for_model(project_context, model)
+        cache_key = f"stub:{model}:{snapshot.project_id}" if snapshot is not None else None
+        cached_content = None
+        if snapshot is not None:
+            cached_content = prefix_cache.get(
+                cache_key,
+                snapshot.version,
+                snapshot.tokens,
+                lambda ttl: self._send("/v1/cachedContents", {
+                    "model": model,
+                    "ttl": ttl,
+                    "contents": {"completed_topics": snapshot.completed, "to_learn_topics": snapshot.to_learn},
+                }, timeout)["name"],
+                delete=lambda name: self.session.delete(f"{self.base_url}/v1/{name}", timeout=self.timeout)
+            )
+        if cached_content:
+            payload = dict(payload, cached_content=cached_content, model=model)
+        else:
+            payload = dict(
+                payload,
+                completed_topics=list(snapshot.completed) if snapshot else _context_titles(project_context, learned=True),
+                to_learn_topics=list(snapshot.to_learn) if snapshot else _context_titles(project_context, learned=False),
+                model=model,
+            )
+
+        try:
+            body = self._send("/v1/analyze", payload, timeout)
+        except LLMProviderError as e:
+            if cached_content and e.status_code == 404:
+                # The stub dropped the prefix (expired or restarted): upload it again on the retry
+                prefix_cache.invalidate(cache_key)
+                raise LLMProviderError(str(e), status_code=404, transient=True) from e
+            raise
+        return "".join(
+            part.get("text", "")
+            for candidate in body.get("candidates", [])[:1]
+            for part in candidate.get("content", {}).get("parts", [])
+        )
+
+    def _send(self, path: str, payload: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        # POST to the stub and return the JSON body
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=payload,
+                                         timeout=min(self.timeout, timeout) if timeout else self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise LLMProviderError(f"Stub LLM request failed: {e}") from e
+
+        if response.status_code != 200:
+            retry_after = response.headers.get("Retry-After")
+            raise LLMProviderError(
+                f"Stub LLM returned HTTP {response.status_code}",
+                status_code=response.status_code,
+                retry_after=float(retry_after) if retry_after else None,
+                transient=response.status_code == 429 or response.status_code >= 500
+            )
+        return response.json()
+
+
+PROVIDERS = {
+    MockProvider.name: MockProvider,
+    GeminiProvider.name: GeminiProvider,
+    HTTPStubProvider.name: HTTPStubProvider,
+}
+
+_providers: Dict[str, LLMProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name: Optional[str] = None) -> LLMProvider:
+    """
+    Return the (shared) provider instance selected in settings.
+
+    Args:
+        name: Provider name, overriding BRAINVIBE_LLM_PROVIDER
+
+    Returns:
+        An LLMProvider
+    """
+    name = name or getattr(settings, 'BRAINVIBE_LLM_PROVIDER', 'mock')
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}', expected one of {', '.join(PROVIDERS)}")
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = PROVIDERS[name]()
+            logger.info(f"Using LLM provider: {name}")
+        return _providers[name]
+
+
+def reset_providers():
+    """
+    Drop the shared provider instances so the next get_provider() call
+    re-reads the provider settings.
+    """
+    with _providers_lock:
+        _providers.clear()
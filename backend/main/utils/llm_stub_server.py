@@ -0,0 +1,398 @@
+"""
+Local stub LLM server for offline load testing.
+
+The server answers POST /v1/analyze with a Gemini-shaped JSON response
+({"candidates": [{"content": {"parts": [{"text": ...}]}}]}) whose text is a
+JSON array of topics, or, for batched requests carrying "items", an array of
+{"change_key": ..., "topics": [...]} objects. Requests carrying "describe"
+(titles keyed by topic ID) are answered with one described topic per ID. Latency, server errors and rate limiting (429 with
+Retry-After) are simulated from a seeded random generator so that benchmark
+runs are reproducible.
+
+Like Gemini's context caching, POST /v1/cachedContents stores a prompt prefix
+(the project's topic lists) for "ttl" seconds and returns its name; analyze
+requests carrying "cached_content" reference it instead of sending the topics,
+and get a 404 once it has expired. DELETE /v1/cachedContents/<id> drops one.
+Prompt tokens are estimated per request and counted in /v1/stats as input
+(processed) and cached tokens; with prefill_ms_per_1k, each 1000 input tokens
+add that much latency, so the cost of prompt prefixes shows up in timings.
+
+Start it with `python manage.py run_llm_stub` and point the backend at it with
+BRAINVIBE_LLM_PROVIDER=stub.
+"""
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .tokens import PROMPT_OVERHEAD_TOKENS, estimate_tokens
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution spec into a sampler returning seconds.
+
+    Supported specs (all values in milliseconds):
+    - "fixed:MS"
+    - "uniform:LOW,HIGH"
+    - "normal:MEAN,STDDEV" (clamped at zero)
+    - "lognormal:MEDIAN,SIGMA" (SIGMA is the shape parameter of the log)
+
+    Args:
+        spec: Distribution spec
+
+    Returns:
+        A callable taking a random.Random and returning a delay in seconds
+    """
+    kind, _, raw_args = (spec or "fixed:0").partition(":")
+    try:
+        args = [float(value) for value in raw_args.split(",") if value.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec '{spec}'")
+
+    kind = kind.strip().lower()
+    if kind == "fixed" and len(args) == 1:
+        return lambda rng: args[0] / 1000.0
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1]) / 1000.0
+    if kind == "normal" and len(args) == 2:
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1])) / 1000.0
+    if kind == "lognormal" and len(args) == 2 and args[0] > 0:
+        mu = math.log(args[0])
+        return lambda rng: rng.lognormvariate(mu, args[1]) / 1000.0
+    raise ValueError(f"Invalid latency spec '{spec}'")
+
+
+class StubBehaviour:
+    """
+    Failure and latency model shared by all request handler threads.
+    """
+
+    def __init__(self, latency: str = "fixed:0", error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, seed: Optional[int] = None,
+                 canned: Optional[Dict[str, List[Dict[str, Any]]]] = None, prefill_ms_per_1k: float = 0.0):
+        """
+        Args:
+            latency: Latency distribution spec (see parse_latency)
+            error_rate: Fraction of requests answered with HTTP 500/503
+            rate_limit_rate: Fraction of requests answered with HTTP 429
+            retry_after: Retry-After seconds sent with 429 responses
+            seed: Seed for the random generator
+            canned: Optional canned responses, keyed by diff sha256 or "default"
+            prefill_ms_per_1k: Milliseconds added per 1000 input tokens not read from a cached prefix
+        """
+        self.sample_latency = parse_latency(latency)
+        self.latency_spec = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.canned = canned or {}
+        self.prefill_ms_per_1k = prefill_ms_per_1k
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # Cached prefixes by name: (tokens, expiry time)
+        self._caches: Dict[str, Tuple[int, float]] = {}
+        self._cache_ids = 0
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "models": {},
+                      "input_tokens": 0, "cached_tokens": 0, "cache_creates": 0, "cache_not_found": 0}
+
+    def decide(self, model: Optional[str] = None):
+        """
+        Draw the outcome of the next request.
+
+        Args:
+            model: Model tier requested by the client (counted in stats)
+
+        Returns:
+            Tuple of (delay in seconds, HTTP status)
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            models = self.stats["models"]
+            models[model or "default"] = models.get(model or "default", 0) + 1
+            delay = self.sample_latency(self._rng)
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return delay, 429
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return delay, self._rng.choice((500, 503))
+            self.stats["ok"] += 1
+            return delay, 200
+
+    def create_cache(self, contents: Any, ttl: float) -> str:
+        """
+        Store a prompt prefix.
+
+        Args:
+            contents: The prefix (any JSON value; only its size matters)
+            ttl: Seconds the prefix is kept
+
+        Returns:
+            The name requests reference the prefix by
+        """
+        tokens = PROMPT_OVERHEAD_TOKENS + estimate_tokens(json.dumps(contents))
+        with self._lock:
+            self._cache_ids += 1
+            name = f"cachedContents/{self._cache_ids}"
+            self._caches[name] = (tokens, time.monotonic() + ttl)
+            self.stats["cache_creates"] += 1
+        return name
+
+    def cached_tokens(self, name: str) -> Optional[int]:
+        """
+        Tokens of a stored prefix, or None if it does not exist or has expired.
+        """
+        with self._lock:
+            tokens, expires_at = self._caches.get(name, (None, 0.0))
+            if tokens is not None and expires_at <= time.monotonic():
+                del self._caches[name]
+                tokens = None
+            if tokens is None:
+                self.stats["cache_not_found"] += 1
+            return tokens
+
+    def delete_cache(self, name: str) -> bool:
+        """
+        Drop a stored prefix; returns whether it existed.
+        """
+        with self._lock:
+            return self._caches.pop(name, None) is not None
+
+    def live_caches(self) -> int:
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for _, expires_at in self._caches.values() if expires_at > now)
+
+    def prefill(self, request: Dict[str, Any], cached_tokens: int) -> float:
+        """
+        Count the prompt tokens of a request and return its prefill delay.
+
+        Args:
+            request: The analyze request
+            cached_tokens: Tokens of the cached prefix it references (0 if none)
+
+        Returns:
+            Seconds added to the request's latency
+        """
+        if isinstance(request.get("describe"), dict):
+            text = "\n".join(f"{key}: {title}" for key, title in request["describe"].items())
+        elif isinstance(request.get("items"), dict):
+            text = "\n".join(request["items"].values())
+        else:
+            text = request.get("diff", "")
+        tokens = estimate_tokens(text)
+        if not cached_tokens:
+            # The template and topic lists are part of the prompt
+            tokens += PROMPT_OVERHEAD_TOKENS + estimate_tokens(
+                json.dumps([request.get("completed_topics", []), request.get("to_learn_topics", [])])
+            )
+        with self._lock:
+            self.stats["input_tokens"] += tokens
+            self.stats["cached_tokens"] += cached_tokens
+        return tokens / 1000.0 * self.prefill_ms_per_1k / 1000.0
+
+    def topics_for(self, diff_text: str) -> List[Dict[str, Any]]:
+        """
+        Build the topics returned for a diff.
+
+        Canned responses are looked up by the sha256 of the diff, then under
+        "default"; otherwise topics are derived from the rule-based and mock
+        extractors so the response depends on the diff content.
+
+        Args:
+            diff_text: The diff sent by the client
+
+        Returns:
+            A list of topic dictionaries
+        """
+        if self.canned:
+            digest = hashlib.sha256(diff_text.encode("utf-8")).hexdigest()
+            if digest in self.canned:
+                return self.canned[digest]
+            if "default" in self.canned:
+                return self.canned["default"]
+
+        from .llm_utils import extract_mock_topics, merge_topics
+        from .topic_rules import extract_rule_topics
+        return merge_topics(extract_rule_topics(diff_text).topics, extract_mock_topics(diff_text))
+
+    def describe(self, topic_id: str, title: str) -> Dict[str, Any]:
+        """
+        Build the description returned for a placeholder topic.
+
+        Catalogue topics get their catalogue entry; other topics get a
+        generated description without prerequisites.
+
+        Args:
+            topic_id: ID of the topic
+            title: Title sent by the client
+
+        Returns:
+            A topic dictionary
+        """
+        from .topic_rules import get_catalogue
+        return get_catalogue().topic(topic_id) or {
+            "topic_id": topic_id,
+            "title": title,
+            "description": f"What {title} is and how it is used in code.",
+            "prerequisites": [],
+        }
+
+
+def load_canned_responses(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Load canned responses from a JSON file.
+
+    The file holds either a list of topics (used for every request) or an
+    object mapping diff sha256 digests (or "default") to topic lists.
+
+    Args:
+        path: Path to the JSON file
+
+    Returns:
+        Canned responses keyed by digest
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return {"default": data}
+    return data
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler for the stub LLM endpoints.
+    """
+    server_version = "BrainVibeLLMStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def behaviour(self) -> StubBehaviour:
+        return self.server.behaviour
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout or a hedged request that lost the race)
+            self.close_connection = True
+
+    def do_GET(self):
+        if self.path == "/v1/stats":
+            self._send_json(200, dict(self.behaviour.stats, latency=self.behaviour.latency_spec,
+                                      cached_contents=self.behaviour.live_caches()))
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def do_DELETE(self):
+        if self.path.startswith("/v1/cachedContents/") and self.behaviour.delete_cache(self.path[len("/v1/"):]):
+            self._send_json(200, {})
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        if self.path not in ("/v1/analyze", "/v1/cachedContents"):
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+        try:
+            request = json.loads(raw_body or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON body"}})
+            return
+
+        if self.path == "/v1/cachedContents":
+            name = self.behaviour.create_cache(request.get("contents"), float(request.get("ttl") or 3600))
+            self._send_json(200, {"name": name, "model": request.get("model")})
+            return
+
+        cached_tokens = 0
+        if request.get("cached_content"):
+            cached_tokens = self.behaviour.cached_tokens(request["cached_content"])
+            if cached_tokens is None:
+                self._send_json(404, {"error": {"code": 404, "message": "CachedContent not found"}})
+                return
+
+        delay, status = self.behaviour.decide(request.get("model"))
+        prefill = self.behaviour.prefill(request, cached_tokens) if status == 200 else 0.0
+        if delay or prefill:
+            time.sleep(delay + prefill)
+
+        if status == 429:
+            self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted"}},
+                            headers={"Retry-After": f"{self.behaviour.retry_after:g}"})
+            return
+        if status != 200:
+            self._send_json(status, {"error": {"code": status, "message": "Simulated server error"}})
+            return
+
+        if isinstance(request.get("describe"), dict):
+            answer = [self.behaviour.describe(topic_id, title) for topic_id, title in request["describe"].items()]
+        elif isinstance(request.get("items"), dict):
+            # Batched prompt: one topic list per change key
+            answer = [{"change_key": key, "topics": self.behaviour.topics_for(diff)}
+                      for key, diff in request["items"].items()]
+        else:
+            answer = self.behaviour.topics_for(request.get("diff", ""))
+        self._send_json(200, {
+            "candidates": [{
+                "content": {"parts": [{"text": json.dumps(answer)}], "role": "model"},
+                "finishReason": "STOP",
+            }],
+            "usageMetadata": {"simulatedLatencyMs": round((delay + prefill) * 1000, 3),
+                              "cachedContentTokenCount": cached_tokens},
+        })
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server carrying a StubBehaviour.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, behaviour: StubBehaviour):
+        super().__init__(address, StubRequestHandler)
+        self.behaviour = behaviour
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 8765,
+                      behaviour: Optional[StubBehaviour] = None, background: bool = False) -> StubLLMServer:
+    """
+    Start the stub LLM server.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        behaviour: Latency and failure model
+        background: Serve from a daemon thread instead of blocking
+
+    Returns:
+        The running server (server.server_address holds the bound address)
+    """
+    server = StubLLMServer((host, port), behaviour or StubBehaviour())
+    if background:
+        threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
@@ -1,23 +1,65 @@
 """
 Utility functions for interacting with LLMs (e.g., Gemini API)
 """
+import hashlib
 import logging
 import json
 import os
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional
 from datetime import datetime
+from django.conf import settings
+from django.db.models import Count, Max
 from ..models import Topic
+from .analysis_cache import get_unit_topics, remember_unit_topics
+from .diff_chunker import chunk_diff
+from .diff_compaction import compact_diff
+from .diff_filter import filter_diff
+from .diff_parser import parse_diff
+from .json_stream import iter_topics, parse_topics
+from .keyword_matcher import AhoCorasick, scan_added_lines
+from . import model_router
+from .llm_batch import pack_batches
+from .llm_providers import get_provider
+from .prompt_cache import cacheable_snapshot
+from .tokens import estimate_tokens
+from .resilience import (CircuitOpenError, Deadline, DeadlineExceeded, ProviderGuard, call_with_resilience,
+                         get_guard)
+from .topic_index import DEFAULT_CONTEXT_TOPICS, get_cached_index, select_relevant_topics
+from .topic_rules import DEFAULT_MAX_UNEXPLAINED_RATIO, extract_rule_topics, get_catalogue
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
-def analyze_diff(diff_text: str, project_context: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+class PartialAnalysis(Exception):
+    """
+    Raised instead of falling back when the LLM could not finish an analysis
+    (deadline passed, circuit open or provider failing).
+    
+    Attributes:
+        topics: The topics found before the failure: those of the topic rules
+            and of the diff units already answered
+    """
+    
+    def __init__(self, message: str, topics: List[Dict[str, Any]]):
+        super().__init__(message)
+        self.topics = topics
+
+
+def analyze_diff(diff_text: str, project_context: Optional[Dict[str, Any]] = None,
+                 deadline: Optional[Deadline] = None, fallback: bool = True) -> List[Dict[str, Any]]:
     """
     Analyze a Git diff using an LLM (e.g., Gemini) to extract learning topics.
     
     Args:
         diff_text: The Git diff to analyze
         project_context: Optional context about the project to improve topic extraction
+        deadline: Time budget for the LLM call (defaults to BRAINVIBE_LLM_DEADLINE seconds);
+            a StagedDeadline is split across filtering, cache lookups and the LLM
+        fallback: Fall back to cached or keyword-based topics when the LLM fails;
+            with False, PartialAnalysis is raised with the topics found so far
         
     Returns:
         A list of dictionaries representing detected topics
@@ -27,20 +69,453 @@ def analyze_diff(diff_text: str, project_context: Optional[Dict[str, Any]] = Non
         logger.warning("Empty diff provided")
         return []
     
-    # STUB: In the real implementation, we would call Gemini API here
-    # Sample implementation would be:
-    # api_key = os.environ.get("GEMINI_API_KEY")
-    # if not api_key:
-    #     logger.error("GEMINI_API_KEY environment variable not set")
-    #     return []
-    #
-    # response = call_gemini_api(api_key, diff_text, project_context)
-    # return parse_gemini_response(response)
-    
-    # For now, analyze the mock diff and return mock topics
+    if deadline is None:
+        deadline = Deadline(getattr(settings, 'BRAINVIBE_LLM_DEADLINE', 60))
+    rule_result = rule_analysis(diff_text, deadline)
+    if rule_result is None:
+        return []
+    if rule_result.fully_covered:
+        return rule_result.topics
+    
+    # Only the residue the rules could not explain goes to the LLM
+    try:
+        return merge_topics(rule_result.topics,
+                            _analyze_residue(rule_result.residue, project_context, deadline, fallback))
+    except PartialAnalysis as e:
+        raise PartialAnalysis(str(e), merge_topics(rule_result.topics, e.topics)) from e
+
+
+def rule_analysis(diff_text: str, deadline: Optional[Deadline] = None):
+    """
+    Filter a diff and resolve what the topic rules can explain without a network call.
+    
+    Args:
+        diff_text: The Git diff to analyze
+        deadline: Optional time budget; only its "filter" stage is checked
+        
+    Returns:
+        The topic_rules result (topics, and the residue left for the LLM), or
+        None when nothing is left after filtering
+    """
+    filter_deadline = deadline.stage("filter") if deadline is not None else None
+    
+    # Drop ignored, binary and generated files before any analysis
+    diff_text = filter_diff(diff_text) if diff_text else ""
+    if not diff_text:
+        logger.info("Nothing left to analyze after filtering the diff")
+        return None
+    
+    rule_result = extract_rule_topics(
+        parse_diff(diff_text),
+        max_unexplained_ratio=getattr(settings, 'BRAINVIBE_RULES_MAX_UNEXPLAINED_RATIO', DEFAULT_MAX_UNEXPLAINED_RATIO)
+    )
+    if rule_result.fully_covered:
+        logger.info(f"Diff fully covered by topic rules ({rule_result.elapsed_ms:.2f} ms), skipping LLM")
+    else:
+        logger.info(f"{len(rule_result.residue_files)} files are left unexplained for the LLM")
+    if filter_deadline is not None and filter_deadline.expired:
+        logger.warning("Filtering and topic rules used up their share of the deadline")
+    return rule_result
+
+
+def _analyze_residue(residue: str, project_context: Optional[Dict[str, Any]] = None,
+                     deadline: Optional[Deadline] = None, fallback: bool = True) -> List[Dict[str, Any]]:
+    """
+    Send the residue of the topic rules to the LLM one definition at a time,
+    reusing the topics of units analyzed before.
+    
+    The residue is split into diff_chunker units (the hunks changing one
+    function or class). Units whose fingerprint is in the analysis cache are
+    answered from it. The others are compacted and sent: a lone unit through
+    the routed single-diff path, several units as items of batched prompts
+    sized for the fast tier, so their topics can be cached unit by unit.
+    
+    Cache lookups stop when the "cache" stage of the deadline runs out; the
+    units not looked up yet are sent to the LLM.
+    
+    Args:
+        residue: Residue diff of the topic rules
+        project_context: Optional context about the project
+        deadline: Time budget for the cache lookups and all LLM calls
+        fallback: Return fallback topics on failure instead of raising PartialAnalysis
+        
+    Returns:
+        A list of dictionaries representing detected topics
+    """
+    if deadline is None:
+        deadline = Deadline(getattr(settings, 'BRAINVIBE_LLM_DEADLINE', 60))
+    topic_lists, pending = lookup_units(residue, deadline)
+    if not pending:
+        return merge_topics(*topic_lists)
+    
+    answers: Dict[str, List[Dict[str, Any]]] = {}
+    try:
+        analyze_units(pending, project_context, deadline.stage("llm"), fallback, answers)
+    except Exception as e:
+        if fallback:
+            raise
+        # What was answered before the failure is cached and reported
+        raise PartialAnalysis(f"LLM analysis incomplete: {e}", merge_topics(*topic_lists, *answers.values())) from e
+    return merge_topics(*topic_lists, *answers.values())
+
+
+def lookup_units(residue: str, deadline: Optional[Deadline] = None):
+    """
+    Split a residue into diff_chunker units and look their topics up in the analysis cache.
+    
+    Lookups stop when the "cache" stage of the deadline runs out; the units
+    not looked up yet count as pending.
+    
+    Args:
+        residue: Residue diff of the topic rules
+        deadline: Optional time budget
+        
+    Returns:
+        Tuple of (cached topic lists, texts of the pending units keyed by fingerprint)
+    """
+    provider = get_provider()
+    topic_lists: List[List[Dict[str, Any]]] = []
+    pending: Dict[str, str] = {}
+    units = chunk_diff(residue)
+    cache_deadline = deadline.stage("cache") if deadline is not None else None
+    for unit in units:
+        expired = cache_deadline is not None and cache_deadline.expired
+        cached = get_unit_topics(provider.name, unit.fingerprint) if not expired else None
+        if cached is not None:
+            topic_lists.append(cached)
+        elif unit.fingerprint not in pending:
+            pending[unit.fingerprint] = unit.text
+    logger.info(f"Residue has {len(units)} definition units, {len(units) - len(pending)} answered from the cache")
+    return topic_lists, pending
+
+
+def analyze_units(pending: Dict[str, str], project_context: Optional[Dict[str, Any]], deadline: Deadline,
+                  fallback: bool = True, answers: Optional[Dict[str, List[Dict[str, Any]]]] = None
+                  ) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Send diff units to the LLM and cache their topics unit by unit.
+    
+    The units are compacted. A lone unit goes through the routed single-diff
+    path; several units are items of batched prompts sized for the fast tier.
+    
+    Args:
+        pending: Unit texts keyed by fingerprint (see lookup_units)
+        project_context: Optional context about the project
+        deadline: Time budget for all LLM calls
+        fallback: Answer the units of a failed call with fallback topics instead of raising
+        answers: Optional dict receiving the answers as they arrive, so callers
+            keep them when a later call raises
+        
+    Returns:
+        Topic lists keyed by fingerprint
+    """
+    provider = get_provider()
+    answers = {} if answers is None else answers
+    pending = {fingerprint: compact_residue(text) for fingerprint, text in pending.items()}
+    
+    def analyze_one(texts):
+        return {key: _analyze_with_llm(text, project_context, deadline, fallback=False) for key, text in texts.items()}
+    
+    def analyze_batch(texts):
+        return _analyze_batch_with_llm(texts, project_context, deadline, fallback=False)
+    
+    if len(pending) == 1:
+        # What the cache leaves is routed as one diff, with escalation
+        calls = [(pending, analyze_one)]
+    else:
+        budget = model_router.fast_diff_budget(project_context)
+        batches, singles = pack_batches(pending, item_max_tokens=budget, batch_max_tokens=budget)
+        calls = [(batch, analyze_batch) for batch in batches]
+        for key in singles:
+            # A unit left alone in its batch stays a batch item on the fast model unless it
+            # needs routing of its own
+            small = estimate_tokens(pending[key]) <= budget
+            calls.append(({key: pending[key]}, analyze_batch if small else analyze_one))
+    
+    for texts, call in calls:
+        try:
+            answered = call(texts)
+        except Exception as e:
+            if not fallback:
+                raise
+            logger.warning(f"Falling back for {len(texts)} diff units: {e}")
+            for fingerprint, text in texts.items():
+                answers[fingerprint] = _fallback_topics(hashlib.sha256(text.encode('utf-8')).hexdigest(), text)
+            continue
+        for fingerprint, topics in answered.items():
+            remember_unit_topics(provider.name, fingerprint, topics)
+            answers[fingerprint] = topics
+    return answers
+
+
+def compact_residue(residue: str) -> str:
+    """
+    Compact the diff residue the rules left for the LLM (see diff_compaction).
+    
+    Args:
+        residue: Residue diff of the topic rules
+        
+    Returns:
+        The compacted diff, or the residue unchanged when compaction is disabled
+    """
+    if not getattr(settings, 'BRAINVIBE_COMPACTION_ENABLED', True):
+        return residue
+    result = compact_diff(residue)
+    logger.info(f"Compacted the LLM residue from {result.tokens_before} to {result.tokens_after} tokens "
+                f"({result.saved_ratio:.0%} saved)")
+    return result.text
+
+
+def merge_topics(*topic_lists: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge topic lists, keeping the first occurrence of each topic_id.
+    
+    Args:
+        topic_lists: Lists of topic dictionaries
+        
+    Returns:
+        A single deduplicated list of topics
+    """
+    merged = {}
+    for topics in topic_lists:
+        for topic in topics:
+            topic_id = topic.get("topic_id")
+            if topic_id and topic_id not in merged:
+                merged[topic_id] = topic
+    return list(merged.values())
+
+
+# Recent successful LLM results, served when the provider is unavailable
+_RECENT_RESULTS_SIZE = 256
+_recent_results: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+_recent_results_lock = threading.Lock()
+
+
+def _remember_result(key: str, topics: List[Dict[str, Any]]):
+    with _recent_results_lock:
+        _recent_results[key] = topics
+        _recent_results.move_to_end(key)
+        while len(_recent_results) > _RECENT_RESULTS_SIZE:
+            _recent_results.popitem(last=False)
+
+
+def _recall_result(key: str) -> Optional[List[Dict[str, Any]]]:
+    with _recent_results_lock:
+        return _recent_results.get(key)
+
+
+def get_provider_guard(provider=None) -> ProviderGuard:
+    """
+    Return the circuit breaker and rate limiter shared by all calls to a provider.
+    
+    Args:
+        provider: The provider (default: the configured one)
+        
+    Returns:
+        The provider's ProviderGuard
+    """
+    provider = provider or get_provider()
+    return get_guard(
+        provider.name,
+        requests_per_second=getattr(settings, 'BRAINVIBE_LLM_MAX_RPS', 0),
+        error_rate=getattr(settings, 'BRAINVIBE_LLM_CIRCUIT_ERROR_RATE', 0.5),
+        open_seconds=getattr(settings, 'BRAINVIBE_LLM_CIRCUIT_OPEN_SECONDS', 30)
+    )
+
+
+def set_max_rps(rps: Optional[float]):
+    """
+    Override BRAINVIBE_LLM_MAX_RPS for this process (the --rps option of the batch commands).
+    
+    The rate is read when the provider guard is created, so this must run
+    before the first LLM call.
+    
+    Args:
+        rps: LLM requests per second (None keeps the setting)
+    """
+    if rps is not None:
+        settings.BRAINVIBE_LLM_MAX_RPS = rps
+
+
+def wait_for_provider(report: Optional[Callable[[str], Any]] = None) -> bool:
+    """
+    Wait out an open circuit of the provider before a page of batch work,
+    instead of failing the whole page.
+    
+    Args:
+        report: Called with a message before waiting
+        
+    Returns:
+        True if the circuit was not closed, so the page should run sequentially
+        and let its first call probe the provider alone
+    """
+    breaker = get_provider_guard().breaker
+    if breaker.state == 'closed':
+        return False
+    if breaker.state == 'open':
+        if report:
+            report(f"LLM circuit is open, waiting {breaker.open_seconds:g}s")
+        time.sleep(breaker.open_seconds)
+    return True
+
+
+def _analyze_with_llm(diff_text: str, project_context: Optional[Dict[str, Any]] = None,
+                      deadline: Optional[Deadline] = None, fallback: bool = True) -> List[Dict[str, Any]]:
+    """
+    Send a diff to the LLM and return the extracted topics.
+    
+    The model tier is picked by model_router from the estimated prompt size:
+    most diffs go to the fast model, huge diffs go to the long-context model
+    or are chunked, and a fast-tier result that fails validation is
+    retried once on the strong model.
+    
+    Each call runs under a deadline with capped retries (and optional hedging).
+    When the provider's circuit is open, the deadline runs out or the provider
+    keeps failing, the last result for the same diff or the keyword-based
+    topics are returned instead, so callers never wait on a provider outage.
+    
+    Args:
+        diff_text: The Git diff to analyze
+        project_context: Optional context about the project
+        deadline: Time budget for the call, including retries
+        fallback: Return fallback topics on failure instead of raising
+        
+    Returns:
+        A list of dictionaries representing detected topics
+    """
+    decision = model_router.route(diff_text, project_context)
+    
+    # The provider (mock, gemini or the local stub server) is picked in settings
+    provider = get_provider()
+    guard = get_provider_guard(provider)
+    if deadline is None:
+        deadline = Deadline(getattr(settings, 'BRAINVIBE_LLM_DEADLINE', 60))
+    cache_key = hashlib.sha256(diff_text.encode('utf-8')).hexdigest()
+    
+    def call(text, model):
+        return call_with_resilience(
+            lambda timeout: provider.analyze(text, project_context, timeout=timeout, model=model),
+            guard,
+            deadline,
+            max_attempts=getattr(settings, 'BRAINVIBE_LLM_MAX_ATTEMPTS', 3),
+            hedge_percentile=0.95 if getattr(settings, 'BRAINVIBE_LLM_HEDGE', False) else None
+        )
+    
+    try:
+        topics = merge_topics(*(call(chunk, decision.model) for chunk in decision.chunks))
+        rejection = model_router.validate_topics(topics, decision.diff_tokens)
+        if rejection and decision.escalate_model and not deadline.expired:
+            model_router.log_decision("escalate", decision, rejected=rejection, to_model=decision.escalate_model)
+            topics = merge_topics(topics, call(diff_text, decision.escalate_model))
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning(f"Skipping LLM analysis: {e}")
+        if not fallback:
+            raise
+        return _fallback_topics(cache_key, diff_text)
+    except Exception as e:
+        logger.error(f"LLM analysis failed with provider '{provider.name}': {e}")
+        if not fallback:
+            raise
+        return _fallback_topics(cache_key, diff_text)
+    
+    _remember_result(cache_key, topics)
+    return topics
+
+
+def _analyze_batch_with_llm(diff_texts: Dict[str, str], project_context: Optional[Dict[str, Any]],
+                            deadline: Deadline, fallback: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Send several small diffs to the LLM in one prompt and fan the topics back out.
+    
+    Items get short keys in the prompt. Items the model leaves out of its
+    answer are analyzed on their own; when the batched call fails, every item
+    falls back like a failed single analysis.
+    
+    Args:
+        diff_texts: Small diffs keyed by caller keys
+        project_context: Optional context about the project
+        deadline: Time budget for the call, including retries
+        fallback: Return fallback topics on failure instead of raising
+        
+    Returns:
+        Lists of topics keyed like diff_texts
+    """
+    provider = get_provider()
+    guard = get_provider_guard(provider)
+    keys = {f"c{index}": key for index, key in enumerate(diff_texts, 1)}
+    items = {short: diff_texts[key] for short, key in keys.items()}
+    cache_keys = {key: hashlib.sha256(text.encode('utf-8')).hexdigest() for key, text in diff_texts.items()}
+    model = getattr(settings, 'BRAINVIBE_LLM_FAST_MODEL', model_router.DEFAULT_FAST_MODEL)
+    
+    try:
+        answered = call_with_resilience(
+            lambda timeout: provider.analyze_batch(items, project_context, timeout=timeout, model=model),
+            guard,
+            deadline,
+            max_attempts=getattr(settings, 'BRAINVIBE_LLM_MAX_ATTEMPTS', 3),
+            hedge_percentile=0.95 if getattr(settings, 'BRAINVIBE_LLM_HEDGE', False) else None
+        )
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.warning(f"Skipping batched LLM analysis: {e}")
+        if not fallback:
+            raise
+        return {key: _fallback_topics(cache_keys[key], text) for key, text in diff_texts.items()}
+    except Exception as e:
+        logger.error(f"Batched LLM analysis failed with provider '{provider.name}': {e}")
+        if not fallback:
+            raise
+        return {key: _fallback_topics(cache_keys[key], text) for key, text in diff_texts.items()}
+    
+    results = {}
+    for short, key in keys.items():
+        if short in answered:
+            results[key] = answered[short]
+            _remember_result(cache_keys[key], results[key])
+        else:
+            logger.info(f"Batched LLM answer has no entry for {short}, analyzing it on its own")
+            results[key] = _analyze_with_llm(diff_texts[key], project_context, deadline, fallback)
+    return results
+
+
+def _fallback_topics(cache_key: str, diff_text: str) -> List[Dict[str, Any]]:
+    cached = _recall_result(cache_key)
+    if cached is not None:
+        logger.info("Using the cached LLM result for this diff")
+        return cached
     return extract_mock_topics(diff_text)
 
 
+# Keyword rules used by the mock extractor, in output order
+MOCK_TOPIC_RULES = [
+    ("React", {
+        "topic_id": "react-hooks-useState",
+        "title": "React Hooks - useState",
+        "description": "Using the useState hook in React for managing component state",
+        "prerequisites": ["react-basics"]
+    }),
+    ("axios", {
+        "topic_id": "axios-http-client",
+        "title": "Axios HTTP Client",
+        "description": "Making HTTP requests with Axios in JavaScript applications",
+        "prerequisites": ["javascript-promises", "async-await"]
+    }),
+    ("jwt_decode", {
+        "topic_id": "jwt-authentication",
+        "title": "JWT Authentication",
+        "description": "Implementing authentication using JSON Web Tokens",
+        "prerequisites": ["web-security-basics", "http-authentication"]
+    }),
+    ("router", {
+        "topic_id": "react-router",
+        "title": "React Router",
+        "description": "Client-side routing in React applications",
+        "prerequisites": ["react-basics"]
+    }),
+]
+
+_mock_matcher = AhoCorasick((keyword, position) for position, (keyword, _) in enumerate(MOCK_TOPIC_RULES))
+
+
 def extract_mock_topics(diff_text: str) -> List[Dict[str, Any]]:
     """
     Mock function to extract topics from a diff.
@@ -52,42 +527,10 @@ def extract_mock_topics(diff_text: str) -> List[Dict[str, Any]]:
     Returns:
         A list of dictionaries representing detected topics
     """
-    # Analyze the diff content to find potential topics - this is just a mock implementation
-    topics = []
-    
-    if "React" in diff_text:
-        topics.append({
-            "topic_id": "react-hooks-useState",
-            "title": "React Hooks - useState",
-            "description": "Using the useState hook in React for managing component state",
-            "prerequisites": ["react-basics"]
-        })
-    
-    if "axios" in diff_text:
-        topics.append({
-            "topic_id": "axios-http-client",
-            "title": "Axios HTTP Client",
-            "description": "Making HTTP requests with Axios in JavaScript applications",
-            "prerequisites": ["javascript-promises", "async-await"]
-        })
-    
-    if "jwt_decode" in diff_text:
-        topics.append({
-            "topic_id": "jwt-authentication",
-            "title": "JWT Authentication",
-            "description": "Implementing authentication using JSON Web Tokens",
-            "prerequisites": ["web-security-basics", "http-authentication"]
-        })
-    
-    if "router" in diff_text:
-        topics.append({
-            "topic_id": "react-router",
-            "title": "React Router",
-            "description": "Client-side routing in React applications",
-            "prerequisites": ["react-basics"]
-        })
-    
-    return topics
+    # One pass over the added lines finds every rule keyword
+    hits = scan_added_lines(diff_text, _mock_matcher)
+    matched = {position for payloads in hits.payloads.values() for position in payloads}
+    return [dict(MOCK_TOPIC_RULES[position][1]) for position in sorted(matched)]
 
 
 def call_gemini_api(api_key: str, diff_text: str, project_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
@@ -107,6 +550,7 @@ def call_gemini_api(api_key: str, diff_text: str, project_context: Optional[Dict
     # import requests
     # 
     # url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+    # (use :streamGenerateContent?alt=sse with iter_streamed_topics to consume topics incrementally)
     # headers = {
     #     "Content-Type": "application/json",
     #     "x-goog-api-key": api_key
@@ -140,7 +584,9 @@ def call_gemini_api(api_key: str, diff_text: str, project_context: Optional[Dict
     #     "generationConfig": {
     #         "temperature": 0.2,
     #         "topP": 0.8,
-    #         "topK": 40
+    #         "topK": 40,
+    #         "responseMimeType": "application/json",
+    #         "responseSchema": TOPIC_RESPONSE_SCHEMA
     #     }
     # }
     # 
@@ -171,7 +617,10 @@ def call_gemini_api(api_key: str, diff_text: str, project_context: Optional[Dict
 def parse_gemini_response(response: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Parse the response from the Gemini API.
-    This is a placeholder for the actual implementation.
+    
+    The text part is expected to hold a JSON array of topics (optionally inside a
+    markdown code fence); it is read with the same incremental parser used for
+    streamed responses.
     
     Args:
         response: The JSON response from the Gemini API
@@ -179,65 +628,125 @@ def parse_gemini_response(response: Dict[str, Any]) -> List[Dict[str, Any]]:
     Returns:
         A list of dictionaries representing detected topics
     """
-    # This would be implemented in the actual code
-    # try:
-    #     if "error" in response:
-    #         logger.error(f"Error in Gemini API response: {response['error']}")
-    #         return []
-    #     
-    #     if "candidates" not in response or not response["candidates"]:
-    #         logger.error("No candidates in Gemini API response")
-    #         return []
-    #     
-    #     content = response["candidates"][0]["content"]
-    #     if "parts" not in content or not content["parts"]:
-    #         logger.error("No parts in Gemini API response content")
-    #         return []
-    #     
-    #     text = content["parts"][0]["text"]
-    #     # The response might be in a code block, so extract the JSON
-    #     if "```json" in text:
-    #         text = text.split("```json")[1].split("```")[0].strip()
-    #     elif "```" in text:
-    #         text = text.split("```")[1].split("```")[0].strip()
-    #     
-    #     topics = json.loads(text)
-    #     return topics
-    # except Exception as e:
-    #     logger.exception(f"Error parsing Gemini API response: {e}")
-    #     return []
+    if "error" in response:
+        logger.error(f"Error in Gemini API response: {response['error']}")
+        return []
     
-    # Return mock topics
-    if "candidates" in response and response["candidates"]:
-        try:
-            text = response["candidates"][0]["content"]["parts"][0]["text"]
-            return json.loads(text)
-        except Exception as e:
-            logger.exception(f"Error parsing mock response: {e}")
-            
-    return [] 
+    if not response.get("candidates"):
+        logger.error("No candidates in Gemini API response")
+        return []
+    
+    try:
+        parts = response["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError) as e:
+        logger.exception(f"Error parsing Gemini API response: {e}")
+        return []
+    
+    return parse_topics("".join(part.get("text", "") for part in parts))
+
 
-def extract_topics_from_diff(diff_text, project):
+def iter_streamed_topics(chunks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
     """
-    Extract topics from a diff using the LLM.
+    Yield topics from a streamed Gemini response as soon as each topic object closes.
+    
+    Args:
+        chunks: Iterable of streamed response chunks (same shape as a full response)
+        
+    Yields:
+        Topic dictionaries
+    """
+    def texts():
+        for chunk in chunks:
+            for candidate in chunk.get("candidates", [])[:1]:
+                for part in candidate.get("content", {}).get("parts", []):
+                    yield part.get("text", "")
+    
+    return iter_topics(texts())
+
+
+def build_project_context(project, diff_text: str, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Build the project context for a diff, keeping only the most relevant existing topics.
+
+    The topic index is cached per project and rebuilt only when the project's
+    topic set changes, so prompt size stays bounded as the graph grows. When
+    the project's topics are worth caching on the provider side, the context
+    also carries their snapshot under "topic_snapshot" (see prompt_cache).
     
     Args:
-        diff_text: The diff text to analyze
         project: The project model object
+        diff_text: The diff text to analyze
+        limit: Maximum number of existing topics (defaults to BRAINVIBE_PROMPT_CONTEXT_TOPICS)
         
     Returns:
-        List of topics extracted from the diff
+        A dictionary with the project context
     """
-    # Prepare project context
-    project_context = {
+    if limit is None:
+        limit = getattr(settings, 'BRAINVIBE_PROMPT_CONTEXT_TOPICS', DEFAULT_CONTEXT_TOPICS)
+
+    project_topics = Topic.objects.filter(project=project)
+    stats = project_topics.aggregate(count=Count('id'), last_update=Max('updated_at'))
+    version = (stats['count'], stats['last_update'])
+    index = get_cached_index(
+        project.project_id,
+        version,
+        lambda: list(project_topics.values('topic_id', 'title', 'description', 'status'))
+    )
+
+    context = {
         "project_id": project.project_id,
         "name": project.name,
-        "existing_topics": list(Topic.objects.filter(project=project).values('topic_id', 'title', 'status'))
+        "total_topics": stats['count'],
+        "existing_topics": [
+            {key: topic[key] for key in ('topic_id', 'title', 'status')}
+            for topic in select_relevant_topics(diff_text, (), limit=limit, index=index)
+        ]
     }
+    # Large projects send all their topics as a prompt prefix cached by the provider
+    snapshot = cacheable_snapshot(project.project_id, version, lambda: index.topics)
+    if snapshot is not None:
+        context["topic_snapshot"] = snapshot
+    return context
+
+
+def extract_topics_from_diff(diff_text, project, deadline: Optional[Deadline] = None, fallback: bool = True):
+    """
+    Extract topics from a diff using the LLM.
+    
+    Args:
+        diff_text: The diff text to analyze
+        project: The project model object
+        deadline: Optional time budget for the LLM call
+        fallback: Fall back to cached or keyword-based topics when the LLM fails
+            (with False, PartialAnalysis is raised carrying the processed topics found so far)
+        
+    Returns:
+        List of topics extracted from the diff
+    """
+    # Prepare project context with only the topics relevant to this diff
+    project_context = build_project_context(project, diff_text)
     
     # Pass the diff to the LLM to extract topics
-    new_topics = analyze_diff(diff_text, project_context)
+    try:
+        new_topics = analyze_diff(diff_text, project_context, deadline, fallback)
+    except PartialAnalysis as e:
+        raise PartialAnalysis(str(e), process_topics(e.topics)) from e
+    return process_topics(new_topics)
+
+
+def process_topics(new_topics: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Standardize topics and add their missing prerequisites as topics.
     
+    Prerequisites found in the topic catalogue get their catalogue entry;
+    others become placeholders with an empty description (see topic_enrichment).
+    
+    Args:
+        new_topics: Topics as returned by the rules and the LLM
+        
+    Returns:
+        The processed topics, ready to be saved
+    """
     # Process and enrich the topics
     topics_data = []
     for topic_data in new_topics:
@@ -259,8 +768,8 @@ def extract_topics_from_diff(diff_text, project):
         for prereq_id in processed_topic.get("prerequisites", []):
             # Check if we already have this topic in our list
             if not any(t.get("topic_id") == prereq_id for t in topics_data):
-                # Add a basic topic for this prerequisite
-                topics_data.append({
+                # Use the catalogue entry if there is one, otherwise a basic placeholder
+                topics_data.append(get_catalogue().topic(prereq_id) or {
                     "topic_id": prereq_id,
                     "title": prereq_id.replace('-', ' ').title(),
                     "description": "",
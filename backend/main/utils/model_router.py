@@ -0,0 +1,208 @@
+"""
+Size-based model tier routing for diff analysis.
+
+Every diff that reaches the LLM is routed by its estimated prompt size:
+- "fast": the cheap, low-latency model (BRAINVIBE_LLM_FAST_MODEL) for
+  everything up to BRAINVIBE_ROUTER_FAST_MAX_TOKENS, however small: a residue
+  the topic rules did not explain still needs its topics
+- "strong": the long-context model (BRAINVIBE_LLM_STRONG_MODEL) for diffs up to
+  BRAINVIBE_ROUTER_STRONG_MAX_TOKENS
+- "chunked": larger diffs are split at function and class boundaries (see
+  diff_chunker) into chunks the fast model can take
+
+A fast-tier result that fails validation (malformed topics, or no topics at
+all for a diff of substantial size, not counting the project context) is
+escalated once to the strong model. Each decision is logged as one JSON line
+on this module's logger and counted in routing_stats(), so thresholds can be
+tuned from real traffic.
+"""
+import json
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from .diff_chunker import chunk_diff
+from .tokens import estimate_prompt_tokens, estimate_tokens
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+CHUNKED_TIER = "chunked"
+
+DEFAULT_FAST_MODEL = "gemini-1.5-flash"
+DEFAULT_STRONG_MODEL = "gemini-1.5-pro"
+
+
+class RoutingDecision:
+    """
+    Where a diff goes and why.
+
+    Attributes:
+        tier: One of the tier names above
+        model: Model name for the tier
+        tokens: Estimated prompt tokens
+        diff_tokens: Estimated tokens of the diff alone (without template and project context)
+        reason: Short human-readable explanation
+        chunks: Diff texts to send (the whole diff unless chunked)
+        escalate_model: Model to retry with if the result fails validation
+    """
+    __slots__ = ("tier", "model", "tokens", "diff_tokens", "reason", "chunks", "escalate_model")
+
+    def __init__(self, tier: str, model: Optional[str], tokens: int, diff_tokens: int, reason: str,
+                 chunks: Optional[List[str]] = None, escalate_model: Optional[str] = None):
+        self.tier = tier
+        self.model = model
+        self.tokens = tokens
+        self.diff_tokens = diff_tokens
+        self.reason = reason
+        self.chunks = chunks or []
+        self.escalate_model = escalate_model
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tier": self.tier,
+            "model": self.model,
+            "tokens": self.tokens,
+            "diff_tokens": self.diff_tokens,
+            "reason": self.reason,
+            "chunks": len(self.chunks),
+        }
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def split_diff(diff_text: str, max_tokens: int) -> List[str]:
+    """
+    Split a diff into chunks of at most max_tokens estimated tokens.
+
+    Chunks are cut at function and class boundaries: the hunks changing the
+    same definition (a diff_chunker unit) stay together, and units are packed
+    in file order, sharing one file header where they follow each other. A
+    unit larger than a chunk is split between its hunks; a single hunk larger
+    than a chunk is kept whole.
+
+    Args:
+        diff_text: The diff to split
+        max_tokens: Token budget per chunk
+
+    Returns:
+        Diff texts, in order
+    """
+    # (path, header, hunks) pieces, each of which goes into one chunk
+    pieces = []
+    for unit in chunk_diff(diff_text):
+        if unit.tokens <= max_tokens or len(unit.hunk_texts) < 2:
+            pieces.append((unit.path, unit.header, "".join(unit.hunk_texts)))
+        else:
+            pieces.extend((unit.path, unit.header, hunk_text) for hunk_text in unit.hunk_texts)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_path = None
+    current_tokens = 0
+    for path, header, hunks in pieces:
+        tokens = estimate_tokens(header + hunks)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_path, current_tokens = [], None, 0
+        current.append(hunks if path == current_path else header + hunks)
+        current_path = path
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def fast_diff_budget(project_context: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Diff tokens that fit a fast-tier prompt next to the template and project context.
+    """
+    fast_max = _setting('BRAINVIBE_ROUTER_FAST_MAX_TOKENS', 32000)
+    return max(fast_max - estimate_prompt_tokens("", project_context), fast_max // 2)
+
+
+def route(diff_text: str, project_context: Optional[Dict[str, Any]] = None) -> RoutingDecision:
+    """
+    Pick the model tier for a diff.
+
+    Args:
+        diff_text: The diff (or rule residue) that would be sent to the model
+        project_context: Project context rendered into the prompt
+
+    Returns:
+        A RoutingDecision
+    """
+    tokens = estimate_prompt_tokens(diff_text, project_context)
+    diff_tokens = estimate_tokens(diff_text)
+    fast_model = _setting('BRAINVIBE_LLM_FAST_MODEL', DEFAULT_FAST_MODEL)
+    strong_model = _setting('BRAINVIBE_LLM_STRONG_MODEL', DEFAULT_STRONG_MODEL)
+    fast_max = _setting('BRAINVIBE_ROUTER_FAST_MAX_TOKENS', 32000)
+    strong_max = _setting('BRAINVIBE_ROUTER_STRONG_MAX_TOKENS', 500000)
+
+    if tokens <= fast_max:
+        decision = RoutingDecision(FAST_TIER, fast_model, tokens, diff_tokens, f"fits the fast tier ({fast_max} tokens)",
+                                   [diff_text], escalate_model=strong_model)
+    elif tokens <= strong_max:
+        decision = RoutingDecision(STRONG_TIER, strong_model, tokens, diff_tokens, f"fits the long-context tier ({strong_max} tokens)",
+                                   [diff_text])
+    else:
+        budget = max(fast_max - (tokens - diff_tokens), fast_max // 2)
+        decision = RoutingDecision(CHUNKED_TIER, fast_model, tokens, diff_tokens, f"exceeds {strong_max} tokens, chunked",
+                                   split_diff(diff_text, budget))
+    log_decision("route", decision)
+    return decision
+
+
+def validate_topics(topics: List[Dict[str, Any]], diff_tokens: int) -> Optional[str]:
+    """
+    Check a model result for signs that a stronger model should retry.
+
+    Args:
+        topics: Topics returned by the model
+        diff_tokens: Estimated tokens of the diff (see RoutingDecision.diff_tokens)
+
+    Returns:
+        The reason the result is rejected, or None if it is acceptable
+    """
+    for topic in topics:
+        if not isinstance(topic, dict) or not topic.get("topic_id") or not topic.get("title"):
+            return "malformed topic"
+        if not isinstance(topic.get("prerequisites", []), list):
+            return "malformed prerequisites"
+    if not topics and diff_tokens >= _setting('BRAINVIBE_ROUTER_ESCALATE_MIN_TOKENS', 400):
+        return "no topics for a substantial diff"
+    return None
+
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+def log_decision(event: str, decision: RoutingDecision, **extra):
+    """
+    Log a routing event as one JSON line and count it.
+
+    Args:
+        event: "route" or "escalate"
+        decision: The decision the event belongs to
+        extra: Additional fields (e.g. the validation failure)
+    """
+    record = dict(decision.to_dict(), event=event, **extra)
+    with _stats_lock:
+        _stats[f"{event}:{decision.tier}"] += 1
+    logger.info(f"LLM routing {json.dumps(record, sort_keys=True)}")
+
+
+def routing_stats() -> Dict[str, int]:
+    """
+    Counts of routing events per tier since start-up.
+    """
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,145 @@
+"""
+Path-prefix routing of monorepo diffs to the projects owning the files.
+
+A project tracking a monorepo may list ownership rules under
+`metadata["path_owners"]`: a mapping of path prefixes to the IDs of the
+projects owning them, e.g. `{"services/billing/": "billing", "web": "web"}`.
+Prefixes match whole path segments, so "web" covers "web/app.js" but not
+"webhooks/app.py", and the longest matching prefix wins. Files no rule
+covers stay with the project the diff was posted to.
+
+The rules are compiled into a trie keyed by path segment, so finding a
+file's owner costs one lookup per segment of its path however many rules
+there are. Compiled tries are cached by their rules.
+"""
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from .diff_parser import parse_diff
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Key of the ownership rules in Project.metadata
+RULES_KEY = "path_owners"
+
+
+def _segments(path: str) -> List[str]:
+    return [segment for segment in path.replace("\\", "/").split("/") if segment and segment != "."]
+
+
+class PathTrie:
+    """
+    Path prefixes compiled into a trie of path segments.
+
+    Attributes:
+        root: The root node, a (children, owner) pair where children maps a
+            segment to its node
+        size: Number of prefixes in the trie
+    """
+    __slots__ = ("root", "size")
+
+    def __init__(self):
+        self.root: Tuple[Dict[str, Any], List[Optional[str]]] = ({}, [None])
+        self.size = 0
+
+    def add(self, prefix: str, owner: str):
+        """
+        Add a prefix; a later owner of the same prefix replaces the earlier one.
+        """
+        node = self.root
+        for segment in _segments(prefix):
+            node = node[0].setdefault(segment, ({}, [None]))
+        if node[1][0] is None:
+            self.size += 1
+        node[1][0] = owner
+
+    def owner_of(self, path: str) -> Optional[str]:
+        """
+        Owner of the longest prefix covering a path.
+
+        Args:
+            path: Repository-relative path of a file
+
+        Returns:
+            The owner, or None if no prefix covers the path
+        """
+        node = self.root
+        owner = node[1][0]
+        for segment in _segments(path):
+            node = node[0].get(segment)
+            if node is None:
+                break
+            if node[1][0] is not None:
+                owner = node[1][0]
+        return owner
+
+
+@lru_cache(maxsize=256)
+def _compile(rules: Tuple[Tuple[str, str], ...]) -> PathTrie:
+    trie = PathTrie()
+    for prefix, owner in rules:
+        trie.add(prefix, owner)
+    return trie
+
+
+def project_rules(metadata: Optional[Mapping[str, Any]]) -> Dict[str, str]:
+    """
+    The valid ownership rules in a project's metadata.
+
+    Args:
+        metadata: Project.metadata
+
+    Returns:
+        Owning project IDs keyed by path prefix (empty without rules)
+    """
+    rules = (metadata or {}).get(RULES_KEY)
+    if not rules:
+        return {}
+    if not isinstance(rules, Mapping):
+        logger.warning(f"Ignoring {RULES_KEY} metadata that is not a mapping of path prefixes to project IDs")
+        return {}
+    valid = {}
+    for prefix, owner in rules.items():
+        if isinstance(prefix, str) and isinstance(owner, str) and owner:
+            valid[prefix] = owner
+        else:
+            logger.warning(f"Ignoring invalid {RULES_KEY} rule {prefix!r}: {owner!r}")
+    return valid
+
+
+def compile_rules(rules: Mapping[str, str]) -> PathTrie:
+    """
+    Compile ownership rules into a trie (cached by the rules).
+
+    Args:
+        rules: Owning project IDs keyed by path prefix
+
+    Returns:
+        The PathTrie
+    """
+    return _compile(tuple(sorted(rules.items())))
+
+
+def split_diff(diff_text: str, trie: PathTrie, default: str) -> Dict[str, Tuple[str, int]]:
+    """
+    Split a diff into one sub-diff per owner, in a single pass over its files.
+
+    Sections without a path (a plain diff without file headers) go to the
+    default owner.
+
+    Args:
+        diff_text: The diff
+        trie: The compiled ownership rules
+        default: Owner of files no rule covers
+
+    Returns:
+        (sub-diff text, number of files) keyed by owner, in order of first appearance
+    """
+    parsed = parse_diff(diff_text)
+    groups: Dict[str, list] = {}
+    for file_diff in parsed.files:
+        owner = (trie.owner_of(file_diff.path) if file_diff.path else None) or default
+        groups.setdefault(owner, []).append(file_diff)
+    return {owner: (parsed.join(files), len(files)) for owner, files in groups.items()}
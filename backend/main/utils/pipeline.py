@@ -0,0 +1,329 @@
+"""
+Staged processing pipelines with per-stage workers, queues and metrics.
+
+A pipeline is declared as an ordered list of stages. Every stage has its own
+bounded queue and worker threads, so each step can be given the concurrency it
+needs (a few threads for CPU-bound parsing, many for LLM calls waiting on the
+network, few for database writes). When a stage's queue is full, the workers of
+the stage before it (or the submitter) block until there is room, so a slow
+stage holds work back instead of letting queues grow without bound.
+
+A job is any object; each stage function receives it and updates it in
+place. A stage returns None to pass the job on, or the job's result to finish
+it early (e.g. nothing left to analyze). The last stage's return value is the
+result. An exception in a stage only fails that job: the stage's on_error
+handler may turn it into a result or let the job continue, otherwise the
+job's future gets the exception. The workers keep running either way.
+
+A job may be submitted with a timeout. Waits for room in a full queue then
+end at the job's deadline, and a job whose deadline passed before a stage
+picks it up is dropped; either way its future gets JobExpired, so a caller
+that stopped waiting does not leave work behind in the queues.
+
+Per stage, the pipeline records queue waits and run times in histograms with
+fixed buckets, plus processed, failed and finished-early counts, so stats()
+shows which stage is the bottleneck.
+"""
+import logging
+import queue
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+class Histogram:
+    """
+    Duration histogram with fixed buckets.
+
+    Percentiles are estimated as the upper bound of the bucket holding the
+    rank (the largest value seen, for the last bucket).
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000.0
+        self.counts[bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(fraction * self.count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS_MS[index], self.max_ms) if index < len(BUCKET_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in BUCKET_BOUNDS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "mean": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "p50": round(self.percentile(0.50), 1),
+            "p95": round(self.percentile(0.95), 1),
+            "p99": round(self.percentile(0.99), 1),
+            "max": round(self.max_ms, 1),
+            "buckets": {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+
+class JobExpired(Exception):
+    """
+    Raised for a job whose deadline passed before it got through the pipeline.
+    """
+
+
+class Stage:
+    """
+    Declaration of one pipeline stage.
+
+    Attributes:
+        name: Name of the stage (in stats and worker thread names)
+        run: Callable taking the job; returns None to pass it on or the job's result to finish it
+        workers: Number of worker threads
+        queue_size: Jobs that may wait for the stage before submitters block
+        on_error: Optional callable taking (job, exception) when run raises; returns like run,
+            and raising fails the job
+    """
+    __slots__ = ("name", "run", "workers", "queue_size", "on_error")
+
+    def __init__(self, name: str, run: Callable[[Any], Any], workers: int = 1, queue_size: int = 64,
+                 on_error: Optional[Callable[[Any, Exception], Any]] = None):
+        self.name = name
+        self.run = run
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.on_error = on_error
+
+
+class _Item:
+    __slots__ = ("job", "future", "submitted_at", "enqueued_at", "expires_at")
+
+    def __init__(self, job: Any, timeout: Optional[float] = None):
+        self.job = job
+        self.future: Future = Future()
+        self.submitted_at = time.monotonic()
+        self.enqueued_at = self.submitted_at
+        self.expires_at = None if timeout is None else self.submitted_at + max(0.0, timeout)
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+class _StageRunner:
+    # A stage's queue, workers and metrics
+
+    def __init__(self, stage: Stage):
+        self.stage = stage
+        self.queue: "queue.Queue[_Item]" = queue.Queue(maxsize=stage.queue_size)
+        self.lock = threading.Lock()
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.finished = 0
+        self.expired = 0
+        self.waits = Histogram()
+        self.runs = Histogram()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "workers": self.stage.workers,
+                "queue_size": self.stage.queue_size,
+                "queued": self.queue.qsize(),
+                "busy": self.busy,
+                "processed": self.processed,
+                "failed": self.failed,
+                "finished_early": self.finished,
+                "expired": self.expired,
+                "wait_ms": self.waits.snapshot(),
+                "run_ms": self.runs.snapshot(),
+            }
+
+
+class Pipeline:
+    """
+    Jobs flowing through a fixed sequence of stages, each with its own workers.
+    """
+
+    def __init__(self, name: str, stages: List[Stage]):
+        """
+        Args:
+            name: Name of the pipeline (prefix of the worker thread names)
+            stages: The stages, in order
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.name = name
+        self._runners = [_StageRunner(stage) for stage in stages]
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._expired = 0
+        self._latency = Histogram()
+        for index, runner in enumerate(self._runners):
+            for worker in range(runner.stage.workers):
+                threading.Thread(target=self._work, args=(index,), daemon=True,
+                                 name=f"{name}-{runner.stage.name}_{worker}").start()
+
+    @property
+    def stage_names(self) -> List[str]:
+        return [runner.stage.name for runner in self._runners]
+
+    def submit(self, job: Any, timeout: Optional[float] = None) -> Future:
+        """
+        Queue a job at the first stage, blocking while that stage's queue is full.
+
+        Args:
+            job: The job object handed to each stage
+            timeout: Seconds the job may take, queue waits included (default: no limit)
+
+        Returns:
+            A Future resolving to the job's result
+
+        Raises:
+            JobExpired: If the first stage's queue stayed full until the deadline
+        """
+        item = _Item(job, timeout)
+        with self._lock:
+            self._in_flight += 1
+        try:
+            self._runners[0].queue.put(item, timeout=item.remaining())
+        except queue.Full:
+            self._expire(self._runners[0], item)
+            raise JobExpired(f"Stage '{self._runners[0].stage.name}' of pipeline '{self.name}' "
+                             f"stayed full until the job's deadline")
+        return item.future
+
+    def run(self, job: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Submit a job and wait for its result.
+
+        Args:
+            job: The job object handed to each stage
+            timeout: Seconds to wait, queue waits included (default: no limit)
+
+        Returns:
+            The job's result; a stage's exception is raised here
+
+        Raises:
+            JobExpired: If the job's deadline passed while it waited for a stage
+            concurrent.futures.TimeoutError: If the deadline passed while a stage ran the job
+        """
+        started = time.monotonic()
+        future = self.submit(job, timeout)
+        return future.result(None if timeout is None else max(0.0, started + timeout - time.monotonic()))
+
+    def _work(self, index: int):
+        runner = self._runners[index]
+        stage = runner.stage
+        while True:
+            item = runner.queue.get()
+            if item.expires_at is not None and item.remaining() <= 0:
+                # The caller stopped waiting; do not spend the stage on the job
+                self._expire(runner, item)
+                item.future.set_exception(JobExpired(f"The job's deadline passed before stage "
+                                                     f"'{stage.name}' of pipeline '{self.name}'"))
+                continue
+            started = time.monotonic()
+            with runner.lock:
+                runner.busy += 1
+                runner.waits.observe(started - item.enqueued_at)
+
+            failed = False
+            error: Optional[BaseException] = None
+            try:
+                result = stage.run(item.job)
+            except Exception as e:
+                failed = True
+                result = None
+                if stage.on_error is None:
+                    error = e
+                else:
+                    try:
+                        result = stage.on_error(item.job, e)
+                    except Exception as handler_error:
+                        error = handler_error
+            except BaseException as e:
+                failed, result, error = True, None, e
+
+            with runner.lock:
+                runner.busy -= 1
+                runner.processed += 1
+                runner.runs.observe(time.monotonic() - started)
+                if failed:
+                    runner.failed += 1
+                if error is None and result is not None and index < len(self._runners) - 1:
+                    runner.finished += 1
+
+            if error is not None:
+                logger.error(f"Stage '{stage.name}' of pipeline '{self.name}' failed: {error}")
+                self._finish(item, error=error)
+            elif result is not None or index == len(self._runners) - 1:
+                self._finish(item, result=result)
+            else:
+                item.enqueued_at = time.monotonic()
+                following = self._runners[index + 1]
+                try:
+                    # Blocks while the next stage is saturated, at most until the job's deadline
+                    following.queue.put(item, timeout=item.remaining())
+                except queue.Full:
+                    self._expire(following, item)
+                    item.future.set_exception(JobExpired(f"Stage '{following.stage.name}' of pipeline "
+                                                         f"'{self.name}' stayed full until the job's deadline"))
+
+    def _expire(self, runner: _StageRunner, item: _Item):
+        with runner.lock:
+            runner.expired += 1
+        with self._lock:
+            self._in_flight -= 1
+            self._expired += 1
+
+    def _finish(self, item: _Item, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._in_flight -= 1
+            self._latency.observe(time.monotonic() - item.submitted_at)
+            if error is None:
+                self._completed += 1
+            else:
+                self._failed += 1
+        if error is None:
+            item.future.set_result(result)
+        else:
+            item.future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Jobs in flight, completed, failed and expired, end-to-end latency, and
+        per stage the queue length, busy workers, counts and wait/run histograms.
+        """
+        with self._lock:
+            totals = {
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "expired": self._expired,
+                "latency_ms": self._latency.snapshot(),
+            }
+        totals["stages"] = {runner.stage.name: runner.stats() for runner in self._runners}
+        return totals
@@ -0,0 +1,209 @@
+"""
+In-process publish/subscribe broker for analysis progress events.
+
+Analysis code publishes stage and topic events to a per-change channel and a
+per-project channel; the SSE views in main.views stream them to the CLI and
+the web UI. Each channel keeps a short history so a subscriber that connects
+late (or reconnects with Last-Event-ID) still sees what it missed.
+
+The broker lives in the server process, so SSE clients must reach the same
+process that runs the analysis (a single ASGI worker or sticky routing).
+"""
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Events kept per channel for late subscribers
+CHANNEL_HISTORY = 200
+# Channels kept in memory; the least recently used are dropped first
+MAX_CHANNELS = 1024
+# Seconds between SSE keep-alive comments
+KEEPALIVE_SECONDS = 15
+
+# Events after which a change channel has nothing more to say
+TERMINAL_EVENTS = frozenset({"complete", "error"})
+
+
+def change_channel(change_id: str) -> str:
+    """Channel name for the events of a single code change"""
+    return f"change:{change_id}"
+
+
+def project_channel(project_id: str) -> str:
+    """Channel name for the events of every change in a project"""
+    return f"project:{project_id}"
+
+
+class ProgressEvent:
+    """
+    A single progress event.
+    """
+    __slots__ = ("id", "event", "data", "created_at")
+
+    def __init__(self, event_id: int, event: str, data: Dict[str, Any]):
+        self.id = event_id
+        self.event = event
+        self.data = data
+        self.created_at = time.time()
+
+    def to_sse(self) -> str:
+        """Encode the event in text/event-stream format"""
+        return f"id: {self.id}\nevent: {self.event}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+
+class _Channel:
+    def __init__(self):
+        self.history: deque = deque(maxlen=CHANNEL_HISTORY)
+        self.subscribers: List[Callable[[ProgressEvent], None]] = []
+
+
+class ProgressBroker:
+    """
+    Thread-safe broker that fans events out to sync and async subscribers.
+    """
+
+    def __init__(self):
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _channel(self, name: str) -> _Channel:
+        channel = self._channels.get(name)
+        if channel is None:
+            channel = self._channels[name] = _Channel()
+            while len(self._channels) > MAX_CHANNELS:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(name)
+        return channel
+
+    def publish(self, channels: List[str], event: str, data: Dict[str, Any]) -> ProgressEvent:
+        """
+        Publish an event to one or more channels.
+
+        Args:
+            channels: Channel names
+            event: Event type (e.g. "stage", "topic", "complete", "error")
+            data: JSON-serialisable payload
+
+        Returns:
+            The published event
+        """
+        progress_event = ProgressEvent(next(self._ids), event, data)
+        with self._lock:
+            deliveries = []
+            for name in channels:
+                channel = self._channel(name)
+                channel.history.append(progress_event)
+                deliveries.extend(channel.subscribers)
+        for deliver in deliveries:
+            try:
+                deliver(progress_event)
+            except Exception as e:
+                logger.warning(f"Dropping progress event for a subscriber: {e}")
+        return progress_event
+
+    def _attach(self, name: str, deliver: Callable[[ProgressEvent], None], last_event_id: int) -> List[ProgressEvent]:
+        with self._lock:
+            channel = self._channel(name)
+            channel.subscribers.append(deliver)
+            return [e for e in channel.history if e.id > last_event_id]
+
+    def _detach(self, name: str, deliver: Callable[[ProgressEvent], None]):
+        with self._lock:
+            channel = self._channels.get(name)
+            if channel and deliver in channel.subscribers:
+                channel.subscribers.remove(deliver)
+
+    def subscribe(self, name: str, last_event_id: int = 0, stop_on_terminal: bool = False,
+                  keepalive: float = KEEPALIVE_SECONDS) -> Iterator[Optional[ProgressEvent]]:
+        """
+        Blocking subscription for WSGI servers.
+
+        Args:
+            name: Channel name
+            last_event_id: Only events after this ID are replayed
+            stop_on_terminal: Stop after a complete/error event
+            keepalive: Seconds after which None is yielded if nothing happened
+
+        Yields:
+            ProgressEvent objects, or None as a keep-alive tick
+        """
+        inbox: "queue.Queue[ProgressEvent]" = queue.Queue()
+        backlog = self._attach(name, inbox.put_nowait, last_event_id)
+        try:
+            for progress_event in backlog:
+                yield progress_event
+                if stop_on_terminal and progress_event.event in TERMINAL_EVENTS:
+                    return
+            while True:
+                try:
+                    progress_event = inbox.get(timeout=keepalive)
+                except queue.Empty:
+                    yield None
+                    continue
+                yield progress_event
+                if stop_on_terminal and progress_event.event in TERMINAL_EVENTS:
+                    return
+        finally:
+            self._detach(name, inbox.put_nowait)
+
+    async def asubscribe(self, name: str, last_event_id: int = 0, stop_on_terminal: bool = False,
+                         keepalive: float = KEEPALIVE_SECONDS) -> AsyncIterator[Optional[ProgressEvent]]:
+        """
+        Asynchronous subscription for ASGI servers; see subscribe().
+        """
+        loop = asyncio.get_running_loop()
+        inbox: "asyncio.Queue[ProgressEvent]" = asyncio.Queue()
+
+        def deliver(progress_event: ProgressEvent):
+            loop.call_soon_threadsafe(inbox.put_nowait, progress_event)
+
+        backlog = self._attach(name, deliver, last_event_id)
+        try:
+            for progress_event in backlog:
+                yield progress_event
+                if stop_on_terminal and progress_event.event in TERMINAL_EVENTS:
+                    return
+            while True:
+                try:
+                    progress_event = await asyncio.wait_for(inbox.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield progress_event
+                if stop_on_terminal and progress_event.event in TERMINAL_EVENTS:
+                    return
+        finally:
+            self._detach(name, deliver)
+
+
+# Process-wide broker
+broker = ProgressBroker()
+
+
+def publish_change_event(project_id: str, change_id: str, event: str,
+                         data: Optional[Dict[str, Any]] = None) -> ProgressEvent:
+    """
+    Publish an event for a code change on both its change and project channels.
+
+    Args:
+        project_id: The ID of the project
+        change_id: The ID of the code change
+        event: Event type
+        data: Event payload
+
+    Returns:
+        The published event
+    """
+    data = dict(data or {}, project_id=project_id, change_id=change_id)
+    return broker.publish([change_channel(change_id), project_channel(project_id)], event, data)
@@ -0,0 +1,274 @@
+"""
+Provider-side caching of the stable prompt prefix.
+
+Analysis prompts start with a prefix that only changes with the project: the
+instructions and the titles of the project's completed and to-learn topics.
+Once a project's topic snapshot reaches the minimum the model accepts for
+context caching (BRAINVIBE_PROMPT_CACHE_MIN_TOKENS, per model: Gemini 1.5
+models cache nothing under 32768 tokens), providers upload the prefix once
+through their context-caching API (Gemini CachedContent, the stub's
+/v1/cachedContents) and later calls only reference it and send the diff.
+Smaller projects, and calls to models whose minimum the prefix does not
+reach, keep rendering the topics most relevant to each diff (see topic_index).
+
+Cached prefixes are tracked per provider, prompt kind, model and project, and
+versioned by a hash of the project's topic set: when the topic set changes,
+the next call uploads a new prefix and the old one is deleted on the provider.
+Both sides expire entries after BRAINVIBE_PROMPT_CACHE_TTL seconds. When
+creating a prefix fails (e.g. the model does not support caching), the
+provider is not asked again for FAILURE_BACKOFF seconds and prompts are
+rendered in full meanwhile.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Tuple
+
+from django.conf import settings
+
+from .tokens import PROMPT_OVERHEAD_TOKENS, estimate_tokens
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Seconds before a failed prefix upload is retried
+FAILURE_BACKOFF = 300
+# Entries are renewed this long before they expire on the provider
+EXPIRY_MARGIN = 30
+# Smallest prefix (in tokens) each model caches, by model name prefix; "default" covers other models
+DEFAULT_MIN_TOKENS = {"gemini-1.5": 32768, "default": 4096}
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def caching_enabled() -> bool:
+    return _setting('BRAINVIBE_PROMPT_CACHE_ENABLED', True)
+
+
+def cache_ttl() -> int:
+    return _setting('BRAINVIBE_PROMPT_CACHE_TTL', 3600)
+
+
+def _min_tokens_by_model() -> Mapping[str, int]:
+    value = _setting('BRAINVIBE_PROMPT_CACHE_MIN_TOKENS', DEFAULT_MIN_TOKENS)
+    # A single number applies to every model
+    return {"default": value} if isinstance(value, (int, float)) else value
+
+
+def min_cache_tokens(model: Optional[str]) -> int:
+    """
+    Smallest prefix a model caches: the entry of BRAINVIBE_PROMPT_CACHE_MIN_TOKENS
+    with the longest prefix of the model name, or its "default" entry.
+    """
+    minimums = _min_tokens_by_model()
+    matches = [prefix for prefix in minimums if prefix != "default" and (model or "").startswith(prefix)]
+    if matches:
+        return minimums[max(matches, key=len)]
+    return minimums.get("default", DEFAULT_MIN_TOKENS["default"])
+
+
+def snapshot_for_model(project_context: Optional[Dict[str, Any]], model: Optional[str]) -> Optional["TopicSnapshot"]:
+    """
+    The context's topic snapshot (see cacheable_snapshot), if its prefix reaches
+    the model's caching minimum; otherwise providers render the relevant topics.
+    """
+    snapshot = (project_context or {}).get("topic_snapshot")
+    if snapshot is None or snapshot.tokens < min_cache_tokens(model):
+        return None
+    return snapshot
+
+
+class TopicSnapshot:
+    """
+    The topic titles of a project as rendered into a cached prompt prefix.
+
+    Attributes:
+        project_id: ID of the project
+        version: Hash of the project's topic set; changes whenever a topic is
+            added, removed, renamed or changes status
+        completed: Titles of learned topics, sorted
+        to_learn: Titles of the other topics, sorted
+        tokens: Estimated tokens of the prefix (template and titles)
+    """
+    __slots__ = ("project_id", "version", "completed", "to_learn", "tokens")
+
+    def __init__(self, project_id: str, version: str, completed: List[str], to_learn: List[str]):
+        self.project_id = project_id
+        self.version = version
+        self.completed = completed
+        self.to_learn = to_learn
+        self.tokens = PROMPT_OVERHEAD_TOKENS + sum(estimate_tokens(title) + 2 for title in completed + to_learn)
+
+
+def build_snapshot(project_id: str, topics: Iterable[Dict[str, Any]]) -> TopicSnapshot:
+    """
+    Snapshot a project's topics for a prompt prefix.
+
+    Args:
+        project_id: ID of the project
+        topics: The project's topics (topic_id, title and status)
+
+    Returns:
+        A TopicSnapshot
+    """
+    rows = sorted((topic["topic_id"], topic.get("title", ""), topic.get("status", "")) for topic in topics)
+    version = hashlib.sha256(json.dumps(rows).encode("utf-8")).hexdigest()[:16]
+    completed = sorted(title for _, title, status in rows if status == "learned")
+    to_learn = sorted(title for _, title, status in rows if status != "learned")
+    return TopicSnapshot(project_id, version, completed, to_learn)
+
+
+# Snapshots by project, keyed by the version of the project's topic index
+_snapshots: Dict[str, Tuple[Hashable, TopicSnapshot]] = {}
+_snapshots_lock = threading.Lock()
+_SNAPSHOTS_SIZE = 128
+
+
+def cacheable_snapshot(project_id: str, index_version: Hashable,
+                       loader: Callable[[], Iterable[Dict[str, Any]]]) -> Optional[TopicSnapshot]:
+    """
+    The project's topic snapshot, if its prefix is worth caching on the provider.
+
+    Args:
+        project_id: ID of the project
+        index_version: Version of the project's topic index (see llm_utils.build_project_context);
+            the snapshot is rebuilt only when it changes
+        loader: Callable returning the project's topics
+
+    Returns:
+        The snapshot, or None when caching is disabled or the prefix is below
+        the smallest minimum of BRAINVIBE_PROMPT_CACHE_MIN_TOKENS (the model is
+        not known yet; see snapshot_for_model)
+    """
+    if not caching_enabled():
+        return None
+    with _snapshots_lock:
+        cached = _snapshots.get(project_id)
+    if cached and cached[0] == index_version:
+        snapshot = cached[1]
+    else:
+        snapshot = build_snapshot(project_id, loader())
+        with _snapshots_lock:
+            if len(_snapshots) >= _SNAPSHOTS_SIZE and project_id not in _snapshots:
+                _snapshots.pop(next(iter(_snapshots)))
+            _snapshots[project_id] = (index_version, snapshot)
+    if snapshot.tokens < min(_min_tokens_by_model().values(), default=DEFAULT_MIN_TOKENS["default"]):
+        return None
+    return snapshot
+
+
+class _Entry:
+    __slots__ = ("version", "handle", "expires_at", "tokens")
+
+    def __init__(self, version: str, handle: Any, expires_at: float, tokens: int):
+        self.version = version
+        # None marks a failed upload, retried once the entry expires
+        self.handle = handle
+        self.expires_at = expires_at
+        self.tokens = tokens
+
+
+class PrefixCache:
+    """
+    Handles of prompt prefixes cached on the provider side.
+
+    The cache does not know how providers upload or delete prefixes; callers
+    pass callables for both.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        # One upload per key at a time; other callers wait for it
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._stats: Counter = Counter()
+
+    def get(self, key: str, version: str, tokens: int, create: Callable[[int], Any],
+            delete: Optional[Callable[[Any], None]] = None) -> Optional[Any]:
+        """
+        Return the provider handle of a cached prefix, uploading it if needed.
+
+        Args:
+            key: Provider, prompt kind, model and project of the prefix
+            version: Version of the prefix; a different version replaces the cached one
+            tokens: Estimated tokens of the prefix (counted in stats)
+            create: Callable taking the TTL in seconds, uploading the prefix and returning its handle
+            delete: Callable deleting a replaced handle on the provider
+
+        Returns:
+            The handle, or None if the prefix could not be cached
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and entry.version == version and entry.expires_at > now:
+                if entry.handle is None:
+                    return None
+                self._count(hits=1, tokens_reused=tokens)
+                return entry.handle
+            if entry is not None and entry.handle is not None and entry.version != version:
+                self._count(invalidations=1)
+                self._delete(key, entry.handle, delete)
+
+            ttl = cache_ttl()
+            try:
+                handle = create(ttl)
+            except Exception as e:
+                logger.warning(f"Could not cache the prompt prefix {key}, sending full prompts for "
+                               f"{FAILURE_BACKOFF}s: {e}")
+                self._count(failures=1)
+                with self._lock:
+                    self._entries[key] = _Entry(version, None, now + FAILURE_BACKOFF, tokens)
+                return None
+            logger.info(f"Cached prompt prefix {key} version {version} (~{tokens} tokens) for {ttl}s")
+            self._count(uploads=1, tokens_uploaded=tokens)
+            with self._lock:
+                self._entries[key] = _Entry(version, handle, now + max(ttl - EXPIRY_MARGIN, ttl / 2), tokens)
+            return handle
+
+    def invalidate(self, key: str):
+        """
+        Forget a prefix the provider no longer has (e.g. it answered "not found").
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def _delete(self, key: str, handle: Any, delete: Optional[Callable[[Any], None]]):
+        if delete is None:
+            return
+        try:
+            delete(handle)
+        except Exception as e:
+            # It expires on the provider anyway
+            logger.info(f"Could not delete the replaced prompt prefix {key}: {e}")
+
+    def _count(self, **counts: int):
+        with self._lock:
+            self._stats.update(counts)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Prefix cache hits, uploads, failures and invalidations, and the prefix
+        tokens uploaded and reused, since start-up.
+        """
+        with self._lock:
+            return dict(self._stats, cached=sum(1 for entry in self._entries.values() if entry.handle is not None))
+
+
+prefix_cache = PrefixCache()
+
+
+def prompt_cache_stats() -> Dict[str, int]:
+    """
+    Stats of the shared prefix cache (see PrefixCache.stats).
+    """
+    return prefix_cache.stats()
@@ -0,0 +1,447 @@
+"""
+Deadlines, bounded retries, hedged requests and circuit breaking for LLM calls.
+
+Every provider call runs under a Deadline taken from the request budget.
+Transient failures are retried with capped, jittered exponential backoff
+only while the deadline allows it. With hedging enabled, a duplicate request
+is started when the first one is slower than the observed p95 latency and
+the first response wins. A per-provider CircuitBreaker fails calls fast while
+the recent error rate is high, so an outage costs callers nothing instead of
+tying up every worker in retries. A per-provider RateLimiter spaces requests
+to the provider's quota and makes every caller back off together when the
+provider answers with Retry-After.
+
+A request deadline set by the client (see views) is a StagedDeadline, which
+splits what is left of the budget across the analysis stages, so a slow stage
+cannot use up the time reserved for the ones after it.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Backoff between attempts: full jitter over min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+# Latency samples kept per provider for the hedging threshold
+LATENCY_WINDOW = 200
+# Samples needed before hedging kicks in
+HEDGE_MIN_SAMPLES = 20
+# Threads available for hedged attempts
+HEDGE_WORKERS = 16
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the time budget for a call has run out"""
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the provider's circuit is open"""
+
+
+class Deadline:
+    """
+    A point in time by which a piece of work must finish.
+    """
+
+    def __init__(self, seconds: Optional[float]):
+        """
+        Args:
+            seconds: Budget from now, or None for no deadline
+        """
+        self.expires_at = None if seconds is None else time.monotonic() + max(0.0, seconds)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None without a deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """
+        Timeout to use for a single operation.
+
+        Args:
+            cap: Upper bound for the timeout, e.g. a per-request timeout
+
+        Returns:
+            The smaller of the cap and the remaining budget
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return remaining if cap is None else min(cap, remaining)
+
+    def stage(self, name: str) -> "Deadline":
+        """
+        Deadline for one stage of the work; a plain deadline gives every stage all of it.
+        """
+        return self
+
+
+# Stages of an analysis in order, with their default share of the request budget
+DEADLINE_STAGES = ("filter", "cache", "llm", "save")
+DEFAULT_STAGE_SHARES = {"filter": 0.05, "cache": 0.05, "llm": 0.8, "save": 0.1}
+
+
+class StagedDeadline(Deadline):
+    """
+    A request deadline split across the stages of an analysis.
+
+    A stage gets its share of what remains when it starts, relative to the
+    shares of the stages still to come, so time a stage does not use goes to
+    the later ones. Stages not in DEADLINE_STAGES get the whole remainder.
+    """
+
+    def __init__(self, seconds: Optional[float], shares: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            seconds: Budget from now, or None for no deadline
+            shares: Share of the budget per stage (missing stages get DEFAULT_STAGE_SHARES)
+        """
+        super().__init__(seconds)
+        self.shares = dict(DEFAULT_STAGE_SHARES, **(shares or {}))
+
+    def stage(self, name: str) -> Deadline:
+        remaining = self.remaining()
+        if remaining is None or name not in DEADLINE_STAGES:
+            return self
+        later = DEADLINE_STAGES[DEADLINE_STAGES.index(name):]
+        total = sum(self.shares.get(stage, 0.0) for stage in later)
+        fraction = self.shares.get(name, 0.0) / total if total > 0 else 1.0
+        return Deadline(remaining * fraction)
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP,
+                  rng: Optional[random.Random] = None) -> float:
+    """
+    Capped exponential backoff with full jitter.
+
+    Args:
+        attempt: Zero-based number of the attempt that just failed
+        base: Delay ceiling after the first failure
+        cap: Maximum delay ceiling
+
+    Returns:
+        Seconds to wait before the next attempt
+    """
+    return (rng or random).uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """
+    Rolling window of call latencies.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int = HEDGE_MIN_SAMPLES) -> Optional[float]:
+        """
+        Latency at the given percentile, or None if there are too few samples.
+        """
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker over a rolling time window.
+
+    States:
+    - closed: calls go through; outcomes are recorded
+    - open: calls are rejected until open_seconds have passed
+    - half_open: a single probe call is let through; its outcome closes or re-opens the circuit
+    """
+
+    def __init__(self, name: str, error_rate: float = 0.5, window_seconds: float = 30.0,
+                 minimum_calls: int = 10, open_seconds: float = 30.0):
+        """
+        Args:
+            name: Name used in logs
+            error_rate: Failure fraction within the window that opens the circuit
+            window_seconds: Length of the rolling window
+            minimum_calls: Calls needed in the window before the error rate is trusted
+            open_seconds: How long the circuit stays open before a probe is allowed
+        """
+        self.name = name
+        self.error_rate = error_rate
+        self.window_seconds = window_seconds
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self._outcomes: deque = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def allow(self) -> bool:
+        """
+        Decide whether a call may proceed, moving open circuits to half-open when due.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = "half_open"
+                self._probe_in_flight = False
+                logger.info(f"Circuit '{self.name}' half-open, probing the provider")
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release(self):
+        """
+        Give back a call allowed by allow() that was never sent, so a half-open
+        circuit can grant its probe to the next call.
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "half_open":
+                logger.info(f"Circuit '{self.name}' closed")
+                self.state = "closed"
+                self._outcomes.clear()
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "half_open":
+                self._open(now)
+                return
+            self._outcomes.append((now, False))
+            self._trim(now)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (self.state == "closed" and len(self._outcomes) >= self.minimum_calls
+                    and failures / len(self._outcomes) >= self.error_rate):
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state = "open"
+        self._opened_at = now
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        logger.warning(f"Circuit '{self.name}' opened for {self.open_seconds:g}s after repeated LLM failures")
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread calling one provider.
+
+    A rate of 0 disables the limit; pauses requested by the provider
+    (Retry-After) still apply.
+    """
+
+    def __init__(self, rate: float = 0.0, burst: Optional[float] = None):
+        """
+        Args:
+            rate: Requests per second (0 for unlimited)
+            burst: Requests that may be sent back to back (default: one second's worth)
+        """
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float):
+        """
+        Hold back every caller for the given number of seconds.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self, deadline: Deadline):
+        """
+        Wait until a request may be sent.
+
+        Raises:
+            DeadlineExceeded: The wait would outlast the deadline
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self.rate <= 0:
+                        return
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            remaining = deadline.remaining()
+            if remaining is not None and wait >= remaining:
+                raise DeadlineExceeded("LLM rate limit wait exceeds the deadline")
+            time.sleep(wait)
+
+
+class ProviderGuard:
+    """
+    Breaker, rate limiter and latency statistics for one provider.
+    """
+
+    def __init__(self, name: str, requests_per_second: float = 0.0, **breaker_options):
+        self.breaker = CircuitBreaker(name, **breaker_options)
+        self.limiter = RateLimiter(requests_per_second)
+        self.latency = LatencyTracker()
+
+
+_guards: Dict[str, ProviderGuard] = {}
+_guards_lock = threading.Lock()
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_guard(name: str, requests_per_second: float = 0.0, **breaker_options) -> ProviderGuard:
+    """
+    Return the shared guard for a provider, creating it on first use.
+    """
+    with _guards_lock:
+        if name not in _guards:
+            _guards[name] = ProviderGuard(name, requests_per_second, **breaker_options)
+        return _guards[name]
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _guards_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='llm-hedge')
+        return _hedge_executor
+
+
+def _is_transient(error: Exception) -> bool:
+    return getattr(error, "transient", isinstance(error, (TimeoutError, ConnectionError)))
+
+
+def _hedged_call(call: Callable[[Optional[float]], Any], deadline: Deadline, hedge_after: float) -> Any:
+    # Start the primary attempt; add a duplicate if it is still running after hedge_after
+    executor = _get_hedge_executor()
+    pending = {executor.submit(call, deadline.remaining())}
+    done, pending = wait(pending, timeout=deadline.timeout(hedge_after))
+    if not done and not deadline.expired:
+        logger.info(f"LLM call slower than p95 ({hedge_after:.2f}s), sending a hedged request")
+        pending.add(executor.submit(call, deadline.remaining()))
+
+    error = None
+    while pending or done:
+        for future in done:
+            if future.exception() is None:
+                # Losing attempts finish in the background, bounded by their own timeout;
+                # ones still queued for a hedge worker are dropped
+                _cancel(pending)
+                return future.result()
+            error = future.exception()
+        done = set()
+        if not pending:
+            break
+        if deadline.expired:
+            _cancel(pending)
+            raise DeadlineExceeded("LLM call deadline exceeded")
+        done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            _cancel(pending)
+            raise DeadlineExceeded("LLM call deadline exceeded")
+    raise error
+
+
+def _cancel(futures):
+    for future in futures:
+        future.cancel()
+
+
+def call_with_resilience(call: Callable[[Optional[float]], Any], guard: ProviderGuard, deadline: Deadline,
+                         max_attempts: int = 3, hedge_percentile: Optional[float] = None) -> Any:
+    """
+    Run a provider call under a deadline, with rate limiting, retries, hedging and circuit breaking.
+
+    Args:
+        call: Callable taking the timeout (seconds or None) for one attempt
+        guard: The provider's guard
+        deadline: Overall deadline for the call, including retries
+        max_attempts: Maximum attempts for transient failures
+        hedge_percentile: Latency percentile after which a hedged request is sent
+            (None disables hedging)
+
+    Returns:
+        The call's result
+
+    Raises:
+        CircuitOpenError: The circuit is open; nothing was sent
+        DeadlineExceeded: The deadline ran out (or would, waiting for the rate limit) before a successful attempt
+        Exception: The last error from the provider once attempts are exhausted
+    """
+    for attempt in range(max_attempts):
+        if not guard.breaker.allow():
+            raise CircuitOpenError(f"Circuit '{guard.breaker.name}' is open")
+        try:
+            if deadline.expired:
+                raise DeadlineExceeded("LLM call deadline exceeded")
+            guard.limiter.acquire(deadline)
+        except BaseException:
+            # Nothing was sent, so a half-open circuit must not wait for this call's outcome
+            guard.breaker.release()
+            raise
+
+        started = time.monotonic()
+        hedge_after = guard.latency.percentile(hedge_percentile) if hedge_percentile else None
+        try:
+            if hedge_after is not None:
+                result = _hedged_call(call, deadline, hedge_after)
+            else:
+                result = call(deadline.remaining())
+        except DeadlineExceeded:
+            guard.breaker.record_failure()
+            raise
+        except Exception as e:
+            guard.breaker.record_failure()
+            if not _is_transient(e) or attempt + 1 >= max_attempts:
+                raise
+            delay = backoff_delay(attempt)
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after:
+                # The quota is shared, so every caller of the provider backs off
+                guard.limiter.pause(retry_after)
+                delay = max(delay, min(retry_after, BACKOFF_CAP))
+            remaining = deadline.remaining()
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded(f"No time left to retry after: {e}") from e
+            logger.warning(f"LLM call failed ({e}), retrying in {delay:.2f}s (attempt {attempt + 2}/{max_attempts})")
+            time.sleep(delay)
+            continue
+
+        guard.latency.record(time.monotonic() - started)
+        guard.breaker.record_success()
+        return result
@@ -0,0 +1,236 @@
+"""
+Weighted-fair scheduling of background analysis jobs.
+
+Jobs are queued by class (the admission priority of their change source) and,
+within a class, by project. Workers pick the next class by stride scheduling:
+each class advances a virtual clock by 1/weight per job, and the class with
+the earliest clock goes next, so with the default weights interactive work
+(cursor_ai, manual_edit, web) gets 8 turns for every 3 of git_commit/cli and
+every 1 of scheduled_scan. A class that was idle rejoins at the current
+clock instead of cashing in the turns it missed. Within a class, projects take
+turns round-robin, so one project's huge backfill only delays its own jobs.
+
+As starvation protection, a job that has waited longer than
+BRAINVIBE_SCHEDULER_MAX_WAIT_SECONDS is run next whatever its class. Queue
+waits are recorded per class and reported by stats().
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from .admission import INTERACTIVE_PRIORITY, LOW_PRIORITY, NORMAL_PRIORITY
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHTS = {INTERACTIVE_PRIORITY: 8, NORMAL_PRIORITY: 3, LOW_PRIORITY: 1}
+# Queue waits kept per class for the percentiles
+WAIT_SAMPLES = 1000
+
+
+class _Job:
+    __slots__ = ("fn", "job_class", "project", "enqueued_at", "future")
+
+    def __init__(self, fn: Callable[[], Any], job_class: str, project: Hashable):
+        self.fn = fn
+        self.job_class = job_class
+        self.project = project
+        self.enqueued_at = time.monotonic()
+        self.future: Future = Future()
+
+
+class _ClassQueue:
+    # Jobs of one class, one FIFO per project, served round-robin
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.clock = 0.0
+        self.projects: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self.size = 0
+        self.dispatched = 0
+        self.waits: deque = deque(maxlen=WAIT_SAMPLES)
+        self.max_wait = 0.0
+
+    def push(self, job: _Job):
+        self.projects.setdefault(job.project, deque()).append(job)
+        self.size += 1
+
+    def oldest(self) -> Optional[_Job]:
+        # Each project's FIFO is ordered, so the oldest job heads one of them
+        heads = [jobs[0] for jobs in self.projects.values()]
+        return min(heads, key=lambda job: job.enqueued_at) if heads else None
+
+    def pop(self, job: Optional[_Job] = None) -> _Job:
+        if job is None:
+            # Next project in turn; it goes to the back of the rotation
+            project, jobs = next(iter(self.projects.items()))
+            job = jobs.popleft()
+            self.projects.move_to_end(project)
+        else:
+            jobs = self.projects[job.project]
+            jobs.remove(job)
+        if not jobs:
+            del self.projects[job.project]
+        self.size -= 1
+        return job
+
+
+class FairScheduler:
+    """
+    Worker pool running jobs in weighted-fair order across classes and projects.
+    """
+
+    def __init__(self, workers: int, weights: Optional[Dict[str, float]] = None,
+                 max_wait: Optional[float] = 30.0, name: str = 'brainvibe-analysis'):
+        """
+        Args:
+            workers: Number of worker threads
+            weights: Share of turns per class (missing classes get DEFAULT_WEIGHTS)
+            max_wait: Seconds after which a waiting job is run next regardless of class
+                (None disables starvation protection)
+            name: Prefix of the worker thread names
+        """
+        self.max_wait = max_wait
+        weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self._classes = {name: _ClassQueue(weight) for name, weight in weights.items()}
+        self._clock = 0.0
+        self._aged = 0
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        for index in range(workers):
+            thread = threading.Thread(target=self._work, name=f"{name}_{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn: Callable[[], Any], job_class: str, project: Hashable = None) -> Future:
+        """
+        Queue a job.
+
+        Args:
+            fn: Callable run on a worker thread
+            job_class: Class of the job (unknown classes are treated as normal)
+            project: Key of the project the job belongs to
+
+        Returns:
+            A Future resolving to fn's result
+        """
+        if job_class not in self._classes:
+            job_class = NORMAL_PRIORITY
+        job = _Job(fn, job_class, project)
+        with self._condition:
+            queue = self._classes[job_class]
+            if not queue.size:
+                # An idle class rejoins at the current clock rather than with banked turns
+                queue.clock = max(queue.clock, self._clock)
+            queue.push(job)
+            self._condition.notify()
+        return job.future
+
+    def _next_job(self) -> _Job:
+        # Called with the condition held and at least one job queued
+        if self.max_wait is not None:
+            now = time.monotonic()
+            heads = [job for job in (queue.oldest() for queue in self._classes.values()) if job is not None]
+            oldest = min(heads, key=lambda job: job.enqueued_at)
+            if now - oldest.enqueued_at > self.max_wait:
+                self._aged += 1
+                return self._classes[oldest.job_class].pop(oldest)
+
+        queue = min((queue for queue in self._classes.values() if queue.size), key=lambda queue: queue.clock)
+        self._clock = queue.clock
+        queue.clock += 1.0 / queue.weight
+        return queue.pop()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not any(queue.size for queue in self._classes.values()):
+                    self._condition.wait()
+                job = self._next_job()
+                queue = self._classes[job.job_class]
+                wait = time.monotonic() - job.enqueued_at
+                queue.dispatched += 1
+                queue.waits.append(wait)
+                queue.max_wait = max(queue.max_wait, wait)
+
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = job.fn()
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue lengths, dispatch counts and queue-wait percentiles per class.
+        """
+        def percentile(values, fraction):
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(fraction * len(values)))]
+
+        with self._condition:
+            classes = {}
+            for name, queue in self._classes.items():
+                waits = sorted(queue.waits)
+                classes[name] = {
+                    "weight": queue.weight,
+                    "queued": queue.size,
+                    "projects_queued": len(queue.projects),
+                    "dispatched": queue.dispatched,
+                    "wait_ms": {
+                        "p50": round(percentile(waits, 0.50) * 1000, 1),
+                        "p95": round(percentile(waits, 0.95) * 1000, 1),
+                        "p99": round(percentile(waits, 0.99) * 1000, 1),
+                        "max": round(queue.max_wait * 1000, 1),
+                    },
+                }
+            return {"workers": len(self._threads), "aged_dispatches": self._aged, "classes": classes}
+
+
+class DelayedSubmission:
+    """
+    A job submitted to the analysis scheduler once a delay has passed.
+
+    schedule() is a no-op while a submission is pending, so the calls made
+    during the delay share one run. The job may call schedule() again to run
+    once more later.
+    """
+
+    def __init__(self, fn: Callable[[], Any], job_class: str):
+        """
+        Args:
+            fn: Callable run on a worker thread
+            job_class: Class the job is submitted with
+        """
+        self.fn = fn
+        self.job_class = job_class
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def schedule(self, delay: float) -> bool:
+        """
+        Submit the job in `delay` seconds unless a submission is already pending.
+
+        Returns:
+            Whether a new submission was scheduled
+        """
+        with self._lock:
+            if self._timer is not None:
+                return False
+            self._timer = threading.Timer(max(0.0, delay), self._submit)
+            self._timer.daemon = True
+            self._timer.start()
+            return True
+
+    def _submit(self):
+        with self._lock:
+            self._timer = None
+        # Imported here as services imports this module
+        from ..services import get_analysis_scheduler
+        get_analysis_scheduler().submit(self.fn, self.job_class)
@@ -0,0 +1,72 @@
+"""
+Fast local token estimation for LLM prompts.
+
+Model tokenizers split code into sub-word pieces: short identifiers and
+keywords are one token, long identifiers several, and almost every operator
+or bracket is a token of its own. The estimator mirrors that with one regular
+expression (letter runs of up to 6 characters, digit runs of up to 3, single
+punctuation characters and line breaks) and counts matches in C. On source
+code this gives about 3.5 characters per token, in line with real
+tokenizers; that is precise enough for routing and budgeting decisions, not
+for billing. Large texts are estimated from evenly spaced samples so the cost
+stays bounded.
+"""
+import logging
+import re
+from typing import Any, Dict, Optional
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\w\s]|\n|[^\x00-\x7f]")
+
+# Texts longer than this are estimated from samples
+SAMPLE_THRESHOLD = 256 * 1024
+SAMPLE_SIZE = 16 * 1024
+SAMPLE_COUNT = 8
+
+# Tokens of the fixed prompt template (instructions and response format)
+PROMPT_OVERHEAD_TOKENS = 600
+
+
+def _count(text: str) -> int:
+    return len(_TOKEN_RE.findall(text))
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Estimate the number of model tokens in a text.
+
+    Args:
+        text: The text to estimate
+
+    Returns:
+        Estimated token count
+    """
+    if not text:
+        return 0
+    length = len(text)
+    if length <= SAMPLE_THRESHOLD:
+        return _count(text)
+    # Count evenly spaced samples and scale up by the sampled fraction
+    step = (length - SAMPLE_SIZE) // (SAMPLE_COUNT - 1)
+    sampled = sum(_count(text[i * step:i * step + SAMPLE_SIZE]) for i in range(SAMPLE_COUNT))
+    return int(sampled * length / (SAMPLE_SIZE * SAMPLE_COUNT))
+
+
+def estimate_prompt_tokens(diff_text: str, project_context: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Estimate the tokens of a full analysis prompt for a diff.
+
+    Args:
+        diff_text: The diff to analyze
+        project_context: Project context rendered into the prompt (see llm_utils.build_project_context)
+
+    Returns:
+        Estimated prompt token count
+    """
+    context_tokens = sum(
+        estimate_tokens(topic.get("title", "")) + 2
+        for topic in (project_context or {}).get("existing_topics", [])
+    )
+    return PROMPT_OVERHEAD_TOKENS + context_tokens + estimate_tokens(diff_text)
@@ -0,0 +1,233 @@
+"""
+Batched enrichment of placeholder topics.
+
+When the LLM names a prerequisite that is neither among the topics it returned
+nor in the topic catalogue, llm_utils saves it as a placeholder: a title
+generated from its ID and an empty description. enrich_topics() fills these in:
+
+- placeholders are collected across all projects, and IDs that only differ in
+  case or separators ("react_hooks", "React-Hooks") are sent once
+- the provider describes BRAINVIBE_ENRICHMENT_BATCH_SIZE topics per call, so
+  the prompt overhead is paid once per batch instead of once per topic
+- calls go through the provider guard like analyses, sharing their rate limit
+  and circuit breaker
+- answers are written back with one bulk update per batch, and prerequisites
+  naming existing topics are linked with one bulk insert
+
+Saving a placeholder schedules a background pass (schedule_enrichment),
+debounced by BRAINVIBE_ENRICHMENT_DELAY_SECONDS so that the placeholders of
+many analyses share calls. `manage.py enrich_topics` runs it on demand.
+Topics the provider leaves unanswered stay placeholders for a later pass.
+"""
+import logging
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from ..models import Topic
+from .admission import LOW_PRIORITY
+from .llm_providers import get_provider
+from .llm_utils import get_provider_guard
+from .resilience import CircuitOpenError, Deadline, call_with_resilience
+from .scheduler import DelayedSubmission
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+_SEPARATOR_RE = re.compile(r"[\W_]+")
+
+
+def enrichment_setting(name: str) -> Any:
+    """
+    Enrichment settings with their defaults.
+    """
+    defaults = {
+        # Topics described per LLM call
+        'BRAINVIBE_ENRICHMENT_BATCH_SIZE': 50,
+        # Seconds a background pass waits for more placeholders (0 disables background passes)
+        'BRAINVIBE_ENRICHMENT_DELAY_SECONDS': 60,
+        # Placeholders handled per background pass
+        'BRAINVIBE_ENRICHMENT_MAX_TOPICS': 500,
+    }
+    return getattr(settings, name, defaults[name])
+
+
+def placeholder_topics():
+    """
+    Topics still waiting for a description, oldest first.
+    """
+    return Topic.objects.filter(description='').order_by('pk')
+
+
+def dedupe_key(topic_id: str) -> str:
+    """
+    Key shared by topic IDs that only differ in case or separators.
+    """
+    return slugify(_SEPARATOR_RE.sub("-", topic_id))
+
+
+def generated_title(topic_id: str) -> str:
+    """
+    The title a placeholder gets from its ID (see llm_utils.process_topics).
+    """
+    return topic_id.replace('-', ' ').title()
+
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(**counts: int):
+    with _stats_lock:
+        _stats.update(counts)
+
+
+def enrich_topics(topics: List[Topic], batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Describe placeholder topics with batched LLM calls and save the answers.
+
+    Args:
+        topics: Placeholder topics, possibly of many projects
+        batch_size: Topics per call (default: BRAINVIBE_ENRICHMENT_BATCH_SIZE)
+
+    Returns:
+        Counts of the topics seen and enriched, calls made and failed, and
+        prerequisite links created; "circuit_open" is set when the pass stopped
+        because the provider's circuit is open
+    """
+    batch_size = max(1, batch_size or enrichment_setting('BRAINVIBE_ENRICHMENT_BATCH_SIZE'))
+    provider = get_provider()
+    guard = get_provider_guard(provider)
+    model = getattr(settings, 'BRAINVIBE_LLM_FAST_MODEL', None)
+
+    groups: "OrderedDict[str, List[Topic]]" = OrderedDict()
+    for topic in topics:
+        groups.setdefault(dedupe_key(topic.topic_id), []).append(topic)
+    result = Counter(topics=len(topics), unique=len(groups))
+
+    items = list(groups.values())
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        # The first topic of each group stands for all of them in the prompt
+        request = {group[0].topic_id: group[0].title for group in batch}
+        deadline = Deadline(getattr(settings, 'BRAINVIBE_LLM_DEADLINE', 60))
+        result['calls'] += 1
+        try:
+            answered = call_with_resilience(
+                lambda timeout: provider.describe_topics(request, timeout=timeout, model=model),
+                guard,
+                deadline,
+                max_attempts=getattr(settings, 'BRAINVIBE_LLM_MAX_ATTEMPTS', 3)
+            )
+        except CircuitOpenError as e:
+            logger.warning(f"Stopping topic enrichment: {e}")
+            result['calls'] -= 1
+            result['circuit_open'] = 1
+            break
+        except Exception as e:
+            logger.error(f"Describing {len(request)} topics failed with provider '{provider.name}': {e}")
+            result['failed_calls'] += 1
+            continue
+
+        enriched, linked = _save_descriptions(batch, answered)
+        result['enriched'] += enriched
+        result['prerequisites_linked'] += linked
+        logger.info(f"Described {len(answered)} of {len(request)} placeholder topics in one call "
+                    f"({enriched} topics updated, {linked} prerequisites linked)")
+
+    _count(passes=1, calls=result['calls'], failed_calls=result['failed_calls'],
+           topics_enriched=result['enriched'], prerequisites_linked=result['prerequisites_linked'])
+    return dict(result)
+
+
+def _save_descriptions(batch: List[List[Topic]], answered: Dict[str, Dict[str, Any]]):
+    # Bulk-update the answered topics and link their prerequisites; returns (topics updated, links created)
+    now = timezone.now()
+    updated: List[Topic] = []
+    prerequisites: Dict[int, List[str]] = {}
+    for group in batch:
+        described = answered.get(group[0].topic_id)
+        if not described:
+            continue
+        for topic in group:
+            # A title someone edited is kept; only generated titles are replaced
+            if described["title"] and topic.title == generated_title(topic.topic_id):
+                topic.title = described["title"][:255]
+            topic.description = described["description"]
+            topic.updated_at = now
+            updated.append(topic)
+            prerequisites[topic.pk] = described["prerequisites"]
+    if not updated:
+        return 0, 0
+
+    prerequisite_ids = {topic_id for topic_ids in prerequisites.values() for topic_id in topic_ids}
+    existing = dict(Topic.objects.filter(topic_id__in=prerequisite_ids).values_list('topic_id', 'pk'))
+    Link = Topic.prerequisites.through
+    links = [
+        Link(from_topic_id=pk, to_topic_id=existing[topic_id])
+        for pk, topic_ids in prerequisites.items()
+        for topic_id in topic_ids
+        if topic_id in existing and existing[topic_id] != pk
+    ]
+    with transaction.atomic():
+        Topic.objects.bulk_update(updated, ['title', 'description', 'updated_at'])
+        Link.objects.bulk_create(links, ignore_conflicts=True)
+    return len(updated), len(links)
+
+
+def enrich_placeholder_topics(limit: Optional[int] = None, batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Enrich the oldest placeholder topics of all projects.
+
+    Args:
+        limit: Maximum number of placeholders handled (default: all)
+        batch_size: Topics per call (default: BRAINVIBE_ENRICHMENT_BATCH_SIZE)
+
+    Returns:
+        Counts as returned by enrich_topics
+    """
+    topics = placeholder_topics()
+    return enrich_topics(list(topics[:limit] if limit else topics), batch_size)
+
+
+def schedule_enrichment():
+    """
+    Run a background enrichment pass after BRAINVIBE_ENRICHMENT_DELAY_SECONDS.
+
+    Calls while a pass is pending are no-ops, so placeholders saved in the
+    meantime are described together. The pass runs as low-priority work in
+    the analysis pool (see services.get_analysis_scheduler).
+    """
+    delay = enrichment_setting('BRAINVIBE_ENRICHMENT_DELAY_SECONDS')
+    if delay > 0:
+        _pass.schedule(delay)
+
+
+def _run_pass():
+    try:
+        limit = enrichment_setting('BRAINVIBE_ENRICHMENT_MAX_TOPICS')
+        result = enrich_placeholder_topics(limit=limit)
+        # A full pass that made progress leaves more work; a pass that made none waits for new placeholders
+        if result['topics'] >= limit and result.get('enriched'):
+            schedule_enrichment()
+    except Exception as e:
+        logger.exception(f"Background topic enrichment failed: {e}")
+    finally:
+        close_old_connections()
+
+
+_pass = DelayedSubmission(_run_pass, LOW_PRIORITY)
+
+
+def enrichment_stats() -> Dict[str, int]:
+    """
+    Enrichment passes, calls and topics enriched since start-up.
+    """
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,221 @@
+"""
+Lexical relevance index over project topics.
+
+Builds a BM25 index over topic titles and descriptions so that only the topics
+relevant to the identifiers and imports in a diff are rendered into LLM prompts.
+"""
+import heapq
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from .diff_parser import parse_diff
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Default number of existing topics rendered into a prompt
+DEFAULT_CONTEXT_TOPICS = 40
+
+# Identifiers and words; camelCase and snake_case are split further in tokenize()
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+# Module names in import statements (Python, JS/TS, Go, Java, C/C++)
+_IMPORT_RES = [
+    re.compile(r"^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w.]+))"),
+    re.compile(r"""(?:from\s+|require\(\s*|import\s+)['"]([^'"]+)['"]"""),
+    re.compile(r"""^\s*#include\s*[<"]([^>"]+)[>"]"""),
+]
+
+# Terms that carry no topic signal
+_STOP_WORDS = frozenset("""
+    a an and are as at be by for from if in into is it of on or the to with
+    const let var def return self this true false none null new function class
+    import export default else elif end get set use using value values data
+""".split())
+
+# Imported module names count more than plain identifiers
+IMPORT_WEIGHT = 3
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase terms, breaking up camelCase and snake_case identifiers.
+
+    Args:
+        text: Free text or source code
+
+    Returns:
+        A list of terms
+    """
+    terms = []
+    for word in _WORD_RE.findall(text or ""):
+        parts = _CAMEL_RE.findall(word)
+        if len(parts) > 1:
+            terms.append(word.lower())
+        for part in parts:
+            part = part.lower()
+            if len(part) > 1 and part not in _STOP_WORDS:
+                terms.append(part)
+    return [t for t in terms if t not in _STOP_WORDS]
+
+
+def extract_diff_terms(diff_text: str) -> Counter:
+    """
+    Collect weighted query terms from the changed lines of a diff.
+
+    Only added and removed lines are considered. Module names found in import
+    statements are weighted by IMPORT_WEIGHT.
+
+    Args:
+        diff_text: The Git diff to analyze
+
+    Returns:
+        A Counter mapping terms to weights
+    """
+    terms = Counter()
+    parsed = parse_diff(diff_text)
+    for file_diff in parsed.files:
+        for code in parsed.iter_changed_lines(file_diff):
+            terms.update(tokenize(code))
+            for pattern in _IMPORT_RES:
+                match = pattern.search(code)
+                if match:
+                    module = next(g for g in match.groups() if g)
+                    for term in tokenize(module.replace("/", " ").replace(".", " ")):
+                        terms[term] += IMPORT_WEIGHT
+                    break
+    return terms
+
+
+class TopicIndex:
+    """
+    BM25 index over topic titles and descriptions.
+
+    Postings lists are kept sparse so a query only touches the documents that
+    share at least one term with it.
+    """
+
+    def __init__(self, topics: Iterable[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        """
+        Build the index
+
+        Args:
+            topics: Topic dictionaries with at least a title
+            k1: BM25 term frequency saturation
+            b: BM25 length normalisation
+        """
+        self.topics = list(topics)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._lengths: List[int] = []
+
+        for doc_id, topic in enumerate(self.topics):
+            # Titles are short and precise, so they count twice
+            title_terms = tokenize(topic.get("title", "")) + tokenize(topic.get("topic_id", "").replace("-", " "))
+            doc_terms = title_terms * 2 + tokenize(topic.get("description", ""))
+            self._lengths.append(len(doc_terms))
+            for term, freq in Counter(doc_terms).items():
+                self._postings[term].append((doc_id, freq))
+
+        doc_count = len(self.topics)
+        self._avg_length = (sum(self._lengths) / doc_count) if doc_count else 0.0
+        self._idf = {
+            term: math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+    def search(self, query: Counter, limit: int) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Rank topics against weighted query terms
+
+        Args:
+            query: Counter mapping terms to weights
+            limit: Maximum number of results
+
+        Returns:
+            A list of (score, topic) tuples, best first
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        avg_length = self._avg_length or 1.0
+        for term, weight in query.items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for doc_id, freq in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                scores[doc_id] += weight * idf * freq * (self.k1 + 1) / (freq + norm)
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, self.topics[doc_id]) for doc_id, score in best]
+
+
+def select_relevant_topics(
+    diff_text: str,
+    topics: Iterable[Dict[str, Any]],
+    limit: int = DEFAULT_CONTEXT_TOPICS,
+    index: Optional[TopicIndex] = None
+) -> List[Dict[str, Any]]:
+    """
+    Pick the topics most relevant to a diff, at most `limit` of them.
+
+    Args:
+        diff_text: The Git diff to analyze
+        topics: All candidate topics (ignored when an index is given)
+        limit: Maximum number of topics to return
+        index: Optional prebuilt index over the candidate topics
+
+    Returns:
+        A list of topic dictionaries, most relevant first
+    """
+    if index is None:
+        topics = list(topics)
+        if len(topics) <= limit:
+            return topics
+        index = TopicIndex(topics)
+    elif len(index) <= limit:
+        return list(index.topics)
+
+    results = index.search(extract_diff_terms(diff_text), limit)
+    logger.debug(f"Selected {len(results)} of {len(index)} topics for prompt context")
+    return [topic for _, topic in results]
+
+
+# Per-project index cache, keyed by a version that changes whenever the topic set does
+_index_cache: Dict[Hashable, Tuple[Hashable, TopicIndex]] = {}
+_index_cache_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 128
+
+
+def get_cached_index(key: Hashable, version: Hashable, loader) -> TopicIndex:
+    """
+    Return the cached index for `key`, rebuilding it when `version` has changed.
+
+    Args:
+        key: Cache key (e.g. the project ID)
+        version: Version of the underlying topic set
+        loader: Callable returning the topics to index
+
+    Returns:
+        A TopicIndex
+    """
+    with _index_cache_lock:
+        cached = _index_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    index = TopicIndex(loader())
+    with _index_cache_lock:
+        if len(_index_cache) >= _INDEX_CACHE_SIZE:
+            _index_cache.pop(next(iter(_index_cache)))
+        _index_cache[key] = (version, index)
+    return index
@@ -0,0 +1,437 @@
+"""
+Rule-based topic extraction that runs before the LLM.
+
+Import statements and well-known API calls are mapped to canonical topic IDs
+through a versioned catalogue (topic_catalogue.json). Files the rules fully
+explain never reach the LLM; everything else is returned as a residue diff.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from .diff_parser import ParsedDiff, parse_diff
+from .keyword_matcher import AhoCorasick
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOGUE_PATH = Path(__file__).resolve().parent / "topic_catalogue.json"
+
+# Files whose added code lines are left unexplained by the rules in a larger share than this go to the LLM
+DEFAULT_MAX_UNEXPLAINED_RATIO = 0.25
+
+# Line comment prefixes, used to ignore comment-only lines
+_COMMENT_PREFIXES = {
+    "python": ("#",), "ruby": ("#",),
+    "javascript": ("//", "/*", "*"), "go": ("//", "/*", "*"), "java": ("//", "/*", "*"),
+    "rust": ("//", "/*", "*"), "cpp": ("//", "/*", "*"),
+}
+
+_PY_IMPORT_RE = re.compile(r"^\s*(?:from\s+(\.*[\w.]*)\s+import\b|import\s+([\w.]+(?:\s+as\s+\w+)?(?:\s*,\s*[\w.]+(?:\s+as\s+\w+)?)*))")
+_JS_IMPORT_RE = re.compile(r"""(?:^\s*import\b[^'"]*['"]([^'"]+)['"]|\bfrom\s+['"]([^'"]+)['"]|\brequire\(\s*['"]([^'"]+)['"]\s*\)|\bimport\(\s*['"]([^'"]+)['"]\s*\))""")
+_GO_IMPORT_RE = re.compile(r"""^\s*import\s+(?:[\w.]+\s+)?"([^"]+)"|^\s*(?:[\w.]+\s+)?"([^"]+)"\s*$""")
+_JAVA_IMPORT_RE = re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+)(?:\.\*)?\s*;?")
+_RUST_IMPORT_RE = re.compile(r"^\s*(?:pub\s+)?(?:use|extern\s+crate)\s+(?:::)?(\w+)")
+_CPP_IMPORT_RE = re.compile(r"""^\s*#\s*include\s*[<"]([^>"]+)[>"]""")
+_RUBY_IMPORT_RE = re.compile(r"""^\s*require(?:_relative)?\s*\(?\s*['"]([^'"]+)['"]""")
+
+_PYTHON_STDLIB = frozenset(getattr(sys, "stdlib_module_names", ())) | {"__future__"}
+_NODE_BUILTINS = frozenset("""
+    assert buffer child_process cluster crypto dgram dns events fs http http2 https net os
+    path perf_hooks process querystring readline stream string_decoder timers tls url util
+    v8 vm worker_threads zlib
+""".split())
+
+
+def parse_import(language: str, line: str, in_go_block: bool = False) -> List[str]:
+    """
+    Extract the imported module names from a single line of source.
+
+    Args:
+        language: Language of the file
+        line: A line of source code (without the diff marker)
+        in_go_block: Whether the line is inside a Go `import ( ... )` block
+
+    Returns:
+        A list of module names (empty if the line is not an import)
+    """
+    if language == "python":
+        match = _PY_IMPORT_RE.match(line)
+        if not match:
+            return []
+        if match.group(1) is not None:
+            return [match.group(1)]
+        return [part.split()[0] for part in match.group(2).split(",")]
+    if language == "javascript":
+        match = _JS_IMPORT_RE.search(line)
+        return [next(g for g in match.groups() if g)] if match else []
+    if language == "go":
+        match = _GO_IMPORT_RE.match(line)
+        if not match:
+            return []
+        if match.group(1):
+            return [match.group(1)]
+        return [match.group(2)] if in_go_block else []
+    if language == "java":
+        match = _JAVA_IMPORT_RE.match(line)
+        return [match.group(1)] if match else []
+    if language == "rust":
+        match = _RUST_IMPORT_RE.match(line)
+        return [match.group(1)] if match else []
+    if language == "cpp":
+        match = _CPP_IMPORT_RE.match(line)
+        return [match.group(1)] if match else []
+    if language == "ruby":
+        match = _RUBY_IMPORT_RE.match(line)
+        return [match.group(1)] if match else []
+    return []
+
+
+def is_ignorable_import(language: str, module: str) -> bool:
+    """
+    Check whether an import carries no topic signal (relative or standard library).
+
+    Args:
+        language: Language of the file
+        module: Imported module name
+
+    Returns:
+        True if the import can be explained without a catalogue entry
+    """
+    if module.startswith("."):
+        return True
+    if language == "python":
+        return module.split(".")[0] in _PYTHON_STDLIB
+    if language == "javascript":
+        return module.startswith(("node:", "/", "@/", "~/")) or module.split("/")[0] in _NODE_BUILTINS
+    if language == "go":
+        return "." not in module.split("/")[0]
+    if language == "java":
+        return module.startswith(("java.", "javax.", "kotlin.", "scala."))
+    if language == "rust":
+        return module in ("std", "core", "alloc", "crate", "self", "super")
+    if language == "cpp":
+        return "." not in module or module.endswith((".h", ".hpp"))
+    return False
+
+
+class TopicCatalogue:
+    """
+    Versioned mapping of packages and API signatures to canonical topics.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        """
+        Initialize the catalogue from its JSON representation
+
+        Args:
+            data: Parsed catalogue with version, topics, packages and apis keys
+        """
+        self.version = data.get("version", "0")
+        self.topics: Dict[str, Dict[str, Any]] = data.get("topics", {})
+        self.packages: Dict[str, Dict[str, List[str]]] = data.get("packages", {})
+        self.apis: Dict[str, Dict[str, List[str]]] = data.get("apis", {})
+
+        # One automaton over the API signatures of every language, compiled once per catalogue
+        self.matcher = AhoCorasick(
+            (signature, (language, topics))
+            for language, signatures in self.apis.items()
+            for signature, topics in signatures.items()
+        )
+
+    def lookup_package(self, language: str, module: str) -> Optional[List[str]]:
+        """
+        Find the topics for an imported module, matching the longest known prefix.
+
+        Args:
+            language: Language of the file
+            module: Imported module name
+
+        Returns:
+            A list of topic IDs, or None if the package is not in the catalogue
+        """
+        packages = self.packages.get(language, {})
+        separator = "." if language in ("python", "java") else "/"
+        parts = module.split(separator)
+        for end in range(len(parts), 0, -1):
+            topics = packages.get(separator.join(parts[:end]))
+            if topics is not None:
+                return topics
+        return None
+
+    def find_api_topics(self, language: str, line: str) -> List[str]:
+        """
+        Find the topics for well-known API signatures used in a line.
+
+        Args:
+            language: Language of the file
+            line: A line of source code
+
+        Returns:
+            A list of topic IDs
+        """
+        return [topic for _, topics in self.find_api_hits(language, line) for topic in topics]
+
+    def find_api_hits(self, language: str, line: str) -> List[Tuple[str, List[str]]]:
+        """
+        Find the well-known API signatures of a language used in a line.
+
+        Args:
+            language: Language of the file
+            line: A line of source code
+
+        Returns:
+            A list of (signature, topic IDs) tuples in order of occurrence
+        """
+        return [
+            (signature, topics)
+            for signature, (hit_language, topics) in self.matcher.find_all(line)
+            if hit_language == language
+        ]
+
+    def topic(self, topic_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a topic dictionary in the shape produced by the LLM path.
+
+        Args:
+            topic_id: Canonical topic ID
+
+        Returns:
+            A topic dictionary, or None if the topic is not in the catalogue
+        """
+        entry = self.topics.get(topic_id)
+        if entry is None:
+            return None
+        return {
+            "topic_id": topic_id,
+            "title": entry.get("title", topic_id.replace("-", " ").title()),
+            "description": entry.get("description", ""),
+            "prerequisites": list(entry.get("prerequisites", [])),
+        }
+
+
+_catalogue: Optional[TopicCatalogue] = None
+_catalogue_lock = threading.Lock()
+
+
+def load_catalogue(path: Optional[str] = None) -> TopicCatalogue:
+    """
+    Read and parse a topic catalogue file.
+
+    Args:
+        path: Path to the catalogue (defaults to BRAINVIBE_TOPIC_CATALOGUE or the bundled file)
+
+    Returns:
+        A TopicCatalogue
+    """
+    path = path or os.environ.get("BRAINVIBE_TOPIC_CATALOGUE") or DEFAULT_CATALOGUE_PATH
+    with open(path, "r") as f:
+        catalogue = TopicCatalogue(json.load(f))
+    logger.info(f"Loaded topic catalogue version {catalogue.version} from {path}")
+    return catalogue
+
+
+def get_catalogue() -> TopicCatalogue:
+    """
+    Return the process-wide catalogue, loading it on first use.
+
+    The catalogue owns the compiled keyword automaton, so the automaton is
+    built once per process and rebuilt only by reload_catalogue().
+
+    Returns:
+        The shared TopicCatalogue
+    """
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                _catalogue = load_catalogue()
+    return _catalogue
+
+
+def reload_catalogue(path: Optional[str] = None) -> TopicCatalogue:
+    """
+    Replace the process-wide catalogue, e.g. after the catalogue file was updated.
+
+    Args:
+        path: Optional path to the new catalogue
+
+    Returns:
+        The newly loaded TopicCatalogue
+    """
+    global _catalogue
+    catalogue = load_catalogue(path)
+    with _catalogue_lock:
+        _catalogue = catalogue
+    return catalogue
+
+
+def iter_file_sections(diff_text: str) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Split a unified diff into per-file sections.
+
+    Args:
+        diff_text: The Git diff
+
+    Yields:
+        Tuples of (file path, section lines including headers)
+    """
+    parsed = parse_diff(diff_text)
+    for file_diff in parsed.files:
+        yield file_diff.path, parsed.section_text(file_diff).splitlines()
+
+
+class RuleResult:
+    """
+    Outcome of rule-based extraction for a diff.
+    """
+
+    def __init__(self):
+        self.topics: List[Dict[str, Any]] = []
+        self.residue: str = ""
+        self.covered_files: List[str] = []
+        self.residue_files: List[str] = []
+        self.api_hits: Dict[str, Dict[str, int]] = {}
+        self.catalogue_version: str = ""
+        self.elapsed_ms: float = 0.0
+
+    @property
+    def fully_covered(self) -> bool:
+        """True when no part of the diff needs the LLM"""
+        return not self.residue_files
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary of the result for logging and API responses"""
+        return {
+            "topics": self.topics,
+            "covered_files": self.covered_files,
+            "residue_files": self.residue_files,
+            "api_hits": self.api_hits,
+            "catalogue_version": self.catalogue_version,
+            "elapsed_ms": round(self.elapsed_ms, 3),
+        }
+
+
+def _analyze_section(catalogue: TopicCatalogue, language: Optional[str], added_lines: Iterable[str]) -> Tuple[Set[str], int, int, bool, Dict[str, int]]:
+    """
+    Apply the rules to the added lines (without the "+") of one file section.
+
+    Returns:
+        Tuple of (topic IDs, code line count, unexplained code line count, has
+        unknown imports, API hit counts)
+    """
+    topic_ids: Set[str] = set()
+    api_hits: Dict[str, int] = {}
+    code_lines = 0
+    unexplained = 0
+    unknown_import = False
+    in_go_block = False
+    comment_prefixes = _COMMENT_PREFIXES.get(language, ())
+
+    for code in added_lines:
+        stripped = code.strip()
+        if not stripped or (comment_prefixes and stripped.startswith(comment_prefixes)):
+            continue
+        code_lines += 1
+        if language is None:
+            unexplained += 1
+            continue
+
+        if language == "go":
+            if stripped.startswith("import ("):
+                in_go_block = True
+                continue
+            if in_go_block and stripped == ")":
+                in_go_block = False
+                continue
+
+        modules = parse_import(language, code, in_go_block)
+        if modules:
+            for module in modules:
+                topics = catalogue.lookup_package(language, module)
+                if topics is not None:
+                    topic_ids.update(topics)
+                elif not is_ignorable_import(language, module):
+                    unknown_import = True
+            continue
+
+        hits = catalogue.find_api_hits(language, code)
+        if not hits:
+            unexplained += 1
+        for signature, topics in hits:
+            topic_ids.update(topics)
+            api_hits[signature] = api_hits.get(signature, 0) + 1
+
+    return topic_ids, code_lines, unexplained, unknown_import, api_hits
+
+
+def extract_rule_topics(
+    diff_text: Union[str, ParsedDiff],
+    catalogue: Optional[TopicCatalogue] = None,
+    max_unexplained_ratio: float = DEFAULT_MAX_UNEXPLAINED_RATIO
+) -> RuleResult:
+    """
+    Extract topics from a diff using import and API-usage rules only.
+
+    A file is covered when the rules found topics in it, all of its imports
+    are known (or ignorable), and at most `max_unexplained_ratio` of its added
+    code lines are left unexplained. A file the rules found nothing in goes to
+    the LLM however small it is; one without added code lines (comments and
+    blank lines only) has nothing to explain. Uncovered file sections are
+    concatenated into the residue diff.
+
+    Args:
+        diff_text: The Git diff to analyze, as text or already parsed
+        catalogue: Optional catalogue (defaults to the shared one)
+        max_unexplained_ratio: Share of unexplained code lines above which a file goes to the LLM
+
+    Returns:
+        A RuleResult
+    """
+    started = time.perf_counter()
+    catalogue = catalogue or get_catalogue()
+    result = RuleResult()
+    result.catalogue_version = catalogue.version
+
+    parsed = parse_diff(diff_text)
+    topic_ids: Dict[str, None] = {}
+    residue_sections = []
+    for file_diff in parsed.files:
+        file_path = file_diff.path
+        found, code_lines, unexplained, unknown_import, api_hits = _analyze_section(
+            catalogue, file_diff.language, parsed.iter_added_lines(file_diff)
+        )
+        if api_hits:
+            result.api_hits[file_path] = api_hits
+        for topic_id in sorted(found):
+            topic_ids.setdefault(topic_id)
+
+        covered = code_lines == 0 or (
+            found and not unknown_import and unexplained <= max_unexplained_ratio * code_lines
+        )
+        if covered:
+            result.covered_files.append(file_path)
+        else:
+            result.residue_files.append(file_path)
+            residue_sections.append(file_diff)
+
+    for topic_id in topic_ids:
+        topic = catalogue.topic(topic_id)
+        if topic is not None:
+            result.topics.append(topic)
+        else:
+            logger.warning(f"Catalogue {catalogue.version} references unknown topic {topic_id}")
+
+    result.residue = parsed.join(residue_sections)
+    result.elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.debug(
+        f"Rules found {len(result.topics)} topics in {result.elapsed_ms:.2f} ms, "
+        f"{len(result.covered_files)} files covered, {len(result.residue_files)} left for the LLM"
+    )
+    return result
@@ -2,7 +2,10 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.urls import reverse
 from .models import Topic, TopicDependency, Project, CodeChange
 from .serializers import (
     TopicSerializer, TopicDependencySerializer, ProjectSerializer, 
@@ -11,16 +14,87 @@ from .serializers import (
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import action
 from . import services
+from .utils import cursor_integration
 from .utils.cursor_integration import process_cursor_change, compute_diff
+from .utils import admission, change_classifier, content_cache, prompt_cache, topic_enrichment
 from .utils import git_utils
 from .utils import llm_utils
-from .utils.llm_utils import analyze_diff, extract_topics_from_diff
+from .utils.llm_utils import analyze_diff
+from .utils.progress import broker, change_channel, project_channel
+from .utils.resilience import StagedDeadline
 import logging
 import uuid
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+def _resolve_uploaded_contents(request, scope):
+    """
+    Resolve the original and new contents of a submitted change, full or delta.
+
+    Returns:
+        Tuple of (original content, new content), or an error Response
+    """
+    try:
+        return content_cache.resolve_contents(scope, request.data)
+    except content_cache.SendFullContent as e:
+        return Response(
+            {"status": "send_full", "message": str(e), "base_hash": e.base_hash},
+            status=status.HTTP_409_CONFLICT
+        )
+    except ValueError as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+def _admission_response(change_source):
+    """
+    Refuse new analysis work when the analysis queue is too deep for its source.
+
+    Returns:
+        A 429/503 Response with Retry-After, or None if the work is admitted
+    """
+    rejection = admission.admit(change_source)
+    if rejection is None:
+        return None
+    return Response(
+        {"status": "busy", "message": rejection.message, "retry_after": rejection.retry_after},
+        status=rejection.status_code,
+        headers={"Retry-After": str(rejection.retry_after)}
+    )
+
+
+# Seconds the client will wait for the response, sent by the CLI
+DEADLINE_HEADER = 'X-BrainVibe-Deadline'
+
+
+def _request_deadline(request):
+    """
+    Deadline of the request from the X-BrainVibe-Deadline header.
+
+    The header holds the seconds the client will wait, which keeps it free of
+    clock skew. BRAINVIBE_DEADLINE_MARGIN_SECONDS are kept back for sending the
+    response, and the budget is capped at BRAINVIBE_REQUEST_MAX_DEADLINE.
+
+    Returns:
+        A StagedDeadline split by BRAINVIBE_DEADLINE_STAGE_SHARES, or None
+        without a (valid) header
+    """
+    value = request.headers.get(DEADLINE_HEADER)
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {DEADLINE_HEADER} header: {value!r}")
+        return None
+    seconds = min(seconds - getattr(settings, 'BRAINVIBE_DEADLINE_MARGIN_SECONDS', 0.5),
+                  getattr(settings, 'BRAINVIBE_REQUEST_MAX_DEADLINE', 300))
+    return StagedDeadline(seconds, getattr(settings, 'BRAINVIBE_DEADLINE_STAGE_SHARES', None))
+
+
 # Create your views here.
 class HelloWorldView(APIView):
     """
@@ -130,7 +204,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
         return Response(result)
     
     @action(detail=True, methods=['post'])
-    def submit_cursor_change(self, request, pk=None):
+    def submit_cursor_change(self, request, project_id=None):
         """
         Submit a code change from Cursor IDE
         
@@ -139,24 +213,39 @@ class ProjectViewSet(viewsets.ModelViewSet):
         - original_content: Original content of the file
         - new_content: New content of the file
         
+        Instead of original_content and new_content, a delta may be sent:
+        - base_hash: content_hash returned for the previous change of the file
+        - patch: Unified diff from that content to the new content
+        - content_hash: Optional sha256 of the new content, to verify the patch
+        If the base is unknown the response is 409 with status "send_full".
+        
         Optional parameters:
         - cursor_session_id: ID of the Cursor session
         - metadata: Additional metadata about the change
+        
+        When the analysis queue is saturated the response is 503 with Retry-After.
         """
+        busy = _admission_response('cursor_ai')
+        if busy is not None:
+            return busy
         project = self.get_object()
         file_path = request.data.get('file_path')
-        original_content = request.data.get('original_content', '')
-        new_content = request.data.get('new_content')
         cursor_session_id = request.data.get('cursor_session_id')
         metadata = request.data.get('metadata')
         
         # Validate required parameters
-        if not file_path or new_content is None:
+        if not file_path:
             return Response(
-                {"error": "file_path and new_content parameters are required"}, 
+                {"error": "file_path parameter is required"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        scope = content_cache.session_scope(project.project_id, cursor_session_id)
+        contents = _resolve_uploaded_contents(request, scope)
+        if isinstance(contents, Response):
+            return contents
+        original_content, new_content = contents
+        
         # Process the change using the cursor integration module
         result = cursor_integration.process_cursor_change(
             project.project_id,
@@ -174,6 +263,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        result['content_hash'] = content_cache.remember_content(scope, new_content)
         return Response(result)
 
     def create(self, request, *args, **kwargs):
@@ -354,6 +444,23 @@ class AnalyzeDiffView(APIView):
     This endpoint accepts either:
     1. A repository path to extract diffs locally
     2. A diff content directly from the CLI tool
+    
+    With `stream: true` the analysis runs in the background and the response is
+    202 with an `events_url` for following progress as server-sent events.
+    
+    An optional `change_source` (e.g. scheduled_scan) sets the change's priority
+    for admission control: when the analysis queue is too deep for it, the
+    response is 429 (or 503 once the queue is full) with a Retry-After header.
+    
+    An X-BrainVibe-Deadline header (seconds the client will wait) bounds the
+    analysis: its budget is split across filtering, cache lookups, the LLM and
+    the database write, topics found so far are returned with `partial: true`
+    when the LLM cannot finish in time, and a streamed analysis still queued
+    when the deadline passes is cancelled.
+
+    A project with path ownership rules in its metadata (see path_router)
+    splits the diff by file and records one change per owning project; the
+    changes are analyzed concurrently and listed under `routes`.
     """
     permission_classes = [AllowAny]
     
@@ -371,6 +478,14 @@ class AnalyzeDiffView(APIView):
         """
         try:
             logger.info(f"Analyzing diff for project_id: {project_id}")
+            deadline = _request_deadline(request)
+            change_source = request.data.get('change_source')
+            if change_source not in admission.SOURCE_PRIORITIES:
+                change_source = 'cli' if 'diff_content' in request.data else 'web'
+            busy = _admission_response(change_source)
+            if busy is not None:
+                return busy
+            
             # Get the project from the database
             try:
                 project = Project.objects.get(project_id=project_id)
@@ -406,10 +521,18 @@ class AnalyzeDiffView(APIView):
                     status=status.HTTP_200_OK
                 )
             
+            streamed = str(request.data.get('stream', '')).lower() in ('1', 'true')
+            
+            # Monorepo projects hand the files under their path prefixes to the owning projects
+            routes = services.route_diff(project, diff_text)
+            if len(routes) > 1 or routes[0][0] != project:
+                return self._analyze_routed(request, project, routes, change_id, change_source,
+                                            repo_path, streamed, deadline)
+            
             # Track the code change in the database
             code_change = CodeChange.objects.create(
                 project=project,
-                change_source='cli' if 'diff_content' in request.data else 'web',
+                change_source=change_source,
                 change_id=change_id,
                 diff_content=diff_text,
                 metadata={
@@ -418,56 +541,21 @@ class AnalyzeDiffView(APIView):
                 }
             )
             
-            # Extract and save topics
-            topics_data = extract_topics_from_diff(diff_text, project)
-            
-            # Save extracted topics and link to the code change
-            topics_created = []
-            for topic_data in topics_data:
-                try:
-                    # Check if the topic already exists
-                    topic_id = topic_data['topic_id']
-                    topic, created = Topic.objects.get_or_create(
-                        topic_id=topic_id,
-                        defaults={
-                            'title': topic_data['title'],
-                            'description': topic_data['description'],
-                            'project': project,
-                            'status': 'not_learned'
-                        }
+            # Streamed mode: analyse in the background and let the client follow the event stream
+            if streamed:
+                services.submit_diff_analysis(project, code_change, deadline)
+                return Response({
+                    'success': True,
+                    'project_id': project_id,
+                    'change_id': code_change.change_id,
+                    'events_url': request.build_absolute_uri(
+                        reverse('change_events', kwargs={'change_id': code_change.change_id})
                     )
-                    
-                    # Link the topic to the code change
-                    code_change.extracted_topics.add(topic)
-                    
-                    # Only add to the topics_created list if it's a new topic
-                    if created:
-                        topics_created.append(topic_id)
-                        
-                        # Create prerequisite relationships
-                        for prereq_id in topic_data.get('prerequisites', []):
-                            try:
-                                prereq = Topic.objects.get(topic_id=prereq_id)
-                                topic.prerequisites.add(prereq)
-                            except Topic.DoesNotExist:
-                                logger.warning(f"Prerequisite topic {prereq_id} not found")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing topic {topic_data.get('topic_id')}: {str(e)}")
-            
-            logger.info(f"Analysis complete. Created {len(topics_created)} new topics")
+                }, status=status.HTTP_202_ACCEPTED)
             
-            return Response({
-                'success': True,
-                'project_id': project_id,
-                'topics_created': topics_created,
-                'change_id': code_change.change_id,
-                'analysis_details': [
-                    f"Analyzed diff with {len(diff_text.splitlines())} lines",
-                    f"Created {len(topics_created)} new topics",
-                    f"The topics are now visible in your project"
-                ]
-            })
+            # Extract and save topics
+            with admission.load.track():
+                return Response(services.run_diff_analysis(project, code_change, deadline))
             
         except Exception as e:
             logger.error(f"Error analyzing diff for project {project_id}: {str(e)}")
@@ -476,6 +564,144 @@ class AnalyzeDiffView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _analyze_routed(self, request, project, routes, change_id, change_source, repo_path, streamed, deadline):
+        """
+        Record and analyze the per-project sub-diffs of a monorepo diff.
+
+        The sub-diff of the posted project keeps the change ID; the others get
+        the owning project's ID appended. The response lists each project's
+        change under `routes`, with its events URL in streamed mode or its
+        result otherwise; the top-level topics and `partial` flag cover all of them.
+        The top-level change ID and events URL are those of the posted
+        project (no events URL if none of the files stayed with it).
+        """
+        changes = []
+        for owner, sub_diff, files in routes:
+            code_change = CodeChange.objects.create(
+                project=owner,
+                change_source=change_source,
+                change_id=change_id if owner == project else f"{change_id}-{owner.project_id}",
+                diff_content=sub_diff,
+                metadata={
+                    'repo_path': repo_path,
+                    'timestamp': timezone.now().isoformat(),
+                    'routed_from': {'project_id': project.project_id, 'change_id': change_id},
+                    'files': files
+                }
+            )
+            changes.append((owner, code_change, files))
+        logger.info(f"Routed change {change_id} of project {project.project_id} to "
+                    f"{', '.join(owner.project_id for owner, _, _ in changes)}")
+
+        if streamed:
+            routed = []
+            for owner, code_change, files in changes:
+                services.submit_diff_analysis(owner, code_change, deadline)
+                routed.append({
+                    'project_id': owner.project_id,
+                    'change_id': code_change.change_id,
+                    'files': files,
+                    'events_url': request.build_absolute_uri(
+                        reverse('change_events', kwargs={'change_id': code_change.change_id})
+                    )
+                })
+            response = {
+                'success': True,
+                'project_id': project.project_id,
+                'change_id': change_id,
+                'routes': routed
+            }
+            # The top level describes the posted project's change; other projects' events are under routes
+            own = [route for route in routed if route['project_id'] == project.project_id]
+            if own:
+                response['events_url'] = own[0]['events_url']
+            return Response(response, status=status.HTTP_202_ACCEPTED)
+
+        with admission.load.track():
+            results = services.run_routed_analysis([(owner, code_change) for owner, code_change, _ in changes],
+                                                   deadline)
+        routed = [dict(results[owner.project_id], project_id=owner.project_id, files=files)
+                  for owner, _, files in changes]
+        response = {
+            'success': all(result.get('success') for result in routed),
+            'project_id': project.project_id,
+            'change_id': change_id,
+            'topics_created': [topic for result in routed for topic in result.get('topics_created') or []],
+            'routes': routed
+        }
+        if any(result.get('partial') for result in routed):
+            response['partial'] = True
+        return Response(response)
+
+
+class AnalysisQueueView(APIView):
+    """
+    API view reporting the background analysis queue: analyses in flight,
+    recent throughput, the scheduler's per-class queue lengths and waits, the
+    placeholder topics waiting for enrichment, provider-side prompt prefix caching,
+    and per-stage queues, workers and timings of the analysis pipeline.
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request, format=None):
+        return Response({
+            'in_flight': admission.load.depth,
+            'completed_per_second': round(admission.load.throughput(), 3),
+            'scheduler': services.get_analysis_scheduler().stats(),
+            'topic_enrichment': dict(topic_enrichment.enrichment_stats(),
+                                     placeholders=topic_enrichment.placeholder_topics().count()),
+            'prompt_cache': prompt_cache.prompt_cache_stats(),
+            'pipeline': services.get_analysis_pipeline().stats()
+        })
+
+
+def _event_stream_response(request, channel, stop_on_terminal):
+    """
+    Build a text/event-stream response for a progress channel.
+    
+    Under ASGI the stream is an async iterator, so an idle subscriber holds no
+    worker thread; under WSGI it falls back to a blocking iterator.
+    """
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+    except ValueError:
+        last_event_id = 0
+    
+    def encode(progress_event):
+        return progress_event.to_sse() if progress_event else ": keep-alive\n\n"
+    
+    if isinstance(request, ASGIRequest):
+        async def stream():
+            yield "retry: 3000\n\n"
+            async for progress_event in broker.asubscribe(channel, last_event_id, stop_on_terminal):
+                yield encode(progress_event)
+    else:
+        def stream():
+            yield "retry: 3000\n\n"
+            for progress_event in broker.subscribe(channel, last_event_id, stop_on_terminal):
+                yield encode(progress_event)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+
+def change_events_view(request, change_id):
+    """
+    Server-sent event stream of analysis progress for a single code change.
+    
+    Emits "stage" and "topic" events and closes after "complete" or "error".
+    """
+    return _event_stream_response(request, change_channel(change_id), stop_on_terminal=True)
+
+
+def project_events_view(request, project_id):
+    """
+    Server-sent event stream of analysis progress for every change in a project.
+    """
+    return _event_stream_response(request, project_channel(project_id), stop_on_terminal=False)
+
 
 def home_view(request):
     """
@@ -523,25 +749,43 @@ class CodeChangeViewSet(viewsets.ModelViewSet):
         
         This is a generic endpoint that can accept code changes from various sources.
         The source should be specified in the request data.
+        
+        Contents are sent either in full (original_content, new_content) or as a
+        delta (base_hash, patch, optional content_hash) against the content_hash
+        returned for an earlier change in the same cursor_session_id. An unknown
+        base gets a 409 response with status "send_full".
+        
+        When the analysis queue is too deep for the change's source, the response
+        is 429 (low-priority sources such as scheduled_scan are shed first) or
+        503 with a Retry-After header.
         """
         # Extract parameters
         project_id = request.data.get('project_id')
         file_path = request.data.get('file_path')
         change_source = request.data.get('change_source', 'manual_edit')
-        original_content = request.data.get('original_content', '')
-        new_content = request.data.get('new_content')
+        cursor_session_id = request.data.get('cursor_session_id')
         
         # Validate required parameters
-        if not project_id or not file_path or new_content is None:
+        if not project_id or not file_path:
             return Response(
-                {"error": "project_id, file_path, and new_content parameters are required"}, 
+                {"error": "project_id and file_path parameters are required"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        busy = _admission_response(change_source)
+        if busy is not None:
+            return busy
+        
+        # Full contents, or base_hash + patch against content sent earlier in the session
+        scope = content_cache.session_scope(project_id, cursor_session_id)
+        contents = _resolve_uploaded_contents(request, scope)
+        if isinstance(contents, Response):
+            return contents
+        original_content, new_content = contents
+        
         # Process the change
         if change_source == 'cursor_ai':
             # Use the cursor integration module
-            cursor_session_id = request.data.get('cursor_session_id')
             metadata = request.data.get('metadata')
             
             result = cursor_integration.process_cursor_change(
@@ -556,15 +800,21 @@ class CodeChangeViewSet(viewsets.ModelViewSet):
             # For other sources, compute the diff and analyze it
             # compute_diff is already imported above
             diff_content = compute_diff(original_content, new_content)
+            # The full versions classify formatting, comment and rename changes best
+            change_kind = change_classifier.classify_versions([(file_path, original_content, new_content)])
             
             # Import the services module
-            result = services.analyze_code_change(
-                project_id,
-                file_path,
-                diff_content,
-                change_source
-            )
+            with admission.load.track():
+                result = services.analyze_code_change(
+                    project_id,
+                    file_path,
+                    diff_content,
+                    change_source,
+                    change_kind
+                )
         
+        if isinstance(result, dict) and result.get('status') != 'error':
+            result['content_hash'] = content_cache.remember_content(scope, new_content)
         return Response(result)
 
 
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Benchmark compute_diff's diff engine against difflib on real files
+"""
+
+import os
+import sys
+import glob
+import time
+import random
+import difflib
+import argparse
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main.utils.fast_diff import diff_texts, get_opcodes
+
+
+def mutate(lines, edits, rng):
+    """Apply random line replacements, insertions and deletions"""
+    lines = list(lines)
+    for _ in range(edits):
+        if not lines:
+            break
+        index = rng.randrange(len(lines))
+        roll = rng.random()
+        if roll < 0.4:
+            lines[index] = f"    value_{rng.randint(0, 10 ** 6)} = compute({index})\n"
+        elif roll < 0.7:
+            lines.insert(index, f"    log_step({rng.randint(0, 10 ** 6)})\n")
+        else:
+            del lines[index]
+    return lines
+
+
+def is_valid(a_lines, b_lines):
+    """Check that the opcodes rebuild the new version from the old one"""
+    rebuilt = []
+    for tag, i1, i2, j1, j2 in get_opcodes(a_lines, b_lines):
+        if tag == 'equal':
+            if a_lines[i1:i2] != b_lines[j1:j2]:
+                return False
+            rebuilt.extend(a_lines[i1:i2])
+        else:
+            rebuilt.extend(b_lines[j1:j2])
+    return rebuilt == list(b_lines)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def difflib_diff(original, new):
+    return ''.join(difflib.unified_diff(
+        original.splitlines(keepends=True), new.splitlines(keepends=True),
+        fromfile='before', tofile='after', n=3
+    ))
+
+
+def changed_lines(diff):
+    return sum(1 for line in diff.splitlines() if line[:1] in '+-' and line[:3] not in ('+++', '---'))
+
+
+def run_case(name, original, new):
+    """Time both engines on one pair of texts and print a result row"""
+    expected, difflib_seconds = timed(difflib_diff, original, new)
+    actual, fast_seconds = timed(diff_texts, original, new)
+    valid = is_valid(original.splitlines(keepends=True), new.splitlines(keepends=True))
+    speedup = difflib_seconds / fast_seconds if fast_seconds else float('inf')
+    print(f"{name[:40]:40} {original.count(chr(10)):>7} {difflib_seconds:>9.4f} {fast_seconds:>9.4f} "
+          f"{speedup:>8.1f}x {changed_lines(expected):>8} {changed_lines(actual):>8} "
+          f"{'yes' if actual == expected else 'no':>9} {'ok' if valid else 'INVALID':>7}")
+    return valid, difflib_seconds, fast_seconds
+
+
+def main():
+    """Main function for the benchmark script"""
+    parser = argparse.ArgumentParser(description='Benchmark compute_diff against difflib')
+    parser.add_argument('files', nargs='*', help='Files to mutate and diff (defaults to the backend sources)')
+    parser.add_argument('--edits', type=int, default=20, help='Random edits per file')
+    parser.add_argument('--large-lines', type=int, default=10000, help='Size of the synthetic large-file case')
+    parser.add_argument('--large-edits', type=int, default=600, help='Random edits in the large-file case')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    files = args.files or sorted(glob.glob(os.path.join(backend_dir, 'main', '**', '*.py'), recursive=True))
+    sources = {}
+    for path in files:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                sources[os.path.relpath(path, backend_dir)] = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Skipping {path}: {e}")
+    if not sources:
+        print("Error: no readable files")
+        return 1
+
+    print(f"{'case':40} {'lines':>7} {'difflib':>9} {'fast':>9} {'speedup':>9} "
+          f"{'+/- old':>8} {'+/- new':>8} {'identical':>9} {'valid':>7}")
+    all_valid = True
+    difflib_total = fast_total = 0.0
+    for name, text in sources.items():
+        mutated = ''.join(mutate(text.splitlines(keepends=True), args.edits, rng))
+        valid, difflib_seconds, fast_seconds = run_case(name, text, mutated)
+        all_valid &= valid
+        difflib_total += difflib_seconds
+        fast_total += fast_seconds
+
+    # Large file built from the real sources, as sent by submit_change for a big module
+    lines = ''.join(sources.values()).splitlines(keepends=True)
+    while len(lines) < args.large_lines:
+        lines = lines + lines
+    lines = lines[:args.large_lines]
+    large = ''.join(lines)
+    large_cases = [
+        (f"large file, {args.large_edits} edits", large, ''.join(mutate(lines, args.large_edits, rng))),
+        ("large file, unchanged", large, large),
+        ("large file, rewritten", large, ''.join(mutate(lines, len(lines), rng))),
+        ("large file, repetitive lines",
+         ''.join('same\n' if i % 2 else f"v{i}\n" for i in range(args.large_lines)),
+         ''.join('same\n' if i % 3 else f"w{i}\n" for i in range(args.large_lines))),
+    ]
+    for name, original, new in large_cases:
+        all_valid &= run_case(name, original, new)[0]
+
+    print(f"\nTotal over {len(sources)} files: difflib {difflib_total:.3f}s, fast {fast_total:.3f}s")
+    return 0 if all_valid else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
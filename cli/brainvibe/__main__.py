@@ -27,6 +27,9 @@ def main():
                              help='Interval in milliseconds between commits (default: 120000 = 2 minutes)')
     track_parser.add_argument('--ignore-file', type=str, 
                              help='Custom ignore file path (default: .brainvibeignore)')
+    track_parser.add_argument('--timeout', type=float, default=60,
+                             help='Seconds to wait for each analysis; the server returns partial results '
+                                  'rather than overrunning it (default: 60)')
     
     # Parse arguments
     args = parser.parse_args()
@@ -13,6 +13,8 @@ import hashlib
 import datetime
 import re
 
+from ..events import iter_sse_events, render_event
+
 def load_config():
     """Load BrainVibe configuration from .brainvibe/config.json"""
     config_path = Path('.brainvibe/config.json')
@@ -104,41 +106,161 @@ def load_ignore_patterns(ignore_file_path=None):
     
     return patterns
 
-def send_changes_to_api(config, changes):
-    """Send changes to the BrainVibe API for analysis"""
+def follow_analysis_events(events_url, deadline=None):
+    """Render analysis progress from the server-sent event stream of a change
+    
+    The server ends the stream by the deadline (time.monotonic() value) it was
+    given, with partial topics if the analysis could not finish.
+    """
+    read_timeout = 120 if deadline is None else max(1, deadline - time.monotonic()) + DEADLINE_GRACE
+    with requests.get(events_url, stream=True, headers={'Accept': 'text/event-stream'},
+                      timeout=(CONNECT_TIMEOUT, read_timeout)) as response:
+        response.raise_for_status()
+        for event_type, data in iter_sse_events(response):
+            if render_event(event_type, data):
+                return event_type == 'complete'
+    print("Event stream closed before the analysis finished.")
+    return False
+
+# Seconds we wait for an analysis by default (sent to the server as X-BrainVibe-Deadline)
+DEFAULT_TIMEOUT = 60
+DEADLINE_HEADER = 'X-BrainVibe-Deadline'
+# Seconds allowed to connect to the server, and extra seconds after the deadline for its last response
+CONNECT_TIMEOUT = 10
+DEADLINE_GRACE = 5
+
+# Changes the server asked us to send later (HTTP 429/503 with Retry-After)
+PENDING_DIR = Path('.brainvibe/pending')
+RETRY_AT_FILE = PENDING_DIR / 'retry_at'
+# Default wait when the server does not say how long to back off
+DEFAULT_RETRY_AFTER = 30
+# Held changes are dropped after this many failed (non-busy) attempts
+MAX_PENDING_ATTEMPTS = 5
+
+class ServerBusy(Exception):
+    """The server refused the change because its analysis queue is full"""
+    def __init__(self, retry_after):
+        super().__init__(f"server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+def _retry_after(response):
+    """Seconds to wait from a 429/503 response (Retry-After header or body)"""
+    value = response.headers.get('Retry-After')
+    if value is None:
+        try:
+            value = response.json().get('retry_after')
+        except ValueError:
+            value = None
+    try:
+        return max(1, int(float(value)))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+def backoff_remaining():
+    """Seconds left before the server accepts changes again (0 if not backing off)"""
+    try:
+        retry_at = float(RETRY_AT_FILE.read_text())
+    except (OSError, ValueError):
+        return 0
+    return max(0, retry_at - time.time())
+
+def hold_change(changes, retry_after=None):
+    """Store a change in .brainvibe/pending to be sent once the server has capacity"""
+    PENDING_DIR.mkdir(parents=True, exist_ok=True)
+    if retry_after is not None:
+        RETRY_AT_FILE.write_text(str(time.time() + retry_after))
+    held = dict(changes, attempts=changes.get('attempts', 0))
+    path = PENDING_DIR / f"{time.time():.6f}-{hashlib.md5(changes['change_id'].encode()).hexdigest()[:8]}.json"
+    with open(path, 'w') as f:
+        json.dump(held, f)
+    return path
+
+def post_change(config, changes, timeout=DEFAULT_TIMEOUT):
+    """POST one change to the analyze-diff endpoint.
+
+    The server is told how long we wait (X-BrainVibe-Deadline) and returns
+    partial topics rather than overrunning it.
+
+    Returns True if it was analyzed, False on errors; raises ServerBusy on 429/503.
+    """
     url = f"{config['api_url']}/projects/{config['project_id']}/analyze-diff/"
+    deadline = time.monotonic() + timeout
     
     data = {
         "repo_path": str(Path.cwd()),
         "change_id": changes['change_id'],
-        "diff_content": changes['diff_content']
+        "diff_content": changes['diff_content'],
+        "stream": True
     }
     
-    try:
-        print(f"Sending changes to BrainVibe API: {url}")
-        print(f"Project ID: {config['project_id']}")
-        print(f"Change ID: {changes['change_id']}")
-        print(f"Diff length: {len(changes['diff_content'].splitlines())} lines")
-        
-        response = requests.post(url, json=data)
-        
-        # Print detailed debug info if there's a problem
-        if response.status_code != 200:
-            print(f"API Error: HTTP {response.status_code}")
-            print(f"Response: {response.text}")
-            return False
-            
+    print(f"Sending changes to BrainVibe API: {url}")
+    print(f"Project ID: {config['project_id']}")
+    print(f"Change ID: {changes['change_id']}")
+    print(f"Diff length: {len(changes['diff_content'].splitlines())} lines")
+    
+    response = requests.post(url, json=data, headers={DEADLINE_HEADER: f"{timeout:g}"},
+                             timeout=(CONNECT_TIMEOUT, timeout + DEADLINE_GRACE))
+    
+    # The server is overloaded and asks us to come back later
+    if response.status_code in (429, 503):
+        raise ServerBusy(_retry_after(response))
+    
+    # The server accepted the change and analyses it in the background
+    if response.status_code == 202:
         result = response.json()
-        print(f"Analysis complete!")
+        print("Analysis started, following progress...")
+        # A monorepo change is split across the projects owning its files
+        routes = result.get('routes')
+        if routes:
+            analyzed = True
+            for route in routes:
+                print(f"Project {route['project_id']} ({route['files']} files):")
+                analyzed = follow_analysis_events(route['events_url'], deadline) and analyzed
+            return analyzed
+        return follow_analysis_events(result.get('events_url'), deadline)
+    
+    # Print detailed debug info if there's a problem
+    if response.status_code != 200:
+        print(f"API Error: HTTP {response.status_code}")
+        print(f"Response: {response.text}")
+        return False
         
-        if 'topics_created' in result and result['topics_created']:
-            print(f"New topics discovered:")
-            for topic in result['topics_created']:
-                print(f"  - {topic}")
-        else:
-            print("No new topics discovered in this change.")
-            
+    result = response.json()
+    print(f"Analysis complete!")
+    if result.get('partial'):
+        print(f"The analysis did not finish within {timeout:g}s; these are partial results.")
+    
+    if 'topics_created' in result and result['topics_created']:
+        print(f"New topics discovered:")
+        for topic in result['topics_created']:
+            print(f"  - {topic}")
+    else:
+        print("No new topics discovered in this change.")
+        
+    return True
+
+def send_changes_to_api(config, changes, timeout=DEFAULT_TIMEOUT):
+    """Send changes to the BrainVibe API for analysis.
+
+    If the server is overloaded (HTTP 429/503), the change is held in
+    .brainvibe/pending and sent by flush_pending_changes once the server's
+    Retry-After has passed. Returns True if the change was analyzed or held.
+    """
+    wait = backoff_remaining()
+    if wait > 0:
+        hold_change(changes)
+        print(f"Server is busy; holding change {changes['change_id']} locally (retry in {wait:.0f}s)")
         return True
+    
+    try:
+        return post_change(config, changes, timeout)
+    except ServerBusy as e:
+        hold_change(changes, e.retry_after)
+        print(f"Server is busy; holding change {changes['change_id']} locally (retry in {e.retry_after}s)")
+        return True
+    except requests.exceptions.Timeout:
+        print(f"Error: The API server did not answer within {timeout:g}s.")
+        return False
     except requests.exceptions.ConnectionError:
         print("Error: Could not connect to the API server.")
         print("Make sure the BrainVibe backend is running at:", config['api_url'])
@@ -150,6 +272,36 @@ def send_changes_to_api(config, changes):
         print(f"Unexpected error: {e}")
         return False
 
+def flush_pending_changes(config, timeout=DEFAULT_TIMEOUT):
+    """Send held changes, oldest first, once the server's Retry-After has passed"""
+    pending = sorted(PENDING_DIR.glob('*.json')) if PENDING_DIR.exists() else []
+    if not pending or backoff_remaining() > 0:
+        return
+    
+    print(f"Sending {len(pending)} held changes")
+    for path in pending:
+        with open(path, 'r') as f:
+            changes = json.load(f)
+        try:
+            sent = post_change(config, changes, timeout)
+        except ServerBusy as e:
+            RETRY_AT_FILE.write_text(str(time.time() + e.retry_after))
+            print(f"Server is still busy; {len(pending)} changes held (retry in {e.retry_after}s)")
+            return
+        except requests.exceptions.RequestException as e:
+            print(f"Error sending held changes: {e}")
+            return
+        
+        if not sent:
+            changes['attempts'] = changes.get('attempts', 0) + 1
+            if changes['attempts'] < MAX_PENDING_ATTEMPTS:
+                with open(path, 'w') as f:
+                    json.dump(changes, f)
+                return
+            print(f"Giving up on held change {changes['change_id']} after {changes['attempts']} attempts")
+        path.unlink()
+        pending = pending[1:]
+
 def track_command(args):
     """Track code changes and analyze them using BrainVibe"""
     config = load_config()
@@ -164,9 +316,10 @@ def track_command(args):
     
     if args.one_shot:
         # Run analysis once and exit
+        flush_pending_changes(config, args.timeout)
         changes = get_git_changes()
         if changes:
-            send_changes_to_api(config, changes)
+            send_changes_to_api(config, changes, args.timeout)
         else:
             print("No changes detected.")
         return 0
@@ -180,9 +333,10 @@ def track_command(args):
             # Only analyze changes if it's been at least <interval> seconds since the last analysis
             current_time = time.time()
             if current_time - last_analysis_time >= interval_seconds:
+                flush_pending_changes(config, args.timeout)
                 changes = get_git_changes()
                 if changes:
-                    if send_changes_to_api(config, changes):
+                    if send_changes_to_api(config, changes, args.timeout):
                         last_analysis_time = current_time
                         print(f"Next analysis scheduled in {interval_seconds} seconds")
                 
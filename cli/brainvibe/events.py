@@ -0,0 +1,70 @@
+"""
+Server-sent event helpers for following BrainVibe analysis progress
+"""
+
+import json
+
+
+def iter_sse_events(response):
+    """
+    Parse a text/event-stream response into (event, data) tuples.
+
+    Args:
+        response: A streaming requests.Response
+
+    Yields:
+        Tuples of (event type, decoded JSON data)
+    """
+    event_type, data_lines = 'message', []
+    for raw_line in response.iter_lines(decode_unicode=True):
+        if raw_line is None:
+            continue
+        line = raw_line.rstrip('\r')
+        if not line:
+            # A blank line dispatches the event
+            if data_lines:
+                data = '\n'.join(data_lines)
+                try:
+                    data = json.loads(data)
+                except ValueError:
+                    pass
+                yield event_type, data
+            event_type, data_lines = 'message', []
+            continue
+        if line.startswith(':'):
+            continue  # Comment / keep-alive
+        field, _, value = line.partition(':')
+        value = value[1:] if value.startswith(' ') else value
+        if field == 'event':
+            event_type = value
+        elif field == 'data':
+            data_lines.append(value)
+
+
+def render_event(event_type, data):
+    """
+    Print a progress event for the user.
+
+    Args:
+        event_type: SSE event type
+        data: Event payload
+
+    Returns:
+        True if this was the final event of the stream
+    """
+    if event_type == 'stage':
+        details = ', '.join(f"{k}={v}" for k, v in data.items()
+                            if k not in ('stage', 'project_id', 'change_id'))
+        print(f"  [{data.get('stage')}] {details}".rstrip())
+    elif event_type == 'topic':
+        topic = data.get('topic', {})
+        marker = 'new' if data.get('created') else 'seen'
+        print(f"  + {topic.get('title')} ({topic.get('topic_id')}) [{marker}]")
+    elif event_type == 'complete':
+        created = data.get('topics_created') or []
+        print(f"Analysis complete! {len(created)} new topics discovered.")
+        return True
+    elif event_type == 'error':
+        print(f"Analysis failed: {data.get('message')}")
+        return True
+    return False
@@ -161,6 +161,20 @@ const ProjectDetails = () => {
     }
   }, [projectId]);
 
+  // Add topics as soon as the backend reports them instead of refetching
+  useEffect(() => {
+    if (!projectId) return undefined;
+    
+    return apiService.subscribeToProjectEvents(projectId, (eventType, data) => {
+      if (eventType !== 'topic' || !data.topic) return;
+      setTopics((current) => (
+        current.some((topic) => topic.topic_id === data.topic.topic_id)
+          ? current
+          : [...current, data.topic]
+      ));
+    });
+  }, [projectId]);
+
   const handleAnalyzeRepo = async (e) => {
     e.preventDefault();
     if (!repoPath.trim()) return;
@@ -97,6 +97,21 @@ const apiService = {
     }
   },
 
+  // Live analysis progress (server-sent events). Returns a function that closes the stream.
+  subscribeToProjectEvents(projectId, onEvent) {
+    const source = new EventSource(`${API_BASE_URL}/projects/${projectId}/events/`);
+    ['stage', 'topic', 'complete', 'error'].forEach((eventType) => {
+      source.addEventListener(eventType, (event) => {
+        try {
+          onEvent(eventType, JSON.parse(event.data));
+        } catch (error) {
+          console.error('Error parsing analysis event:', error);
+        }
+      });
+    });
+    return () => source.close();
+  },
+
   async analyzeProjectDiff(projectId, repoPath) {
     const response = await apiClient.post(`/projects/${projectId}/analyze-diff/`, { repo_path: repoPath });
     return response.data;